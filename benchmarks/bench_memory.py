@@ -0,0 +1,125 @@
+""" Measures the memory taken by the per-page state of the watchdog: the compiled page configs and the latest
+    result of every page. Compares the records used by HttpWatchdog with the dicts and datetime objects used
+    before, built here the same way the watchdog used to build them.
+
+    Run from the top-level directory with:
+        python -m benchmarks.bench_memory [--pages N]
+"""
+
+import time
+import logging
+import argparse
+import tracemalloc
+from datetime import datetime
+
+from src.http_watchdog import HttpWatchdog
+from src.probe_result  import ProbeResult
+
+# Pages per request target. Each URL is listed in the requirement file with several sets of patterns.
+PAGES_PER_URL = 2
+
+def generate_page_configs(page_count):
+    """ Returns page configs in the format read from the requirement file. Every URL is a separate string,
+        like the ones created by the YAML loader, even if the same URL occurs many times.
+    """
+
+    return [
+        {
+            'url':      ''.join(['https://site{}.example.com/section/'.format(i % 250), str(i // PAGES_PER_URL)]),
+            'patterns': ['Copyright \\d{4} Example', 'product-{}'.format(i % PAGES_PER_URL)],
+        }
+        for i in range(page_count)
+    ]
+
+def probe_all_pages(watchdog):
+    """ Fills probe_results with the results of a single successful probe of every group """
+
+    for fetch_group in watchdog._fetch_groups:
+        timings      = {'dns': 0.001, 'connect': 0.02, 'tls': 0.03, 'ttfb': 0.1, 'dns_source': 'cache', 'download': 0.01}
+        matches      = [(100, 'match')] * len(fetch_group['matcher'].patterns)
+        fetch_result = (matches, None, 200, 'OK', time.time() - 0.16, time.time(), False, timings)
+
+        for (page_index, result) in watchdog._process_fetch_result(fetch_group, fetch_result, 0.001):
+            watchdog._probe_results[page_index] = result
+
+def dict_page_configs(watchdog, page_configs):
+    """ Page configs as dicts with lists of regexes and URLs that are not interned """
+
+    return [
+        {
+            'url':      page_config['url'],
+            'regexes':  [watchdog._pattern_cache.regex(pattern) for pattern in page_config['patterns']],
+            'interval': 300,
+        }
+        for page_config in page_configs
+    ]
+
+def dict_results(watchdog):
+    """ The results from probe_results as dicts with datetime timestamps and timings """
+
+    dict_results = [None] * len(watchdog.probe_results)
+    for fetch_group in watchdog._fetch_groups:
+        record  = watchdog.probe_results[fetch_group['page_indices'][0]]
+        timings = record.timings._asdict()
+
+        for page_index in fetch_group['page_indices']:
+            dict_results[page_index] = {
+                'result':           ProbeResult.MATCH.value,
+                'http_status':      record.http_status,
+                'reason':           record.reason,
+                'last_probed_at':   datetime.utcnow(),
+                'request_duration': record.request_duration,
+                'scheduler_lag':    record.scheduler_lag,
+                'revalidated':      record.revalidated,
+                'timings':          timings
+            }
+
+    return dict_results
+
+def measure(function):
+    """ Returns the value returned by function and the number of bytes allocated by it that are still in use """
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        value  = function()
+        after  = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return (value, after - before)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks the memory taken by page configs and results")
+    parser.add_argument('--pages', type = int, default = 10000, help = "The number of probed pages")
+    arguments = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    watchdog = HttpWatchdog(300, generate_page_configs(arguments.pages))
+
+    # The page configs read from the file are discarded after compilation, so only the strings kept by the compiled
+    # configs are counted. Patterns are already in the pattern cache and are not counted either.
+    (_, record_configs_size) = measure(lambda: [watchdog._compile_page_config(page_config) for page_config in generate_page_configs(arguments.pages)])
+    (_, dict_configs_size)   = measure(lambda: dict_page_configs(watchdog, generate_page_configs(arguments.pages)))
+    (_, record_results_size) = measure(lambda: probe_all_pages(watchdog))
+    (_, dict_results_size)   = measure(lambda: dict_results(watchdog))
+
+    scale = 10000 / arguments.pages
+    print("{} pages, {} per URL. Sizes per 10k pages.".format(arguments.pages, PAGES_PER_URL))
+    print()
+    print("{:<30} {:>12} {:>12} {:>12}".format("", "dicts", "records", "saved"))
+    for (name, dict_size, record_size) in [
+        ("Page configs",   dict_configs_size,                     record_configs_size),
+        ("Latest results", dict_results_size,                     record_results_size),
+        ("Total",          dict_configs_size + dict_results_size, record_configs_size + record_results_size),
+    ]:
+        print("{:<30} {:>9.2f} MB {:>9.2f} MB {:>9.2f} MB".format(
+            name,
+            dict_size * scale / 1024 / 1024,
+            record_size * scale / 1024 / 1024,
+            (dict_size - record_size) * scale / 1024 / 1024
+        ))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+""" Compares the time needed to search large page bodies for patterns using PatternMatcher
+    with the original approach of running re.search() once for every pattern.
+
+    Run from the top-level directory with:
+        python -m benchmarks.bench_pattern_matching
+"""
+
+import re
+import time
+import random
+import string
+
+from src import pattern_matcher
+from src.pattern_matcher import PatternMatcher, PatternCache
+
+REPETITIONS = 5
+
+def random_words(count, length_range, alphabet = string.ascii_lowercase):
+    return [''.join(random.choice(alphabet) for _ in range(random.randint(*length_range))) for _ in range(count)]
+
+def generate_body(size, vocabulary):
+    words  = []
+    length = 0
+    while length < size:
+        word    = random.choice(vocabulary)
+        length += len(word) + 1
+        words.append(word)
+
+    return ' '.join(words)
+
+def measure(function):
+    """ Returns the best wall-clock time (in ms) out of REPETITIONS runs """
+
+    best = None
+    for _ in range(REPETITIONS):
+        start    = time.perf_counter()
+        function()
+        duration = (time.perf_counter() - start) * 1000
+        best     = duration if best == None else min(best, duration)
+
+    return best
+
+def search_with_regex_loop(regexes, body):
+    return [regex.search(body) for regex in regexes]
+
+def search_with_matcher(matcher, body):
+    return matcher.search(body, set(range(len(matcher.patterns))))
+
+class FindPatternMatcher(PatternMatcher):
+    MIN_AUTOMATON_LITERALS = float('inf')
+
+class AutomatonPatternMatcher(PatternMatcher):
+    MIN_AUTOMATON_LITERALS = 1
+
+def benchmark_scanning():
+    vocabulary = random_words(5000, (3, 10))
+
+    # Half of the literals are present in the body, half are not (the search has to cover the whole body for them)
+    scenarios = [
+        ("20 patterns (15 literals, 5 regexes)", random.sample(vocabulary, 8) + random_words(7, (6, 10), 'qxzjkvw') + [
+            '<div class="[a-z]+">',
+            '#\\d\\d\\d',
+            'function\\(\\)\\{.*\\}',
+            '[A-Z]{5,}',
+            'spam|eggs',
+        ]),
+        ("100 literals", random.sample(vocabulary, 50) + random_words(50, (6, 10), 'qxzjkvw')),
+    ]
+
+    print("{:<40} {:>10} {:>14} {:>14} {:>14} {:>14}".format("Scenario", "Body size", "re loop", "find", "automaton", "default path"))
+    for (name, patterns) in scenarios:
+        regexes           = [re.compile(pattern) for pattern in patterns]
+        find_matcher      = FindPatternMatcher(patterns)
+        automaton_matcher = AutomatonPatternMatcher(patterns) if pattern_matcher.ahocorasick != None else None
+
+        # The path the watchdog itself takes for these patterns with the installed packages
+        default_path = 'automaton' if PatternMatcher(patterns).uses_automaton else 'find'
+
+        for size in [1024 * 1024, 8 * 1024 * 1024]:
+            body = generate_body(size, vocabulary)
+
+            loop_time      = measure(lambda: search_with_regex_loop(regexes, body))
+            find_time      = measure(lambda: search_with_matcher(find_matcher, body))
+            automaton_time = measure(lambda: search_with_matcher(automaton_matcher, body)) if automaton_matcher != None else None
+
+            print("{:<40} {:>7} MB {:>11.1f} ms {:>11.1f} ms {:>14} {:>14}".format(
+                name,
+                size // (1024 * 1024),
+                loop_time,
+                find_time,
+                "{:.1f} ms".format(automaton_time) if automaton_time != None else "n/a",
+                default_path
+            ))
+
+def benchmark_compilation():
+    # Many pages sharing a small number of patterns, as in requirement files generated from templates
+    pattern_sets = [random_words(5, (5, 10)) + ['#\\d{3}', '<title>[^<]+</title>'] for _ in range(50)]
+    page_count   = 10000
+
+    def compile_separately():
+        for i in range(page_count):
+            [re.compile(pattern) for pattern in pattern_sets[i % len(pattern_sets)]]
+
+    def compile_with_cache():
+        cache = PatternCache()
+        for i in range(page_count):
+            cache.matcher(pattern_sets[i % len(pattern_sets)])
+
+    # re.compile() has an internal cache too. Purge it to measure what happens once it overflows.
+    re.purge()
+    print()
+    print("Compiling patterns for {} pages: separately {:.1f} ms, with PatternCache {:.1f} ms".format(
+        page_count,
+        measure(compile_separately),
+        measure(compile_with_cache)
+    ))
+
+def main():
+    random.seed(0)
+
+    print("pyahocorasick available: {} (install it with: pip install -r requirements-optional.txt)".format(pattern_matcher.ahocorasick != None))
+    print("Pages with at least {} literal patterns use the automaton when it's available".format(PatternMatcher.MIN_AUTOMATON_LITERALS))
+    print()
+
+    benchmark_scanning()
+    benchmark_compilation()
+
+if __name__ == '__main__':
+    main()
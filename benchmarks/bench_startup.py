@@ -0,0 +1,117 @@
+""" Measures the time it takes to get from a large requirement file to a watchdog ready to probe:
+    parsing the YAML file with the pure-Python and the C loader, validating it, loading it from
+    the settings snapshot cache, creating HttpWatchdog and reloading a slightly modified list of pages
+    into a running one.
+
+    Run from the top-level directory with:
+        python -m benchmarks.bench_startup [--pages N]
+"""
+
+import time
+import random
+import logging
+import argparse
+import tempfile
+import os
+
+import yaml
+
+from src.settings_manager import SettingsManager
+from src.http_watchdog    import HttpWatchdog
+
+REPETITIONS = 3
+
+RELOAD_CHANGE_COUNT = 10
+
+def generate_requirement_file(path, page_count, seed = 0):
+    """ Writes a requirement file with page_count pages spread over page_count / 40 hosts. Most patterns
+        are shared by many pages, like in real configurations that check every page of a site for the same footer.
+    """
+
+    generator = random.Random(seed)
+
+    with open(path, 'w') as requirement_file:
+        requirement_file.write("probe-interval: 300\n")
+        requirement_file.write("pages:\n")
+        for i in range(page_count):
+            requirement_file.write("  - url: 'https://site{}.example.com/section/{}/page-{}?lang=en'\n".format(i % max(1, page_count // 40), generator.randint(1, 50), i))
+            requirement_file.write("    patterns: ['Copyright \\\\d{{4}} Example', 'product-{}', '<title>[^<]+</title>']\n".format(generator.randint(1, 1000)))
+            if i % 3 == 0:
+                requirement_file.write("    interval: 60\n")
+
+def modify_pages(page_configs, change_count):
+    """ Returns a copy of the list of page configs with change_count pages replaced, removed or added """
+
+    modified_page_configs = list(page_configs)
+    for i in range(change_count):
+        if i % 3 == 0:
+            modified_page_configs[i * 7] = dict(page_configs[i * 7], patterns = ['changed-{}'.format(i)])
+        elif i % 3 == 1:
+            modified_page_configs.append({'url': 'https://new.example.com/page-{}'.format(i), 'patterns': ['new']})
+        else:
+            del modified_page_configs[i * 11]
+
+    return modified_page_configs
+
+def measure(function):
+    """ Returns the best wall-clock time (in ms) out of REPETITIONS runs """
+
+    best = None
+    for _ in range(REPETITIONS):
+        start    = time.perf_counter()
+        function()
+        duration = (time.perf_counter() - start) * 1000
+        best     = duration if best == None else min(best, duration)
+
+    return best
+
+def load_yaml(path, loader):
+    with open(path, 'rb') as requirement_file:
+        return yaml.load(requirement_file, Loader = loader)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks loading of large requirement files")
+    parser.add_argument('--pages', type = int, default = 20000, help = "The number of pages in the generated requirement file")
+    arguments = parser.parse_args()
+
+    # Page configs are logged at DEBUG level. The benchmark measures the cost with logging disabled.
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path       = os.path.join(directory, 'pages.yaml')
+        cache_path = os.path.join(directory, 'cache')
+        generate_requirement_file(path, arguments.pages)
+
+        def read_without_cache():
+            SettingsManager._read_and_validate(SettingsManager._parse_command_line([path]))
+
+        def read_with_cold_cache():
+            for file_name in os.listdir(cache_path) if os.path.isdir(cache_path) else []:
+                os.unlink(os.path.join(cache_path, file_name))
+            SettingsManager._read_and_validate(SettingsManager._parse_command_line([path, '--config-cache', cache_path]))
+
+        def read_with_warm_cache():
+            SettingsManager._read_and_validate(SettingsManager._parse_command_line([path, '--config-cache', cache_path]))
+
+        (settings, _) = SettingsManager._read_and_validate(SettingsManager._parse_command_line([path]))
+
+        print("Requirement file with {} pages ({:.1f} MB)".format(arguments.pages, os.path.getsize(path) / 1024 / 1024))
+        print()
+        print("{:<45} {:>10.1f} ms".format("YAML parsing, pure-Python loader", measure(lambda: load_yaml(path, yaml.SafeLoader))))
+        if hasattr(yaml, 'CSafeLoader'):
+            print("{:<45} {:>10.1f} ms".format("YAML parsing, C loader", measure(lambda: load_yaml(path, yaml.CSafeLoader))))
+        else:
+            print("{:<45} {:>13}".format("YAML parsing, C loader", "unavailable"))
+        print("{:<45} {:>10.1f} ms".format("Reading and validation, no snapshot cache", measure(read_without_cache)))
+        print("{:<45} {:>10.1f} ms".format("Reading and validation, cold snapshot cache", measure(read_with_cold_cache)))
+        print("{:<45} {:>10.1f} ms".format("Reading and validation, warm snapshot cache", measure(read_with_warm_cache)))
+        print("{:<45} {:>10.1f} ms".format("Creating HttpWatchdog", measure(lambda: HttpWatchdog(settings['probe_interval'], settings['pages']))))
+
+        watchdog       = HttpWatchdog(settings['probe_interval'], settings['pages'])
+        original_pages = settings['pages']
+        modified_pages = modify_pages(original_pages, RELOAD_CHANGE_COUNT)
+        reloads        = iter([modified_pages, original_pages] * REPETITIONS)
+        print("{:<45} {:>10.1f} ms".format("Reloading {} changed pages".format(RELOAD_CHANGE_COUNT), measure(lambda: watchdog.reload(next(reloads)))))
+
+if __name__ == '__main__':
+    main()
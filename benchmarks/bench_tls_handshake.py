@@ -0,0 +1,130 @@
+""" Compares the cost of establishing HTTPS connections the way http.client does it by default (a new
+    SSLContext and a full handshake for every connection) with a shared SSLContext and with TLS session
+    resumption provided by TlsSessionCache.
+
+    The server runs in a thread on the loopback interface so the numbers include the CPU time of both ends
+    of the handshake but no network latency. Requires the openssl command to generate a certificate.
+
+    Run from the top-level directory with:
+        python -m benchmarks.bench_tls_handshake
+"""
+
+import os
+import ssl
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import http.server
+import socketserver
+
+from src.timed_http_connection import TimedHTTPSConnection
+from src.tls_session_cache     import TlsSessionCache
+
+CONNECTIONS = 200
+
+class OkHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(b'OK')
+
+    def log_message(self, format, *args):
+        pass
+
+class TlsServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+def generate_certificate(directory):
+    certificate_path = os.path.join(directory, 'localhost.crt')
+    key_path         = os.path.join(directory, 'localhost.key')
+
+    subprocess.run(
+        [
+            'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+            '-addext', 'subjectAltName=DNS:localhost', '-keyout', key_path, '-out', certificate_path
+        ],
+        check  = True,
+        stdout = subprocess.DEVNULL,
+        stderr = subprocess.DEVNULL
+    )
+
+    return (certificate_path, key_path)
+
+def start_server(certificate_path, key_path, maximum_version):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certificate_path, key_path)
+    context.maximum_version = maximum_version
+
+    server        = TlsServer(('127.0.0.1', 0), OkHandler)
+    server.socket = context.wrap_socket(server.socket, server_side = True)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    return server
+
+def fetch(connection):
+    connection.request('GET', '/')
+    connection.getresponse().read()
+    connection.close()
+
+def measure(create_connection):
+    """ Returns the average time (in ms) of connecting and fetching a tiny page over a new connection """
+
+    start = time.perf_counter()
+    for _ in range(CONNECTIONS):
+        fetch(create_connection())
+
+    return (time.perf_counter() - start) * 1000 / CONNECTIONS
+
+def benchmark_server(port, certificate_path):
+    def default_context_per_connection():
+        # What http.client does when no context is passed, plus the certificate of the test server
+        context = ssl.create_default_context()
+        context.load_verify_locations(cafile = certificate_path)
+        return TimedHTTPSConnection('localhost', port, context = context)
+
+    shared_context = ssl.create_default_context(cafile = certificate_path)
+    def shared_context_without_resumption():
+        return TimedHTTPSConnection('localhost', port, context = shared_context)
+
+    tls_sessions = TlsSessionCache(ca_file = certificate_path)
+    def shared_context_with_resumption():
+        return TimedHTTPSConnection('localhost', port, tls_sessions = tls_sessions)
+
+    results = [
+        ("New default context, full handshake", measure(default_context_per_connection)),
+        ("Shared context, full handshake",      measure(shared_context_without_resumption)),
+        ("Shared context, session resumption",  measure(shared_context_with_resumption)),
+    ]
+
+    return (results, tls_sessions)
+
+def main():
+    if shutil.which('openssl') == None:
+        print("The openssl command is not available. Cannot generate a certificate for the test server.")
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        (certificate_path, key_path) = generate_certificate(directory)
+
+        print("{:<40} {:>16}".format("Scenario", "Per connection"))
+        for (name, maximum_version) in [("TLS 1.2", ssl.TLSVersion.TLSv1_2), ("TLS 1.3", ssl.TLSVersion.TLSv1_3)]:
+            server = start_server(certificate_path, key_path, maximum_version)
+            try:
+                (results, tls_sessions) = benchmark_server(server.server_address[1], certificate_path)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+            print(name)
+            for (scenario, duration) in results:
+                print("    {:<36} {:>13.2f} ms".format(scenario, duration))
+            print("    Resumed handshakes: {} of {}".format(tls_sessions.resumed_handshakes, tls_sessions.resumed_handshakes + tls_sessions.full_handshakes))
+
+if __name__ == '__main__':
+    main()
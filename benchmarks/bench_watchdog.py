@@ -0,0 +1,295 @@
+""" Measures the performance of the whole watchdog against a local farm of fake sites (see fake_site_farm.py)
+    and writes the results to a JSON file so that they can be compared between versions.
+
+    Each scenario runs in a separate process so that its peak memory usage is measured in isolation.
+    The farm runs in the parent process. Recorded metrics:
+
+        - cycle_times: duration of each full probe() cycle over all pages (seconds)
+        - probes_per_second: pages probed per second in the warm cycles (or in run_forever())
+        - scheduler_lag: the scheduler lag reported after the last batch of run_forever()
+        - peak_rss: the sum of the peak resident memory of the process running the watchdog and of its
+          probing processes, if there are any (bytes)
+        - peak_rss_children: the part of peak_rss used by the probing processes (bytes)
+        - report_cold, report_cached, status_api, metrics: latency of the report server (seconds)
+
+    Run from the top-level directory with:
+        python -m benchmarks.bench_watchdog [--pages N] [--https] [--faults] [--output FILE] [--compare OLD_FILE]
+"""
+
+import sys
+import json
+import time
+import queue
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+import http.client
+import multiprocessing
+
+from benchmarks.fake_site_farm import FakeSiteFarm, generate_pages
+
+SCENARIOS = [
+    {'name': 'probe-blocking-1-worker',   'mode': 'probe',       'engine': 'blocking', 'workers': 1,  'processes': 1},
+    {'name': 'probe-blocking-16-workers', 'mode': 'probe',       'engine': 'blocking', 'workers': 16, 'processes': 1},
+    {'name': 'probe-asyncio',             'mode': 'probe',       'engine': 'asyncio',  'workers': 1,  'processes': 1},
+    {'name': 'run-forever-asyncio',       'mode': 'run_forever', 'engine': 'asyncio',  'workers': 1,  'processes': 1},
+    {'name': 'run-sharded-asyncio',       'mode': 'run_forever', 'engine': 'asyncio',  'workers': 1,  'processes': 4},
+]
+
+PROBE_CYCLES         = 3
+RUN_FOREVER_SECONDS  = 10
+RUN_FOREVER_INTERVAL = 2
+REPORT_REPETITIONS   = 20
+
+# Pages that hang would otherwise hold every cycle for the default 30 seconds
+CONNECTION_TIMEOUT = 2
+
+# Metrics where a higher value is better. For all the others lower is better.
+HIGHER_IS_BETTER = ['probes_per_second']
+
+def measure_request(connection, path):
+    start = time.perf_counter()
+    connection.request('GET', path)
+    connection.getresponse().read()
+    return time.perf_counter() - start
+
+def measure_report_server(watchdog):
+    """ Starts a report server for the watchdog and measures how long it takes to serve its resources """
+
+    from src.report_server                  import ThreadingReportServer
+    from src.reporting_http_request_handler import ReportingHTTPRequestHandler
+
+    class QuietRequestHandler(ReportingHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingReportServer(('127.0.0.1', 0), QuietRequestHandler)
+    server.probe_data_provider = watchdog
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+
+        # The first request renders the report. The following ones are served from the cache.
+        results = {
+            'report_cold':   measure_request(connection, '/'),
+            'report_cached': sorted(measure_request(connection, '/') for i in range(REPORT_REPETITIONS))[REPORT_REPETITIONS // 2],
+            'status_api':    measure_request(connection, '/api/status'),
+            'metrics':       measure_request(connection, '/metrics'),
+        }
+
+        connection.close()
+        return results
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def sample_children_peak_rss():
+    """ Returns a dict that maps the PIDs of the running child processes to their peak resident memory (bytes).
+        Empty if it can't be read from /proc (i.e. not on Linux).
+    """
+
+    peak_rss = {}
+    for child in multiprocessing.active_children():
+        try:
+            with open('/proc/{}/status'.format(child.pid)) as status_file:
+                for line in status_file:
+                    if line.startswith('VmHWM:'):
+                        peak_rss[child.pid] = int(line.split()[1]) * 1024
+        except OSError:
+            pass
+
+    return peak_rss
+
+def run_scenario(scenario, page_configs, ca_file, result_queue):
+    """ The body of the process that runs a single scenario. Puts a dict with the results into result_queue. """
+
+    from src.http_watchdog    import HttpWatchdog
+    from src.shard_supervisor import ShardSupervisor
+
+    # The settings are passed on to the watchdogs in the probing processes of sharded scenarios
+    interval = RUN_FOREVER_INTERVAL if scenario['mode'] == 'run_forever' else 60
+    watchdog = HttpWatchdog(
+        interval,
+        page_configs,
+        workers            = scenario['workers'],
+        engine             = scenario['engine'],
+        ca_file            = ca_file,
+        shared_results     = scenario['processes'] > 1,
+        connection_timeout = CONNECTION_TIMEOUT
+    )
+    results           = {'name': scenario['name']}
+    children_peak_rss = {}
+
+    if scenario['mode'] == 'probe':
+        cycle_times = []
+        for cycle in range(PROBE_CYCLES):
+            start = time.perf_counter()
+            for (page_index, result) in watchdog.probe():
+                watchdog.store_result(page_index, result)
+            cycle_times.append(time.perf_counter() - start)
+
+        # The first cycle includes opening connections and resolving names
+        warm_cycle_times             = cycle_times[1:] if len(cycle_times) > 1 else cycle_times
+        results['cycle_times']       = cycle_times
+        results['probes_per_second'] = len(page_configs) / (sum(warm_cycle_times) / len(warm_cycle_times))
+    else:
+        exception_queue = queue.Queue()
+
+        def interrupt():
+            time.sleep(RUN_FOREVER_SECONDS)
+
+            # The probing processes are gone once run_sharded() returns
+            children_peak_rss.update(sample_children_peak_rss())
+            try:
+                raise KeyboardInterrupt()
+            except KeyboardInterrupt:
+                exception_queue.put(sys.exc_info())
+
+        threading.Thread(target = interrupt, daemon = True).start()
+
+        start = time.perf_counter()
+        try:
+            if scenario['processes'] > 1:
+                watchdog.run_sharded(exception_queue, ShardSupervisor(scenario['processes']))
+            else:
+                watchdog.run_forever(exception_queue)
+        except KeyboardInterrupt:
+            pass
+
+        results['probes_per_second'] = watchdog.probe_results_version / (time.perf_counter() - start)
+        results['scheduler_lag']     = watchdog.scheduler_lag
+
+    results.update(measure_report_server(watchdog))
+    watchdog.close()
+
+    # ru_maxrss is in kilobytes on Linux. For RUSAGE_CHILDREN it's the peak of the largest child, not a sum, so without
+    # samples from /proc the total is only an estimate.
+    if len(children_peak_rss) == 0 and scenario['processes'] > 1:
+        children_peak_rss = {'estimate': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024 * scenario['processes']}
+
+    results['peak_rss_children'] = sum(children_peak_rss.values())
+    results['peak_rss']          = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 + results['peak_rss_children']
+
+    result_queue.put(results)
+
+def run_scenario_in_process(scenario, page_configs, ca_file):
+    context      = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    process      = context.Process(target = run_scenario, args = (scenario, page_configs, ca_file, result_queue))
+
+    process.start()
+    results = result_queue.get()
+    process.join()
+
+    return results
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], check = True, capture_output = True, text = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old_results, new_results):
+    old_scenarios = {scenario['name']: scenario for scenario in old_results['scenarios']}
+
+    print()
+    print("Comparison with {} ({})".format(old_results['metadata']['revision'], old_results['metadata']['date']))
+    for scenario in new_results['scenarios']:
+        if not scenario['name'] in old_scenarios:
+            continue
+
+        print(scenario['name'])
+        for (metric, value) in scenario.items():
+            old_value = old_scenarios[scenario['name']].get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old_value, (int, float)) or old_value == 0:
+                continue
+
+            change    = (value - old_value) / old_value * 100
+            improved  = change > 0 if metric in HIGHER_IS_BETTER else change < 0
+            print("    {:<20} {:>14.4f} -> {:>14.4f} ({:+.1f}%{})".format(metric, old_value, value, change, '' if improved or change == 0 else ', worse'))
+
+def print_results(results):
+    print("{:<28} {:>12} {:>12} {:>12} {:>12} {:>12} {:>12}".format("Scenario", "Probes/s", "Peak RSS", "In children", "Report", "Cached", "Status API"))
+    for scenario in results['scenarios']:
+        print("{:<28} {:>12.1f} {:>9.1f} MB {:>9.1f} MB {:>9.1f} ms {:>9.2f} ms {:>9.1f} ms".format(
+            scenario['name'],
+            scenario['probes_per_second'],
+            scenario['peak_rss'] / 1024 / 1024,
+            scenario['peak_rss_children'] / 1024 / 1024,
+            scenario['report_cold'] * 1000,
+            scenario['report_cached'] * 1000,
+            scenario['status_api'] * 1000
+        ))
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks the watchdog against a local farm of fake sites")
+    parser.add_argument('--pages',   type = int, default = 200, help = "The number of pages in the farm")
+    parser.add_argument('--seed',    type = int, default = 0, help = "Seed used to generate the pages")
+    parser.add_argument('--https',   action = 'store_true', help = "Serve the pages over HTTPS (requires the openssl command)")
+    parser.add_argument('--faults',  action = 'store_true', help = "Make 2%% of the pages hang and 2%% reset the connection")
+    parser.add_argument('--output',  default = 'benchmark-results.json', help = "Where to write the results")
+    parser.add_argument('--compare', help = "Results of an earlier run to compare with")
+    arguments = parser.parse_args()
+
+    fault_fraction = 0.02 if arguments.faults else 0.0
+    pages          = generate_pages(arguments.pages, arguments.seed, hang_fraction = fault_fraction, reset_fraction = fault_fraction)
+
+    with tempfile.TemporaryDirectory() as directory:
+        ca_file     = None
+        ssl_context = None
+        if arguments.https:
+            from benchmarks.bench_tls_handshake import generate_certificate
+            import ssl
+
+            if shutil.which('openssl') == None:
+                print("The openssl command is not available. Cannot generate a certificate for HTTPS.")
+                return
+
+            (ca_file, key_path) = generate_certificate(directory)
+            ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            ssl_context.load_cert_chain(ca_file, key_path)
+
+        with FakeSiteFarm(pages, ssl_context = ssl_context) as farm:
+            scenarios = []
+            for scenario in SCENARIOS:
+                print("Running {}...".format(scenario['name']), file = sys.stderr)
+                scenarios.append(run_scenario_in_process(scenario, farm.page_configs(), ca_file))
+
+    results = {
+        'metadata': {
+            'revision': git_revision(),
+            'date':     time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python':   platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'parameters': {
+            'pages':               arguments.pages,
+            'seed':                arguments.seed,
+            'https':               arguments.https,
+            'faults':              arguments.faults,
+            'probe_cycles':        PROBE_CYCLES,
+            'run_forever_seconds': RUN_FOREVER_SECONDS,
+            'connection_timeout':  CONNECTION_TIMEOUT,
+            'fake_pages':          [page.to_dict() for page in pages],
+        },
+        'scenarios': scenarios,
+    }
+
+    with open(arguments.output, 'w') as output_file:
+        json.dump(results, output_file, indent = 4)
+
+    print_results(results)
+    print()
+    print("Results written to {}".format(arguments.output))
+
+    if arguments.compare != None:
+        with open(arguments.compare) as old_file:
+            compare(json.load(old_file), results)
+
+if __name__ == '__main__':
+    main()
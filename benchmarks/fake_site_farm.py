@@ -0,0 +1,268 @@
+""" A local HTTP(S) server that stands in for the sites probed by the watchdog in benchmarks.
+
+    The farm serves a list of virtual pages at /page/<index>. Each page has its own latency, body size,
+    transfer encoding and status code, or misbehaves by hanging or resetting the connection. It runs on
+    asyncio in a thread of its own so that thousands of slow pages do not need thousands of threads.
+
+    It can also be started on its own, e.g. to point a real watchdog at it:
+        python -m benchmarks.fake_site_farm --pages 1000 --port 8000
+"""
+
+import ssl
+import socket
+import struct
+import random
+import asyncio
+import argparse
+import threading
+
+# A word that every page contains at the end of its body so that the watchdog has to scan the whole body to find it
+MARKER = 'watchdog-marker'
+
+class FakePage:
+    """ Describes how the farm responds to requests for a single page.
+
+        - latency: seconds between receiving the request and sending the headers
+        - size: the number of bytes in the body
+        - chunked: whether the body is sent with chunked transfer encoding rather than Content-Length
+        - status: HTTP status code
+        - behaviour: 'normal', 'hang' (never respond) or 'reset' (reset the connection instead of responding)
+    """
+
+    BEHAVIOURS = ['normal', 'hang', 'reset']
+
+    def __init__(self, latency = 0.0, size = 10 * 1024, chunked = False, status = 200, behaviour = 'normal'):
+        assert behaviour in self.BEHAVIOURS
+
+        self.latency   = latency
+        self.size      = size
+        self.chunked   = chunked
+        self.status    = status
+        self.behaviour = behaviour
+
+    def body(self):
+        filler = (b'lorem ipsum dolor sit amet ' * (self.size // 27 + 1))[:max(0, self.size - len(MARKER))]
+        return filler + MARKER.encode('ascii')
+
+    def to_dict(self):
+        return {
+            'latency':   self.latency,
+            'size':      self.size,
+            'chunked':   self.chunked,
+            'status':    self.status,
+            'behaviour': self.behaviour,
+        }
+
+def generate_pages(count, seed = 0, latency = (0.0, 0.05), sizes = (1024, 64 * 1024), chunked_fraction = 0.25, error_fraction = 0.05, hang_fraction = 0.0, reset_fraction = 0.0):
+    """ Returns a reproducible list of count FakePages with latency and size drawn uniformly from specified
+        ranges. The fractions give the share of chunked responses, error statuses, hangs and resets.
+    """
+
+    generator = random.Random(seed)
+
+    pages = []
+    for i in range(count):
+        draw = generator.random()
+        if draw < hang_fraction:
+            behaviour = 'hang'
+        elif draw < hang_fraction + reset_fraction:
+            behaviour = 'reset'
+        else:
+            behaviour = 'normal'
+
+        pages.append(FakePage(
+            latency   = generator.uniform(*latency),
+            size      = generator.randint(*sizes),
+            chunked   = generator.random() < chunked_fraction,
+            status    = generator.choice([404, 500, 503]) if generator.random() < error_fraction else 200,
+            behaviour = behaviour
+        ))
+
+    return pages
+
+class FakeSiteFarm:
+    """ Serves pages from a list of FakePages on 127.0.0.1. Use start() and stop() or a with statement.
+        If ssl_context is given, the farm speaks HTTPS. Connections are kept alive unless the client
+        asks otherwise.
+    """
+
+    REASONS = {200: 'OK', 404: 'Not Found', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+    CHUNK_SIZE = 4096
+
+    def __init__(self, pages, port = 0, ssl_context = None):
+        self.pages         = pages
+        self.port          = port
+        self.request_count = 0
+
+        self._ssl_context = ssl_context
+        self._bodies      = {}
+        self._loop        = None
+        self._server      = None
+        self._thread      = None
+        self._ready       = threading.Event()
+
+    @property
+    def scheme(self):
+        return 'https' if self._ssl_context != None else 'http'
+
+    def url(self, page_index):
+        return '{}://localhost:{}/page/{}'.format(self.scheme, self.port, page_index)
+
+    def page_configs(self, patterns = [MARKER]):
+        """ Returns page configs in the format expected by HttpWatchdog, one for each page """
+
+        return [{'url': self.url(page_index), 'patterns': list(patterns)} for page_index in range(len(self.pages))]
+
+    def _body(self, page_index):
+        # Bodies are generated once and shared by all requests for the page
+        if not page_index in self._bodies:
+            self._bodies[page_index] = self.pages[page_index].body()
+
+        return self._bodies[page_index]
+
+    @classmethod
+    def _reset(cls, writer):
+        # SO_LINGER with zero timeout makes close() send RST instead of FIN
+        sock = writer.get_extra_info('socket')
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        writer.transport.abort()
+
+    async def _respond(self, page_index, writer):
+        """ Sends the response for specified page. Returns False if the connection must not be used anymore. """
+
+        if page_index == None or page_index >= len(self.pages):
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+            return True
+
+        page = self.pages[page_index]
+        if page.behaviour == 'hang':
+            await asyncio.sleep(3600)
+            return False
+
+        if page.latency > 0:
+            await asyncio.sleep(page.latency)
+
+        if page.behaviour == 'reset':
+            self._reset(writer)
+            return False
+
+        # The client may have given up while waiting. asyncio logs a warning for every write to a lost connection.
+        if writer.transport.is_closing():
+            return False
+
+        body = self._body(page_index)
+        head = 'HTTP/1.1 {} {}\r\nContent-Type: text/html; charset=utf-8\r\n'.format(page.status, self.REASONS.get(page.status, 'Unknown'))
+        if page.chunked:
+            writer.write((head + 'Transfer-Encoding: chunked\r\n\r\n').encode('ascii'))
+            for offset in range(0, len(body), self.CHUNK_SIZE):
+                # The watchdog closes the connection as soon as it has found all the patterns
+                if writer.transport.is_closing():
+                    return False
+
+                chunk = body[offset : offset + self.CHUNK_SIZE]
+                writer.write('{:x}\r\n'.format(len(chunk)).encode('ascii') + chunk + b'\r\n')
+                await writer.drain()
+            writer.write(b'0\r\n\r\n')
+        else:
+            writer.write((head + 'Content-Length: {}\r\n\r\n'.format(len(body))).encode('ascii') + body)
+
+        return True
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if request_line == b'':
+                    return
+
+                keep_alive = True
+                while True:
+                    line = await reader.readline()
+                    if line in [b'\r\n', b'\n', b'']:
+                        break
+                    if line.lower().startswith(b'connection:') and b'close' in line.lower():
+                        keep_alive = False
+
+                self.request_count += 1
+
+                path = request_line.split(b' ')[1].decode('ascii', 'replace') if len(request_line.split(b' ')) > 1 else ''
+                try:
+                    page_index = int(path.split('/page/', 1)[1]) if path.startswith('/page/') else None
+                except ValueError:
+                    page_index = None
+
+                if not await self._respond(page_index, writer) or not keep_alive:
+                    break
+
+                await writer.drain()
+        except (ConnectionError, ssl.SSLError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # The farm is stopping. The callback in asyncio.streams calls exception() on the finished
+            # task and would print a traceback for every hanging page if the cancellation propagated.
+            pass
+        finally:
+            if not writer.transport.is_closing():
+                writer.close()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        self._server = self._loop.run_until_complete(asyncio.start_server(
+            self._handle_connection,
+            '127.0.0.1',
+            self.port,
+            ssl     = self._ssl_context,
+            backlog = 1024
+        ))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+
+        self._loop.run_forever()
+
+        # Hanging pages are still waiting. Cancel them so that the loop can be closed cleanly.
+        self._server.close()
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions = True))
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target = self._run, name = 'FakeSiteFarm', daemon = True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description = "Serves fake pages for benchmarking the watchdog")
+    parser.add_argument('--pages',   type = int, default = 100)
+    parser.add_argument('--port',    type = int, default = 8000)
+    parser.add_argument('--seed',    type = int, default = 0)
+    parser.add_argument('--hangs',   type = float, default = 0.0, help = "The fraction of pages that never respond")
+    parser.add_argument('--resets',  type = float, default = 0.0, help = "The fraction of pages that reset the connection")
+    arguments = parser.parse_args()
+
+    farm = FakeSiteFarm(generate_pages(arguments.pages, arguments.seed, hang_fraction = arguments.hangs, reset_fraction = arguments.resets), arguments.port)
+    farm.start()
+    print("Serving {} pages at {}".format(len(farm.pages), farm.url('<index>')))
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        farm.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+""" Definition of AsyncHttpClient class that performs HTTP GET requests on top of asyncio streams
+    (i.e. non-blocking sockets) so that a single thread can keep thousands of them in flight.
+"""
+
+import ssl
+import time
+import socket
+import asyncio
+import contextlib
+import http.client
+from email.parser import Parser
+
+from .dns_cache import DnsCache
+
+class AsyncHttpResponse:
+    """ A minimal counterpart of http.client.HTTPResponse returned by AsyncHttpClient.
+        The body is not downloaded until read() or read_chunk() is called.
+    """
+
+    def __init__(self, status, reason, headers, reader, writer, timeout, connection_timings, time_to_headers):
+        """ connection_timings is a dict with the durations of the phases of connecting ('dns', 'connect'
+            and 'tls') and time_to_headers is the time from the start of connecting until the headers
+            were received (see HttpWatchdog._complete_timings()).
+        """
+
+        self.status             = status
+        self.reason             = reason
+        self.headers            = headers
+        self.connection_timings = connection_timings
+        self.time_to_headers    = time_to_headers
+        self._reader            = reader
+        self._writer            = writer
+        self._timeout           = timeout
+
+        transfer_encoding = self.getheader('Transfer-Encoding', '')
+        content_length    = self.getheader('Content-Length')
+
+        # Exactly one of these is used depending on how the end of the body is marked
+        self._chunked          = 'chunked' in transfer_encoding.lower()
+        self._chunk_remaining  = 0
+        self._length_remaining = None
+        self._finished         = False
+
+        if not self._chunked and content_length != None:
+            if not content_length.strip().isdigit():
+                raise http.client.HTTPException("Invalid Content-Length header: '{}'".format(content_length))
+
+            self._length_remaining = int(content_length)
+
+    def getheader(self, name, default = None):
+        """ Returns the value of specified header (same as http.client.HTTPResponse.getheader()) """
+
+        return self.headers.get(name, default)
+
+    async def _read_with_timeout(self, coroutine):
+        return await asyncio.wait_for(coroutine, self._timeout)
+
+    async def _read_chunked(self, max_size):
+        """ Reads a part of a body sent with 'Transfer-Encoding: chunked' """
+
+        if self._chunk_remaining == 0:
+            size_line = await self._read_with_timeout(self._reader.readline())
+
+            # Chunk extensions (after a semicolon) are allowed by the standard but carry no meaning for us.
+            try:
+                self._chunk_remaining = int(size_line.split(b';')[0].strip(), 16)
+            except ValueError as exception:
+                raise http.client.IncompleteRead(b'') from exception
+
+            if self._chunk_remaining == 0:
+                # Skip trailers
+                while (await self._read_with_timeout(self._reader.readline())) not in [b'\r\n', b'\n', b'']:
+                    pass
+
+                self._finished = True
+                return b''
+
+        data = await self._read_with_timeout(self._reader.read(min(max_size, self._chunk_remaining)))
+        if data == b'':
+            raise http.client.IncompleteRead(b'')
+
+        self._chunk_remaining -= len(data)
+        if self._chunk_remaining == 0:
+            # CRLF after chunk data
+            await self._read_with_timeout(self._reader.readline())
+
+        return data
+
+    async def read_chunk(self, max_size):
+        """ Returns the next part of the body, at most max_size bytes long. Returns an empty bytes
+            object when the whole body has been read.
+        """
+
+        if self._finished:
+            return b''
+
+        if self._chunked:
+            return await self._read_chunked(max_size)
+        elif self._length_remaining != None:
+            if self._length_remaining == 0:
+                self._finished = True
+                return b''
+
+            data = await self._read_with_timeout(self._reader.read(min(max_size, self._length_remaining)))
+            if data == b'':
+                raise http.client.IncompleteRead(b'', self._length_remaining)
+
+            self._length_remaining -= len(data)
+            return data
+        else:
+            # Neither length nor chunks. The server is going to close the connection after sending the whole body.
+            data = await self._read_with_timeout(self._reader.read(max_size))
+            if data == b'':
+                self._finished = True
+
+            return data
+
+    async def read(self):
+        """ Downloads the rest of the body and returns it as bytes """
+
+        chunks = []
+        while True:
+            chunk = await self.read_chunk(64 * 1024)
+            if chunk == b'':
+                return b''.join(chunks)
+
+            chunks.append(chunk)
+
+    def close(self):
+        if not self._writer.is_closing():
+            self._writer.close()
+
+class AsyncHttpClient:
+    """ A very small HTTP/1.1 client sufficient for probing web pages. It sends a single GET request per
+        connection ('Connection: close') and understands bodies delimited by Content-Length, chunked
+        transfer encoding or connection close. Unlike the blocking engine (see ConnectionPool) it does
+        not reuse connections, so every probe pays for connecting and, with HTTPS, a TLS handshake
+        (abbreviated if the session is resumed).
+
+        timeout is applied to each network operation separately, just like the timeout in http.client.
+        Host names are resolved with dns_cache (a DnsCache) if specified. HTTPS connections use the
+        SSLContext of tls_sessions (a TlsSessionCache) and resume its sessions if specified.
+    """
+
+    def __init__(self, timeout, dns_cache = None, tls_sessions = None):
+        self._timeout      = timeout
+        self._dns_cache    = dns_cache
+        self._tls_sessions = tls_sessions
+        self._ssl_context  = None
+
+    def _get_ssl_context(self):
+        if self._tls_sessions != None:
+            return self._tls_sessions.context
+
+        # Creating a context loads the whole CA bundle so it's better to do it only once.
+        if self._ssl_context == None:
+            self._ssl_context = ssl.create_default_context()
+
+        return self._ssl_context
+
+    def _tls_origin(self, host, port):
+        """ Returns a context manager inside which TLS handshakes resume the session of specified origin """
+
+        if self._tls_sessions == None:
+            return contextlib.nullcontext()
+
+        return self._tls_sessions.origin(host, port)
+
+    def _handshake_completed(self, writer):
+        if self._tls_sessions != None:
+            self._tls_sessions.handshake_completed(writer.get_extra_info('ssl_object'))
+
+    async def _open_tcp_connection(self, addresses):
+        """ Connects to the first of the addresses returned by getaddrinfo() that accepts the connection """
+
+        last_error = None
+        for (family, socket_type, protocol, canonical_name, address) in addresses:
+            try:
+                return await asyncio.wait_for(asyncio.open_connection(address[0], address[1], family = family), self._timeout)
+            except (OSError, asyncio.TimeoutError) as error:
+                last_error = error
+
+        if last_error != None:
+            raise last_error
+
+        raise OSError("getaddrinfo returns an empty list")
+
+    async def _connect(self, scheme, host, port, connection_timings):
+        """ Resolves the host name, connects and, in case of HTTPS, performs the TLS handshake. Returns a (reader, writer) tuple.
+            Records the duration of each phase in connection_timings as 'dns', 'connect' and 'tls' and the source of
+            the addresses (see DnsCache) as 'dns_source'.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        start_time = time.perf_counter()
+        if self._dns_cache != None:
+            (addresses, dns_source) = await self._dns_cache.resolve_async(host, port, self._timeout)
+        else:
+            addresses  = await asyncio.wait_for(loop.getaddrinfo(host, port, type = socket.SOCK_STREAM), self._timeout)
+            dns_source = DnsCache.SOURCE_RESOLVER
+
+        connection_timings['dns']        = time.perf_counter() - start_time
+        connection_timings['dns_source'] = dns_source
+
+        if scheme == 'https' and not hasattr(asyncio.StreamWriter, 'start_tls'):
+            # Before Python 3.11 streams could not be upgraded to TLS. The handshake is counted as a part of connecting.
+            (family, socket_type, protocol, canonical_name, address) = addresses[0]
+
+            start_time = time.perf_counter()
+            with self._tls_origin(host, port):
+                (reader, writer) = await asyncio.wait_for(
+                    asyncio.open_connection(address[0], address[1], ssl = self._get_ssl_context(), server_hostname = host),
+                    self._timeout
+                )
+            connection_timings['connect'] = time.perf_counter() - start_time
+
+            self._handshake_completed(writer)
+
+            return (reader, writer)
+
+        start_time       = time.perf_counter()
+        (reader, writer) = await self._open_tcp_connection(addresses)
+        connection_timings['connect'] = time.perf_counter() - start_time
+
+        if scheme == 'https':
+            try:
+                start_time = time.perf_counter()
+                with self._tls_origin(host, port):
+                    await asyncio.wait_for(writer.start_tls(self._get_ssl_context(), server_hostname = host), self._timeout)
+                connection_timings['tls'] = time.perf_counter() - start_time
+
+                self._handshake_completed(writer)
+            except:
+                writer.close()
+                raise
+
+        return (reader, writer)
+
+    async def get(self, scheme, host, port, path_and_query, headers = {}):
+        """ Connects to specified host and sends a GET request with specified extra headers. Returns
+            AsyncHttpResponse as soon as the status line and headers have been received. The caller is
+            responsible for closing it.
+
+            host and path_and_query are expected to be already escaped (see HttpWatchdog._dissect_and_escape_url()).
+        """
+
+        assert scheme in ['http', 'https']
+
+        start_time         = time.perf_counter()
+        connection_timings = {}
+        (reader, writer)   = await self._connect(scheme, host, port, connection_timings)
+
+        try:
+            default_port = 80 if scheme == 'http' else 443
+            host_header  = host if port == default_port else '{}:{}'.format(host, port)
+
+            extra_headers = ''.join("{}: {}\r\n".format(name, value) for (name, value) in headers.items())
+
+            # Writing to a connection that is already gone does not fail. asyncio only counts such writes and logs warnings.
+            if writer.is_closing():
+                raise http.client.RemoteDisconnected("Remote end closed connection before the request was sent")
+
+            writer.write((
+                "GET {} HTTP/1.1\r\n"
+                "Host: {}\r\n"
+                "Accept-Encoding: identity\r\n"
+                "Connection: close\r\n"
+                "{}"
+                "\r\n"
+            ).format(path_and_query, host_header, extra_headers).encode('latin-1'))
+            await asyncio.wait_for(writer.drain(), self._timeout)
+
+            status_line = await asyncio.wait_for(reader.readline(), self._timeout)
+            if status_line == b'':
+                raise http.client.RemoteDisconnected("Remote end closed connection without response")
+
+            try:
+                (version, status, reason) = (status_line.decode('iso-8859-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+                status = int(status)
+            except ValueError as exception:
+                raise http.client.BadStatusLine(status_line) from exception
+
+            if not version.startswith('HTTP/'):
+                raise http.client.BadStatusLine(status_line)
+
+            header_lines = []
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self._timeout)
+                if line in [b'\r\n', b'\n', b'']:
+                    break
+
+                header_lines.append(line)
+
+            headers = Parser(_class = http.client.HTTPMessage).parsestr(b''.join(header_lines).decode('iso-8859-1'))
+
+            # TLS 1.3 servers send session tickets after the handshake so they have surely arrived before the response
+            if scheme == 'https' and self._tls_sessions != None:
+                self._tls_sessions.store(host, port, writer.get_extra_info('ssl_object'))
+
+            return AsyncHttpResponse(status, reason.strip(), headers, reader, writer, self._timeout, connection_timings, time.perf_counter() - start_time)
+        except:
+            writer.close()
+            raise
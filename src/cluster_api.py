@@ -0,0 +1,97 @@
+""" Definition of ClusterApi class that passes probe results between the nodes of a cluster """
+
+import json
+
+from .probe_result import ProbeResult, ProbeRecord, ProbeTimings
+from .status_api   import StatusApi
+
+class ClusterApi:
+    """ Generates and parses JSON documents with the results of the pages probed by a node of a cluster (see
+        ClusterNode). Unlike StatusApi, a document contains only the pages owned by the node that serves it,
+        identifies them by their page keys rather than positions (the nodes may be in the middle of reloading
+        the requirement file) and contains everything needed to restore the ProbeRecords exactly.
+
+        Like in StatusApi, a node that passes the version from the last document it received gets only the
+        results replaced since then. The instance identifier changes when the serving node restarts and
+        its versions start from zero again.
+    """
+
+    @classmethod
+    def _encode_result(cls, page_key, result):
+        return [
+            page_key.hex(),
+            int(result.result),
+            result.http_status,
+            result.reason,
+            result.last_probed_at,
+            result.request_duration,
+            result.scheduler_lag,
+            result.revalidated,
+            list(result.timings) if result.timings != None else None
+        ]
+
+    @classmethod
+    def _decode_result(cls, fields):
+        (page_key, result, http_status, reason, last_probed_at, request_duration, scheduler_lag, revalidated, timings) = fields
+
+        record = ProbeRecord(
+            result           = ProbeResult(result),
+            http_status      = http_status,
+            reason           = reason,
+            last_probed_at   = last_probed_at,
+            request_duration = request_duration,
+            scheduler_lag    = scheduler_lag,
+            revalidated      = revalidated,
+            timings          = ProbeTimings._make(timings) if timings != None else None
+        )
+
+        return (bytes.fromhex(page_key), record)
+
+    @classmethod
+    def document(cls, probe_data_provider, since = None):
+        """ Returns a JSON document with the results of the pages owned by the watchdog or, if since is not None,
+            only of those replaced after that version. probe_data_provider must have probe_results_version and
+            page_table properties (see HttpWatchdog).
+        """
+
+        # NOTE: The version must be read before the results. See StatusApi._generate_document().
+        version = probe_data_provider.probe_results_version
+        if since != None and since > version:
+            since = None
+
+        page_table    = probe_data_provider.page_table
+        probe_results = page_table.probe_results
+        page_versions = page_table.page_versions
+        page_keys     = page_table.page_keys
+        owned_pages   = page_table.owned_pages
+
+        results = []
+        for page_index in range(len(page_keys)):
+            if owned_pages[page_index] and (since == None or page_versions[page_index] > since):
+                result = probe_results[page_index]
+                if result != None:
+                    results.append(cls._encode_result(page_keys[page_index], result))
+
+        return json.dumps({
+            'instance': StatusApi.INSTANCE_ID,
+            'version':  version,
+            'since':    since,
+            'results':  results,
+        })
+
+    @classmethod
+    def parse(cls, content):
+        """ Returns an (instance, version, since, results) tuple describing a document generated by document().
+            results is a list of (page key, ProbeRecord) tuples. Raises ValueError if the document is invalid.
+        """
+
+        try:
+            document = json.loads(content)
+            return (
+                document['instance'],
+                document['version'],
+                document['since'],
+                [cls._decode_result(fields) for fields in document['results']]
+            )
+        except (KeyError, TypeError) as exception:
+            raise ValueError("Invalid cluster document: {}".format(exception)) from exception
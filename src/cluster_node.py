@@ -0,0 +1,175 @@
+""" Definition of ClusterNode class that lets several watchdogs share the work of probing the same pages """
+
+import gzip
+import time
+import logging
+import http.client
+from threading import Thread, Event
+
+from .hash_ring                      import HashRing
+from .cluster_api                    import ClusterApi
+from .status_api                     import StatusApi
+from .reporting_http_request_handler import ReportingHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+class ClusterNode:
+    """ Makes a watchdog one of the nodes of a cluster that probe the pages of the same requirement file. Each page
+        is probed by only one node and the report server of every node shows the results of all pages.
+
+        Nodes are identified by the addresses of their report servers (host:port), which must be listed in the same
+        way in the configuration of every node. There is no coordinator. Every poll_interval seconds (and once when
+        it starts) the node fetches the results obtained since its previous request from every peer through
+        ReportingHTTPRequestHandler.CLUSTER_API_PATH and passes them to the watchdog. The peers are asked in parallel
+        and a request is abandoned after a third of failure_timeout, so a peer that does not respond delays neither
+        the others nor the next poll much. A peer that has not answered for failure_timeout seconds is considered gone. Whenever a peer joins or leaves, the node assigns the request
+        targets of the pages to the nodes it can reach with a HashRing and passes its own share to the watchdog.
+
+        As long as all nodes reach each other, they compute the same assignment. While they don't (e.g. during
+        failure_timeout after a node dies) some pages may be probed by two nodes or by none.
+    """
+
+    # The longest time (in seconds) after which a request to a peer that does not respond is abandoned
+    REQUEST_TIMEOUT = 10
+
+    # Identifies the documents served by this node, so that it does not mistake itself for a peer
+    INSTANCE_ID = StatusApi.INSTANCE_ID
+
+    def __init__(self, address, peer_addresses, watchdog, poll_interval, failure_timeout):
+        assert poll_interval > 0
+        assert failure_timeout >= poll_interval
+
+        self.address = address
+
+        # The node is on the list of peers too if the list is shared by all nodes
+        self._peers = {
+            peer_address: {'last_seen': None, 'instance': None, 'version': None}
+            for peer_address in peer_addresses
+            if peer_address != address
+        }
+
+        self._watchdog        = watchdog
+        self._poll_interval   = poll_interval
+        self._failure_timeout = failure_timeout
+        self._request_timeout = min(self.REQUEST_TIMEOUT, failure_timeout / 3)
+        self._members         = None
+        self._stopped         = Event()
+        self._thread          = Thread(target = self._run, name = 'ClusterNode', daemon = True)
+
+    @property
+    def members(self):
+        """ A sorted list of the addresses of all nodes that are currently alive, including this one """
+
+        return self._members
+
+    def start(self):
+        """ Polls the peers once and starts a thread that keeps polling them. Until the first poll is finished the
+            watchdog should not start probing. Otherwise it probes all pages until it learns about the other nodes.
+            The first poll takes at most two thirds of failure_timeout, even if none of the peers responds.
+        """
+
+        self.poll()
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    @classmethod
+    def _split_address(cls, address):
+        (host, separator, port) = address.rpartition(':')
+
+        # IPv6 addresses are written in brackets, like in URLs
+        if host.startswith('[') and host.endswith(']'):
+            host = host[1:-1]
+
+        return (host, int(port))
+
+    def _fetch(self, peer_address, since):
+        """ Returns the cluster document of a peer. Raises OSError, HTTPException or ValueError if it cannot be obtained. """
+
+        path = ReportingHTTPRequestHandler.CLUSTER_API_PATH
+        if since != None:
+            path += '?since={}'.format(since)
+
+        (host, port) = self._split_address(peer_address)
+        connection   = http.client.HTTPConnection(host, port, timeout = self._request_timeout)
+        try:
+            connection.request('GET', path, headers = {'Accept-Encoding': 'gzip'})
+            response = connection.getresponse()
+            body     = response.read()
+        finally:
+            connection.close()
+
+        if response.status != http.client.OK:
+            raise http.client.HTTPException("HTTP {} {}".format(response.status, response.reason))
+
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+
+        return ClusterApi.parse(body.decode('utf-8'))
+
+    def _poll_peer(self, peer_address):
+        """ Fetches new results from a peer and passes them to the watchdog. Records the time of the answer as the
+            time the peer was last seen alive. Called in a separate thread for each peer.
+        """
+
+        peer = self._peers[peer_address]
+
+        try:
+            since = peer['version']
+            (instance, version, served_since, results) = self._fetch(peer_address, since)
+
+            # A peer that has restarted counts versions from zero. What it sent may not contain all of its results.
+            if since != None and instance != peer['instance']:
+                (instance, version, served_since, results) = self._fetch(peer_address, None)
+        except (OSError, http.client.HTTPException, ValueError) as exception:
+            logger.debug("Cluster peer %s did not answer: %s", peer_address, exception)
+            return
+
+        if instance == self.INSTANCE_ID:
+            logger.warning("WARNING: Cluster peer %s is this node. Add '%s' to the list of peers instead.", peer_address, self.address)
+            return
+
+        peer['last_seen'] = time.monotonic()
+        peer['instance']  = instance
+        peer['version']   = version
+
+        if len(results) > 0:
+            self._watchdog.request_remote_results(results)
+
+    def poll(self):
+        """ Fetches new results from all peers at the same time and updates the set of live nodes """
+
+        threads = [
+            Thread(target = self._poll_peer, args = (peer_address,), name = 'ClusterNode-{}'.format(peer_address), daemon = True)
+            for peer_address in self._peers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        now     = time.monotonic()
+        members = sorted([self.address] + [
+            peer_address
+            for (peer_address, peer) in self._peers.items()
+            if peer['last_seen'] != None and now - peer['last_seen'] <= self._failure_timeout
+        ])
+
+        if members != self._members:
+            if self._members != None:
+                joined = [member for member in members if member not in self._members]
+                left   = [member for member in self._members if member not in members]
+                logger.info("Cluster membership changed (joined: %s; left: %s). %d nodes: %s", ', '.join(joined) or '-', ', '.join(left) or '-', len(members), ', '.join(members))
+            else:
+                logger.info("Cluster of %d nodes: %s", len(members), ', '.join(members))
+
+            self._members = members
+
+            hash_ring = HashRing(members)
+            self._watchdog.request_ownership(lambda target_key: hash_ring.owner(target_key) == self.address)
+
+    def _run(self):
+        while not self._stopped.wait(self._poll_interval):
+            self.poll()
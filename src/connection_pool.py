@@ -0,0 +1,167 @@
+""" Definition of ConnectionPool class that keeps HTTP/1.1 connections open between requests
+    so that subsequent requests to the same origin can skip TCP and TLS handshakes.
+"""
+
+import time
+import select
+import logging
+import http.client
+from threading import Lock
+
+from .timed_http_connection import TimedHTTPConnection, TimedHTTPSConnection
+
+logger = logging.getLogger(__name__)
+
+class ConnectionPool:
+    """ A thread-safe pool of idle http.client connections keyed by (scheme, host, port).
+
+        A connection is taken out of the pool for the duration of a request with acquire() and
+        either returned with release() or thrown away with discard(). The pool holds at most
+        max_size idle connections in total and closes the ones that were not used for longer
+        than idle_timeout seconds.
+    """
+
+    # The connections record the duration of each phase of connecting in connection_timings
+    CONNECTION_CLASSES = {
+        'http':  TimedHTTPConnection,
+        'https': TimedHTTPSConnection,
+    }
+
+    def __init__(self, max_size, idle_timeout, connection_timeout, dns_cache = None, tls_sessions = None):
+        """ dns_cache is a DnsCache used by all connections to resolve host names. Without it each
+            new connection resolves the name on its own.
+
+            tls_sessions is a TlsSessionCache that provides the SSLContext for HTTPS connections and
+            lets them resume TLS sessions. Without it each connection creates a default context.
+        """
+
+        assert max_size >= 0
+        assert idle_timeout >= 0
+
+        self._max_size           = max_size
+        self._idle_timeout       = idle_timeout
+        self._connection_timeout = connection_timeout
+        self._dns_cache          = dns_cache
+        self._tls_sessions       = tls_sessions
+        self._idle_connections   = {}
+        self._idle_count         = 0
+        self._lock               = Lock()
+
+        self.hits   = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        """ The fraction of acquire() calls that were served with an already open connection.
+            None if there were no calls yet.
+        """
+
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else None
+
+    @property
+    def idle_count(self):
+        """ The number of open connections currently waiting in the pool """
+        return self._idle_count
+
+    @classmethod
+    def _is_connection_alive(cls, connection):
+        """ Checks whether an idle connection can still be used. When the server closes a keep-alive
+            connection the socket becomes readable (EOF) so there's no need to send anything to find out.
+        """
+
+        if connection.sock == None:
+            return False
+
+        try:
+            (readable, writable, exceptional) = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+
+        # An idle connection must not have anything to read. If it has, it's either EOF or
+        # something we did not ask for. Either way it's unusable.
+        return len(readable) == 0
+
+    def _evict_expired(self, now):
+        """ Closes connections that were idle for too long. Must be called with the lock held. """
+
+        for key in list(self._idle_connections.keys()):
+            fresh_connections = []
+            for (connection, released_at) in self._idle_connections[key]:
+                if now - released_at <= self._idle_timeout:
+                    fresh_connections.append((connection, released_at))
+                else:
+                    connection.close()
+                    self._idle_count -= 1
+
+            if len(fresh_connections) > 0:
+                self._idle_connections[key] = fresh_connections
+            else:
+                del self._idle_connections[key]
+
+    def acquire(self, scheme, host, port):
+        """ Returns a (connection, reused) tuple. The connection is taken from the pool if there is
+            a live one for specified origin. Otherwise a new one is created (reused is False then).
+            A new connection is not connected yet - http.client connects when sending the request.
+        """
+
+        key = (scheme, host, port)
+
+        with self._lock:
+            self._evict_expired(time.time())
+
+            while len(self._idle_connections.get(key, [])) > 0:
+                # Take the most recently used connection. It's the least likely to have been closed by the server.
+                (connection, released_at) = self._idle_connections[key].pop()
+                self._idle_count -= 1
+
+                if len(self._idle_connections[key]) == 0:
+                    del self._idle_connections[key]
+
+                if self._is_connection_alive(connection):
+                    self.hits += 1
+                    return (connection, True)
+
+                logger.debug("Dropping a pooled connection to %s://%s:%d closed by the server", scheme, host, port)
+                connection.close()
+
+            self.misses += 1
+
+        if scheme == 'https':
+            connection = self.CONNECTION_CLASSES[scheme](host, port, timeout = self._connection_timeout, dns_cache = self._dns_cache, tls_sessions = self._tls_sessions)
+        else:
+            connection = self.CONNECTION_CLASSES[scheme](host, port, timeout = self._connection_timeout, dns_cache = self._dns_cache)
+
+        return (connection, False)
+
+    def release(self, scheme, host, port, connection):
+        """ Returns a connection to the pool after a complete response has been read from it """
+
+        key = (scheme, host, port)
+        now = time.time()
+
+        with self._lock:
+            self._evict_expired(now)
+
+            if self._idle_count >= self._max_size:
+                connection.close()
+                return
+
+            self._idle_connections.setdefault(key, []).append((connection, now))
+            self._idle_count += 1
+
+    def discard(self, connection):
+        """ Closes a connection that cannot be reused (e.g. after an error or a partially read response) """
+
+        connection.close()
+
+    def close_all(self):
+        """ Closes all idle connections """
+
+        with self._lock:
+            for connections in self._idle_connections.values():
+                for (connection, released_at) in connections:
+                    connection.close()
+
+            self._idle_connections = {}
+            self._idle_count       = 0
@@ -0,0 +1,102 @@
+""" Definition of ContentScanner class that searches for patterns in a page while it's being downloaded """
+
+import codecs
+
+class ContentScanner:
+    """ Decodes a body received in chunks and searches it for the patterns of a PatternMatcher
+        without keeping the whole text in memory unless some of the patterns require it (see below).
+        The caller can stop feeding data as soon as all_matched becomes True.
+
+        Patterns that match at most MATCH_OVERLAP characters and do not look outside of the match
+        (see PatternMatcher.max_match_length()) are searched in a window consisting of the new chunk
+        and the last MATCH_OVERLAP characters of the text seen so far. Every match of such a pattern,
+        also one crossing chunk boundaries, is fully contained in one of the windows and anything it
+        matches in a window is a match in the whole text too.
+
+        That's not the case for the other patterns. '^' or '\\b' could match at the artificial start
+        of a window, '$' at its end and a long match could be split between windows. Those patterns
+        are searched only once, in the whole text, when finish() is called. Until then the scanner
+        keeps the whole decoded text in memory. If the caller stops reading a body that is too large,
+        finish() searches the part that has been fed so far.
+    """
+
+    MATCH_OVERLAP = 16 * 1024
+
+    def __init__(self, matcher, charset):
+        """ matcher is a PatternMatcher. charset is the name of the encoding of the body.
+            Raises LookupError if the charset is not known to Python.
+
+            Bytes that are not valid in specified encoding are replaced rather than reported as errors.
+            A mislabeled page should not stop the search for patterns in the rest of it.
+        """
+
+        self._matcher         = matcher
+        self._decoder         = codecs.getincrementaldecoder(charset)(errors = 'replace')
+        self._matches         = [None] * len(matcher.patterns)
+        self._pending_indices = set(range(len(matcher.patterns)))
+        self._tail            = ''
+        self._tail_offset     = 0
+        self.bytes_scanned    = 0
+
+        # Indices of the patterns that must be searched in the whole text and the text collected for them so far
+        self._whole_text_indices = {
+            i
+            for (i, max_match_length) in enumerate(matcher.max_match_lengths)
+            if max_match_length == None or max_match_length > self.MATCH_OVERLAP
+        }
+        self._chunks = []
+
+    @property
+    def all_matched(self):
+        """ True if every pattern has already been found """
+        return len(self._pending_indices) == 0
+
+    @property
+    def matches(self):
+        """ A list whose i-th element describes the match of the i-th pattern as a (position, matched text)
+            tuple. The element is None if the pattern has not been found.
+        """
+        return self._matches
+
+    def _record_matches(self, matches, offset):
+        for (i, (position, matched_text)) in matches.items():
+            self._matches[i] = (offset + position, matched_text)
+            self._pending_indices.discard(i)
+
+    def _scan(self, text, final):
+        window        = self._tail + text
+        window_offset = self._tail_offset
+
+        window_indices = self._pending_indices - self._whole_text_indices
+        if len(window_indices) > 0:
+            self._record_matches(self._matcher.search(window, window_indices), window_offset)
+
+        whole_text_indices = self._pending_indices & self._whole_text_indices
+        if len(whole_text_indices) > 0:
+            self._chunks.append(text)
+
+            if final:
+                self._record_matches(self._matcher.search(''.join(self._chunks), whole_text_indices), 0)
+
+        if not final:
+            tail_length       = min(len(window), self.MATCH_OVERLAP)
+            self._tail        = window[len(window) - tail_length:]
+            self._tail_offset = window_offset + len(window) - tail_length
+
+    def feed(self, data):
+        """ Decodes another chunk of the body (bytes) and searches it for patterns not found so far """
+
+        self.bytes_scanned += len(data)
+
+        if not self.all_matched:
+            text = self._decoder.decode(data)
+            if text != '':
+                self._scan(text, False)
+
+    def finish(self):
+        """ Processes whatever is still buffered in the decoder. Must be called after the last chunk
+            that is going to be searched, whether the whole body has been read or only a part of it.
+        """
+
+        if not self.all_matched:
+            self._scan(self._decoder.decode(b'', True), True)
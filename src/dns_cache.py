@@ -0,0 +1,158 @@
+""" Definition of DnsCache class that shares the results of host name resolution between probes """
+
+import time
+import socket
+import asyncio
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+class DnsCache:
+    """ A thread-safe cache of getaddrinfo() results keyed by (host, port).
+
+        Successful lookups are reused for ttl seconds and failed ones for negative_ttl seconds. When an
+        entry expires and the resolver fails to refresh it, the expired addresses are still used (for at
+        most max_stale seconds after they were resolved) rather than failing every probe of the host
+        because of a flaky resolver. Such a refresh is retried after negative_ttl seconds.
+
+        The resolver does not expose the TTLs of DNS records so a single, configurable TTL applies to
+        all names.
+
+        resolve() and resolve_async() return the source of the addresses along with them:
+            - SOURCE_CACHE: a fresh entry from the cache (or a cached failure if an exception is raised),
+            - SOURCE_RESOLVER: the name has just been resolved,
+            - SOURCE_STALE: the resolver failed and an expired entry has been used.
+    """
+
+    SOURCE_CACHE    = 'cache'
+    SOURCE_RESOLVER = 'resolver'
+    SOURCE_STALE    = 'stale'
+
+    def __init__(self, ttl, negative_ttl, max_stale):
+        assert ttl >= 0
+        assert negative_ttl >= 0
+        assert max_stale >= 0
+
+        self._ttl          = ttl
+        self._negative_ttl = negative_ttl
+        self._max_stale    = max_stale
+        self._lock         = Lock()
+
+        # Maps (host, port) to dicts with 'addresses' (None after a failure), 'error', 'expires_at' and 'resolved_at' keys
+        self._entries = {}
+
+        self.hits       = 0
+        self.misses     = 0
+        self.stale_hits = 0
+        self.failures   = 0
+
+    def _lookup(self, key, now):
+        """ Returns a fresh entry for specified key or None """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry != None and entry['expires_at'] > now:
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            return None
+
+    @classmethod
+    def _cached_result(cls, entry):
+        if entry['addresses'] == None:
+            # A new instance so that threads raising it at the same time don't share the traceback
+            error = entry['error']
+            raise type(error)(*error.args)
+
+        return (entry['addresses'], cls.SOURCE_CACHE)
+
+    def _store_addresses(self, key, addresses, now):
+        with self._lock:
+            self._entries[key] = {
+                'addresses':   addresses,
+                'error':       None,
+                'expires_at':  now + self._ttl,
+                'resolved_at': now
+            }
+
+        return (addresses, self.SOURCE_RESOLVER)
+
+    def _store_error(self, key, error, now):
+        """ Records a failed lookup. Returns stale addresses if there are any that can still be used.
+            Otherwise raises the error.
+        """
+
+        with self._lock:
+            self.failures += 1
+
+            entry = self._entries.get(key)
+            if entry != None and entry['addresses'] != None and now - entry['resolved_at'] <= self._max_stale:
+                self.stale_hits += 1
+
+                # Keep using the old addresses but don't ask the resolver again on every request
+                entry['expires_at'] = now + self._negative_ttl
+                logger.warning("WARNING: Failed to resolve %s (%s). Using addresses resolved %0.0f seconds ago.", key[0], error, now - entry['resolved_at'])
+
+                return (entry['addresses'], self.SOURCE_STALE)
+
+            self._entries[key] = {
+                'addresses':   None,
+                'error':       error,
+                'expires_at':  now + self._negative_ttl,
+                'resolved_at': now
+            }
+
+        raise error
+
+    @classmethod
+    def _getaddrinfo(cls, host, port):
+        return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+    @classmethod
+    async def _getaddrinfo_async(cls, host, port):
+        return await asyncio.get_running_loop().getaddrinfo(host, port, type = socket.SOCK_STREAM)
+
+    def resolve(self, host, port):
+        """ Returns an (addresses, source) tuple where addresses is a list in the format returned by
+            socket.getaddrinfo(). Raises socket.gaierror (or another OSError) if the name cannot be resolved.
+        """
+
+        key   = (host, port)
+        now   = time.time()
+        entry = self._lookup(key, now)
+        if entry != None:
+            return self._cached_result(entry)
+
+        try:
+            addresses = self._getaddrinfo(host, port)
+        except OSError as error:
+            return self._store_error(key, error, now)
+
+        return self._store_addresses(key, addresses, now)
+
+    async def resolve_async(self, host, port, timeout):
+        """ A coroutine equivalent of resolve() that resolves names in the event loop's executor.
+            A lookup that takes more than timeout seconds is treated as a failure.
+        """
+
+        key   = (host, port)
+        now   = time.time()
+        entry = self._lookup(key, now)
+        if entry != None:
+            return self._cached_result(entry)
+
+        try:
+            addresses = await asyncio.wait_for(self._getaddrinfo_async(host, port), timeout)
+        except (OSError, asyncio.TimeoutError) as error:
+            return self._store_error(key, error, now)
+
+        return self._store_addresses(key, addresses, now)
+
+    @property
+    def hit_rate(self):
+        """ The fraction of lookups served from the cache. None if there were no lookups yet. """
+
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else None
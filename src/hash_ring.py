@@ -0,0 +1,39 @@
+""" Definition of HashRing class that assigns keys to nodes by consistent hashing """
+
+import bisect
+import hashlib
+
+class HashRing:
+    """ Assigns string keys (e.g. URLs) to a set of nodes so that adding or removing a node moves only the keys
+        that the change requires: the ones taken over by the new node or the ones of the node that is gone.
+
+        Every node is placed on a ring of 64-bit hashes at VIRTUAL_NODES points and a key belongs to the node
+        whose point follows the hash of the key. Many points per node keep the shares of the nodes even.
+        The assignment depends only on the names of the nodes, so every node computes the same one on its own.
+    """
+
+    VIRTUAL_NODES = 64
+
+    def __init__(self, nodes, virtual_nodes = VIRTUAL_NODES):
+        assert len(nodes) > 0
+        assert virtual_nodes > 0
+
+        self.nodes = sorted(set(nodes))
+
+        points = sorted(
+            (self._hash('{}#{}'.format(node, i)), node)
+            for node in self.nodes
+            for i in range(virtual_nodes)
+        )
+        self._hashes = [point_hash for (point_hash, node) in points]
+        self._owners = [node for (point_hash, node) in points]
+
+    @classmethod
+    def _hash(cls, key):
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size = 8).digest(), 'big')
+
+    def owner(self, key):
+        """ Returns the node that key belongs to """
+
+        position = bisect.bisect(self._hashes, self._hash(key))
+        return self._owners[position % len(self._owners)]
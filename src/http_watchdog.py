@@ -3,15 +3,36 @@
 """
 
 import sys
+import ssl
+import math
 import errno
-import re
 import time
+import asyncio
 import http.client
 import logging
-from datetime     import datetime
-from urllib.parse import urlparse, quote as urllib_quote
-
-from .probe_result import ProbeResult
+from queue              import Empty as QueueEmpty
+from threading          import Thread, Lock
+from array              import array
+from collections        import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse       import urlparse, quote as urllib_quote
+
+from .probe_result        import ProbeResult, ProbeRecord, ProbeTimings
+from .async_http_client   import AsyncHttpClient
+from .connection_pool     import ConnectionPool
+from .dns_cache           import DnsCache
+from .tls_session_cache   import TlsSessionCache
+from .content_scanner     import ContentScanner
+from .pattern_matcher     import PatternCache
+from .probe_scheduler     import ProbeScheduler
+from .probe_dispatcher    import ProbeDispatcher
+from .probe_engines       import ENGINES
+from .probe_history       import ProbeHistory
+from .result_broadcaster  import ResultBroadcaster
+from .watchdog_metrics    import WatchdogMetrics
+from .result_log          import ResultLog
+from .page_table          import PageTable, PageConfig
+from .shared_result_table import SharedResultTable
 
 logger = logging.getLogger(__name__)
 
@@ -33,30 +54,556 @@ class HttpWatchdog:
         'https': 443,
     }
 
-    def __init__(self, probe_interval, page_configs):
+    # The asyncio engine does not need a thread per request but every request still needs a socket.
+    # The limit should stay well below the number of file descriptors available to the process.
+    MAX_ASYNC_PROBES_IN_FLIGHT = 768
+
+    # Idle keep-alive connections kept by the blocking engine between requests (and probing cycles).
+    # Connections closed by the server in the meantime are detected and replaced transparently.
+    CONNECTION_POOL_MAX_SIZE     = 256
+    CONNECTION_POOL_IDLE_TIMEOUT = 15 * 60
+
+    # Failed lookups are retried after DNS_NEGATIVE_TTL seconds (or the TTL, if shorter). If the resolver fails,
+    # addresses resolved up to DNS_MAX_STALE seconds ago are used.
+    DNS_NEGATIVE_TTL = 30
+    DNS_MAX_STALE    = 24 * 60 * 60
+
+    # Exceptions that mean that a keep-alive connection has been closed by the server while it was idle
+    STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+    # Page bodies are downloaded and searched for patterns in pieces of this size
+    READ_CHUNK_SIZE = 64 * 1024
+
+    # Phases of a request whose durations are reported separately. 'ttfb' is the time from sending the request
+    # on an established connection to receiving the response headers. 'download' is the time spent reading the body.
+    TIMING_PHASES = ['dns', 'connect', 'tls', 'ttfb', 'download']
+
+    # Limits for the subscribers of result_broadcaster. The replay buffer should cover at least one result of each page.
+    BROADCAST_QUEUE_SIZE      = 1024
+    BROADCAST_MIN_REPLAY_SIZE = 1024
+
+    # Time windows (in seconds) over which the statistics in probe_statistics are computed
+    STATISTICS_WINDOWS = [60 * 60, 24 * 60 * 60]
+
+    # The result log is split into segments of at most this size. The oldest segment is deleted as a whole.
+    RESULT_LOG_MAX_SEGMENT_SIZE = 16 * 1024 * 1024
+
+    # The time (in seconds) after which the results written to the result log are forced to disk with fsync()
+    RESULT_LOG_SYNC_INTERVAL = 1
+
+    # How often (in seconds) run_sharded() checks the exception queue while waiting for results from the probing processes
+    SHARD_POLL_INTERVAL = 0.25
+
+    # Media types other than text/* that are worth searching for patterns. Anything else (images,
+    # archives, etc.) is reported as a content error without downloading the body.
+    TEXT_MEDIA_TYPES = [
+        'application/xhtml+xml',
+        'application/xml',
+        'application/json',
+        'application/javascript',
+        'application/ecmascript',
+        'application/x-javascript',
+    ]
+
+    def __init__(
+        self,
+        probe_interval,
+        page_configs,
+        workers              = 1,
+        max_host_connections = 2,
+        engine               = 'blocking',
+        max_page_size        = 10 * 1024 * 1024,
+        history_memory       = 16 * 1024 * 1024,
+        dns_ttl              = 5 * 60,
+        ca_file              = None,
+        tls_verify           = 'required',
+        result_log_path      = None,
+        result_log_size      = 256 * 1024 * 1024,
+        log_transitions_only = False,
+        shared_results       = False,
+        connection_timeout   = CONNECTION_TIMEOUT
+    ):
         """ Creates a watchdog instance running specified configuration.
 
             page_configs is a list of dicts. Each dict represents one page to be probed.
             It should contain 'url' - full URL of the page and 'patterns' - a list of
-            strings that will be interpreted as regular expression patterns.
+            strings that will be interpreted as regular expression patterns. It may also
+            contain 'interval' - the time between subsequent probes of this particular page
+            in seconds. probe_interval is used for pages that do not specify it.
+
+            workers is the number of threads that fetch pages concurrently. With a single
+            worker all pages are probed sequentially. max_host_connections limits the number
+            of simultaneous requests sent to the same host.
+
+            engine selects the way the pages are fetched: 'blocking' uses http.client in worker
+            threads while 'asyncio' runs all requests in a single thread on non-blocking sockets.
+            The asyncio engine ignores the number of workers and keeps up to
+            MAX_ASYNC_PROBES_IN_FLIGHT requests in flight at once. Either way the calling thread
+            only starts the probes and collects their results (see run_forever()).
+
+            max_page_size is the maximum number of bytes downloaded from a single page. If not all
+            patterns are found within that limit, the probe results in a content error.
+
+            history_memory is the maximum number of bytes used to keep the history of the results
+            of all pages (see ProbeHistory).
+
+            dns_ttl is the time in seconds for which resolved host names are cached (see DnsCache).
+
+            ca_file and tls_verify configure the SSLContext shared by all HTTPS probes (see TlsSessionCache).
+
+            result_log_path is a directory where all results are logged (see ResultLog). The log takes at most
+            about result_log_size bytes. The latest results and the history of the pages are restored from it
+            when the watchdog is created. If result_log_path is None, results are kept only in memory.
+
+            If log_transitions_only is True, the result of a probe is logged only if it differs from the
+            previous result of the page. Otherwise failures are logged as INFO and matches as DEBUG.
+
+            If shared_results is True, probe_results is a SharedResultTable rather than a list. This is
+            required by run_sharded().
+
+            connection_timeout is the time in seconds after which a network operation of a probe that
+            does not make any progress is abandoned.
         """
 
-        self._probe_interval = probe_interval
-        self._page_configs   = []
+        assert workers >= 1
+        assert max_host_connections >= 1
+        assert engine in ENGINES
+        assert max_page_size > 0
+        assert history_memory > 0
+        assert dns_ttl >= 0
+        assert tls_verify in TlsSessionCache.VERIFY_MODES
+        assert result_log_size > 0
+        assert connection_timeout > 0
+
+        self._probe_interval       = probe_interval
+        self._shared_results       = shared_results
+        self._workers              = workers
+        self._max_host_connections = max_host_connections
+        self._engine               = engine
+        self._max_page_size        = max_page_size
+        self._log_transitions_only = log_transitions_only
+        self._connection_timeout   = connection_timeout
+        self._revalidation_cache   = {}
+        self._dns_cache            = DnsCache(dns_ttl, min(dns_ttl, self.DNS_NEGATIVE_TTL), self.DNS_MAX_STALE)
+        self._tls_sessions         = TlsSessionCache(ca_file, tls_verify)
+        self._connection_pool      = ConnectionPool(self.CONNECTION_POOL_MAX_SIZE, self.CONNECTION_POOL_IDLE_TIMEOUT, connection_timeout, self._dns_cache, self._tls_sessions)
+
+        # Threads that run the probes of the blocking engine and the event loop (in a thread of its own) that runs
+        # the probes of the asyncio engine. Created when first needed and kept until close().
+        self._worker_pool       = None
+        self._event_loop        = None
+        self._async_client      = None
+        self._async_probe_slots = None
+
+        # Passed to the watchdogs in the probing processes started by run_sharded()
+        self._shard_settings = {
+            'probe_interval':       probe_interval,
+            'workers':              workers,
+            'max_host_connections': max_host_connections,
+            'engine':               engine,
+            'max_page_size':        max_page_size,
+            'dns_ttl':              dns_ttl,
+            'ca_file':              ca_file,
+            'tls_verify':           tls_verify,
+            'log_transitions_only': log_transitions_only,
+            'connection_timeout':   connection_timeout,
+        }
 
         logger.debug("Probing interval: %d seconds", self._probe_interval)
+        logger.debug("Probing engine: %s", self._engine)
+        logger.debug("Probing workers: %d (at most %d connections per host)", self._workers, self._max_host_connections)
+        logger.debug("Maximum page size: %d bytes", self._max_page_size)
+        logger.debug("Connection timeout: %s seconds", self._connection_timeout)
+        logger.debug("DNS cache TTL: %d seconds", dns_ttl)
+        logger.debug("TLS certificate verification: %s (CA file: %s)", tls_verify, ca_file if ca_file != None else 'system default')
+
+        # Identical patterns and pattern sets share a single compiled object. Also across reloads.
+        self._pattern_cache = PatternCache()
+
+        # Maps URLs to their request targets (see _group_by_request_target()) so that a reload does not have to parse them again
+        self._request_targets = {}
+
+        # Identifies pages in the result log independently of their position in page_configs
+        self._page_log_keys = [ResultLog.page_key(page_config['url'], page_config['patterns']) for page_config in page_configs]
+        self._page_configs  = [self._compile_page_config(page_config) for page_config in page_configs]
+        self._fetch_groups  = self._group_by_request_target(self._page_configs, self._pattern_cache, self._request_targets)
+
+        # Decides which pages this watchdog probes when it's a node of a cluster (see set_ownership()). None means all of them.
+        self._owns_target                       = None
+        (self._owned_groups, self._owned_pages) = self._find_owned_groups(self._fetch_groups, len(self._page_configs))
+
+        # Maps page keys to page indices for applying results from other nodes. Built only when needed.
+        self._pages_by_key = None
+
+        logger.debug("Compiled %d distinct patterns in %d distinct pattern sets", self._pattern_cache.regex_count, self._pattern_cache.matcher_count)
+        logger.debug("%d pages will be fetched with %d requests per cycle", len(self._page_configs), len(self._fetch_groups))
+
+        self._probe_results         = self._create_result_storage(len(self._page_configs))
+        self._probe_results_version = 0
+        self._page_versions         = [0] * len(self._page_configs)
+        self._probe_history         = ProbeHistory(len(self._page_configs), history_memory)
+        self._page_table            = PageTable(self._page_configs, self._probe_results, self._page_versions, self._page_log_keys, self._owned_pages, self._probe_history, self.STATISTICS_WINDOWS)
+        self._metrics               = WatchdogMetrics(self._page_configs)
+        self._result_broadcaster    = ResultBroadcaster(self.BROADCAST_QUEUE_SIZE, max(self.BROADCAST_MIN_REPLAY_SIZE, len(self._page_configs)))
+        self._scheduler_lag         = None
+        self._scheduler             = None
+        self._exception_queue       = None
+
+        # Page configs passed to request_reload() and not applied yet
+        self._requested_page_configs      = None
+        self._requested_page_configs_lock = Lock()
+
+        # Ownership and results passed to request_ownership() and request_remote_results() and not applied yet
+        self._requested_ownership = None
+        self._remote_results      = []
+        self._cluster_lock        = Lock()
+
+        logger.debug("Probe history: up to %d results per page", self._probe_history.capacity)
+
+        if result_log_path != None:
+            segment_size     = min(self.RESULT_LOG_MAX_SEGMENT_SIZE, max(1, result_log_size // 8))
+            self._result_log = ResultLog(result_log_path, result_log_size, segment_size, self.RESULT_LOG_SYNC_INTERVAL)
+            self._restore_results()
+        else:
+            self._result_log = None
+
+        logger.debug("Watchdog initialized\n")
+
+    def _create_result_storage(self, page_count):
+        """ Returns an object for storing the results of page_count pages (see probe_results) """
+
+        return SharedResultTable(page_count) if self._shared_results else [None] * page_count
+
+    def _compile_page_config(self, page_config):
+        """ Converts a page config from the requirement file into the format used internally (see page_configs) """
+
+        # The same URL is often listed many times with different patterns. Interning makes them share a single string,
+        # also with the keys of the dicts indexed by URL.
+        compiled_page_config = PageConfig(
+            url      = sys.intern(page_config['url']),
+            regexes  = self._pattern_cache.regexes(page_config['patterns']),
+            interval = page_config['interval'] if page_config.get('interval') != None else self._probe_interval
+        )
+
+        # With tens of thousands of pages even creating the records that are going to be discarded takes noticeable time
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Probe URL: %s, patterns: %s, interval: %d seconds", page_config['url'], ' AND '.join(page_config['patterns']), compiled_page_config.interval)
+
+        return compiled_page_config
+
+    def reload(self, page_configs):
+        """ Replaces the set of probed pages with page_configs (in the same format as in __init__()).
+
+            A page that has the same URL and patterns as one of the current pages is considered unchanged even
+            if its position in the list or its interval is different. It keeps its result, history and metrics
+            and, if its request target is still probed at the same interval, also its place in the schedule.
+            Patterns, URLs and result log keys are processed only for the new pages, so most of the work is
+            proportional to the number of changes rather than the number of pages.
 
+            The new lists are made visible to readers all at once by replacing page_table. Since the page
+            indices change, the reload counts as a replacement of all results: probe_results_version is
+            incremented, page_versions of all pages are set to its new value and the subscribers of
+            result_broadcaster get a reset.
+
+            Must be called from the thread that runs run_forever() or before it starts (see request_reload()).
+        """
+
+        start_time = time.perf_counter()
+
+        # There may be multiple identical pages. They're matched with the old ones in the order of appearance.
+        old_indices_by_identity = {}
+        for (old_index, old_page_config) in enumerate(self._page_configs):
+            identity = (old_page_config.url, tuple(regex.pattern for regex in old_page_config.regexes))
+            old_indices_by_identity.setdefault(identity, deque()).append(old_index)
+
+        # old_indices[i] is the index that i-th page had before the reload or None if it's new
+        old_indices  = []
+        new_configs  = []
+        new_log_keys = []
         for page_config in page_configs:
-            self._page_configs.append({
-                'url':     page_config['url'],
-                'regexes': [re.compile(pattern) for pattern in page_config['patterns']]
-            })
-            logger.debug("Probe URL: %s", page_config['url'])
-            logger.debug("Probe patterns: %s", ' AND '.join(page_config['patterns']))
+            candidates = old_indices_by_identity.get((page_config['url'], tuple(page_config['patterns'])))
+            old_index  = candidates.popleft() if candidates != None and len(candidates) > 0 else None
+
+            old_indices.append(old_index)
+            if old_index == None:
+                new_configs.append(self._compile_page_config(page_config))
+                new_log_keys.append(ResultLog.page_key(page_config['url'], page_config['patterns']))
+            else:
+                old_page_config = self._page_configs[old_index]
+                interval        = page_config['interval'] if page_config.get('interval') != None else self._probe_interval
+
+                new_configs.append(old_page_config if old_page_config.interval == interval else old_page_config._replace(interval = interval))
+                new_log_keys.append(self._page_log_keys[old_index])
+
+        new_urls              = set(page_config['url'] for page_config in page_configs)
+        self._request_targets = {url: target for (url, target) in self._request_targets.items() if url in new_urls}
+        new_fetch_groups      = self._group_by_request_target(new_configs, self._pattern_cache, self._request_targets)
+
+        # Validators of pages that are no longer probed would never be used
+        self._revalidation_cache = {url: cache_entry for (url, cache_entry) in self._revalidation_cache.items() if url in new_urls}
+
+        if self._scheduler != None:
+            old_group_indices = {(fetch_group['target'], fetch_group['interval']): group_index for (group_index, fetch_group) in enumerate(self._fetch_groups)}
+            new_group_indices = {}
+            added_groups      = []
+            for (group_index, fetch_group) in enumerate(new_fetch_groups):
+                old_group_index = old_group_indices.get((fetch_group['target'], fetch_group['interval']))
+                if old_group_index != None:
+                    new_group_indices[old_group_index] = group_index
+                else:
+                    added_groups.append(group_index)
+
+            self._scheduler.rename(new_group_indices)
+
+            now = time.time()
+            for group_index in added_groups:
+                if self._owns_group(new_fetch_groups[group_index]):
+                    self._scheduler.add(group_index, new_fetch_groups[group_index]['interval'], now)
+
+        reload_version = self._probe_results_version + 1
+        probe_results  = self._create_result_storage(len(new_configs))
+        for (page_index, old_index) in enumerate(old_indices):
+            result = self._probe_results[old_index] if old_index != None else None
+            if result != None:
+                probe_results[page_index] = result
+
+        page_versions  = [reload_version] * len(new_configs)
+        probe_history  = self._probe_history.reordered(old_indices)
+        metrics        = self._metrics.reordered(new_configs, old_indices)
+
+        (owned_groups, owned_pages) = self._find_owned_groups(new_fetch_groups, len(new_configs))
+
+        # Whatever has not been matched with a new page has been removed
+        kept_page_count    = sum(1 for old_index in old_indices if old_index != None)
+        removed_page_count = sum(len(candidates) for candidates in old_indices_by_identity.values())
+
+        self._page_configs  = new_configs
+        self._page_log_keys = new_log_keys
+        self._pages_by_key  = None
+        old_probe_results   = self._probe_results
+        self._fetch_groups  = new_fetch_groups
+        self._owned_groups  = owned_groups
+        self._owned_pages   = owned_pages
+        self._probe_results = probe_results
+        self._page_versions = page_versions
+        self._probe_history = probe_history
+        self._metrics       = metrics
+
+        # NOTE: The table must be replaced before the version is incremented. Readers that see the new
+        # version must also see the new table.
+        self._page_table = PageTable(new_configs, probe_results, page_versions, new_log_keys, owned_pages, probe_history, self.STATISTICS_WINDOWS)
+        self._probe_results_version = reload_version
+        self._result_broadcaster.reset(reload_version)
+
+        # Readers that still use the old table keep it mapped until they're done
+        if self._shared_results:
+            old_probe_results.unlink()
+
+        logger.info(
+            "Reloaded page configs in %0.1f ms: %d pages added, %d removed, %d unchanged. %d pages will be fetched with %d requests per cycle.",
+            (time.perf_counter() - start_time) * 1000,
+            len(new_configs) - kept_page_count,
+            removed_page_count,
+            kept_page_count,
+            len(new_configs),
+            len(new_fetch_groups)
+        )
+
+    def request_reload(self, page_configs):
+        """ Makes run_forever() call reload() with specified page configs before it starts the next batch of probes.
+            Can be called from any thread. If it's called again in the meantime, only the latest page configs are used.
+        """
 
-        self._probe_results = [None] * len(self._page_configs)
+        with self._requested_page_configs_lock:
+            self._requested_page_configs = page_configs
 
-        logger.debug("Watchdog initialized\n")
+        # Wakes up run_forever() if it's sleeping
+        if self._exception_queue != None:
+            self._exception_queue.put(None)
+
+    def _take_requested_page_configs(self):
+        """ Returns the page configs passed to request_reload() since the last call or None if there are none """
+
+        with self._requested_page_configs_lock:
+            page_configs                 = self._requested_page_configs
+            self._requested_page_configs = None
+
+        return page_configs
+
+    def _reload_if_requested(self):
+        page_configs = self._take_requested_page_configs()
+        if page_configs != None:
+            self.reload(page_configs)
+
+    @classmethod
+    def _target_key(cls, fetch_group):
+        """ The request target of a fetch group as a URL. Nodes of a cluster assign pages to nodes by this key,
+            so all pages fetched with the same request are probed by the same node.
+        """
+
+        (scheme, host, port, path_and_query) = fetch_group['target']
+        return '{}://{}:{}{}'.format(scheme, host, port, path_and_query)
+
+    def _owns_group(self, fetch_group):
+        return self._owns_target == None or self._owns_target(self._target_key(fetch_group))
+
+    def _find_owned_groups(self, fetch_groups, page_count):
+        """ Returns a set of the indices of the fetch groups owned by this watchdog and a bytearray with 1 for each owned page """
+
+        owned_groups = set()
+        owned_pages  = bytearray(page_count)
+        for (group_index, fetch_group) in enumerate(fetch_groups):
+            if self._owns_group(fetch_group):
+                owned_groups.add(group_index)
+                for page_index in fetch_group['page_indices']:
+                    owned_pages[page_index] = 1
+
+        return (owned_groups, owned_pages)
+
+    def set_ownership(self, owns_target):
+        """ Makes the watchdog probe only the pages whose request targets are accepted by owns_target(), a function
+            that gets the target as a URL (see _target_key()), or all pages if owns_target is None. This is how the
+            pages are split between the nodes of a cluster (see ClusterNode). The results of the other pages come
+            from the other nodes (see request_remote_results()).
+
+            Pages that stay owned keep their place in the schedule. Pages that become owned are scheduled as if
+            they were new. Must be called from the thread that runs run_forever() or before it starts
+            (see request_ownership()).
+        """
+
+        self._owns_target = owns_target
+        (owned_groups, owned_pages) = self._find_owned_groups(self._fetch_groups, len(self._page_configs))
+
+        if self._scheduler != None:
+            self._scheduler.rename({group_index: group_index for group_index in owned_groups & self._owned_groups})
+
+            now = time.time()
+            for group_index in sorted(owned_groups - self._owned_groups):
+                self._scheduler.add(group_index, self._fetch_groups[group_index]['interval'], now)
+
+        self._owned_groups   = owned_groups
+        self._owned_pages[:] = owned_pages
+
+        logger.info("This node now probes %d of %d pages (%d of %d requests per cycle)", sum(owned_pages), len(owned_pages), len(owned_groups), len(self._fetch_groups))
+
+    def request_ownership(self, owns_target):
+        """ Makes run_forever() call set_ownership() with specified function before it starts the next batch of probes.
+            Can be called from any thread. If it's called again in the meantime, only the latest function is used.
+        """
+
+        assert owns_target != None
+
+        with self._cluster_lock:
+            self._requested_ownership = owns_target
+
+        # Wakes up run_forever() if it's sleeping
+        if self._exception_queue != None:
+            self._exception_queue.put(None)
+
+    def request_remote_results(self, remote_results):
+        """ Passes results obtained by other nodes of a cluster to run_forever(), which stores them before it starts
+            the next batch of probes. remote_results is a list of (page key, ProbeRecord) tuples (see ResultLog.page_key()).
+            Can be called from any thread.
+        """
+
+        with self._cluster_lock:
+            self._remote_results.extend(remote_results)
+
+        if self._exception_queue != None:
+            self._exception_queue.put(None)
+
+    def _take_cluster_requests(self):
+        """ Returns the function passed to request_ownership() (or None) and the list of results passed to
+            request_remote_results() since the last call
+        """
+
+        with self._cluster_lock:
+            (owns_target, remote_results) = (self._requested_ownership, self._remote_results)
+            self._requested_ownership = None
+            self._remote_results      = []
+
+        return (owns_target, remote_results)
+
+    def _store_remote_results(self, remote_results):
+        """ Stores results obtained by other nodes of a cluster. A result replaces the current one only if the page is
+            not owned by this watchdog and the result is newer. Only the versions, the history and result_broadcaster
+            are updated. The results are neither written to the result log nor counted in the metrics because their
+            owners do that. Otherwise summing the metrics of all nodes would count every probe once per node.
+        """
+
+        if self._pages_by_key == None:
+            self._pages_by_key = {}
+            for (page_index, page_key) in enumerate(self._page_log_keys):
+                self._pages_by_key.setdefault(page_key, []).append(page_index)
+
+        for (page_key, result) in remote_results:
+            for page_index in self._pages_by_key.get(page_key, []):
+                current_result = self._probe_results[page_index]
+                if self._owned_pages[page_index] == 0 and (current_result == None or result.last_probed_at > current_result.last_probed_at):
+                    self._probe_results[page_index] = result
+                    self._record_result(page_index, result.last_probed_at, result)
+
+    def _take_remote_results(self):
+        """ Returns the list of results passed to request_remote_results() since the last call """
+
+        with self._cluster_lock:
+            (remote_results, self._remote_results) = (self._remote_results, [])
+
+        return remote_results
+
+    def _apply_cluster_requests(self):
+        (owns_target, remote_results) = self._take_cluster_requests()
+
+        if owns_target != None:
+            self.set_ownership(owns_target)
+
+        if len(remote_results) > 0:
+            self._store_remote_results(remote_results)
+
+    def _restore_results(self):
+        """ Fills probe_results and the probe history with the results found in the result log """
+
+        start_time = time.perf_counter()
+        now        = time.time()
+
+        # Results older than the history of a page and its interval would be stale anyway. Not looking for them
+        # keeps pages that have never been probed from making the restore read the whole log.
+        history_since = now - max(self.STATISTICS_WINDOWS)
+        latest_since  = history_since - max((page_config.interval for page_config in self._page_configs), default = 0)
+
+        (latest_results, history) = self._result_log.restore(self._page_log_keys, history_since, latest_since)
+
+        history_entry_count = 0
+        for (page_index, page_log_key) in enumerate(self._page_log_keys):
+            if page_log_key in latest_results:
+                self._probe_results[page_index] = latest_results[page_log_key][1]
+
+            # History entries come from the newest to the oldest and only as many as fit in the buffer are needed
+            for (timestamp, result, http_status, request_duration) in reversed(history[page_log_key][:self._probe_history.capacity]):
+                self._probe_history.record_fields(page_index, timestamp, result, http_status, request_duration)
+                history_entry_count += 1
+
+        logger.info(
+            "Restored the latest results of %d of %d pages and %d history entries from the result log in %0.1f ms",
+            sum(1 for result in self._probe_results if result != None),
+            len(self._probe_results),
+            history_entry_count,
+            (time.perf_counter() - start_time) * 1000
+        )
+
+    def close(self):
+        """ Makes sure that all results have been written to the result log, stops the probing engines, closes
+            the idle connections and frees the shared result table. The watchdog must not be used afterwards.
+        """
+
+        self._stop_engines()
+        self._connection_pool.close_all()
+
+        if self._result_log != None:
+            self._result_log.close()
+
+        if self._shared_results:
+            self._probe_results.unlink()
 
     @classmethod
     def _dissect_and_escape_url(cls, parsed_url):
@@ -112,65 +659,273 @@ class HttpWatchdog:
 
         return result
 
+    def _send_request(self, scheme, host, port, path_and_query, headers):
+        """ Sends a GET request with specified extra headers over a connection from the pool and waits
+            for the response headers. Returns a (connection, response, timings) tuple. timings is a dict
+            with all the TIMING_PHASES except 'download'. Connection phases are None if the connection
+            was already open.
+
+            If the connection was taken from the pool and it turns out that the server has closed it in
+            the meantime, the request is transparently retried on a fresh connection.
+        """
+
+        while True:
+            (connection, reused) = self._connection_pool.acquire(scheme, host, port)
+
+            try:
+                connection.connection_timings = {}
+                request_start = time.perf_counter()
+
+                connection.request("GET", path_and_query, headers = headers)
+                response = connection.getresponse()
+
+                return (connection, response, self._complete_timings(connection.connection_timings, time.perf_counter() - request_start))
+            except self.STALE_CONNECTION_ERRORS:
+                self._connection_pool.discard(connection)
+
+                if not reused:
+                    raise
+
+                logger.debug("Pooled connection to %s://%s:%d has been closed by the server. Reconnecting.", scheme, host, port)
+            except:
+                self._connection_pool.discard(connection)
+                raise
+
     @classmethod
-    def _fetch_page(cls, url):
-        """ Attempts to fetch the content of specified web page. Returns a tuple containing the content
-            and some additional information about eventual errors and timing.
+    def _complete_timings(cls, connection_timings, time_to_headers):
+        """ Returns a dict with the durations of connection phases taken from connection_timings (None if
+            a phase did not occur) and 'ttfb', i.e. the time between the moment the connection was ready
+            and the moment the response headers arrived. time_to_headers must include connecting.
+            'dns_source' tells where the addresses came from (see DnsCache) or is None if there was no lookup.
+        """
+
+        timings = {phase: connection_timings.get(phase) for phase in ['dns', 'connect', 'tls']}
+        timings['ttfb']       = max(0, time_to_headers - sum(duration for duration in timings.values() if duration != None))
+        timings['dns_source'] = connection_timings.get('dns_source')
+
+        return timings
+
+    @classmethod
+    def _is_text_content_type(cls, content_type):
+        """ Checks whether a Content-Type HTTP header describes a document that can be searched for patterns.
+            A missing header is treated as text since it's quite common for simple servers to omit it.
+        """
+
+        if content_type == None:
+            return True
+
+        media_type = content_type.split(';')[0].strip().lower()
+
+        return (
+            media_type.startswith('text/') or
+            media_type.endswith('+xml') or
+            media_type.endswith('+json') or
+            media_type in cls.TEXT_MEDIA_TYPES
+        )
+
+    def _start_scanning(self, response, matcher):
+        """ Inspects the headers of a 200 OK response and prepares a ContentScanner for its body.
+            Returns a (scanner, content error) tuple. If the content is not something that can
+            or should be searched for patterns, scanner is None and content error describes why.
+        """
+
+        content_type   = response.getheader('Content-Type')
+        content_length = response.getheader('Content-Length')
+
+        if not self._is_text_content_type(content_type):
+            return (None, "Unsupported Content-Type: '{}'".format(content_type))
+
+        if content_length != None and content_length.strip().isdigit() and int(content_length) > self._max_page_size:
+            return (None, "Page size ({} bytes) exceeds the limit of {} bytes".format(int(content_length), self._max_page_size))
+
+        response_charset = self._detect_response_charset(content_type)
+        logger.debug("Got response with 'Content-Type': '%s'; Detected charset: '%s'", content_type, response_charset)
+
+        try:
+            return (ContentScanner(matcher, response_charset or 'utf-8'), None)
+        except LookupError:
+            return (None, "Unknown charset: '{}'".format(response_charset))
+
+    def _feed_scanner(self, scanner, chunk):
+        """ Passes a chunk of the body to the scanner unless it exceeds the page size limit.
+            Returns a content error or None.
+        """
+
+        remaining_size = self._max_page_size - scanner.bytes_scanned
+        scanner.feed(chunk[:remaining_size])
+
+        if len(chunk) > remaining_size and not scanner.all_matched:
+            # Patterns searched only in the whole text may still match in the part that has been read
+            scanner.finish()
+
+            if not scanner.all_matched:
+                return "Page size exceeds the limit of {} bytes".format(self._max_page_size)
+
+        return None
+
+    def _conditional_request_headers(self, url, matcher):
+        """ Returns the headers that turn a request for specified page into a conditional one. The dict is
+            empty unless the page has already been searched with the same matcher and the server provided
+            an ETag or a Last-Modified header at the time.
+        """
+
+        cache_entry = self._revalidation_cache.get(url)
+        if cache_entry == None or cache_entry['matcher'] is not matcher:
+            return {}
+
+        headers = {}
+        if cache_entry['etag'] != None:
+            headers['If-None-Match'] = cache_entry['etag']
+        if cache_entry['last_modified'] != None:
+            headers['If-Modified-Since'] = cache_entry['last_modified']
+
+        return headers
+
+    def _update_revalidation_cache(self, url, matcher, response, matches):
+        """ Remembers the validators sent by the server along with the results of a complete search of the
+            page content, so that they can be reused if the server says that the page has not been modified.
+            If matches is None (i.e. there are no valid search results) the page is removed from the cache.
+        """
+
+        etag          = response.getheader('ETag')
+        last_modified = response.getheader('Last-Modified')
+
+        if matches != None and (etag != None or last_modified != None):
+            self._revalidation_cache[url] = {
+                'matcher':       matcher,
+                'etag':          etag,
+                'last_modified': last_modified,
+                'matches':       list(matches)
+            }
+        else:
+            self._revalidation_cache.pop(url, None)
+
+    def _cached_matches(self, url, matcher):
+        """ Returns the search results remembered by _update_revalidation_cache() or None """
+
+        cache_entry = self._revalidation_cache.get(url)
+        if cache_entry == None or cache_entry['matcher'] is not matcher:
+            return None
+
+        return cache_entry['matches']
+
+    def _process_non_ok_response(self, url, matcher, response):
+        """ Handles a response with a status other than 200 OK. Returns a (matches, revalidated) tuple.
+            If the response is a 304 Not Modified for a page with cached search results, the results are
+            returned and revalidated is True. Otherwise matches is None.
+        """
+
+        if response.status == http.client.NOT_MODIFIED:
+            cached_matches = self._cached_matches(url, matcher)
+            if cached_matches != None:
+                logger.debug("Page not modified. Reusing the results of the previous search.")
+                return (cached_matches, True)
+        else:
+            self._update_revalidation_cache(url, matcher, response, None)
+
+        return (None, False)
+
+    def _fetch_page(self, url, matcher):
+        """ Attempts to fetch specified web page and search it for the patterns of specified PatternMatcher. Returns a tuple containing the
+            search results and some additional information about eventual errors and timing.
 
             The tuple contains:
-                - page content: the page content convert to a unicode string if the connection was successfully
-                  estabilished and request returned 200 OK. None otherwise.
-                - result - a value from ProbeResult enum
+                - matches: a list describing the match of each pattern of the matcher (see ContentScanner.matches) if the
+                  connection was successfully estabilished, request returned 200 OK (or 304 Not Modified, see below) and
+                  the content was acceptable. None otherwise.
+                - result - a value from ProbeResult enum if an error has been detected. None otherwise.
                 - http_status - the returned HTTP status if the request was performed (i.e. there were no connection errors).
                   None otherwise.
                 - reason - A textual description of 'result'. If http_status is not None this is the HTTP reason.
                 - start_time - Request start time if the request was performed or None.
                 - end_time - Request end time if the request was performed or None.
+                - revalidated - True if the server responded with 304 Not Modified to a conditional request and the
+                  matches come from the previous search of the same content.
+                - timings - a dict with the duration of each of TIMING_PHASES in seconds if the request was performed.
+                  None otherwise. Phases that did not occur (e.g. connecting when the connection was reused) are None.
+                  The dict also contains 'dns_source' (see _complete_timings()).
+
+            The body is downloaded in chunks and the download stops as soon as all patterns have been found
+            so the whole page is never held in memory.
+
+            Connections are kept open and reused for subsequent requests to the same origin whenever
+            the server allows it.
+
+            If the server sent an ETag or Last-Modified header the last time the page was fully searched,
+            the request is sent with If-None-Match or If-Modified-Since header.
         """
 
         parsed_url = urlparse(url)
         assert parsed_url.scheme in ['http', 'https'], 'Unsupported protocols should not pass through validation performed earlier'
 
-        (host, port, path_and_query) = cls._dissect_and_escape_url(parsed_url)
-        connection_class = http.client.HTTPConnection if parsed_url.scheme == 'http' else http.client.HTTPSConnection
-
-        result       = None
-        page_content = None
-        start_time   = None
-        end_time     = None
-        http_status  = None
-        reason       = None
+        (host, port, path_and_query) = self._dissect_and_escape_url(parsed_url)
+
+        result        = None
+        matches       = None
+        revalidated   = False
+        content_error = None
+        start_time    = None
+        end_time      = None
+        timings       = None
+        http_status   = None
+        reason        = None
         try:
-            connection = connection_class(host, port, timeout = cls.CONNECTION_TIMEOUT)
-            logger.debug("GET %s://%s:%d%s", parsed_url.scheme, host, port, path_and_query)
+            headers = self._conditional_request_headers(url, matcher)
+            logger.debug("GET %s://%s:%d%s%s", parsed_url.scheme, host, port, path_and_query, ' (conditional)' if len(headers) > 0 else '')
 
             # NOTE: We're interested in wall-time here, not CPU time, hence time() rather than clock()
-            # NOTE: getresponse() probably performs the whole operation of receiving the data from
-            # the server rather than just passing the data already received by the OS and for that
-            # reason it's also included in timing.
+            # NOTE: The timing covers everything from connecting to reading the last chunk of the body
+            # that was needed. The durations of individual phases are measured separately.
             start_time = time.time()
 
             try:
-                connection.request("GET", path_and_query)
-                response = connection.getresponse()
+                (connection, response, timings) = self._send_request(parsed_url.scheme, host, port, path_and_query, headers)
             finally:
                 end_time = time.time()
 
-            reason      = response.reason
-            http_status = response.status
+            download_start = time.perf_counter()
+            try:
+                reason      = response.reason
+                http_status = response.status
 
-            if response.status == http.client.OK:
-                # TODO: Add safeguards to make sure the program behaves sensibly with any input, not just text documents.
-                # For example large binary files may waste a lot of bandwidth and processing power before it becomes apparent
-                # that something's wrong.
-                content_type     = response.getheader('Content-Type')
-                response_charset = cls._detect_response_charset(content_type)
-                logger.debug("Got response with 'Content-Type': '%s'; Detected charset: '%s'", content_type, response_charset)
+                if response.status == http.client.OK:
+                    (scanner, content_error) = self._start_scanning(response, matcher)
 
-                page_content = response.read().decode(response_charset or 'utf-8')
+                    while content_error == None and not scanner.all_matched:
+                        chunk = response.read(self.READ_CHUNK_SIZE)
+                        if chunk == b'':
+                            scanner.finish()
+                            break
 
-            connection.close()
+                        content_error = self._feed_scanner(scanner, chunk)
+
+                    matches = scanner.matches if content_error == None else None
+                    self._update_revalidation_cache(url, matcher, response, matches)
+                else:
+                    # Error pages are usually small. Read it so that the connection can be used for another request.
+                    response.read(self.READ_CHUNK_SIZE)
 
+                    (matches, revalidated) = self._process_non_ok_response(url, matcher, response)
+            except:
+                self._connection_pool.discard(connection)
+                raise
+            finally:
+                timings['download'] = time.perf_counter() - download_start
+                end_time            = time.time()
+
+            # Unless the whole body has been consumed, the rest of it is still waiting in the socket
+            if response.isclosed() and not response.will_close:
+                self._connection_pool.release(parsed_url.scheme, host, port, connection)
+            else:
+                self._connection_pool.discard(connection)
+
+            if content_error != None:
+                result = ProbeResult.CONTENT_ERROR
+                reason = content_error
+
+        except ssl.CertificateError as exception:
+            # Also a ValueError but caused by the server rather than by a mistake in the code
+            (matches, result, http_status, reason, revalidated, timings) = self._connection_error_result(exception)
         except (AssertionError, TypeError, SyntaxError, ValueError):
             # We're only interested in connection-related failures. There's no easy and future-proof way to
             # discern them from exceptions caused by programmer's mistakes but we can at least make our life
@@ -181,75 +936,413 @@ class HttpWatchdog:
             # get logged. This is a bit heavy-handed but things can go wrong at many different levels of the stack
             # and it's hard to create a comprehensive list of possible exceptions. It's better to report an error
             # late than let the program crash here if the network goes down for a while.
-            logger.debug("A GET request has been interrupted by an exception", exc_info = True)
+            (matches, result, http_status, reason, revalidated, timings) = self._connection_error_result(exception)
 
-            result      = ProbeResult.CONNECTION_ERROR
-            reason      = str(exception)
-            http_status = None
+        return (matches, result, http_status, reason, start_time, end_time, revalidated, timings)
 
-        return (page_content, result, http_status, reason, start_time, end_time)
+    @classmethod
+    def _connection_error_result(cls, exception):
+        """ Logs an exception that interrupted a request. Returns a (matches, result, http_status, reason,
+            revalidated, timings) tuple describing the failed probe.
+        """
 
-    def probe(self):
-        """ Iterates over all page_configs and for each one tries to fetch the page and find specified patterns.
-            Only if there are no errors and all of the patterns are present, the result is ProbeResult.MATCH.
-            Yields dicts describing the result (same format as in on the list returned from probe_results()).
+        logger.debug("A GET request has been interrupted by an exception", exc_info = True)
+
+        return (None, ProbeResult.CONNECTION_ERROR, None, str(exception) or type(exception).__name__, False, None)
+
+    async def _fetch_page_async(self, client, url, matcher):
+        """ A coroutine equivalent of _fetch_page() that uses an AsyncHttpClient instead of http.client.
+            Returns a tuple in exactly the same format.
         """
 
-        for page_config in self._page_configs:
-            logger.debug("Probing %s", page_config['url'])
+        parsed_url = urlparse(url)
+        assert parsed_url.scheme in ['http', 'https'], 'Unsupported protocols should not pass through validation performed earlier'
 
-            (page_content, result, http_status, reason, start_time, end_time) = self._fetch_page(page_config['url'])
+        (host, port, path_and_query) = self._dissect_and_escape_url(parsed_url)
+
+        result        = None
+        matches       = None
+        revalidated   = False
+        content_error = None
+        start_time    = None
+        end_time      = None
+        timings       = None
+        http_status   = None
+        reason        = None
+        try:
+            headers = self._conditional_request_headers(url, matcher)
+            logger.debug("GET %s://%s:%d%s%s", parsed_url.scheme, host, port, path_and_query, ' (conditional)' if len(headers) > 0 else '')
 
-            if result == None:
-                if http_status == http.client.OK:
-                    assert page_content != None
+            # NOTE: Connecting is included in timing for consistency with _fetch_page(). http.client
+            # connects only when the request is being sent.
+            start_time = time.time()
 
-                    pattern_found = True
-                    for regex in page_config['regexes']:
-                        match = regex.search(page_content)
-                        pattern_found &= (match != None)
+            try:
+                response = await client.get(parsed_url.scheme, host, port, path_and_query, headers)
+            finally:
+                end_time = time.time()
 
-                        if not pattern_found:
-                            logger.debug("Pattern '%s': no match", regex.pattern)
+            timings        = self._complete_timings(response.connection_timings, response.time_to_headers)
+            download_start = time.perf_counter()
+            try:
+                reason      = response.reason
+                http_status = response.status
+
+                if response.status == http.client.OK:
+                    (scanner, content_error) = self._start_scanning(response, matcher)
+
+                    while content_error == None and not scanner.all_matched:
+                        chunk = await response.read_chunk(self.READ_CHUNK_SIZE)
+                        if chunk == b'':
+                            scanner.finish()
                             break
+
+                        content_error = self._feed_scanner(scanner, chunk)
+
+                    matches = scanner.matches if content_error == None else None
+                    self._update_revalidation_cache(url, matcher, response, matches)
+                else:
+                    (matches, revalidated) = self._process_non_ok_response(url, matcher, response)
+            finally:
+                response.close()
+
+                timings['download'] = time.perf_counter() - download_start
+                end_time            = time.time()
+
+            if content_error != None:
+                result = ProbeResult.CONTENT_ERROR
+                reason = content_error
+
+        except ssl.CertificateError as exception:
+            (matches, result, http_status, reason, revalidated, timings) = self._connection_error_result(exception)
+        except (AssertionError, TypeError, SyntaxError, ValueError):
+            # See _fetch_page() for the rationale behind this split
+            raise
+        except Exception as exception:
+            (matches, result, http_status, reason, revalidated, timings) = self._connection_error_result(exception)
+
+        return (matches, result, http_status, reason, start_time, end_time, revalidated, timings)
+
+    @classmethod
+    def _group_by_request_target(cls, page_configs, pattern_cache, request_targets = None):
+        """ Groups page configs that would result in identical requests (i.e. their URLs differ at most in the
+            parts that are not sent to the server or in the way they're escaped). Each group is fetched only once
+            per cycle and the patterns of all its pages are searched in the same body.
+
+            request_targets is a dict that maps URLs to their request targets. URLs found in it are not parsed
+            again and the ones that are not get added to it.
+
+            Returns a list of dicts, each one containing:
+                - url - URL of the first page in the group
+                - target - a (scheme, host, port, path and query) tuple identifying the request
+                - host_key - a (host, port) tuple identifying the server
+                - page_indices - indices of the pages in page_configs
+                - interval - the shortest probing interval among the pages
+                - matcher - a PatternMatcher for all distinct patterns of all the pages
+                - pattern_indices - a list whose i-th element contains indices of the patterns of i-th page in
+                  the group among the patterns of the matcher
+        """
+
+        if request_targets == None:
+            request_targets = {}
+
+        groups_by_target = {}
+        for (i, page_config) in enumerate(page_configs):
+            target = request_targets.get(page_config.url)
+            if target == None:
+                parsed_url = urlparse(page_config.url)
+                target     = (parsed_url.scheme,) + cls._dissect_and_escape_url(parsed_url)
+
+                request_targets[page_config.url] = target
+
+            if not target in groups_by_target:
+                groups_by_target[target] = {
+                    'url':          page_config.url,
+                    'target':       target,
+                    'host_key':     target[1:3],
+                    'page_indices': [],
+                }
+
+            groups_by_target[target]['page_indices'].append(i)
+
+        fetch_groups = []
+        for group in groups_by_target.values():
+            # Maps each distinct pattern to its index. Dicts preserve insertion order so the keys are the patterns of the matcher.
+            pattern_positions = {}
+            for i in group['page_indices']:
+                for regex in page_configs[i].regexes:
+                    pattern_positions.setdefault(regex.pattern, len(pattern_positions))
+
+            group['interval']        = min(page_configs[i].interval for i in group['page_indices'])
+            group['matcher']         = pattern_cache.matcher(list(pattern_positions))
+            group['pattern_indices'] = [
+                [pattern_positions[regex.pattern] for regex in page_configs[i].regexes]
+                for i in group['page_indices']
+            ]
+
+            fetch_groups.append(group)
+
+        return fetch_groups
+
+    def _process_fetch_result(self, fetch_group, fetch_result, scheduler_lag):
+        """ Decides the results of probing all pages in a group based on the tuple returned from _fetch_page() or
+            _fetch_page_async(). Returns a list of (page index, result) tuples where result is a ProbeRecord (same format
+            as in on the list returned from probe_results()).
+
+            scheduler_lag is the time by which the start of the probe was late compared to its deadline.
+        """
+
+        (matches, result, http_status, reason, start_time, end_time, revalidated, timings) = fetch_result
+
+        assert start_time == None and end_time == None or end_time >= start_time
+        assert result != None or (http_status != http.client.OK and not revalidated) or matches != None
+
+        last_probed_at   = time.time()
+        request_duration = end_time - start_time if end_time != None else None
+
+        # All pages in the group share the same timings
+        if timings != None:
+            timings = ProbeTimings._make(timings.get(field) for field in ProbeTimings._fields)
+
+        page_results = []
+        for (page_index, pattern_indices) in zip(fetch_group['page_indices'], fetch_group['pattern_indices']):
+            page_result = result
+
+            if page_result == None:
+                if http_status == http.client.OK or revalidated:
+                    pattern_found = True
+                    for (regex, pattern_index) in zip(self._page_configs[page_index].regexes, pattern_indices):
+                        match = matches[pattern_index]
+                        if match != None:
+                            logger.debug("Pattern '%s': match at %d = '%s'", regex.pattern, match[0], match[1])
                         else:
-                            logger.debug("Pattern '%s': match at %d = '%s'", regex.pattern, match.start(), match.group(0))
+                            logger.debug("Pattern '%s': no match", regex.pattern)
+                            pattern_found = False
 
-                    result = ProbeResult.MATCH if pattern_found else ProbeResult.NO_MATCH
+                    page_result = ProbeResult.MATCH if pattern_found else ProbeResult.NO_MATCH
                 else:
-                    result = ProbeResult.HTTP_ERROR
-
-            assert start_time == None and end_time == None or end_time >= start_time
-            yield {
-                'result':           result,
-                'http_status':      http_status,
-                'reason':           reason,
-                'last_probed_at':   datetime.utcnow(),
-                'request_duration': end_time - start_time if end_time != None else None
-            }
+                    page_result = ProbeResult.HTTP_ERROR
+
+            page_results.append((page_index, ProbeRecord(
+                result           = page_result,
+                http_status      = http_status,
+                reason           = reason,
+                last_probed_at   = last_probed_at,
+                request_duration = request_duration,
+                scheduler_lag    = scheduler_lag,
+                revalidated      = revalidated,
+                timings          = timings
+            )))
+
+        return page_results
+
+    def _probe_group(self, fetch_group, deadline):
+        """ Fetches a page and checks whether it contains the patterns specified for every page in the fetch group.
+            deadline is the time at which the probe should have started. Returns a list of (page index, result)
+            tuples (see _process_fetch_result()).
+        """
+
+        logger.debug("Probing %s", fetch_group['url'])
+
+        scheduler_lag = max(0, time.time() - deadline)
+        fetch_result  = self._fetch_page(fetch_group['url'], fetch_group['matcher'])
+
+        return self._process_fetch_result(fetch_group, fetch_result, scheduler_lag)
+
+    async def _probe_group_async(self, client, fetch_group, deadline):
+        """ A coroutine equivalent of _probe_group() that fetches the page with an AsyncHttpClient """
+
+        async with self._async_probe_slots:
+            logger.debug("Probing %s", fetch_group['url'])
+
+            scheduler_lag = max(0, time.time() - deadline)
+            fetch_result  = await self._fetch_page_async(client, fetch_group['url'], fetch_group['matcher'])
+
+        return self._process_fetch_result(fetch_group, fetch_result, scheduler_lag)
+
+    def _get_worker_pool(self):
+        """ Returns the ThreadPoolExecutor that runs the probes of the blocking engine, creating it if necessary """
+
+        if self._worker_pool == None:
+            self._worker_pool = ThreadPoolExecutor(max_workers = self._workers, thread_name_prefix = 'ProbeWorker')
+
+        return self._worker_pool
+
+    def _get_event_loop(self):
+        """ Returns the event loop that runs the probes of the asyncio engine, starting its thread if necessary """
+
+        if self._event_loop == None:
+            self._event_loop        = asyncio.new_event_loop()
+            self._async_client      = AsyncHttpClient(self._connection_timeout, self._dns_cache, self._tls_sessions)
+            self._async_probe_slots = asyncio.Semaphore(self.MAX_ASYNC_PROBES_IN_FLIGHT)
+
+            Thread(target = self._run_event_loop, args = (self._event_loop,), name = 'ProbeEventLoop', daemon = True).start()
+
+        return self._event_loop
+
+    @classmethod
+    def _run_event_loop(cls, loop):
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    @classmethod
+    async def _cancel_all_tasks(cls):
+        """ Cancels all other tasks of the running loop, waits until they're finished and stops the loop """
+
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions = True)
+        asyncio.get_running_loop().stop()
+
+    def _stop_engines(self):
+        """ Shuts down the worker threads and the event loop without waiting for the probes in progress. They finish
+            in the background and their results are discarded. The engines are started again if the watchdog probes again.
+        """
+
+        if self._worker_pool != None:
+            self._worker_pool.shutdown(wait = False, cancel_futures = True)
+            self._worker_pool = None
+
+        if self._event_loop != None:
+            asyncio.run_coroutine_threadsafe(self._cancel_all_tasks(), self._event_loop)
+            self._event_loop = None
+
+    def _start_probe(self, scheduled_group):
+        """ Starts probing a fetch group with the configured engine. scheduled_group is a (fetch group index, deadline)
+            tuple. Returns a concurrent.futures.Future whose result is a list of (page index, result) tuples
+            (see _process_fetch_result()).
+        """
+
+        (group_index, deadline) = scheduled_group
+        fetch_group             = self._fetch_groups[group_index]
+
+        if self._engine == 'asyncio':
+            loop = self._get_event_loop()
+            return asyncio.run_coroutine_threadsafe(self._probe_group_async(self._async_client, fetch_group, deadline), loop)
+        else:
+            return self._get_worker_pool().submit(self._probe_group, fetch_group, deadline)
+
+    def _create_dispatcher(self, on_finished = None):
+        """ Returns a ProbeDispatcher that probes (fetch group index, deadline) tuples with _start_probe() """
+
+        return ProbeDispatcher(self._max_host_connections, self._start_probe, on_finished)
+
+    def _probe_groups(self, scheduled_groups):
+        """ Probes specified fetch groups using the configured engine. scheduled_groups is a list of
+            (fetch group index, deadline) tuples. Yields (page index, result) tuples in the order in
+            which the probes finish.
+        """
+
+        dispatcher = self._create_dispatcher()
+        for scheduled_group in scheduled_groups:
+            dispatcher.submit(self._fetch_groups[scheduled_group[0]]['host_key'], scheduled_group)
+
+        try:
+            while len(dispatcher) > 0:
+                for (scheduled_group, future) in dispatcher.take_finished():
+                    yield from future.result()
+        finally:
+            # If the consumer stops iterating (e.g. due to an exception from another thread) it must not
+            # wait until the probes in progress time out. Queued ones are cancelled, running ones abandoned.
+            if len(dispatcher) > 0:
+                dispatcher.cancel()
+                self._stop_engines()
+
+    def probe(self):
+        """ Iterates over all page_configs and for each one tries to fetch the page and find specified patterns.
+            Only if there are no errors and all of the patterns are present, the result is ProbeResult.MATCH.
+            Yields (page index, result) tuples where result is a ProbeRecord describing the result (same format as
+            in on the list returned from probe_results()).
+
+            Pages that share the same URL are fetched only once and the results for all of them are yielded together.
+            With the asyncio engine or more than one worker the pages are probed concurrently and the results are
+            yielded in the order in which the probes finish rather than the order of page_configs.
+        """
+
+        now = time.time()
+        yield from self._probe_groups([(group_index, now) for group_index in range(len(self._fetch_groups))])
+
+    @property
+    def page_table(self):
+        """ A PageTable with the current page_configs, probe_results, page_versions and probe_statistics.
+            The table is replaced as a whole when the pages are reloaded (see reload()), so readers that
+            use more than one of the lists should take all of them from a single table.
+        """
+
+        return self._page_table
 
     @property
     def probe_results(self):
         """ A list whose i-th element contains the result of probing i-th page from page_configs.
             The list should not be modified from the outside of the class.
 
-            The watchdog never modifies the results after creating them. Every time the results are
-            updated, a reference to the record is replaced with a new one that points to complete new
-            record. This allows the list to be safely read asynchronously from a different thread.
+            Results are ProbeRecord tuples (or None for pages not probed yet) and therefore can't be modified
+            after creation. Every time the results are updated, a reference to the record is replaced with
+            a new one that points to complete new record. This allows the list to be safely read
+            asynchronously from a different thread.
+
+            The list is only ever modified by the thread that runs run_forever(). Worker threads used
+            for concurrent probing just return their results to it. On reload it's replaced with a new
+            one (see page_table).
+        """
+
+        return self._page_table.probe_results
+
+    @property
+    def probe_results_version(self):
+        """ A counter incremented every time an element of probe_results is replaced. Readers can compare it
+            with the value seen previously to find out whether anything they derived from the results is stale.
+        """
+
+        return self._probe_results_version
+
+    @property
+    def page_versions(self):
+        """ A list whose i-th element is the value of probe_results_version right after the result of i-th page
+            from page_configs was last replaced (0 if it has not been probed yet). It allows finding the pages
+            whose results changed since a specific version. The list should not be modified from the outside of
+            the class.
+        """
+
+        return self._page_table.page_versions
+
+    @property
+    def metrics(self):
+        """ A WatchdogMetrics instance updated by run_forever() with every result and batch """
+
+        return self._metrics
+
+    @property
+    def result_broadcaster(self):
+        """ A ResultBroadcaster that delivers every new result to its subscribers as soon as run_forever() gets it.
+            Event ids are the values of probe_results_version right after the result has been stored.
         """
 
-        return self._probe_results
+        return self._result_broadcaster
+
+    @property
+    def probe_statistics(self):
+        """ A list whose i-th element contains the statistics of the recent results of i-th page from page_configs.
+            Each element is a dict that maps every window from STATISTICS_WINDOWS to the statistics described in
+            ProbeHistory.statistics(). The list is computed on every access and can be read from any thread.
+        """
+
+        return self._page_table.probe_statistics
 
     @property
     def page_configs(self):
-        """ A list of configurations for the pages to be probed, obtained from the requirement file.
-            The list should not be modified from the outside of the class.
+        """ A list of configurations for the pages to be probed, obtained from the requirement file,
+            as PageConfig tuples. The list should not be modified from the outside of the class.
 
-            The list is never modified after watchdog construction and therefore can by safely
-            read asynchronously from a different thread.
+            The list is never modified and therefore can by safely read asynchronously from a different
+            thread. On reload it's replaced with a new one (see page_table).
         """
 
-        return self._page_configs
+        return self._page_table.page_configs
 
     def _process_asynchronous_exceptions(self, exception_queue):
         """ Checks specified queue for messages containing exception information from other threads.
@@ -258,51 +1351,404 @@ class HttpWatchdog:
 
         logger.debug("Processing exceptions from other threads ({} messages)".format(exception_queue.qsize()))
 
-        if not exception_queue.empty():
-            (exc_type, exc_obj, exc_trace) = exception_queue.get_nowait()
+        while not exception_queue.empty():
+            message = exception_queue.get_nowait()
+
+            # None only wakes up the loop (see request_reload())
+            if message != None:
+                (exc_type, exc_obj, exc_trace) = message
+                raise exc_type.with_traceback(exc_obj, exc_trace)
+
+    def _log_connection_pool_statistics(self):
+        pool = self._connection_pool
+        if pool.hit_rate != None:
+            logger.debug(
+                "Connection pool: %d reused, %d new connections (hit rate %0.1f%%); %d idle connections kept open",
+                pool.hits,
+                pool.misses,
+                pool.hit_rate * 100,
+                pool.idle_count
+            )
+
+        dns_cache = self._dns_cache
+        if dns_cache.hit_rate != None:
+            logger.debug(
+                "DNS cache: %d hits, %d lookups (hit rate %0.1f%%); %d failed lookups, %d answered with stale addresses",
+                dns_cache.hits,
+                dns_cache.misses,
+                dns_cache.hit_rate * 100,
+                dns_cache.failures,
+                dns_cache.stale_hits
+            )
+
+        tls_sessions = self._tls_sessions
+        if tls_sessions.resumption_rate != None:
+            logger.debug(
+                "TLS handshakes: %d resumed, %d full (resumption rate %0.1f%%)",
+                tls_sessions.resumed_handshakes,
+                tls_sessions.full_handshakes,
+                tls_sessions.resumption_rate * 100
+            )
+
+    def _wait_for_asynchronous_exceptions(self, exception_queue, timeout):
+        """ Sleeps for at most timeout seconds. If an exception from a different thread arrives through
+            specified queue in the meantime, raises it immediately.
+        """
+
+        try:
+            message = exception_queue.get(timeout = timeout)
+        except QueueEmpty:
+            return
+
+        if message != None:
+            (exc_type, exc_obj, exc_trace) = message
             raise exc_type.with_traceback(exc_obj, exc_trace)
 
+    @property
+    def scheduler_lag(self):
+        """ The longest delay (in seconds) between the deadline of a probe and the moment it actually started,
+            among the probes in the most recently finished batch. A value that stays high means that the watchdog cannot
+            keep up with the requested probing intervals. None until the first batch is finished.
+        """
+
+        return self._scheduler_lag
+
+    @classmethod
+    def _format_timings(cls, timings):
+        """ Describes the durations of the phases of a request for the log. Skips the phases that did not occur. """
+
+        if timings == None:
+            return ''
+
+        def format_phase(phase):
+            # Lookups answered from the cache take no time worth reporting but it's useful to know they happened
+            if phase == 'dns' and timings.dns_source != DnsCache.SOURCE_RESOLVER:
+                return 'dns {}'.format(timings.dns_source)
+
+            return '{} {:0.0f}'.format(phase, getattr(timings, phase) * 1000)
+
+        return ': ' + ', '.join(format_phase(phase) for phase in cls.TIMING_PHASES if getattr(timings, phase) != None)
+
+    def _log_result(self, level, page_index, result, suffix):
+        status_string = "{} {} {}".format(
+            ProbeResult.to_str(result.result),
+            result.http_status if result.http_status != None else '',
+            result.reason
+        )
+
+        duration = " ({:0.0f} ms{})".format(result.request_duration * 1000, self._format_timings(result.timings)) if result.request_duration != None else ''
+        logger.log(level, "%s: %s%s%s", self._page_configs[page_index].url, status_string, duration, suffix)
+
+    @classmethod
+    def _page_state(cls, result):
+        # A change from one error status to another is a transition. From 200 to 304 (revalidated page) is not.
+        return (result.result, result.http_status if result.result == ProbeResult.HTTP_ERROR else None)
+
+    def _log_transition(self, page_index, previous_result, result):
+        """ Logs a result only if the page changed its state (see _page_state()) """
+
+        if previous_result == None:
+            self._log_result(logging.INFO, page_index, result, '')
+        elif self._page_state(previous_result) != self._page_state(result):
+            previous_state = ProbeResult.to_str(previous_result.result)
+            if previous_result.http_status != None:
+                previous_state += ' {}'.format(previous_result.http_status)
+
+            self._log_result(logging.INFO, page_index, result, " (previously {})".format(previous_state))
+
+    def _log_probe_result(self, page_index, previous_result, result):
+        """ Logs a result that has just replaced previous_result according to the logging settings """
+
+        assert result.result in [ProbeResult.MATCH, ProbeResult.NO_MATCH, ProbeResult.HTTP_ERROR, ProbeResult.CONNECTION_ERROR, ProbeResult.CONTENT_ERROR]
+
+        if self._log_transitions_only:
+            self._log_transition(page_index, previous_result, result)
+        else:
+            # By default inform only about the failures
+            self._log_result(logging.INFO if result.result != ProbeResult.MATCH else logging.DEBUG, page_index, result, '')
+
+    def _record_result(self, page_index, timestamp, result):
+        """ Updates the versions and history with a result that has just been stored in probe_results
+            and passes it to the subscribers of result_broadcaster
+        """
+
+        # NOTE: The page version must be updated before the global one. Readers that see a
+        # given global version must also see all the page versions not greater than it.
+        self._probe_history.record(page_index, timestamp, result)
+        self._page_versions[page_index] = self._probe_results_version + 1
+        self._probe_results_version += 1
+        self._result_broadcaster.publish(self._probe_results_version, page_index, result)
+
+    def _observe_result(self, page_index, timestamp, result):
+        """ Works like _record_result() but for results obtained by this watchdog. Updates also the metrics
+            and the result log.
+        """
+
+        self._record_result(page_index, timestamp, result)
+        self._metrics.observe_result(page_index, result)
+
+        if self._result_log != None:
+            self._result_log.append(self._page_log_keys[page_index], timestamp, result)
+
+    def store_result(self, page_index, result):
+        """ Replaces the result of a page with a ProbeRecord obtained by this watchdog (e.g. from probe()) and
+            updates everything that depends on it, exactly like run_forever() does after every probe
+        """
+
+        previous_result = self._probe_results[page_index]
+        self._probe_results[page_index] = result
+        self._observe_result(page_index, time.time(), result)
+        self._log_probe_result(page_index, previous_result, result)
+
+    def _finish_batch(self, duration, max_lag, skipped_deadlines):
+        """ Updates the metrics and commits the result log after a batch of probes """
+
+        self._scheduler_lag = max_lag
+        self._metrics.observe_batch(duration, max_lag, skipped_deadlines)
+
+        # Written once per batch rather than per result. fsync() is called at most once per RESULT_LOG_SYNC_INTERVAL.
+        if self._result_log != None:
+            self._result_log.commit()
+
+        if skipped_deadlines > 0:
+            logger.warning("WARNING: Probing took so long that %d probes had to be skipped. Consider increasing the number of workers or the probing intervals.", skipped_deadlines)
+
+    def _changes_requested(self):
+        """ True if a reload or a change of ownership is waiting to be applied """
+
+        return self._requested_page_configs != None or self._requested_ownership != None
+
+    def _store_finished_probes(self, finished_probes, batches):
+        """ Stores the results of probes collected from a ProbeDispatcher (see run_forever()) and puts their fetch
+            groups back in the schedule. batches maps the index of every fetch group in progress to the batch it
+            belongs to. A batch that has no probes in progress any more is finished.
+        """
+
+        for ((group_index, deadline), future) in finished_probes:
+            batch = batches.pop(group_index)
+
+            for (i, result) in future.result():
+                self.store_result(i, result)
+
+                batch['http_time'] += result.request_duration if result.request_duration != None else 0
+                batch['max_lag']    = max(batch['max_lag'], result.scheduler_lag)
+
+            now = time.time()
+            batch['skipped_deadlines'] += self._scheduler.reschedule(group_index, now)
+            batch['remaining']         -= 1
+
+            if batch['remaining'] == 0:
+                logger.debug(
+                    "Probe batch %d finished in %0.3f s. Total HTTP time: %0.3f s. Maximum scheduler lag: %0.3f s",
+                    batch['index'],
+                    now - batch['start'],
+                    batch['http_time'],
+                    batch['max_lag']
+                )
+                self._log_connection_pool_statistics()
+
+                self._finish_batch(now - batch['start'], batch['max_lag'], batch['skipped_deadlines'])
+
     def run_forever(self, exception_queue):
-        """ Iterates probe() in a loop over and over again, sleeping between each cycle.
-            Before each probe and after each cycle checks specified queue for exceptions raised by
-            other threads and reraises them if there are any.
+        """ Probes pages in an infinite loop. Each page is probed every 'interval' seconds (see __init__()).
+            Whenever probes are due, they're started as a batch using the configured engine. The function
+            does not wait for the batch to finish. It stores every result as soon as it arrives, puts the
+            page back in the schedule and starts the probes that have become due in the meantime. Between
+            these events it sleeps until the next deadline. Batches matter only for the statistics (see
+            _finish_batch()), which are updated when the last probe of a batch is finished.
+
+            Before processing probe results and while sleeping checks specified queue for exceptions raised
+            by other threads and reraises them if there are any. Reloads requested with request_reload() and
+            changes of ownership requested with request_ownership() renumber the pages, so no new probes are
+            started until the ones in progress are finished and the changes are applied.
 
             The function never returns. It is expected to be interrupted by a KeyboardInterrupt either
-            from its own thread or from the ones communication through exception_queue.
+            from its own thread or from the ones communication through exception_queue. Probes still in
+            progress at that moment are abandoned.
         """
 
         logger.info("Starting HTTP watchdog in an infinite loop. Use Ctrl+C to stop.\n")
 
-        probe_index = 0
-        while True:
-            logger.debug("Starting probe %d", probe_index + 1)
+        self._exception_queue = exception_queue
+
+        # The share of a node of a cluster is known before it starts probing (see ClusterNode.start())
+        self._apply_cluster_requests()
 
-            total_http_time = 0
-            for (i, result) in enumerate(self.probe()):
+        self._scheduler = ProbeScheduler()
+
+        now = time.time()
+        for group_index in sorted(self._owned_groups):
+            self._scheduler.add(group_index, self._fetch_groups[group_index]['interval'], now)
+
+        # Every finished probe wakes up the loop, just like request_reload() does
+        dispatcher  = self._create_dispatcher(lambda future: exception_queue.put(None))
+        batches     = {}
+        batch_index = 0
+        try:
+            while True:
                 self._process_asynchronous_exceptions(exception_queue)
+                self._store_finished_probes(dispatcher.take_finished(0), batches)
 
-                self._probe_results[i] = result
+                if len(dispatcher) == 0:
+                    self._reload_if_requested()
+                    self._apply_cluster_requests()
+                else:
+                    remote_results = self._take_remote_results()
+                    if len(remote_results) > 0:
+                        self._store_remote_results(remote_results)
+
+                if not self._changes_requested():
+                    scheduled_groups = self._scheduler.pop_due(time.time())
+                    if len(scheduled_groups) > 0:
+                        batch_index += 1
+                        logger.debug("Starting probe batch %d (%d requests)", batch_index, len(scheduled_groups))
+
+                        batch = {
+                            'index':             batch_index,
+                            'start':             time.time(),
+                            'remaining':         len(scheduled_groups),
+                            'http_time':         0,
+                            'max_lag':           0,
+                            'skipped_deadlines': 0,
+                        }
+                        for scheduled_group in scheduled_groups:
+                            batches[scheduled_group[0]] = batch
+                            dispatcher.submit(self._fetch_groups[scheduled_group[0]]['host_key'], scheduled_group)
+
+                    next_deadline = self._scheduler.next_deadline
+                else:
+                    # Wait only for the probes in progress
+                    next_deadline = None
 
-                assert result['result'] in [ProbeResult.MATCH, ProbeResult.NO_MATCH, ProbeResult.HTTP_ERROR, ProbeResult.CONNECTION_ERROR]
+                # There may be no pages at all after a reload
+                sleep_time = max(0, next_deadline - time.time()) if next_deadline != None else None
 
-                # By default inform only about the failures
-                level = logging.INFO if result['result'] != ProbeResult.MATCH else logging.DEBUG
-                status_string = "{} {} {}".format(
-                    ProbeResult.to_str(result['result']),
-                    result['http_status'] if result['http_status'] != None else '',
-                    result['reason']
-                )
+                if len(dispatcher) == 0:
+                    logger.debug("Going to sleep for %s seconds\n", "{:0.1f}".format(sleep_time) if sleep_time != None else "an indefinite number of")
+
+                self._wait_for_asynchronous_exceptions(exception_queue, sleep_time)
+        finally:
+            # Don't wait until the probes in progress time out
+            dispatcher.cancel()
+            self._stop_engines()
+
+    @classmethod
+    def _assign_shards(cls, fetch_groups, shard_count):
+        """ Splits the pages into at most shard_count shards with similar numbers of pages. Pages fetched with the
+            same request are never split. Pages on the same host are kept in one shard, so that they share its
+            connections and its limit of max_host_connections, unless the host has more than a fair share of all
+            the pages. Such a host is spread over several shards and gets up to max_host_connections from each.
+            Returns a list of non-empty, sorted lists of page indices.
+        """
+
+        pages_by_host = {}
+        for fetch_group in fetch_groups:
+            pages_by_host.setdefault(fetch_group['host_key'], []).append(fetch_group['page_indices'])
+
+        page_count = sum(len(fetch_group['page_indices']) for fetch_group in fetch_groups)
+        fair_share = math.ceil(page_count / shard_count)
+
+        units = []
+        for host_groups in pages_by_host.values():
+            host_pages = [page_index for page_indices in host_groups for page_index in page_indices]
+            if len(host_pages) <= fair_share:
+                units.append(host_pages)
+            else:
+                units.extend(host_groups)
+
+        # The largest units go first, each one to the shard with the fewest pages so far
+        shards = [[] for i in range(shard_count)]
+        for page_indices in sorted(units, key = len, reverse = True):
+            min(shards, key = len).extend(page_indices)
+
+        return [sorted(shard) for shard in shards if len(shard) > 0]
+
+    def _start_shards(self, supervisor):
+        shards = [
+            (
+                page_indices,
+                [
+                    {
+                        'url':      self._page_configs[page_index].url,
+                        'patterns': [regex.pattern for regex in self._page_configs[page_index].regexes],
+                        'interval': self._page_configs[page_index].interval,
+                    }
+                    for page_index in page_indices
+                ]
+            )
+            for page_indices in self._assign_shards([self._fetch_groups[group_index] for group_index in sorted(self._owned_groups)], supervisor.process_count)
+        ]
+
+        # Results restored from the result log or kept by a reload must not be observed again
+        self._observed_sequence_numbers = array('Q', (self._probe_results.sequence_number(page_index) for page_index in range(len(self._probe_results))))
+
+        supervisor.start(self._probe_results, shards, self._shard_settings)
+        logger.debug("Started %d probing processes with %s pages", len(shards), ', '.join(str(len(page_indices)) for (page_indices, page_configs) in shards))
+
+    def _observe_shard_batches(self, batches):
+        """ Processes the results of batches of probes finished by the probing processes. batches is a list
+            of (page indices, duration, maximum scheduler lag, number of skipped deadlines) tuples.
+        """
+
+        for (page_indices, duration, max_lag, skipped_deadlines) in batches:
+            for page_index in page_indices:
+                (sequence_number, result) = self._probe_results.read(page_index)
+
+                # The page may have been probed again before this notification arrived and then it comes up twice
+                if sequence_number != self._observed_sequence_numbers[page_index] and result != None:
+                    self._observed_sequence_numbers[page_index] = sequence_number
+                    self._observe_result(page_index, result.last_probed_at, result)
+
+            self._finish_batch(duration, max_lag, skipped_deadlines)
+
+    def run_sharded(self, exception_queue, supervisor):
+        """ An alternative to run_forever() that splits the pages between probing processes managed by
+            supervisor (a ShardSupervisor), each one running its own probing loop, so that downloading pages
+            and searching them for patterns is not limited to a single core. Requires shared_results.
 
-                duration = " ({:0.0f} ms)".format(result['request_duration'] * 1000) if result['request_duration'] != None else ''
-                logger.log(level, "%s: %s%s", self._page_configs[i]['url'], status_string, duration)
+            The processes store results directly in probe_results and after every batch tell this process
+            which pages they have probed. This process then updates the versions, history, metrics and the
+            result log, like run_forever() does after every probe. Results are logged by the processes that
+            obtained them.
+
+            To apply a reload requested with request_reload() or a change of ownership requested with
+            request_ownership(), all processes are stopped and started again with the new pages. Probes in
+            progress at that moment are lost and the schedule starts anew.
+
+            The function never returns. It is expected to be interrupted by a KeyboardInterrupt, like
+            run_forever(). The processes are stopped before it propagates.
+        """
+
+        assert self._shared_results
+
+        logger.info("Starting HTTP watchdog in an infinite loop with %d probing processes. Use Ctrl+C to stop.\n", supervisor.process_count)
+
+        self._exception_queue = exception_queue
+
+        try:
+            self._apply_cluster_requests()
+            self._start_shards(supervisor)
+
+            while True:
+                self._process_asynchronous_exceptions(exception_queue)
 
-                total_http_time += result['request_duration'] if result['request_duration'] != None else 0
+                page_configs                  = self._take_requested_page_configs()
+                (owns_target, remote_results) = self._take_cluster_requests()
+                if page_configs != None or owns_target != None:
+                    # Whatever the processes managed to report before stopping belongs to the old pages or owners
+                    self._observe_shard_batches(supervisor.stop())
 
-            logger.debug("Probe %d finished. Total HTTP time: %0.3f s", probe_index + 1, total_http_time)
+                    if page_configs != None:
+                        self.reload(page_configs)
+                    if owns_target != None:
+                        self.set_ownership(owns_target)
 
-            self._process_asynchronous_exceptions(exception_queue)
+                    self._start_shards(supervisor)
 
-            probe_index += 1
+                # Results of the pages that are not owned are written only by this process
+                if len(remote_results) > 0:
+                    self._store_remote_results(remote_results)
 
-            logger.debug("Going to sleep for %d seconds\n", self._probe_interval)
-            time.sleep(self._probe_interval)
+                self._observe_shard_batches(supervisor.poll(self.SHARD_POLL_INTERVAL))
+        finally:
+            supervisor.stop()
@@ -0,0 +1,106 @@
+""" Definitions of LogWriter class that moves the output of the logging module to a background thread,
+    DeferredQueueHandler class that passes records to it without formatting them and BatchedRotatingFileHandler
+    class that lets it write log files without flushing every line.
+"""
+
+import logging
+import logging.handlers
+from queue     import SimpleQueue, Empty as QueueEmpty
+from threading import Thread
+
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """ A RotatingFileHandler that does not flush the file after every record. The records are written
+        to the buffer of the file object and reach the disk when it fills up or when flush() is called.
+    """
+
+    def emit(self, record):
+        # Same as StreamHandler.emit() minus the flush
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+
+            if self.stream == None:
+                self.stream = self._open()
+
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """ A QueueHandler that puts records into the queue as they are. The standard one formats the message
+        (and the traceback) before enqueuing, i.e. in the thread that logs. Here it's done by the handlers
+        that receive the records from the queue.
+
+        Arguments of the message are converted to strings only then, so they should not be modified after
+        they have been logged. The records must stay in the same process.
+    """
+
+    def prepare(self, record):
+        return record
+
+class LogWriter:
+    """ Receives log records through a queue (see handler()) and passes them to handlers in a background
+        thread so that the threads that log never wait for the disk or the console.
+
+        The thread takes all the records waiting in the queue (at most MAX_BATCH_SIZE at a time), passes
+        each of them to every handler whose level it meets and then flushes the handlers once for the
+        whole batch.
+    """
+
+    MAX_BATCH_SIZE = 1000
+
+    _STOP = object()
+
+    def __init__(self, handlers):
+        self._handlers = handlers
+        self._queue    = SimpleQueue()
+        self._thread   = Thread(target = self._run, name = 'LogWriter', daemon = True)
+
+    def handler(self):
+        """ Returns a handler that puts records into the queue of the writer. It should be the only handler
+            of the root logger. Records are formatted in the thread of the writer, not in the one that logs them.
+        """
+
+        return DeferredQueueHandler(self._queue)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """ Writes all the records logged so far and stops the thread """
+
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+        for handler in self._handlers:
+            handler.close()
+
+    def _next_batch(self):
+        records = [self._queue.get()]
+        try:
+            while len(records) < self.MAX_BATCH_SIZE and records[-1] is not self._STOP:
+                records.append(self._queue.get_nowait())
+        except QueueEmpty:
+            pass
+
+        return records
+
+    def _run(self):
+        while True:
+            records = self._next_batch()
+
+            for record in records:
+                if record is self._STOP:
+                    break
+
+                for handler in self._handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+            for handler in self._handlers:
+                handler.flush()
+
+            if records[-1] is self._STOP:
+                return
@@ -2,46 +2,77 @@
 
 import sys
 import errno
+import signal
 import logging
 from queue import Queue
 
-from .report_server    import ReportServer
-from .http_watchdog    import HttpWatchdog
-from .settings_manager import SettingsManager, ConfigurationError
+from .report_server            import ReportServer
+from .http_watchdog            import HttpWatchdog
+from .settings_manager         import SettingsManager, ConfigurationError, DEFAULT_LOG_FILE_SIZE, DEFAULT_LOG_FILE_COUNT
+from .log_writer               import LogWriter, BatchedRotatingFileHandler
+from .requirement_file_watcher import RequirementFileWatcher
+from .shard_supervisor         import ShardSupervisor
+from .cluster_node             import ClusterNode
 
 logger = logging.getLogger(__name__)
 
-def configure_console_logging(logger, level):
-    """ Makes specified logger print information to the console """
+LOG_PATH = 'http_watchdog.log'
+
+# A cluster peer is considered gone if it does not answer this many requests in a row
+CLUSTER_FAILURE_POLLS = 3
+
+def create_console_handler(level):
+    """ Creates a handler that prints information to the console """
     formatter = logging.Formatter('%(message)s')
 
     handler = logging.StreamHandler()
     handler.setLevel(level)
     handler.setFormatter(formatter)
 
-    logger.addHandler(handler)
+    return handler
 
-def configure_file_logging(logger, level, log_path):
-    """ Makes specified logger print information to specified file.
-        The file will be appended to if it already exists.
+def create_file_handler(level, log_path):
+    """ Creates a handler that prints information to specified file. The file will be appended to
+        if it already exists and rotated when it reaches its maximum size (see apply_logging_settings()).
     """
 
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-    handler = logging.FileHandler(log_path)
+    handler = BatchedRotatingFileHandler(log_path, maxBytes = DEFAULT_LOG_FILE_SIZE, backupCount = DEFAULT_LOG_FILE_COUNT)
     handler.setLevel(level)
     handler.setFormatter(formatter)
 
-    logger.addHandler(handler)
+    return handler
 
 def configure_logging():
-    """ Configures the top-level logger """
+    """ Configures the top-level logger to pass records to a LogWriter that writes them to the console and
+        the log file in a background thread. Returns a (log_writer, console_handler, file_handler) tuple.
+    """
+
+    console_handler = create_console_handler(logging.INFO)
+    file_handler    = create_file_handler(logging.DEBUG, LOG_PATH)
+    log_writer      = LogWriter([console_handler, file_handler])
 
     root_logger = logging.getLogger()
     root_logger.setLevel(logging.DEBUG)
+    root_logger.addHandler(log_writer.handler())
+
+    log_writer.start()
+
+    return (log_writer, console_handler, file_handler)
+
+def apply_logging_settings(settings_manager, console_handler, file_handler):
+    """ Adjusts the handlers created by configure_logging() to the settings """
 
-    configure_console_logging(root_logger, logging.INFO)
-    configure_file_logging(root_logger, logging.DEBUG, 'http_watchdog.log')
+    console_handler.setLevel(settings_manager.get('console_log_level'))
+    file_handler.setLevel(settings_manager.get('file_log_level'))
+
+    # Rotation parameters are read by the handler for every record so they can be changed while it's in use
+    file_handler.maxBytes    = settings_manager.get('log_file_size')
+    file_handler.backupCount = settings_manager.get('log_file_count')
+
+    # Records below the level of both handlers are discarded right away, before they're even formatted
+    logging.getLogger().setLevel(min(console_handler.level, file_handler.level))
 
 def gather_settings():
     """ Creates SettingsManager and orders it to gather setting values from requirement file, command line and defaults """
@@ -60,7 +91,57 @@ def gather_settings():
 def create_watchdog(settings_manager):
     """ Creates an instance of the watchdog """
 
-    return HttpWatchdog(settings_manager.get('probe_interval'), settings_manager.get('pages'))
+    return HttpWatchdog(
+        settings_manager.get('probe_interval'),
+        settings_manager.get('pages'),
+        workers              = settings_manager.get('workers'),
+        max_host_connections = settings_manager.get('max_host_connections'),
+        engine               = settings_manager.get('engine'),
+        max_page_size        = settings_manager.get('max_page_size'),
+        connection_timeout   = settings_manager.get('connection_timeout'),
+        history_memory       = settings_manager.get('history_memory'),
+        dns_ttl              = settings_manager.get('dns_ttl'),
+        ca_file              = settings_manager.get('ca_file'),
+        tls_verify           = settings_manager.get('tls_verify'),
+        result_log_path      = settings_manager.get('result_log'),
+        result_log_size      = settings_manager.get('result_log_size'),
+        log_transitions_only = settings_manager.get('log_transitions_only'),
+        shared_results       = settings_manager.get('processes') > 1
+    )
+
+def start_requirement_file_watcher(settings_manager, watchdog):
+    """ Starts a thread that reloads the pages of the watchdog when the requirement file changes or the process gets SIGHUP """
+
+    watcher = RequirementFileWatcher(
+        settings_manager.get('requirement_file_path'),
+        settings_manager.read_page_configs,
+        watchdog.request_reload,
+        settings_manager.get('reload_interval')
+    )
+    watcher.start()
+
+    # Not available on Windows
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signal_number, frame: watcher.trigger())
+
+    return watcher
+
+def start_cluster_node(settings_manager, watchdog):
+    """ Joins the cluster of watchdogs if the settings define one. Returns None otherwise. """
+
+    if len(settings_manager.get('cluster_peers')) == 0:
+        return None
+
+    cluster_node = ClusterNode(
+        settings_manager.get('cluster_node'),
+        settings_manager.get('cluster_peers'),
+        watchdog,
+        settings_manager.get('cluster_interval'),
+        settings_manager.get('cluster_interval') * CLUSTER_FAILURE_POLLS
+    )
+    cluster_node.start()
+
+    return cluster_node
 
 def start_report_server(settings_manager, watchdog):
     """ Starts a HTTP server that serves a page describing latest probing results """
@@ -71,11 +152,17 @@ def start_report_server(settings_manager, watchdog):
 
     return (report_server, exception_queue)
 
-def run_watchdog(settings_manager, watchdog, exception_queue):
-    """ Starts an infinite loop executing watchdog probes """
+def run_watchdog(settings_manager, watchdog, exception_queue, helpers):
+    """ Starts an infinite loop executing watchdog probes, in this process or in several probing processes.
+        helpers are the objects that feed the watchdog from other threads (a RequirementFileWatcher and,
+        optionally, a ClusterNode). They are stopped before the watchdog is closed, however the loop ends.
+    """
 
     try:
-        watchdog.run_forever(exception_queue)
+        if settings_manager.get('processes') > 1:
+            watchdog.run_sharded(exception_queue, ShardSupervisor(settings_manager.get('processes')))
+        else:
+            watchdog.run_forever(exception_queue)
     except PermissionError as exception:
         assert exception.errno in [errno.EACCES, errno.EPERM]
         logger.error("ERROR: %s. Are you sure you have enough privileges to bind to port %d? You can use --port option to select a different port.", str(exception), settings_manager.get('port'))
@@ -90,14 +177,30 @@ def run_watchdog(settings_manager, watchdog, exception_queue):
         # Exit without error. Ctrl+C is the expected way of closing
         # this application.
         sys.exit(0)
+    finally:
+        for helper in helpers:
+            if helper != None:
+                helper.stop()
+
+        watchdog.close()
 
 def main():
     """ Runs the application """
 
-    configure_logging()
-
-    settings_manager                 = gather_settings()
-    watchdog                         = create_watchdog(settings_manager)
-    (report_server, exception_queue) = start_report_server(settings_manager, watchdog)
+    (log_writer, console_handler, file_handler) = configure_logging()
 
-    run_watchdog(settings_manager, watchdog, exception_queue)
+    try:
+        settings_manager = gather_settings()
+        apply_logging_settings(settings_manager, console_handler, file_handler)
+
+        watchdog                         = create_watchdog(settings_manager)
+        (report_server, exception_queue) = start_report_server(settings_manager, watchdog)
+        helpers                          = [
+            start_requirement_file_watcher(settings_manager, watchdog),
+            start_cluster_node(settings_manager, watchdog),
+        ]
+
+        run_watchdog(settings_manager, watchdog, exception_queue, helpers)
+    finally:
+        # Whatever was logged before exiting must reach the console and the file
+        log_writer.stop()
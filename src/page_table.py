@@ -0,0 +1,45 @@
+""" Definition of PageTable class that holds the state of all probed pages that is shown to readers """
+
+import time
+from collections import namedtuple
+
+# The configuration of a probed page in the format used internally by HttpWatchdog: the URL, a tuple of
+# compiled regular expressions (shared by all pages with the same patterns) and the probing interval in seconds
+PageConfig = namedtuple('PageConfig', ['url', 'regexes', 'interval'])
+
+class PageTable:
+    """ The configurations, latest results and history of all pages probed by HttpWatchdog, as lists in which
+        i-th element of each one describes i-th page.
+
+        When the requirement file is reloaded, the watchdog builds a new table and replaces the old one with a single
+        assignment. A reader that takes all the lists it needs from one table (see HttpWatchdog.page_table) never
+        mixes pages from two different configurations. The lists in a table never change their length. Results and
+        page versions are replaced in place by the watchdog, like the elements of HttpWatchdog.probe_results.
+        Page configs are PageConfig and results are ProbeRecord tuples, so an element, once read, never changes.
+
+        page_keys identify the pages independently of their positions (see ResultLog.page_key()) and owned_pages
+        is a bytearray in which 1 marks the pages probed by this watchdog rather than by other nodes of a cluster
+        (see HttpWatchdog.request_ownership()). Ownership is updated in place.
+    """
+
+    def __init__(self, page_configs, probe_results, page_versions, page_keys, owned_pages, probe_history, statistics_windows):
+        self.page_configs  = page_configs
+        self.probe_results = probe_results
+        self.page_versions = page_versions
+        self.page_keys     = page_keys
+        self.owned_pages   = owned_pages
+
+        self._probe_history      = probe_history
+        self._statistics_windows = statistics_windows
+
+    @property
+    def probe_statistics(self):
+        """ A list whose i-th element contains the statistics of the recent results of i-th page (see
+            HttpWatchdog.probe_statistics). The list is computed on every access and can be read from any thread.
+        """
+
+        now = time.time()
+        return [
+            self._probe_history.statistics(page_index, self._statistics_windows, now)
+            for page_index in range(len(self.page_configs))
+        ]
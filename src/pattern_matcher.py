@@ -0,0 +1,236 @@
+""" Definitions of PatternMatcher class that searches text for a set of patterns at once and
+    PatternCache class that makes sure that identical patterns are compiled only once.
+"""
+
+import re
+
+try:
+    # The parser used by re.compile(). It's not public but it's the only way to inspect a compiled pattern.
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:
+    # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+try:
+    # Optional C extension (pyahocorasick). Without it literals are searched with str.find().
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+class PatternMatcher:
+    """ Searches text for all patterns of a page in a single call.
+
+        Patterns that do not use any regular expression features (possibly apart from escaped
+        punctuation, e.g. 'window\\._') are treated as literals. When pyahocorasick is installed
+        and there are at least MIN_AUTOMATON_LITERALS of them, they are all found in a single pass
+        over the text with an Aho-Corasick automaton. Otherwise each of them is located with
+        str.find() which is still considerably faster than an equivalent regex search. Only the
+        real regular expressions go through the re module.
+
+        max_match_lengths tells ContentScanner which patterns can be searched for in fragments of the
+        text. See max_match_length().
+
+        NOTE: Merging all patterns into a single alternation does not help. re does not build
+        a DFA and tries every alternative at every position so it ends up slower than separate
+        searches.
+    """
+
+    METACHARACTERS = set('.^$*+?{}[]|()')
+
+    # Operations whose outcome depends on the text around the match: anchors and word boundaries (AT) and lookarounds
+    CONTEXT_OPCODES = {sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT}
+
+    # The automaton scans the text once but reports every occurrence of every literal to Python code,
+    # which is costly for frequent words. It pays off only when there are many literals to look for.
+    MIN_AUTOMATON_LITERALS = 32
+
+    def __init__(self, patterns, pattern_cache = None):
+        """ patterns is a list of strings. pattern_cache is a PatternCache used to obtain compiled
+            regular expressions. A private one is used if not specified.
+        """
+
+        if pattern_cache == None:
+            pattern_cache = PatternCache()
+
+        self.patterns = list(patterns)
+        self.regexes  = [pattern_cache.regex(pattern) for pattern in self.patterns]
+
+        # Lists of (pattern index, literal) and (pattern index, regex)
+        self._literals     = []
+        self._real_regexes = []
+        for (i, pattern) in enumerate(self.patterns):
+            literal = self.as_literal(pattern)
+            if literal != None and literal != '':
+                self._literals.append((i, literal))
+            else:
+                self._real_regexes.append((i, self.regexes[i]))
+
+        self.max_match_lengths = [self.max_match_length(pattern) for pattern in self.patterns]
+
+        self._automaton = None
+        if ahocorasick != None and len(self._literals) >= self.MIN_AUTOMATON_LITERALS:
+            self._automaton = ahocorasick.Automaton()
+
+            indices_by_literal = {}
+            for (i, literal) in self._literals:
+                indices_by_literal.setdefault(literal, []).append(i)
+
+            for (literal, indices) in indices_by_literal.items():
+                self._automaton.add_word(literal, (len(literal), indices))
+
+            self._automaton.make_automaton()
+
+    @property
+    def uses_automaton(self):
+        return self._automaton != None
+
+    @property
+    def literal_count(self):
+        return len(self._literals)
+
+    @classmethod
+    def as_literal(cls, pattern):
+        """ Returns the text matched by the pattern if it matches only one, fixed string.
+            Returns None if the pattern uses any features of regular expressions.
+        """
+
+        literal = []
+        escaped = False
+        for character in pattern:
+            if escaped:
+                # Escaped letters and digits have special meaning (\d, \b, \1, etc.)
+                if character.isalnum() or character == '_':
+                    return None
+
+                literal.append(character)
+                escaped = False
+            elif character == '\\':
+                escaped = True
+            elif character in cls.METACHARACTERS:
+                return None
+            else:
+                literal.append(character)
+
+        if escaped:
+            return None
+
+        return ''.join(literal)
+
+    @classmethod
+    def _uses_context(cls, node):
+        """ Checks whether a parsed pattern (or a part of it) contains any of CONTEXT_OPCODES """
+
+        if isinstance(node, sre_parse.SubPattern):
+            return any(opcode in cls.CONTEXT_OPCODES or cls._uses_context(argument) for (opcode, argument) in node.data)
+        elif isinstance(node, (list, tuple)):
+            return any(cls._uses_context(element) for element in node)
+        else:
+            return False
+
+    @classmethod
+    def max_match_length(cls, pattern):
+        """ Returns the maximum length of the text matched by the pattern if the pattern matches a fragment of
+            a text exactly where it matches the whole text. Returns None if the length is unbounded (e.g. '.*')
+            or if the pattern looks at the text outside of the match (anchors like '^' and '$', '\\b' or lookarounds).
+            Such a pattern may match at the edge of a fragment but not at the same place in the whole text or
+            the other way around.
+        """
+
+        literal = cls.as_literal(pattern)
+        if literal != None:
+            return len(literal)
+
+        parsed_pattern = sre_parse.parse(pattern)
+        if cls._uses_context(parsed_pattern):
+            return None
+
+        (min_width, max_width) = parsed_pattern.getwidth()
+        if max_width >= sre_constants.MAXREPEAT:
+            return None
+
+        return max_width
+
+    def _search_literals_with_automaton(self, text, pending_indices, matches):
+        pending_literal_count = sum(1 for (i, literal) in self._literals if i in pending_indices)
+
+        for (end_position, (length, indices)) in self._automaton.iter(text):
+            for i in indices:
+                if i in pending_indices and not i in matches:
+                    start = end_position - length + 1
+                    matches[i] = (start, text[start : end_position + 1])
+                    pending_literal_count -= 1
+
+            if pending_literal_count == 0:
+                break
+
+    def search(self, text, pending_indices):
+        """ Searches text for the patterns whose indices are in pending_indices (a set).
+            Returns a dict that maps indices of the patterns that have been found to
+            (position, matched text) tuples describing their first occurrences.
+        """
+
+        matches = {}
+
+        if self._automaton != None:
+            self._search_literals_with_automaton(text, pending_indices, matches)
+        else:
+            for (i, literal) in self._literals:
+                if i in pending_indices:
+                    position = text.find(literal)
+                    if position != -1:
+                        matches[i] = (position, literal)
+
+        for (i, regex) in self._real_regexes:
+            if i in pending_indices:
+                match = regex.search(text)
+                if match != None:
+                    matches[i] = (match.start(), match.group(0))
+
+        return matches
+
+class PatternCache:
+    """ Stores compiled regular expressions and matchers so that a pattern or a set of patterns
+        that occurs in the configuration many times is compiled only once and all pages share
+        the same object.
+    """
+
+    def __init__(self):
+        self._regexes     = {}
+        self._regex_lists = {}
+        self._matchers    = {}
+
+    def regex(self, pattern):
+        """ Returns a compiled regular expression for specified pattern """
+
+        if not pattern in self._regexes:
+            self._regexes[pattern] = re.compile(pattern)
+
+        return self._regexes[pattern]
+
+    def regexes(self, patterns):
+        """ Returns a tuple of compiled regular expressions for specified list of patterns """
+
+        key = tuple(patterns)
+        if not key in self._regex_lists:
+            self._regex_lists[key] = tuple(self.regex(pattern) for pattern in key)
+
+        return self._regex_lists[key]
+
+    def matcher(self, patterns):
+        """ Returns a PatternMatcher for specified list of patterns """
+
+        key = tuple(patterns)
+        if not key in self._matchers:
+            self._matchers[key] = PatternMatcher(key, self)
+
+        return self._matchers[key]
+
+    @property
+    def regex_count(self):
+        return len(self._regexes)
+
+    @property
+    def matcher_count(self):
+        return len(self._matchers)
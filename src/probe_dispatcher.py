@@ -0,0 +1,105 @@
+""" Definition of ProbeDispatcher class that starts probes in the background and limits the number of requests sent to each host """
+
+from queue       import Queue, Empty as QueueEmpty
+from collections import deque
+
+class ProbeDispatcher:
+    """ Starts the probes submitted by one thread and hands their results back to it. A probe is started by
+        start_probe(probe), a function that returns a concurrent.futures.Future (e.g. from a ThreadPoolExecutor),
+        and it's finished when the future is done.
+
+        At most max_host_connections probes of the same host run at a time. The other ones wait in a queue of
+        their host and start when a probe of that host is collected with take_finished(), so a slow host never
+        holds up the probes of the other hosts.
+
+        If on_finished is not None, it's called with every future as soon as it's done, usually from another
+        thread. It lets the submitting thread wait for other events at the same time (see HttpWatchdog.run_forever()).
+    """
+
+    def __init__(self, max_host_connections, start_probe, on_finished = None):
+        assert max_host_connections >= 1
+
+        self._max_host_connections = max_host_connections
+        self._start_probe          = start_probe
+        self._on_finished          = on_finished
+        self._pending_by_host      = {}
+        self._pending_count        = 0
+        self._running_by_host      = {}
+        self._running              = {}
+        self._finished             = Queue()
+
+    def __len__(self):
+        """ The number of probes submitted and not collected with take_finished() yet """
+
+        return self._pending_count + len(self._running)
+
+    def _start(self, host_key, probe):
+        future = self._start_probe(probe)
+
+        self._running[future]           = (host_key, probe)
+        self._running_by_host[host_key] = self._running_by_host.get(host_key, 0) + 1
+
+        future.add_done_callback(self._finish)
+
+    def _finish(self, future):
+        self._finished.put(future)
+
+        if self._on_finished != None:
+            self._on_finished(future)
+
+    def submit(self, host_key, probe):
+        """ Starts a probe of the host identified by host_key, or queues it until a connection to the host is free """
+
+        if self._running_by_host.get(host_key, 0) < self._max_host_connections:
+            self._start(host_key, probe)
+        else:
+            self._pending_by_host.setdefault(host_key, deque()).append(probe)
+            self._pending_count += 1
+
+    def take_finished(self, timeout = None):
+        """ Waits until at least one probe is finished, but no longer than timeout seconds (indefinitely if timeout
+            is None), and returns a list of (probe, future) tuples for all probes finished so far. A probe of the
+            same host waiting in the queue is started in place of each of them. Does not wait if there are no
+            probes or timeout is 0.
+        """
+
+        finished = []
+        block    = len(self._running) > 0 and timeout != 0
+        while True:
+            try:
+                future = self._finished.get(block, timeout)
+            except QueueEmpty:
+                return finished
+
+            # Futures cancelled by cancel() may still arrive
+            if future in self._running:
+                (host_key, probe) = self._running.pop(future)
+                finished.append((probe, future))
+
+                self._running_by_host[host_key] -= 1
+                if self._running_by_host[host_key] == 0:
+                    del self._running_by_host[host_key]
+
+                pending = self._pending_by_host.get(host_key)
+                if pending != None:
+                    self._pending_count -= 1
+                    next_probe = pending.popleft()
+                    if len(pending) == 0:
+                        del self._pending_by_host[host_key]
+
+                    self._start(host_key, next_probe)
+
+            block = len(finished) == 0 and len(self._running) > 0 and timeout != 0
+
+    def cancel(self):
+        """ Drops the probes waiting in the queues and cancels the running ones, as far as their futures allow it.
+            Probes that cannot be cancelled finish in the background and their results are never collected.
+        """
+
+        for future in self._running.keys():
+            future.cancel()
+
+        self._pending_by_host = {}
+        self._pending_count   = 0
+        self._running_by_host = {}
+        self._running         = {}
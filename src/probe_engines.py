@@ -0,0 +1,5 @@
+""" Names of the implementations that HttpWatchdog can use to fetch pages. Kept apart from HttpWatchdog
+    so that the settings can be validated without importing the whole probing machinery.
+"""
+
+ENGINES = ['blocking', 'asyncio']
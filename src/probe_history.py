@@ -0,0 +1,214 @@
+""" Definitions of ResultRingBuffer class that stores the recent results of a single page in typed arrays
+    and ProbeHistory class that keeps such buffers for all pages within a memory budget.
+"""
+
+import math
+import bisect
+import random
+from array     import array
+from threading import Lock
+
+from .probe_result import ProbeResult
+
+class ResultRingBuffer:
+    """ A fixed-capacity circular buffer of probe results. Instead of keeping result dicts, each field is
+        stored in a separate array of machine values, which takes ENTRY_SIZE bytes per result:
+
+            - timestamps: seconds since the epoch (double)
+            - results: ProbeResult values (signed char)
+            - HTTP statuses: -1 if there was no response (signed short)
+            - request durations: seconds, NaN if the request was not performed (float)
+
+        The arrays grow as results are appended until they reach the capacity. From then on the oldest
+        result is overwritten with every new one.
+    """
+
+    ENTRY_SIZE = array('d').itemsize + array('b').itemsize + array('h').itemsize + array('f').itemsize
+
+    def __init__(self, capacity):
+        assert capacity > 0
+
+        self.capacity     = capacity
+        self._timestamps  = array('d')
+        self._results     = array('b')
+        self._statuses    = array('h')
+        self._durations   = array('f')
+        self._next_index  = 0
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def append(self, timestamp, result, http_status, request_duration):
+        http_status      = http_status      if http_status      != None else -1
+        request_duration = request_duration if request_duration != None else math.nan
+
+        if len(self._timestamps) < self.capacity:
+            self._timestamps.append(timestamp)
+            self._results.append(result)
+            self._statuses.append(http_status)
+            self._durations.append(request_duration)
+        else:
+            self._timestamps[self._next_index] = timestamp
+            self._results[self._next_index]    = result
+            self._statuses[self._next_index]   = http_status
+            self._durations[self._next_index]  = request_duration
+
+        self._next_index = (self._next_index + 1) % self.capacity
+
+    def _in_order(self, values):
+        """ Returns a copy of one of the arrays with the elements ordered from the oldest to the newest """
+
+        if len(values) < self.capacity:
+            return values[:]
+
+        return values[self._next_index:] + values[:self._next_index]
+
+    def snapshot(self):
+        """ Returns a (timestamps, results, statuses, durations) tuple of arrays ordered from the oldest to the newest result """
+
+        return (
+            self._in_order(self._timestamps),
+            self._in_order(self._results),
+            self._in_order(self._statuses),
+            self._in_order(self._durations)
+        )
+
+class ProbeHistory:
+    """ Keeps a ResultRingBuffer for every page and computes statistics over time windows.
+
+        The capacity of the buffers is chosen so that all of them together never take more than memory_budget
+        bytes. The budget is split evenly between the pages. The buffers can be safely written by one thread
+        and read by others.
+    """
+
+    PERCENTILES = [50, 95, 99]
+
+    def __init__(self, page_count, memory_budget):
+        assert page_count >= 0
+        assert memory_budget > 0
+
+        self.capacity = max(1, memory_budget // (max(1, page_count) * ResultRingBuffer.ENTRY_SIZE))
+
+        self._memory_budget = memory_budget
+        self._buffers       = [ResultRingBuffer(self.capacity) for i in range(page_count)]
+        self._lock          = Lock()
+
+    def reordered(self, old_indices):
+        """ Returns a new ProbeHistory for a changed list of pages. old_indices[i] is the index of i-th page in
+            this history or None if the page is new. The buffers of the pages that are still present are moved to
+            the new history without copying and keep their capacity. The capacity of the new ones is computed from
+            the new number of pages, so until the old buffers are gone the history may use more than its budget.
+
+            The new history shares the lock with this one so that readers that still use this one are safe.
+        """
+
+        history = ProbeHistory(0, self._memory_budget)
+
+        history.capacity = max(1, self._memory_budget // (max(1, len(old_indices)) * ResultRingBuffer.ENTRY_SIZE))
+        history._buffers = [
+            self._buffers[old_index] if old_index != None else ResultRingBuffer(history.capacity)
+            for old_index in old_indices
+        ]
+        history._lock = self._lock
+
+        return history
+
+    def record(self, page_index, timestamp, result):
+        """ Appends a ProbeRecord (in the format used by HttpWatchdog.probe_results) to the history of specified page """
+
+        self.record_fields(page_index, timestamp, result.result, result.http_status, result.request_duration)
+
+    def record_fields(self, page_index, timestamp, result, http_status, request_duration):
+        """ Appends a result given as the fields stored in the history (e.g. restored from ResultLog) to the history of specified page """
+
+        with self._lock:
+            self._buffers[page_index].append(timestamp, result, http_status, request_duration)
+
+    @classmethod
+    def _select(cls, values, positions):
+        """ Returns a dict that maps each of positions to the value that would be at that position if values (a non-empty
+            list) were sorted. Works like quickselect extended to several positions at once, which takes expected linear
+            time rather than the O(n log n) of sorting. Partitioning is done by list comprehensions, i.e. mostly in C.
+        """
+
+        selected = {}
+        pending  = [(values, 0, sorted(set(positions)))]
+        while len(pending) > 0:
+            (values, offset, positions) = pending.pop()
+
+            pivot = values[random.randrange(len(values))]
+            lower = [value for value in values if value < pivot]
+            upper = [value for value in values if value > pivot]
+
+            # Positions (relative to offset) of the values equal to the pivot are [len(lower), upper_start)
+            upper_start     = len(values) - len(upper)
+            lower_positions = []
+            upper_positions = []
+            for position in positions:
+                if position - offset < len(lower):
+                    lower_positions.append(position)
+                elif position - offset < upper_start:
+                    selected[position] = pivot
+                else:
+                    upper_positions.append(position)
+
+            if len(lower_positions) > 0:
+                pending.append((lower, offset, lower_positions))
+            if len(upper_positions) > 0:
+                pending.append((upper, offset + upper_start, upper_positions))
+
+        return selected
+
+    @classmethod
+    def _percentiles(cls, values, percentiles):
+        """ Nearest-rank percentiles of a non-empty list. Returns a dict that maps each percentile to its value. """
+
+        positions = {percentile: max(0, math.ceil(percentile / 100 * len(values)) - 1) for percentile in percentiles}
+        selected  = cls._select(values, positions.values())
+
+        return {percentile: selected[position] for (percentile, position) in positions.items()}
+
+    @classmethod
+    def _window_statistics(cls, timestamps, results, durations, window_start):
+        first_index = bisect.bisect_right(timestamps, window_start)
+        probe_count = len(timestamps) - first_index
+
+        if probe_count == 0:
+            return None
+
+        # Results are small integers so counting the matches is done by bytes.count() in C
+        match_count = results[first_index:].tobytes().count(bytes([ProbeResult.MATCH]))
+
+        # NaN is the only value not equal to itself
+        measured_durations = [duration for duration in durations[first_index:] if duration == duration]
+        percentiles        = cls._percentiles(measured_durations, cls.PERCENTILES) if len(measured_durations) > 0 else {}
+
+        statistics = {
+            'probe_count': probe_count,
+            'uptime':      match_count / probe_count
+        }
+        for percentile in cls.PERCENTILES:
+            statistics['p{}'.format(percentile)] = percentiles.get(percentile)
+
+        return statistics
+
+    def statistics(self, page_index, windows, now):
+        """ Computes statistics of the results of specified page from the last window seconds for each window
+            in windows. Returns a dict mapping each window to None if there were no probes in the window or
+            to a dict with the following keys:
+
+                - probe_count: the number of probes in the window
+                - uptime: the fraction of probes that resulted in ProbeResult.MATCH
+                - p50, p95, p99: percentiles of the request duration (seconds) or None if no request was performed
+
+            Only the results still held in the buffer are taken into account, so with a small budget a window
+            may effectively be shorter than requested.
+        """
+
+        with self._lock:
+            (timestamps, results, statuses, durations) = self._buffers[page_index].snapshot()
+
+        return {
+            window: self._window_statistics(timestamps, results, durations, now - window)
+            for window in windows
+        }
@@ -1,22 +1,41 @@
-""" Enumeration of possible results of probing a web page. """
+""" Enumeration of possible results of probing a web page and the records that describe the results. """
 
-class ProbeResult:
+from enum        import IntEnum
+from collections import namedtuple
+
+class ProbeResult(IntEnum):
     MATCH            = 0 # There were no errors and all patterns were found
     NO_MATCH         = 1 # There were no errors but at least one pattern was not found
-    HTTP_ERROR       = 2 # Connection was established but the request resulted in a HTTP status other than 200 OK
+    HTTP_ERROR       = 2 # Connection was established but the request resulted in a HTTP status other than 200 OK (or 304 Not Modified for a revalidated page)
     CONNECTION_ERROR = 3 # Connection was not estabilished due to an error and request could not be performed
     NOT_PROBED_YET   = 4 # The site has not been probed yet
+    CONTENT_ERROR    = 5 # The request returned 200 OK but the content is not something that can be searched for patterns (e.g. binary or too large)
 
     @classmethod
     def to_str(cls, result):
         # SYNC: Keep in sync with class names in report.css
-        result_strings = {
-            cls.MATCH:            'MATCH',
-            cls.NO_MATCH:         'NO MATCH',
-            cls.HTTP_ERROR:       'HTTP ERROR',
-            cls.CONNECTION_ERROR: 'CONNECTION ERROR',
-            cls.NOT_PROBED_YET:   'NOT PROBED YET'
-        }
+        return RESULT_STRINGS[result]
+
+RESULT_STRINGS = {
+    ProbeResult.MATCH:            'MATCH',
+    ProbeResult.NO_MATCH:         'NO MATCH',
+    ProbeResult.HTTP_ERROR:       'HTTP ERROR',
+    ProbeResult.CONNECTION_ERROR: 'CONNECTION ERROR',
+    ProbeResult.NOT_PROBED_YET:   'NOT PROBED YET',
+    ProbeResult.CONTENT_ERROR:    'CONTENT ERROR'
+}
 
-        return result_strings[result]
+# The outcome of a single probe of a page, as stored in HttpWatchdog.probe_results:
+#   - result - a ProbeResult
+#   - http_status, reason - the status line of the response (None and an error message if there was no response)
+#   - last_probed_at - the time at which the probe finished, in seconds since the epoch (UTC)
+#   - request_duration - the time it took to fetch the page in seconds (None if the request was not made)
+#   - scheduler_lag - the time by which the start of the probe was late compared to its deadline
+#   - revalidated - True if the server confirmed that the page has not changed since the previous probe
+#   - timings - a ProbeTimings or None if the request was not made
+# Records are tuples, so they're immutable and several times smaller than dicts with the same keys.
+ProbeRecord = namedtuple('ProbeRecord', ['result', 'http_status', 'reason', 'last_probed_at', 'request_duration', 'scheduler_lag', 'revalidated', 'timings'])
 
+# The durations of the phases of a request in seconds (None for phases that did not occur) and
+# the source of the addresses of the server (see DnsCache). Shared by all pages fetched with the same request.
+ProbeTimings = namedtuple('ProbeTimings', ['dns', 'connect', 'tls', 'ttfb', 'dns_source', 'download'])
@@ -0,0 +1,100 @@
+""" Definition of ProbeScheduler class that decides when each page should be probed """
+
+import heapq
+import random
+
+class ProbeScheduler:
+    """ A priority queue of items (e.g. pages) ordered by the time they're due to be probed.
+        Each item has its own interval.
+
+        Deadlines are laid out on a fixed grid (previous deadline + interval) rather than counted
+        from the moment the previous probe finished, so the time spent probing does not accumulate
+        as drift. If a probe overruns so badly that the next deadline has already passed, the
+        missed deadlines are skipped instead of being probed in a burst.
+
+        To avoid sending requests for all items at the same moment, the grid of every item is
+        shifted by a random fraction of JITTER_FRACTION * interval and each deadline is additionally
+        moved randomly by up to half of that in either direction. The latter does not affect the
+        grid so the jitter does not accumulate over time.
+    """
+
+    JITTER_FRACTION = 0.1
+
+    def __init__(self, random_generator = None):
+        self._queue          = []
+        self._intervals      = {}
+        self._grid_deadlines = {}
+        self._random         = random_generator or random.Random()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _jitter(self, interval):
+        return self._random.uniform(-0.5, 0.5) * self.JITTER_FRACTION * interval
+
+    def add(self, item, interval, now):
+        """ Adds an item that should be probed every interval seconds starting (roughly) from now.
+            The item must be hashable and comparable with other items.
+        """
+
+        assert interval >= 0
+        assert not item in self._intervals
+
+        self._intervals[item]      = interval
+        self._grid_deadlines[item] = now + self._random.uniform(0, self.JITTER_FRACTION * interval)
+
+        heapq.heappush(self._queue, (self._grid_deadlines[item], item))
+
+    def rename(self, new_items):
+        """ Replaces the items in the queue according to new_items, a dict that maps an old item to a new one.
+            The renamed items keep their intervals and deadlines. Items not present in the dict are removed.
+            Must not be called while any items popped with pop_due() are waiting to be rescheduled.
+        """
+
+        self._queue = [(deadline, new_items[item]) for (deadline, item) in self._queue if item in new_items]
+        heapq.heapify(self._queue)
+
+        self._intervals      = {new_items[item]: interval for (item, interval) in self._intervals.items() if item in new_items}
+        self._grid_deadlines = {new_items[item]: deadline for (item, deadline) in self._grid_deadlines.items() if item in new_items}
+
+    @property
+    def next_deadline(self):
+        """ The earliest deadline among all items or None if there are no items """
+
+        return self._queue[0][0] if len(self._queue) > 0 else None
+
+    def pop_due(self, now):
+        """ Removes from the queue all items whose deadline is not later than now.
+            Returns a list of (item, deadline) tuples. Each item should be passed to
+            reschedule() once it has been probed.
+        """
+
+        due_items = []
+        while len(self._queue) > 0 and self._queue[0][0] <= now:
+            (deadline, item) = heapq.heappop(self._queue)
+            due_items.append((item, deadline))
+
+        return due_items
+
+    def reschedule(self, item, now):
+        """ Puts an item popped with pop_due() back in the queue with its next deadline.
+            Returns the number of deadlines skipped because the probe overran them.
+        """
+
+        interval = self._intervals[item]
+
+        if interval == 0:
+            self._grid_deadlines[item] = now
+            heapq.heappush(self._queue, (now, item))
+            return 0
+
+        next_deadline = self._grid_deadlines[item] + interval
+        skipped       = 0
+        while next_deadline <= now:
+            next_deadline += interval
+            skipped       += 1
+
+        self._grid_deadlines[item] = next_deadline
+        heapq.heappush(self._queue, (next_deadline + self._jitter(interval), item))
+
+        return skipped
@@ -0,0 +1,73 @@
+// Replaces the time of each probe with the number of seconds that passed since then.
+// The server sends the time as a number of milliseconds since the epoch in data-timestamp.
+function updateProbeAges() {
+    var cells = document.querySelectorAll('td.probed-at');
+    for (var i = 0; i < cells.length; ++i) {
+        var timestamp = cells[i].getAttribute('data-timestamp');
+        if (timestamp !== '')
+            cells[i].textContent = Math.max(0, Math.round((Date.now() - Number(timestamp)) / 1000)) + ' seconds ago';
+    }
+}
+
+// SYNC: Keep the order of phases in sync with ReportPageGenerator._format_timings()
+function formatTimings(timings) {
+    if (timings === null)
+        return '';
+
+    var phases = ['dns', 'connect', 'tls', 'ttfb', 'download'];
+    return phases.map(function (phase) {
+        if (timings[phase] === null)
+            return '-';
+        if (phase === 'dns' && timings.dns_source !== 'resolver')
+            return timings.dns_source;
+
+        return Math.round(timings[phase] * 1000);
+    }).join(' / ') + ' ms';
+}
+
+// Updates the row of a page with a result received from the event stream (same format as in /api/status).
+// SYNC: Keep the order of cells in sync with ReportPageGenerator.generate_report()
+function updateRow(page) {
+    var row = document.getElementById('page-' + page.index);
+    if (row === null)
+        return;
+
+    var statusCell    = row.cells[1];
+    var httpCell      = row.cells[2];
+    var durationCell  = row.cells[3];
+    var timingsCell   = row.cells[4];
+    var probedAtCell  = row.cells[7];
+    var probedAt      = Date.parse(page.last_probed_at);
+
+    statusCell.textContent   = page.result;
+    statusCell.className     = page.result.toLowerCase().replace(/ /g, '-');
+    httpCell.textContent     = (page.http_status !== null ? page.http_status : '') + ' ' + page.reason + (page.revalidated ? ' (revalidated)' : '');
+    durationCell.textContent = page.request_duration !== null ? Math.round(page.request_duration * 1000) + ' ms' : '';
+    timingsCell.textContent  = formatTimings(page.timings);
+
+    probedAtCell.setAttribute('data-timestamp', probedAt);
+    probedAtCell.title = page.last_probed_at.replace('T', ' ').replace('Z', ' UTC');
+}
+
+// Receives the results that arrive after the page has been generated. The browser reconnects automatically
+// and resumes from the last event. If that's not possible, the server sends 'reset' and the page is reloaded.
+function subscribeToResults() {
+    if (!window.EventSource)
+        return;
+
+    var version = document.getElementById('report').getAttribute('data-version');
+    var source  = new EventSource('/events?last_event_id=' + version);
+
+    source.addEventListener('result', function (event) {
+        updateRow(JSON.parse(event.data));
+        updateProbeAges();
+    });
+    source.addEventListener('reset', function () {
+        source.close();
+        window.location.reload();
+    });
+}
+
+updateProbeAges();
+setInterval(updateProbeAges, 1000);
+subscribeToResults();
@@ -3,9 +3,11 @@
 """
 
 import os
-from datetime import datetime
+from datetime  import datetime, timezone
+from threading import Lock
 
 from .probe_result import ProbeResult
+from .dns_cache    import DnsCache
 
 class ReportPageGenerator:
     """ The class uses a set of templates stored in REPORT_DIR to construct report and
@@ -15,11 +17,42 @@ class ReportPageGenerator:
 
         The templates are not meant to be modified by the end-user (there is not enough
         error checking and validation to make it easy).
+
+        Templates are read from disk only once and then again only if their modification
+        time changes. The report itself is cached too (see cached_report()).
     """
 
     REPORT_DIR        = 'src/report-templates'
     BOOTSTRAP_VERSION = '2.3.2'
 
+    # Maps template file names to (modification time, content) tuples
+    _template_cache = {}
+
+    # (key, content) tuple describing the last report generated by cached_report()
+    _report_cache      = (None, None)
+    _report_cache_lock = Lock()
+
+    @classmethod
+    def _template_mtime(cls, file_name):
+        return os.stat(os.path.join(cls.REPORT_DIR, file_name)).st_mtime_ns
+
+    @classmethod
+    def _read_template(cls, file_name):
+        """ Returns the content of specified file from REPORT_DIR. The file is read again only if
+            it has been modified since the last call.
+        """
+
+        mtime        = cls._template_mtime(file_name)
+        cached_entry = cls._template_cache.get(file_name)
+        if cached_entry != None and cached_entry[0] == mtime:
+            return cached_entry[1]
+
+        with open(os.path.join(cls.REPORT_DIR, file_name)) as template_file:
+            content = template_file.read()
+
+        cls._template_cache[file_name] = (mtime, content)
+        return content
+
     @classmethod
     def page_with_layout(cls, title, body, extra_style = ''):
         """ Wraps specified content in a layout. title is the content for the <title> tag
@@ -28,8 +61,7 @@ class ReportPageGenerator:
             Template is read from the layout.html file in REPORT_DIR.
         """
 
-        with open(os.path.join(cls.REPORT_DIR, 'layout.html')) as layout_template_file:
-            layout_template = layout_template_file.read()
+        layout_template = cls._read_template('layout.html')
 
         return layout_template.format(
             title             = title,
@@ -38,66 +70,153 @@ class ReportPageGenerator:
             style             = extra_style
         )
 
+    HOUR = 60 * 60
+    DAY  = 24 * 60 * 60
+
+    @classmethod
+    def _format_percentiles(cls, statistics):
+        if statistics == None or statistics['p50'] == None:
+            return ''
+
+        return ' / '.join('{:0.0f}'.format(statistics[key] * 1000) for key in ['p50', 'p95', 'p99']) + ' ms'
+
+    @classmethod
+    def _format_timings(cls, timings):
+        if timings == None:
+            return ''
+
+        def format_phase(phase):
+            if getattr(timings, phase) == None:
+                return '-'
+
+            # Instead of the time of a lookup answered from the cache show where the answer came from
+            if phase == 'dns' and timings.dns_source != DnsCache.SOURCE_RESOLVER:
+                return timings.dns_source
+
+            return '{:0.0f}'.format(getattr(timings, phase) * 1000)
+
+        # SYNC: Keep the order of phases in sync with HttpWatchdog.TIMING_PHASES and formatTimings() in report.js
+        phases = ['dns', 'connect', 'tls', 'ttfb', 'download']
+        return ' / '.join(format_phase(phase) for phase in phases) + ' ms'
+
     @classmethod
-    def generate_report(cls, probe_results, page_configs):
+    def _format_uptime(cls, statistics):
+        if statistics == None:
+            return '-'
+
+        return '{:0.1f}%'.format(statistics['uptime'] * 100)
+
+    @classmethod
+    def generate_report(cls, probe_results, probe_statistics, page_configs, version):
         """ Generates a page detailing the results for watchdog probes.
 
             Template is read from the report.html file in REPORT_DIR. The CSS for the page
-            is in report.css.
+            is in report.css and the script that displays the time elapsed since each probe
+            is in report.js.
 
-            probe_results and page_configs are expected to come from the properties of the same
-            names on a HttpWatchdog instance.
+            probe_results, probe_statistics and page_configs are expected to come from the properties
+            of the same names on a HttpWatchdog instance. The statistics must include 1h and 24h windows.
+            version is the value of probe_results_version read before the results. The script on the
+            page uses it to receive only the results that arrive later from the event stream.
         """
 
         assert len(probe_results) == len(page_configs)
+        assert len(probe_statistics) == len(page_configs)
 
-        with open(os.path.join(cls.REPORT_DIR, 'report.html')) as page_template_file:
-            page_template = page_template_file.read()
-
-        with open(os.path.join(cls.REPORT_DIR, 'report.css')) as style_file:
-            style = style_file.read()
+        page_template = cls._read_template('report.html')
+        style         = cls._read_template('report.css')
+        script        = cls._read_template('report.js')
 
-        table_body = ""
-        for (result, config) in zip(probe_results, page_configs):
+        table_rows = []
+        for (page_index, (result, statistics, config)) in enumerate(zip(probe_results, probe_statistics, page_configs)):
             if result != None:
-                assert result['result'] in [ProbeResult.MATCH, ProbeResult.NO_MATCH, ProbeResult.HTTP_ERROR, ProbeResult.CONNECTION_ERROR]
-
-                status              = ProbeResult.to_str(result['result'])
-                http_status         = (str(result['http_status']) if result['http_status'] != None else '') + ' ' + result['reason']
-                request_duration    = '{:0.0f} ms'.format(result['request_duration'] * 1000) if result['request_duration'] != None else ''
-                seconds_since_probe = '{} seconds ago'.format(round((datetime.utcnow() - result['last_probed_at']).total_seconds()))
-                last_probed_at      = str(result['last_probed_at']) + " UTC"
+                assert result.result in [ProbeResult.MATCH, ProbeResult.NO_MATCH, ProbeResult.HTTP_ERROR, ProbeResult.CONNECTION_ERROR, ProbeResult.CONTENT_ERROR]
+
+                status              = ProbeResult.to_str(result.result)
+                http_status         = (str(result.http_status) if result.http_status != None else '') + ' ' + result.reason
+                if result.revalidated:
+                    http_status    += ' (revalidated)'
+                request_duration    = '{:0.0f} ms'.format(result.request_duration * 1000) if result.request_duration != None else ''
+                last_probed_at      = str(datetime.fromtimestamp(result.last_probed_at, timezone.utc).replace(tzinfo = None)) + " UTC"
+                probed_at_timestamp = '{:0.0f}'.format(result.last_probed_at * 1000)
             else:
                 status              = 'NOT PROBED YET'
                 http_status         = ''
                 request_duration    = ''
-                seconds_since_probe = ''
                 last_probed_at      = 'NOT PROBED YET'
+                probed_at_timestamp = ''
 
-            table_body += (
-                "<tr>\n"
+            # The content of the last cell is replaced by report.js with the number of seconds that passed since the probe.
+            # This way the page can be cached until the results change.
+            # SYNC: Keep the order of cells in sync with updateRow() in report.js
+            table_rows.append((
+                "<tr id='page-{page_index}'>\n"
                 "   <td><a href='{url}'>{url}</a></td>\n"
                 "   <td class='{status_class}'>{status}</td>\n"
                 "   <td>{http_status}</td>\n"
                 "   <td>{request_duration}</td>\n"
-                "   <td title='{last_probed_at}'>{seconds_since_probe}</td>\n"
+                "   <td>{timings}</td>\n"
+                "   <td title='24h: {percentiles_24h}'>{percentiles_1h}</td>\n"
+                "   <td>{uptime_1h} / {uptime_24h}</td>\n"
+                "   <td class='probed-at' title='{last_probed_at}' data-timestamp='{probed_at_timestamp}'>{last_probed_at}</td>\n"
                 "</tr>\n"
             ).format(
-                url                 = config['url'],
+                page_index          = page_index,
+                url                 = config.url,
                 status              = status,
                 status_class        = status.lower().replace(' ', '-'),
                 http_status         = http_status,
                 request_duration    = request_duration,
+                timings             = cls._format_timings(result.timings if result != None else None),
+                percentiles_1h      = cls._format_percentiles(statistics[cls.HOUR]),
+                percentiles_24h     = cls._format_percentiles(statistics[cls.DAY]),
+                uptime_1h           = cls._format_uptime(statistics[cls.HOUR]),
+                uptime_24h          = cls._format_uptime(statistics[cls.DAY]),
                 last_probed_at      = last_probed_at,
-                seconds_since_probe = seconds_since_probe
-            )
+                probed_at_timestamp = probed_at_timestamp
+            ))
 
         return cls.page_with_layout(
             "HTTP watchdog report",
-            page_template.format(table_body = table_body),
+            page_template.format(table_body = ''.join(table_rows), script = script, version = version),
             style
         )
 
+    @classmethod
+    def cached_report(cls, probe_data_provider):
+        """ Returns the same page as generate_report() for the data from specified provider (see ReportServer)
+            but generates it only if the results or the templates have changed since the last call.
+            The provider must have a probe_results_version property that changes whenever the results do.
+
+            The statistics shown in the report are recomputed only along with the results. They can be slightly
+            out of date when the time windows move on without new probes.
+        """
+
+        # NOTE: The version must be read before the results. If the results change in the meantime,
+        # the report is generated again on the next request.
+        version = probe_data_provider.probe_results_version
+        key     = (
+            version,
+            tuple(cls._template_mtime(file_name) for file_name in ['layout.html', 'report.html', 'report.css', 'report.js'])
+        )
+
+        with cls._report_cache_lock:
+            (cached_key, cached_content) = cls._report_cache
+            if cached_key == key:
+                return cached_content
+
+            # All lists must come from the same table. They're replaced together when the requirement file is reloaded.
+            page_table = probe_data_provider.page_table
+            content    = cls.generate_report(
+                page_table.probe_results,
+                page_table.probe_statistics,
+                page_table.page_configs,
+                version
+            )
+            cls._report_cache = (key, content)
+
+        return content
+
     @classmethod
     def generate_error_404_page(cls, report_page_path):
         """ Generates a page for HTTP status 404.
@@ -107,8 +226,7 @@ class ReportPageGenerator:
             report_page_path is the path to the report page that can be used to link to it.
         """
 
-        with open(os.path.join(cls.REPORT_DIR, 'error-404.html')) as page_template_file:
-            page_template = page_template_file.read()
+        page_template = cls._read_template('error-404.html')
 
         body = page_template.format(report_page_path = report_page_path)
 
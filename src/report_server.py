@@ -5,7 +5,7 @@
 import sys
 import logging
 from threading    import Thread
-from socketserver import TCPServer
+from socketserver import TCPServer, ThreadingMixIn
 
 from .reporting_http_request_handler import ReportingHTTPRequestHandler
 
@@ -13,13 +13,25 @@ from .reporting_http_request_handler import ReportingHTTPRequestHandler
 # http://docs.python.org/3.3/library/logging.html#thread-safety
 logger = logging.getLogger(__name__)
 
+class ThreadingReportServer(ThreadingMixIn, TCPServer):
+    """ A TCP server that handles each connection in a separate thread so that a slow client
+        or an idle keep-alive connection does not block the others.
+    """
+
+    # Threads serving connections must not keep the program running when the main thread exits
+    daemon_threads = True
+
+    # The default backlog of 5 is too small for a larger number of dashboards connecting at once
+    request_queue_size = 128
+
 class ReportServer:
     def __init__(self, port, probe_data_provider, exception_queue):
         """ Creates an instance of the class that holds data for the server thread.
 
             - port: the port at which the HTTP server should be started.
-            - probe_data_provider: an object with probe_results and page_configs
-              properties that pass results and configuration from the watchdog.
+            - probe_data_provider: an object that passes results, their statistics and
+              configuration from the watchdog. See the properties of HttpWatchdog used
+              by ReportingHTTPRequestHandler.
               The properties should be safe to read from a different thread.
             - expception_queue: a thread safe queue that can be used to pass
               exception information to the main thread. Possibly an instance of
@@ -40,7 +52,7 @@ class ReportServer:
         """
 
         try:
-            httpd = TCPServer(("", self.port), ReportingHTTPRequestHandler)
+            httpd = ThreadingReportServer(("", self.port), ReportingHTTPRequestHandler)
 
             logger.info("Starting HTTP server at port %d\n", self.port)
 
@@ -1,41 +1,264 @@
 """ Definition of ReportingHTTPRequestHandler class """
 
+import gzip
+import json
+import socket
 import http.client
-from http.server import BaseHTTPRequestHandler
+from threading    import Lock
+from http.server  import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 
 from .report_page_generator import ReportPageGenerator
+from .status_api            import StatusApi
+from .cluster_api           import ClusterApi
 
 class ReportingHTTPRequestHandler(BaseHTTPRequestHandler):
     """ A handler for an instance of a server from socketserver module.
         The handler uses ReportPageGenerator to serve a page with detailed
-        status of the HTTP watchdog.
+        status of the HTTP watchdog and StatusApi to serve the same information
+        as JSON at STATUS_API_PATH (optionally with ?since=<version>). New results
+        are pushed to the clients connected to EVENTS_PATH as Server-Sent Events.
+        METRICS_PATH serves WatchdogMetrics in Prometheus text format. CLUSTER_API_PATH
+        serves the results needed by the other nodes of a cluster (see ClusterApi).
+
+        The handler speaks HTTP/1.1 and keeps connections open between requests
+        until the client closes them or stays idle for longer than KEEP_ALIVE_TIMEOUT
+        seconds. Pages are compressed with gzip if the client accepts it.
+
+        Responses that come with an ETag are answered with 304 Not Modified if the
+        client already has them (If-None-Match).
     """
 
-    REPORT_PAGE_PATH = '/'
+    REPORT_PAGE_PATH   = '/'
+    STATUS_API_PATH    = '/api/status'
+    EVENTS_PATH        = '/events'
+    METRICS_PATH       = '/metrics'
+    CLUSTER_API_PATH   = '/api/cluster'
+    KEEP_ALIVE_TIMEOUT = 30
 
-    def do_HEAD(self):
-        """ Responds to HEAD request """
+    # An event stream with no results is kept alive with comments sent this often (in seconds).
+    # It must be shorter than KEEP_ALIVE_TIMEOUT.
+    EVENTS_HEARTBEAT_INTERVAL = 15
 
-        if self.path == self.REPORT_PAGE_PATH:
-            self.send_response(http.client.OK)
-            self.send_header("Content-type", "text/html")
+    # Headers and body are sent separately. With Nagle's algorithm the body of a response on a keep-alive
+    # connection waits for the client to acknowledge the headers, which it delays by up to 40 ms.
+    disable_nagle_algorithm = True
+
+    protocol_version = 'HTTP/1.1'
+
+    # Applied to the socket by StreamRequestHandler. Makes idle keep-alive connections release their threads.
+    timeout = KEEP_ALIVE_TIMEOUT
+
+    # Maps paths to (page content, compressed body) tuples. The report and the full status are cached by
+    # their generators so as long as they do not change, the same string is returned and does not have
+    # to be compressed again.
+    _compressed_cache      = {}
+    _compressed_cache_lock = Lock()
+
+    @classmethod
+    def _accepts_gzip(cls, accept_encoding):
+        """ Checks whether the value of an Accept-Encoding header allows a gzip-compressed response """
+
+        if accept_encoding == None:
+            return False
+
+        for coding in accept_encoding.split(','):
+            (name, *parameters) = [part.strip() for part in coding.split(';')]
+            if name.lower() not in ['gzip', 'x-gzip']:
+                continue
+
+            # 'gzip;q=0' means that the client explicitly refuses gzip
+            for parameter in parameters:
+                (key, separator, value) = parameter.partition('=')
+                if key.strip().lower() == 'q':
+                    try:
+                        return float(value) > 0
+                    except ValueError:
+                        return False
+
+            return True
+
+        return False
+
+    @classmethod
+    def _compress(cls, path, page_content):
+        """ Returns gzip-compressed content. If path is not None, the result is cached for that path. """
+
+        if path == None:
+            return gzip.compress(page_content.encode('utf-8'))
+
+        with cls._compressed_cache_lock:
+            (cached_content, cached_body) = cls._compressed_cache.get(path, (None, None))
+            if cached_content is page_content:
+                return cached_body
+
+        body = gzip.compress(page_content.encode('utf-8'))
+
+        with cls._compressed_cache_lock:
+            cls._compressed_cache[path] = (page_content, body)
+
+        return body
+
+    @classmethod
+    def _etag_matches(cls, if_none_match, etag):
+        """ Checks whether the value of an If-None-Match header lists specified ETag """
+
+        if if_none_match == None:
+            return False
+
+        return any(candidate.strip() in ['*', etag] for candidate in if_none_match.split(','))
+
+    def _generate_page(self):
+        """ Returns a (HTTP status, content type, content, ETag) tuple for the requested path.
+            ETag is None if the response should not have one.
+        """
+
+        parsed_path = urlparse(self.path)
+
+        if parsed_path.path == self.REPORT_PAGE_PATH:
+            return (http.client.OK, "text/html", ReportPageGenerator.cached_report(self.server.probe_data_provider), None)
+        elif parsed_path.path == self.METRICS_PATH:
+            metrics = self.server.probe_data_provider.metrics
+            return (http.client.OK, metrics.CONTENT_TYPE, metrics.exposition(), None)
+        elif parsed_path.path == self.EVENTS_PATH:
+            # Only reachable with HEAD. GET streams the events.
+            return (http.client.METHOD_NOT_ALLOWED, "text/html", '', None)
+        elif parsed_path.path in [self.STATUS_API_PATH, self.CLUSTER_API_PATH]:
+            since_values = parse_qs(parsed_path.query).get('since', [])
+            if len(since_values) > 1 or len(since_values) == 1 and not since_values[0].isdigit():
+                return (http.client.BAD_REQUEST, "application/json", '{"error": "\'since\' must be a single non-negative integer"}', None)
+
+            since = int(since_values[0]) if len(since_values) == 1 else None
+            if parsed_path.path == self.CLUSTER_API_PATH:
+                return (http.client.OK, "application/json", ClusterApi.document(self.server.probe_data_provider, since), None)
+
+            (content, etag) = StatusApi.status(self.server.probe_data_provider, since)
+
+            return (http.client.OK, "application/json", content, etag)
         else:
-            self.send_response(http.client.NOT_FOUND)
-            self.send_header("Content-type", "text/html")
+            return (http.client.NOT_FOUND, "text/html", ReportPageGenerator.generate_error_404_page(report_page_path = self.REPORT_PAGE_PATH), None)
+
+    def _respond(self, include_body):
+        (status, content_type, page_content, etag) = self._generate_page()
 
+        compress = self._accepts_gzip(self.headers.get('Accept-Encoding'))
+
+        # A strong ETag identifies a specific representation so the compressed one needs a different tag
+        if etag != None and compress:
+            etag = etag[:-1] + '-gzip"'
+
+        if etag != None and self._etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(http.client.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+
+        if compress:
+            # Only the responses for the known paths are cached. The number of paths that produce errors is unlimited.
+            body = self._compress(urlparse(self.path).path if status == http.client.OK else None, page_content)
+        else:
+            body = page_content.encode('utf-8')
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if etag != None:
+            self.send_header("ETag", etag)
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
         self.end_headers()
 
-    def do_GET(self):
-        """ Responds to GET request """
+        if include_body:
+            self.wfile.write(body)
+
+    def _last_event_id(self):
+        """ Returns the id of the last event seen by a reconnecting client or None. EventSource sends it in the
+            Last-Event-ID header. The report page passes the version it was generated from in the query string.
+        """
+
+        values = [self.headers.get('Last-Event-ID')] + parse_qs(urlparse(self.path).query).get('last_event_id', [])
+        for value in values:
+            if value != None and value.strip().isdigit():
+                return int(value)
+
+        return None
+
+    def _write_event(self, event_type, event_id, data):
+        lines = []
+        if event_id != None:
+            lines.append("id: {}\n".format(event_id))
+        lines.append("event: {}\n".format(event_type))
+        lines.append("data: {}\n\n".format(json.dumps(data)))
+
+        self.wfile.write(''.join(lines).encode('utf-8'))
+        self.wfile.flush()
+
+    def _stream_events(self):
+        """ Sends each new probe result as an event until the client disconnects or falls so far
+            behind that it gets dropped by the broadcaster.
+
+            Each 'result' event carries a JSON object in the same format as the pages in the status API.
+            A 'reset' event means that some results could not be delivered (e.g. the client reconnected
+            too late to resume) or that the requirement file has been reloaded, and the client should get
+            the full state again.
+        """
+
+        broadcaster  = self.server.probe_data_provider.result_broadcaster
+        subscription = broadcaster.subscribe(self._last_event_id())
 
-        self.do_HEAD()
+        # NOTE: Must be read after subscribing. If the pages are reloaded in between, the subscription gets a reset.
+        page_configs = self.server.probe_data_provider.page_table.page_configs
 
-        if self.path == self.REPORT_PAGE_PATH:
-            probe_results = self.server.probe_data_provider.probe_results
-            page_configs  = self.server.probe_data_provider.page_configs
+        try:
+            # The length of the stream is unknown. It ends when the connection is closed.
+            self.close_connection = True
+
+            self.send_response(http.client.OK)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+
+            if subscription.missed_events:
+                self._write_event('reset', None, {})
+
+            while not subscription.dropped:
+                event = subscription.get(self.EVENTS_HEARTBEAT_INTERVAL)
+                if event == None:
+                    self.wfile.write(b": heartbeat\n\n")
+                    self.wfile.flush()
+                    continue
+
+                (event_id, page_index, result) = event
+                if event_id == None:
+                    # The pages have been reloaded and the indices in the events that follow refer to the new ones
+                    break
+
+                self._write_event('result', event_id, StatusApi.describe_page(page_index, result, event_id, page_configs[page_index]))
+
+            # The client can reconnect but will have to start from the current state
+            self._write_event('reset', None, {})
+        except (ConnectionError, socket.timeout):
+            pass
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    def do_HEAD(self):
+        """ Responds to HEAD request """
+
+        self._respond(False)
+
+    def do_GET(self):
+        """ Responds to GET request """
 
-            page_content = ReportPageGenerator.generate_report(probe_results, page_configs)
+        if urlparse(self.path).path == self.EVENTS_PATH:
+            self._stream_events()
         else:
-            page_content = ReportPageGenerator.generate_error_404_page(report_page_path = self.REPORT_PAGE_PATH)
+            self._respond(True)
 
-        self.wfile.write(page_content.encode('utf-8'))
+    def log_request(self, code = '-', size = '-'):
+        # Cluster peers ask for new results every few seconds and would drown out all other requests
+        if urlparse(self.path).path != self.CLUSTER_API_PATH:
+            super().log_request(code, size)
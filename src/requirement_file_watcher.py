@@ -0,0 +1,84 @@
+""" Definition of RequirementFileWatcher class that notices changes in the requirement file while the watchdog is running """
+
+import os
+import logging
+from threading import Thread, Event
+
+from .settings_manager import ConfigurationError
+
+logger = logging.getLogger(__name__)
+
+class RequirementFileWatcher:
+    """ Checks the requirement file for changes in a background thread and passes the new page configs to a callback.
+
+        The modification time and size of the file are compared with the previous ones every poll_interval seconds
+        (never, if it's 0). trigger() makes the watcher read the file right away, whether it has changed or not.
+        It's safe to call from a signal handler.
+
+        The file is read and validated by read_page_configs() in the thread of the watcher so even a large file does
+        not delay probing. The function should raise ConfigurationError if the file is invalid. The error is logged
+        and the watchdog keeps probing the pages it already has until the file is fixed.
+    """
+
+    def __init__(self, path, read_page_configs, on_change, poll_interval):
+        assert poll_interval >= 0
+
+        self._path              = path
+        self._read_page_configs = read_page_configs
+        self._on_change         = on_change
+        self._poll_interval     = poll_interval
+        self._signature         = self._file_signature()
+        self._triggered         = Event()
+        self._stopped           = False
+        self._thread            = Thread(target = self._run, name = 'RequirementFileWatcher', daemon = True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._triggered.set()
+        self._thread.join()
+
+    def trigger(self):
+        self._triggered.set()
+
+    def _file_signature(self):
+        """ Returns a value that changes whenever the file is modified. None if the file cannot be accessed. """
+
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def check(self, force):
+        """ Reads the file and passes its page configs to on_change() if the file has changed since the last check or if force is True """
+
+        signature = self._file_signature()
+        if not force and signature == self._signature:
+            return
+
+        self._signature = signature
+
+        logger.info("Reading the requirement file %s", self._path)
+        try:
+            page_configs = self._read_page_configs()
+        except (ConfigurationError, OSError) as exception:
+            logger.error("ERROR: The requirement file cannot be reloaded. Still probing the previous set of pages.")
+            logger.error(str(exception))
+            return
+
+        self._on_change(page_configs)
+
+    def _run(self):
+        while True:
+            self._triggered.wait(self._poll_interval if self._poll_interval > 0 else None)
+            if self._stopped:
+                return
+
+            force = self._triggered.is_set()
+            self._triggered.clear()
+
+            self.check(force)
@@ -0,0 +1,130 @@
+""" Definition of ResultBroadcaster class that passes probe results from the watchdog to any number of subscribers """
+
+from queue       import Queue, Full as QueueFull, Empty as QueueEmpty
+from threading   import Lock
+from collections import deque
+
+class ResultSubscription:
+    """ A queue of events for a single subscriber created by ResultBroadcaster.subscribe().
+
+        Each event is an (event id, page index, result) tuple. If the subscriber
+        cannot keep up and the queue fills up, the subscription is dropped: dropped becomes True
+        and no more events are delivered.
+    """
+
+    def __init__(self, queue_size):
+        self._queue  = Queue(queue_size)
+        self.dropped = False
+
+        # True if the events the subscriber wanted to resume from are no longer available.
+        # The subscriber has to get the current state from elsewhere before using the events.
+        self.missed_events = False
+
+    def get(self, timeout):
+        """ Returns the next event or None if there was none for timeout seconds or the subscription has been dropped """
+
+        try:
+            return self._queue.get(timeout = timeout)
+        except QueueEmpty:
+            return None
+
+    def _put(self, event):
+        self._queue.put_nowait(event)
+
+class ResultBroadcaster:
+    """ Delivers every probe result published by the watchdog to all subscribers.
+
+        Publishing never blocks. Each subscriber has its own queue of at most queue_size events
+        and is dropped as soon as it falls that far behind. The last replay_size events are
+        kept so that a subscriber that reconnects can resume from the last event it has seen.
+        Event ids must be consecutive integers starting from 1 (HttpWatchdog uses probe_results_version).
+
+        reset() tells the subscribers that the events published so far are no longer meaningful (e.g. because
+        page indices have changed). It takes an event id of its own.
+    """
+
+    # Delivered to the subscribers by reset() instead of a regular event
+    RESET_EVENT = (None, None, None)
+
+    def __init__(self, queue_size, replay_size):
+        assert queue_size > 0
+        assert replay_size > 0
+
+        self._queue_size    = queue_size
+        self._replay_buffer = deque(maxlen = replay_size)
+        self._subscriptions = set()
+        self._lock          = Lock()
+        self._reset_id      = 0
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscriptions)
+
+    def publish(self, event_id, page_index, result):
+        """ Passes a result to all subscribers. Subscribers whose queues are full are dropped. """
+
+        event = (event_id, page_index, result)
+
+        with self._lock:
+            self._replay_buffer.append(event)
+
+            dropped_subscriptions = []
+            for subscription in self._subscriptions:
+                try:
+                    subscription._put(event)
+                except QueueFull:
+                    subscription.dropped = True
+                    dropped_subscriptions.append(subscription)
+
+            for subscription in dropped_subscriptions:
+                self._subscriptions.discard(subscription)
+
+    def reset(self, event_id):
+        """ Marks all current subscriptions as having missed events (see ResultSubscription.missed_events) and
+            empties the replay buffer so that no subscriber can resume from an event published before the reset.
+            The subscribers get RESET_EVENT so that they notice even if they're waiting for an event.
+        """
+
+        with self._lock:
+            self._replay_buffer.clear()
+            self._reset_id = event_id
+
+            for subscription in self._subscriptions:
+                subscription.missed_events = True
+                try:
+                    subscription._put(self.RESET_EVENT)
+                except QueueFull:
+                    subscription.dropped = True
+
+            self._subscriptions = {subscription for subscription in self._subscriptions if not subscription.dropped}
+
+    def subscribe(self, last_event_id = None):
+        """ Returns a new ResultSubscription. If last_event_id is not None, the events published after the
+            one with that id are delivered first. If some of them are no longer in the replay buffer or would
+            not fit in the queue, none of them are delivered and missed_events is set on the subscription.
+        """
+
+        subscription = ResultSubscription(self._queue_size)
+
+        with self._lock:
+            if last_event_id != None:
+                oldest_event_id = self._replay_buffer[0][0]  if len(self._replay_buffer) > 0 else self._reset_id + 1
+                newest_event_id = self._replay_buffer[-1][0] if len(self._replay_buffer) > 0 else self._reset_id
+                events          = [event for event in self._replay_buffer if event[0] > last_event_id]
+
+                # Ids are consecutive so if the oldest event kept is not the one right after the last one seen, some are missing.
+                # An id newer than any published means that the subscriber has seen events from before a restart.
+                # Events from before a reset are not meaningful anymore.
+                if oldest_event_id > last_event_id + 1 or last_event_id > newest_event_id or last_event_id < self._reset_id or len(events) > self._queue_size:
+                    subscription.missed_events = True
+                else:
+                    for event in events:
+                        subscription._put(event)
+
+            self._subscriptions.add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
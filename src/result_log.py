@@ -0,0 +1,290 @@
+""" Definition of ResultLog class that stores probe results on disk in an append-only, segmented log
+    from which the latest state can be restored after a restart.
+"""
+
+import os
+import re
+import json
+import math
+import mmap
+import zlib
+import time
+import struct
+import hashlib
+import logging
+
+from .probe_result import ProbeResult, ProbeRecord, ProbeTimings
+
+logger = logging.getLogger(__name__)
+
+class ResultLog:
+    """ An append-only log of probe results split into numbered segment files in a directory.
+
+        Each record has the following layout (little-endian):
+
+            - record length (uint32), including this header and the trailer
+            - CRC-32 of everything between the header and the trailer (uint32)
+            - page key (8 bytes, see page_key())
+            - timestamp: seconds since the epoch (double)
+            - ProbeResult value (signed char)
+            - HTTP status: -1 if there was no response (signed short)
+            - request duration: seconds, NaN if the request was not performed (float)
+            - the remaining fields of the ProbeRecord as a compact JSON object
+            - record length again (uint32)
+
+        The length at both ends makes it possible to walk the log backwards, from the newest record,
+        which is how restore() finds the latest result of every page without reading the whole log.
+        The fixed fields needed by ProbeHistory are decoded without parsing the JSON.
+
+        append() only buffers a record. commit() writes the buffer to the current segment and calls
+        fsync() if at least sync_interval seconds passed since the last one, so a crash loses at most
+        the results of the last sync_interval seconds. A new segment is started when the current one
+        reaches segment_size bytes and the oldest segments are deleted when all of them together
+        exceed max_size bytes.
+    """
+
+    HEADER  = struct.Struct('<II8sdbhf')
+    TRAILER = struct.Struct('<I')
+
+    SEGMENT_NAME_FORMAT  = 'results-{:08d}.log'
+    SEGMENT_NAME_PATTERN = re.compile(r'^results-(\d{8})\.log$')
+
+    # Fields of ProbeRecord that are stored in the JSON part of the record. The others are stored in the fixed
+    # part or, in case of last_probed_at, are equal to the timestamp.
+    JSON_FIELDS = ['reason', 'scheduler_lag', 'revalidated', 'timings']
+
+    def __init__(self, directory, max_size, segment_size, sync_interval = 1.0):
+        assert max_size > 0
+        assert 0 < segment_size <= max_size
+        assert sync_interval >= 0
+
+        self._directory     = directory
+        self._max_size      = max_size
+        self._segment_size  = segment_size
+        self._sync_interval = sync_interval
+        self._buffer        = []
+        self._file          = None
+        self._last_sync     = time.monotonic()
+
+        os.makedirs(directory, exist_ok = True)
+
+        segments = self._segment_numbers()
+        self._segment_number = segments[-1] if len(segments) > 0 else 1
+
+        self._open_segment()
+
+    @classmethod
+    def page_key(cls, url, patterns):
+        """ Returns an 8-byte key identifying a page in the log. Pages with the same URL and patterns are
+            considered the same page even if their position in the requirement file changes.
+        """
+
+        return hashlib.blake2b('\0'.join([url] + list(patterns)).encode('utf-8'), digest_size = 8).digest()
+
+    def _segment_path(self, number):
+        return os.path.join(self._directory, self.SEGMENT_NAME_FORMAT.format(number))
+
+    def _segment_numbers(self):
+        """ Returns the numbers of existing segments, from the oldest to the newest """
+
+        numbers = []
+        for file_name in os.listdir(self._directory):
+            match = self.SEGMENT_NAME_PATTERN.match(file_name)
+            if match != None:
+                numbers.append(int(match.group(1)))
+
+        return sorted(numbers)
+
+    def _open_segment(self):
+        path = self._segment_path(self._segment_number)
+        if os.path.exists(path):
+            self._truncate_torn_record(path)
+
+        self._file = open(path, 'ab')
+
+    @classmethod
+    def _truncate_torn_record(cls, path):
+        """ Cuts off an incomplete record left at the end of a segment by a crash. Checking the last record
+            is enough in the common case. Only if it's damaged, the segment is scanned from the beginning
+            to find the end of the last valid record.
+        """
+
+        size = os.path.getsize(path)
+        if size == 0:
+            return
+
+        with open(path, 'r+b') as segment_file:
+            with mmap.mmap(segment_file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                if cls._record_start(data, size) != None:
+                    return
+
+                valid_size = 0
+                while valid_size < size:
+                    record_end = cls._record_end(data, valid_size, size)
+                    if record_end == None:
+                        break
+
+                    valid_size = record_end
+
+            logger.warning("WARNING: Discarding %d bytes of an incomplete record at the end of %s", size - valid_size, path)
+            segment_file.truncate(valid_size)
+
+    @classmethod
+    def _is_valid_record(cls, data, start, end):
+        if end - start < cls.HEADER.size + cls.TRAILER.size:
+            return False
+
+        (length, checksum) = struct.unpack_from('<II', data, start)
+        if length != end - start or cls.TRAILER.unpack_from(data, end - cls.TRAILER.size)[0] != length:
+            return False
+
+        return zlib.crc32(data[start + 8 : end - cls.TRAILER.size]) == checksum
+
+    @classmethod
+    def _record_start(cls, data, end):
+        """ Returns the offset of the valid record that ends at specified offset or None """
+
+        if end < cls.TRAILER.size:
+            return None
+
+        start = end - cls.TRAILER.unpack_from(data, end - cls.TRAILER.size)[0]
+        return start if start >= 0 and cls._is_valid_record(data, start, end) else None
+
+    @classmethod
+    def _record_end(cls, data, start, size):
+        """ Returns the offset right after the valid record that starts at specified offset or None """
+
+        if size - start < cls.HEADER.size:
+            return None
+
+        end = start + struct.unpack_from('<I', data, start)[0]
+        return end if end <= size and cls._is_valid_record(data, start, end) else None
+
+    @classmethod
+    def _encode(cls, page_key, timestamp, result):
+        json_fields = {field: getattr(result, field) for field in cls.JSON_FIELDS}
+        if result.timings != None:
+            json_fields['timings'] = result.timings._asdict()
+
+        payload = json.dumps(json_fields, separators = (',', ':')).encode('utf-8')
+
+        length = cls.HEADER.size + len(payload) + cls.TRAILER.size
+        fixed  = struct.pack(
+            '<8sdbhf',
+            page_key,
+            timestamp,
+            result.result,
+            result.http_status if result.http_status != None else -1,
+            result.request_duration if result.request_duration != None else math.nan
+        )
+
+        return struct.pack('<II', length, zlib.crc32(fixed + payload)) + fixed + payload + cls.TRAILER.pack(length)
+
+    def append(self, page_key, timestamp, result):
+        """ Adds a ProbeRecord (in the format used by HttpWatchdog.probe_results) to the log. The record
+            is not written until commit() is called.
+        """
+
+        self._buffer.append(self._encode(page_key, timestamp, result))
+
+    def commit(self, force_sync = False):
+        """ Writes all appended records to disk. Calls fsync() if sync_interval passed since the last time or if force_sync is True. """
+
+        if len(self._buffer) > 0:
+            self._file.write(b''.join(self._buffer))
+            self._file.flush()
+            self._buffer = []
+
+        now = time.monotonic()
+        if force_sync or now - self._last_sync >= self._sync_interval:
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+
+        if self._file.tell() >= self._segment_size:
+            self._start_new_segment()
+
+    def _start_new_segment(self):
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        self._segment_number += 1
+        self._file = open(self._segment_path(self._segment_number), 'ab')
+
+        # Delete the oldest segments until the rest fits within the limit
+        segments   = self._segment_numbers()
+        sizes      = {number: os.path.getsize(self._segment_path(number)) for number in segments}
+        total_size = sum(sizes.values())
+        for number in segments[:-1]:
+            if total_size <= self._max_size:
+                break
+
+            logger.debug("Deleting result log segment %s", self._segment_path(number))
+            os.remove(self._segment_path(number))
+            total_size -= sizes[number]
+
+    def close(self):
+        self.commit(force_sync = True)
+        self._file.close()
+
+    def restore(self, page_keys, since, latest_since = None):
+        """ Reads the log from the newest record backwards. Returns a (latest_results, history) tuple:
+
+                - latest_results maps each page key from page_keys that has a result newer than latest_since
+                  (since if it's None) to a (timestamp, ProbeRecord) tuple describing its latest result,
+                - history maps page keys to lists of (timestamp, result, http_status, request_duration)
+                  tuples (in ProbeHistory format) of all the results newer than since, from the newest
+                  to the oldest.
+
+            Reading stops at the first record that is neither newer than since nor than latest_since, or
+            at the first one older than since once the latest results of all pages are known. A page that
+            has never been probed (e.g. a new one) therefore costs only the records within that window
+            rather than a walk through the whole log.
+        """
+
+        latest_since   = latest_since if latest_since != None else since
+        page_keys      = set(page_keys)
+        latest_results = {}
+        history        = {page_key: [] for page_key in page_keys}
+
+        for number in reversed(self._segment_numbers()):
+            path = self._segment_path(number)
+            if os.path.getsize(path) == 0:
+                continue
+
+            with open(path, 'rb') as segment_file, mmap.mmap(segment_file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                end = len(data)
+                while end > 0:
+                    start = self._record_start(data, end)
+                    if start == None:
+                        logger.warning("WARNING: Result log segment %s is damaged. Ignoring %d bytes at its beginning.", path, end)
+                        break
+
+                    (length, checksum, page_key, timestamp, result, http_status, request_duration) = self.HEADER.unpack_from(data, start)
+                    if timestamp <= since and (timestamp <= latest_since or len(latest_results) == len(page_keys)):
+                        return (latest_results, history)
+
+                    if page_key in page_keys:
+                        http_status      = http_status      if http_status      != -1 else None
+                        request_duration = request_duration if request_duration == request_duration else None
+
+                        if timestamp > since:
+                            history[page_key].append((timestamp, result, http_status, request_duration))
+
+                        if not page_key in latest_results and timestamp > latest_since:
+                            json_fields = json.loads(bytes(data[start + self.HEADER.size : end - self.TRAILER.size]).decode('utf-8'))
+                            timings     = json_fields.get('timings')
+
+                            latest_results[page_key] = (timestamp, ProbeRecord(
+                                result           = ProbeResult(result),
+                                http_status      = http_status,
+                                reason           = json_fields.get('reason'),
+                                last_probed_at   = timestamp,
+                                request_duration = request_duration,
+                                scheduler_lag    = json_fields.get('scheduler_lag'),
+                                revalidated      = json_fields.get('revalidated'),
+                                timings          = ProbeTimings._make(timings.get(field) for field in ProbeTimings._fields) if timings != None else None
+                            ))
+
+                    end = start
+
+        return (latest_results, history)
@@ -1,12 +1,42 @@
 """ Definition of SettingsManager class """
 
+import io
+import os
 import logging
 import yaml
 from argparse     import ArgumentParser
 from urllib.parse import urlparse
 
-DEFAULT_PROBE_INTERVAL = 5 * 60
-DEFAULT_PORT           = 80
+from .probe_engines           import ENGINES
+from .settings_snapshot_cache import SettingsSnapshotCache
+
+# The loader implemented in C (libyaml) is several times faster but it's available only if pyyaml has been built with it.
+# Requirement files consist of plain scalars, lists and dicts so the safe variant is sufficient.
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+DEFAULT_PROBE_INTERVAL       = 5 * 60
+DEFAULT_PORT                 = 80
+DEFAULT_WORKERS              = 1
+DEFAULT_PROCESSES            = 1
+DEFAULT_MAX_HOST_CONNECTIONS = 2
+DEFAULT_ENGINE               = 'blocking'
+DEFAULT_MAX_PAGE_SIZE        = 10 * 1024 * 1024
+DEFAULT_CONNECTION_TIMEOUT   = 30
+DEFAULT_HISTORY_MEMORY       = 16 * 1024 * 1024
+DEFAULT_DNS_TTL              = 5 * 60
+DEFAULT_TLS_VERIFY           = 'required'
+TLS_VERIFY_MODES             = ['required', 'none']
+DEFAULT_RESULT_LOG_SIZE      = 256 * 1024 * 1024
+DEFAULT_CONSOLE_LOG_LEVEL    = 'info'
+DEFAULT_FILE_LOG_LEVEL       = 'debug'
+DEFAULT_LOG_FILE_SIZE        = 10 * 1024 * 1024
+DEFAULT_LOG_FILE_COUNT       = 5
+DEFAULT_RELOAD_INTERVAL      = 5
+DEFAULT_CLUSTER_INTERVAL     = 2
+LOG_LEVELS                   = ['debug', 'info', 'warning', 'error']
+
+# Validation finds all the problems with page configs but only this many are listed in the error message
+MAX_REPORTED_ERRORS = 20
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +50,8 @@ class SettingsManager:
     def __init__(self):
         """ Creates a manager with an empty set of settings """
 
-        self._settings = {}
+        self._settings               = {}
+        self._command_line_namespace = None
 
     def get(self, setting_name):
         """ Returns specified setting """
@@ -34,18 +65,32 @@ class SettingsManager:
             set of settings ready to be used.
         """
 
-        command_line_namespace = self._parse_command_line()
+        self._command_line_namespace = self._parse_command_line()
 
-        (self._settings, warnings) = self._read_and_validate(command_line_namespace)
+        (self._settings, warnings) = self._read_and_validate(self._command_line_namespace)
 
         for warning in warnings:
             logger.warning('WARNING: %s', warning)
 
+    def read_page_configs(self):
+        """ Reads the requirement file found by gather() again and returns the validated list of page configs.
+            Other settings are not affected. Raises ConfigurationError if the file is not valid.
+        """
+
+        assert self._command_line_namespace != None
+
+        (requirements, warnings) = self._read_requirements(self._command_line_namespace.requirement_file_path, self._command_line_namespace.config_cache)
+
+        for warning in warnings:
+            logger.warning('WARNING: %s', warning)
+
+        return requirements['pages']
+
     @classmethod
-    def _parse_command_line(cls):
-        """ Parses the values passed by the user on the command line according to a set
-            of internal rules. Returns a namespace object that contains all required and possibly
-            some optional settings.
+    def _parse_command_line(cls, arguments = None):
+        """ Parses the values passed by the user on the command line (or in the arguments list if specified)
+            according to a set of internal rules. Returns a namespace object that contains all required and
+            possibly some optional settings.
         """
 
         parser = ArgumentParser(description = "A tool for monitoring remote documents available over HTTP.")
@@ -55,7 +100,7 @@ class SettingsManager:
             type    = str
         )
         parser.add_argument('--probe-interval',
-            help    = "The time to wait between subsequent probes. Default is {}".format(DEFAULT_PROBE_INTERVAL),
+            help    = "The time between subsequent probes of a page (unless specified for the page in the requirement file). Default is {}".format(DEFAULT_PROBE_INTERVAL),
             dest    = 'probe_interval',
             action  = 'store',
             type    = int
@@ -66,8 +111,137 @@ class SettingsManager:
             action  = 'store',
             type    = int
         )
+        parser.add_argument('--workers',
+            help    = "The number of threads probing pages concurrently. Default is {}".format(DEFAULT_WORKERS),
+            dest    = 'workers',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--processes',
+            help    = "The number of processes probing disjoint parts of the pages, each one with its own workers. Default is {}".format(DEFAULT_PROCESSES),
+            dest    = 'processes',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--max-host-connections',
+            help    = "The maximum number of concurrent requests sent to a single host. Default is {}".format(DEFAULT_MAX_HOST_CONNECTIONS),
+            dest    = 'max_host_connections',
+            action  = 'store',
+            type    = int
+        )
 
-        return parser.parse_args()
+        parser.add_argument('--engine',
+            help    = "The implementation used to fetch pages. Default is {}".format(DEFAULT_ENGINE),
+            dest    = 'engine',
+            action  = 'store',
+            type    = str,
+            choices = ENGINES
+        )
+        parser.add_argument('--max-page-size',
+            help    = "The maximum number of bytes downloaded from a single page. Default is {}".format(DEFAULT_MAX_PAGE_SIZE),
+            dest    = 'max_page_size',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--connection-timeout',
+            help    = "The number of seconds after which a probe that waits for a connection or for data from the server fails. Default is {}".format(DEFAULT_CONNECTION_TIMEOUT),
+            dest    = 'connection_timeout',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--history-memory',
+            help    = "The maximum number of bytes used to store the history of probe results of all pages. Default is {}".format(DEFAULT_HISTORY_MEMORY),
+            dest    = 'history_memory',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--dns-ttl',
+            help    = "The number of seconds for which resolved host names are cached. 0 disables caching. Default is {}".format(DEFAULT_DNS_TTL),
+            dest    = 'dns_ttl',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--ca-file',
+            help    = "A PEM file with the certificates of CAs trusted when probing HTTPS pages. By default the system CA certificates are used",
+            dest    = 'ca_file',
+            action  = 'store'
+        )
+        parser.add_argument('--tls-verify',
+            help    = "Whether the certificates of HTTPS pages are verified. 'none' disables the verification. Default is '{}'".format(DEFAULT_TLS_VERIFY),
+            dest    = 'tls_verify',
+            action  = 'store',
+            choices = TLS_VERIFY_MODES
+        )
+        parser.add_argument('--result-log',
+            help    = "A directory where all probe results are logged. The latest results and their history are restored from it on startup. By default results are not stored on disk",
+            dest    = 'result_log',
+            action  = 'store'
+        )
+        parser.add_argument('--result-log-size',
+            help    = "The maximum number of bytes taken by the result log. The oldest results are deleted when the log exceeds it. Default is {}".format(DEFAULT_RESULT_LOG_SIZE),
+            dest    = 'result_log_size',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--console-log-level',
+            help    = "The least severe messages printed to the console. Default is '{}'".format(DEFAULT_CONSOLE_LOG_LEVEL),
+            dest    = 'console_log_level',
+            action  = 'store',
+            choices = LOG_LEVELS
+        )
+        parser.add_argument('--file-log-level',
+            help    = "The least severe messages written to the log file. Default is '{}'".format(DEFAULT_FILE_LOG_LEVEL),
+            dest    = 'file_log_level',
+            action  = 'store',
+            choices = LOG_LEVELS
+        )
+        parser.add_argument('--log-file-size',
+            help    = "The size in bytes at which the log file is rotated. 0 disables rotation. Default is {}".format(DEFAULT_LOG_FILE_SIZE),
+            dest    = 'log_file_size',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--log-file-count',
+            help    = "The number of rotated log files kept besides the current one. Default is {}".format(DEFAULT_LOG_FILE_COUNT),
+            dest    = 'log_file_count',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--log-transitions-only',
+            help    = "Log the result of a probe only if it differs from the previous result of the same page",
+            dest    = 'log_transitions_only',
+            action  = 'store_const',
+            const   = True
+        )
+        parser.add_argument('--reload-interval',
+            help    = "The number of seconds between checks whether the requirement file has changed. The pages are reloaded when it does. 0 disables the checks. The file is also reloaded on SIGHUP. Default is {}".format(DEFAULT_RELOAD_INTERVAL),
+            dest    = 'reload_interval',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--cluster-node',
+            help    = "The address (host:port) at which the other nodes of a cluster reach the report server of this node. Must be one of the cluster peers",
+            dest    = 'cluster_node',
+            action  = 'store'
+        )
+        parser.add_argument('--cluster-peers',
+            help    = "Comma-separated addresses (host:port) of the report servers of all nodes of the cluster. Enables the cluster mode",
+            dest    = 'cluster_peers',
+            action  = 'store'
+        )
+        parser.add_argument('--cluster-interval',
+            help    = "The number of seconds between requests for new results sent to each cluster peer. Default is {}".format(DEFAULT_CLUSTER_INTERVAL),
+            dest    = 'cluster_interval',
+            action  = 'store',
+            type    = int
+        )
+        parser.add_argument('--config-cache',
+            help    = "A directory where validated contents of requirement files are cached so that an unchanged file loads faster. By default the file is always parsed and validated from scratch",
+            dest    = 'config_cache',
+            action  = 'store'
+        )
+
+        return parser.parse_args(arguments)
 
     @classmethod
     def _get_optional_integer_setting(cls, setting_name, default_value, command_line_namespace, requirements):
@@ -84,6 +258,10 @@ class SettingsManager:
             if command_line_value != None:
                 return int(command_line_value)
             elif setting_name in requirements:
+                # bool is a subclass of int and YAML 'true' would otherwise become 1
+                if isinstance(requirements[setting_name], bool):
+                    raise ValueError("{} is not an integer".format(requirements[setting_name]))
+
                 return int(requirements[setting_name])
             else:
                 return default_value
@@ -91,24 +269,183 @@ class SettingsManager:
             raise ConfigurationError("'{}' must be a an integer".format(setting_name)) from exception
 
     @classmethod
-    def _read_and_validate(cls, command_line_namespace):
-        """ Reads requirements from the file specified on the command line and
-            validates its contents. Returns a dict with processed settings, ready
-            to be used.
+    def _get_optional_string_setting(cls, setting_name, default_value, command_line_namespace, requirements):
+        """ Works like _get_optional_integer_setting() but for settings that can be any string """
+
+        internal_setting_name = setting_name.replace('-', '_')
+
+        command_line_value = getattr(command_line_namespace, internal_setting_name)
+
+        if command_line_value != None:
+            value = command_line_value
+        elif setting_name in requirements:
+            value = requirements[setting_name]
+        else:
+            return default_value
+
+        if not isinstance(value, str):
+            raise ConfigurationError("'{}' must be a string (got {} of type {})".format(setting_name, value, type(value)))
+
+        return value
+
+    @classmethod
+    def _get_optional_list_setting(cls, setting_name, default_value, command_line_namespace, requirements):
+        """ Works like _get_optional_string_setting() but for lists of strings. On the command line the
+            elements are separated with commas. In the requirement file it must be a YAML list.
         """
 
-        with open(command_line_namespace.requirement_file_path) as requirement_file:
-            requirements = yaml.load(requirement_file)
+        internal_setting_name = setting_name.replace('-', '_')
+
+        command_line_value = getattr(command_line_namespace, internal_setting_name)
+
+        if command_line_value != None:
+            return [element.strip() for element in command_line_value.split(',') if element.strip() != '']
+        elif setting_name in requirements:
+            value = requirements[setting_name]
+            if not isinstance(value, list) or not all(isinstance(element, str) for element in value):
+                raise ConfigurationError("'{}' must be a list of strings (got {})".format(setting_name, value))
+
+            return value
+        else:
+            return default_value
+
+    @classmethod
+    def _is_node_address(cls, address):
+        """ Checks whether a string has the form host:port """
+
+        (host, separator, port) = address.rpartition(':')
+        return host != '' and port.isdigit() and 0 < int(port) < 65536
+
+    @classmethod
+    def _get_optional_boolean_setting(cls, setting_name, default_value, command_line_namespace, requirements):
+        """ Works like _get_optional_integer_setting() but for flags. A flag given on the command line
+            is always True. In the requirement file it must be a YAML boolean.
+        """
+
+        internal_setting_name = setting_name.replace('-', '_')
+
+        command_line_value = getattr(command_line_namespace, internal_setting_name)
+
+        if command_line_value != None:
+            return command_line_value
+        elif setting_name in requirements:
+            if not isinstance(requirements[setting_name], bool):
+                raise ConfigurationError("'{}' must be true or false (got {})".format(setting_name, requirements[setting_name]))
+
+            return requirements[setting_name]
+        else:
+            return default_value
+
+    @classmethod
+    def _get_optional_choice_setting(cls, setting_name, default_value, choices, command_line_namespace, requirements):
+        """ Works like _get_optional_integer_setting() but for settings that must be one of a
+            fixed set of strings.
+        """
+
+        internal_setting_name = setting_name.replace('-', '_')
+
+        command_line_value = getattr(command_line_namespace, internal_setting_name)
+
+        if command_line_value != None:
+            value = command_line_value
+        elif setting_name in requirements:
+            value = requirements[setting_name]
+        else:
+            value = default_value
+
+        if not value in choices:
+            raise ConfigurationError("'{}' must be one of: {} (got {})".format(setting_name, ', '.join(choices), value))
+
+        return value
+
+    @classmethod
+    def _load_requirement_file(cls, content, file_name):
+        """ Parses the YAML content (bytes) of a requirement file. file_name is used only in error messages.
+            Returns a (requirements, page_lines) tuple
+            where page_lines contains the line number of each item of the 'pages' collection (or is
+            empty if there is no such collection).
+        """
+
+        # The loaders take the name of the file for their error messages from the stream
+        stream      = io.BytesIO(content)
+        stream.name = file_name
+
+        loader = YamlLoader(stream)
+        try:
+            # The document is composed and constructed in two separate steps to get access to the nodes,
+            # which know where they come from in the file
+            node = loader.get_single_node()
+            requirements = loader.construct_document(node) if node != None else None
+        except yaml.YAMLError as exception:
+            raise ConfigurationError("The requirement file is not a valid YAML file: {}".format(exception)) from exception
+        finally:
+            loader.dispose()
+
+        page_lines = []
+        if isinstance(node, yaml.MappingNode):
+            for (key_node, value_node) in node.value:
+                if key_node.value == 'pages' and isinstance(value_node, yaml.SequenceNode):
+                    page_lines = [item_node.start_mark.line + 1 for item_node in value_node.value]
+
+        return (requirements, page_lines)
+
+    @classmethod
+    def _validate_page_config(cls, page_config):
+        """ Checks a single item of the 'pages' collection. Returns a (errors, warnings) tuple
+            with lists of messages.
+        """
+
+        if not isinstance(page_config, dict):
+            return (["Page config must be a mapping with 'url' and 'patterns' keys (got {} of type {})".format(page_config, type(page_config))], [])
+
+        errors = []
+        for key in ['url', 'patterns']:
+            if not key in page_config:
+                errors.append("Page config is missing '{}' key".format(key))
+
+        if 'url' in page_config:
+            if not isinstance(page_config['url'], str):
+                errors.append("'url' must be a string (got {} of type {})".format(page_config['url'], type(page_config['url'])))
+            else:
+                parsed_url = urlparse(page_config['url'])
+                if not parsed_url.scheme in ['http', 'https']:
+                    errors.append("Unsupported protocol: '{}'".format(parsed_url.scheme))
+
+                if parsed_url.username != None or parsed_url.password != None:
+                    errors.append("URL contains username and/or password. This program does not support HTTP authentication. URL in question: '{}'".format(page_config['url']))
 
-        settings = {}
         warnings = []
+        if 'patterns' in page_config:
+            if not isinstance(page_config['patterns'], (list, tuple)):
+                errors.append("'patterns' must be a collection (got {} of type {})".format(page_config['patterns'], type(page_config['patterns'])))
+            else:
+                for pattern in page_config['patterns']:
+                    if not isinstance(pattern, str):
+                        errors.append("'patterns' must be a string (got {} of type {})".format(pattern, type(pattern)))
+
+                if len(page_config['patterns']) == 0:
+                    warnings.append("No patterns specified for url {}.".format(page_config.get('url')))
+
+        if 'interval' in page_config:
+            if not isinstance(page_config['interval'], int) or isinstance(page_config['interval'], bool) or page_config['interval'] < 0:
+                errors.append("'interval' must be a non-negative integer (got {} for url {})".format(page_config['interval'], page_config.get('url')))
+
+        return (errors, warnings)
+
+    @classmethod
+    def _validate_requirements(cls, requirements, page_lines):
+        """ Validates the requirements read from the file in a single pass over the page configs.
+            All problems found are reported together in one ConfigurationError, each one preceded
+            by the number of the line where the offending page config starts. Returns a list of warnings.
+        """
+
+        if not isinstance(requirements, dict):
+            raise ConfigurationError("The requirement file must contain a mapping with 'pages' key")
 
         if not 'pages' in requirements:
             raise ConfigurationError("'pages' key missing from requirement file")
 
-        settings['pages'] = requirements['pages']
-
-        if not isinstance(settings['pages'], (list, tuple)):
+        if not isinstance(requirements['pages'], (list, tuple)):
             # The intention here is to check whether 'pages' was a YAML collection. If it was, it
             # should get converted to list (added also tuple just in case it changes in the future).
             # A more comprehensive check that includes list/tuple-like objects not necessarily inheriting from
@@ -117,35 +454,86 @@ class SettingsManager:
             # we'll notice it anyway because the program will stop working with existing requirement files.
             # And no, trying to use the object and checking for TypeError is not an acceptable solution because there
             # are too many other things that can cause TypeError that we wouldn't like silently ignored.
-            raise ConfigurationError("'pages' must be a collection (got {} of type {})".format(settings['pages'], type(settings['pages'])))
+            raise ConfigurationError("'pages' must be a collection (got {} of type {})".format(requirements['pages'], type(requirements['pages'])))
 
-        if len(settings['pages']) == 0:
+        if len(requirements['pages']) == 0:
             raise ConfigurationError("No page configurations specified.")
 
-        for page_config in settings['pages']:
-            for key in ['url', 'patterns']:
-                if not key in page_config:
-                    raise ConfigurationError("At least one of the page configs is missing '{}' key".format(key))
+        errors   = []
+        warnings = []
+        for (i, page_config) in enumerate(requirements['pages']):
+            (page_errors, page_warnings) = cls._validate_page_config(page_config)
 
-            if not isinstance(page_config['url'], str):
-                raise configurationerror("'url' must be a string (got {} of type {})".format(page_config['url'], type(page_config['url'])))
+            location  = "line {}: ".format(page_lines[i]) if i < len(page_lines) else "page {}: ".format(i + 1)
+            errors   += [location + error for error in page_errors]
+            warnings += [location + warning for warning in page_warnings]
 
-            parsed_url = urlparse(page_config['url'])
-            if not parsed_url.scheme in ['http', 'https']:
-                raise ConfigurationError("Unsupported protocol: '{}'".format(parsed_url.scheme))
+        if len(errors) > 0:
+            message = '\n'.join(errors[:MAX_REPORTED_ERRORS])
+            if len(errors) > MAX_REPORTED_ERRORS:
+                message += "\n... and {} more".format(len(errors) - MAX_REPORTED_ERRORS)
 
-            if parsed_url.username != None or parsed_url.password != None:
-                raise ConfigurationError("URL contains username and/or password. This program does not support HTTP authentication. URL in question: '{}'".format(page_config['url']))
+            raise ConfigurationError(message)
 
-            if not isinstance(page_config['patterns'], (list, tuple)):
-                raise ConfigurationError("'patterns' must be a collection (got {} of type {})".format(page_config['patterns'], type(page_config['patterns'])))
+        return warnings
+
+    @classmethod
+    def _is_valid_snapshot(cls, snapshot):
+        """ Checks whether a snapshot loaded from the cache has the structure stored by _read_requirements().
+            The contents of the cache directory are not trusted any more than the requirement file itself.
+        """
+
+        return (
+            isinstance(snapshot, dict) and
+            isinstance(snapshot.get('requirements'), dict) and
+            isinstance(snapshot['requirements'].get('pages'), list) and
+            all(isinstance(page_config, dict) for page_config in snapshot['requirements']['pages']) and
+            isinstance(snapshot.get('warnings'), list) and
+            all(isinstance(warning, str) for warning in snapshot['warnings'])
+        )
+
+    @classmethod
+    def _read_requirements(cls, requirement_file_path, config_cache):
+        """ Reads and validates the requirement file. If config_cache is not None, it's a directory
+            with a SettingsSnapshotCache that is checked first and updated after a successful validation.
+            Returns a (requirements, warnings) tuple.
+        """
+
+        with open(requirement_file_path, 'rb') as requirement_file:
+            content = requirement_file.read()
+
+        if config_cache != None:
+            snapshot_cache = SettingsSnapshotCache(config_cache)
+            snapshot_key   = SettingsSnapshotCache.key(content)
+
+            snapshot = snapshot_cache.load(snapshot_key)
+            if cls._is_valid_snapshot(snapshot):
+                logger.debug("Loaded validated requirements from %s", config_cache)
+                return (snapshot['requirements'], snapshot['warnings'])
+
+        (requirements, page_lines) = cls._load_requirement_file(content, requirement_file_path)
+        warnings = cls._validate_requirements(requirements, page_lines)
+
+        if config_cache != None:
+            snapshot_cache.store(snapshot_key, {'requirements': requirements, 'warnings': warnings})
+
+        return (requirements, warnings)
+
+    @classmethod
+    def _read_and_validate(cls, command_line_namespace):
+        """ Reads requirements from the file specified on the command line and
+            validates its contents. Returns a dict with processed settings, ready
+            to be used.
+        """
 
-            for pattern in page_config['patterns']:
-                if not isinstance(pattern, str):
-                    raise ConfigurationError("'patterns' must be a string (got {} of type {})".format(pattern, type(pattern)))
+        (requirements, warnings) = cls._read_requirements(command_line_namespace.requirement_file_path, command_line_namespace.config_cache)
 
-            if len(page_config['patterns']) == 0:
-                warnings.append("No patterns specified for url {}.".format(page_config['url']))
+        # The list of warnings may come from the cache and must not be modified
+        warnings = list(warnings)
+        settings = {
+            'requirement_file_path': command_line_namespace.requirement_file_path,
+            'pages':                 requirements['pages'],
+        }
 
         settings['probe_interval'] = cls._get_optional_integer_setting('probe-interval', DEFAULT_PROBE_INTERVAL, command_line_namespace, requirements)
         if settings['probe_interval'] < 0:
@@ -155,4 +543,83 @@ class SettingsManager:
         if not (0 < settings['port'] < 65535):
             raise ConfigurationError("'port' must be in range 0..65535")
 
+        settings['workers'] = cls._get_optional_integer_setting('workers', DEFAULT_WORKERS, command_line_namespace, requirements)
+        if settings['workers'] < 1:
+            raise ConfigurationError("'workers' must be a positive integer")
+
+        settings['processes'] = cls._get_optional_integer_setting('processes', DEFAULT_PROCESSES, command_line_namespace, requirements)
+        if settings['processes'] < 1:
+            raise ConfigurationError("'processes' must be a positive integer")
+
+        settings['max_host_connections'] = cls._get_optional_integer_setting('max-host-connections', DEFAULT_MAX_HOST_CONNECTIONS, command_line_namespace, requirements)
+        if settings['max_host_connections'] < 1:
+            raise ConfigurationError("'max-host-connections' must be a positive integer")
+
+        settings['engine'] = cls._get_optional_choice_setting('engine', DEFAULT_ENGINE, ENGINES, command_line_namespace, requirements)
+
+        settings['max_page_size'] = cls._get_optional_integer_setting('max-page-size', DEFAULT_MAX_PAGE_SIZE, command_line_namespace, requirements)
+        if settings['max_page_size'] < 1:
+            raise ConfigurationError("'max-page-size' must be a positive integer")
+
+        settings['connection_timeout'] = cls._get_optional_integer_setting('connection-timeout', DEFAULT_CONNECTION_TIMEOUT, command_line_namespace, requirements)
+        if settings['connection_timeout'] < 1:
+            raise ConfigurationError("'connection-timeout' must be a positive integer")
+
+        settings['history_memory'] = cls._get_optional_integer_setting('history-memory', DEFAULT_HISTORY_MEMORY, command_line_namespace, requirements)
+        if settings['history_memory'] < 1:
+            raise ConfigurationError("'history-memory' must be a positive integer")
+
+        settings['dns_ttl'] = cls._get_optional_integer_setting('dns-ttl', DEFAULT_DNS_TTL, command_line_namespace, requirements)
+        if settings['dns_ttl'] < 0:
+            raise ConfigurationError("'dns-ttl' must be a non-negative integer")
+
+        settings['ca_file'] = cls._get_optional_string_setting('ca-file', None, command_line_namespace, requirements)
+        if settings['ca_file'] != None and not os.path.isfile(settings['ca_file']):
+            raise ConfigurationError("'ca-file' must be a path to an existing file (got {})".format(settings['ca_file']))
+
+        settings['tls_verify'] = cls._get_optional_choice_setting('tls-verify', DEFAULT_TLS_VERIFY, TLS_VERIFY_MODES, command_line_namespace, requirements)
+        if settings['tls_verify'] == 'none':
+            warnings.append("TLS certificate verification is disabled. HTTPS pages will be trusted regardless of their certificates.")
+
+        settings['result_log'] = cls._get_optional_string_setting('result-log', None, command_line_namespace, requirements)
+        if settings['result_log'] != None and os.path.exists(settings['result_log']) and not os.path.isdir(settings['result_log']):
+            raise ConfigurationError("'result-log' must be a directory (got {})".format(settings['result_log']))
+
+        settings['result_log_size'] = cls._get_optional_integer_setting('result-log-size', DEFAULT_RESULT_LOG_SIZE, command_line_namespace, requirements)
+        if settings['result_log_size'] < 1:
+            raise ConfigurationError("'result-log-size' must be a positive integer")
+
+        # The logging module expects level names in upper case
+        settings['console_log_level'] = cls._get_optional_choice_setting('console-log-level', DEFAULT_CONSOLE_LOG_LEVEL, LOG_LEVELS, command_line_namespace, requirements).upper()
+        settings['file_log_level']    = cls._get_optional_choice_setting('file-log-level', DEFAULT_FILE_LOG_LEVEL, LOG_LEVELS, command_line_namespace, requirements).upper()
+
+        settings['log_file_size'] = cls._get_optional_integer_setting('log-file-size', DEFAULT_LOG_FILE_SIZE, command_line_namespace, requirements)
+        if settings['log_file_size'] < 0:
+            raise ConfigurationError("'log-file-size' must be a non-negative integer")
+
+        settings['log_file_count'] = cls._get_optional_integer_setting('log-file-count', DEFAULT_LOG_FILE_COUNT, command_line_namespace, requirements)
+        if settings['log_file_count'] < 0:
+            raise ConfigurationError("'log-file-count' must be a non-negative integer")
+
+        settings['log_transitions_only'] = cls._get_optional_boolean_setting('log-transitions-only', False, command_line_namespace, requirements)
+
+        settings['reload_interval'] = cls._get_optional_integer_setting('reload-interval', DEFAULT_RELOAD_INTERVAL, command_line_namespace, requirements)
+        if settings['reload_interval'] < 0:
+            raise ConfigurationError("'reload-interval' must be a non-negative integer")
+
+        settings['cluster_peers'] = cls._get_optional_list_setting('cluster-peers', [], command_line_namespace, requirements)
+        for address in settings['cluster_peers']:
+            if not cls._is_node_address(address):
+                raise ConfigurationError("'cluster-peers' must consist of addresses in the form host:port (got {})".format(address))
+
+        settings['cluster_node'] = cls._get_optional_string_setting('cluster-node', None, command_line_namespace, requirements)
+        if len(settings['cluster_peers']) > 0 and settings['cluster_node'] not in settings['cluster_peers']:
+            raise ConfigurationError("'cluster-node' must be one of 'cluster-peers' (got {})".format(settings['cluster_node']))
+        if len(settings['cluster_peers']) == 0 and settings['cluster_node'] != None:
+            raise ConfigurationError("'cluster-node' requires 'cluster-peers'")
+
+        settings['cluster_interval'] = cls._get_optional_integer_setting('cluster-interval', DEFAULT_CLUSTER_INTERVAL, command_line_namespace, requirements)
+        if settings['cluster_interval'] < 1:
+            raise ConfigurationError("'cluster-interval' must be a positive integer")
+
         return (settings, warnings)
@@ -0,0 +1,96 @@
+""" Definition of SettingsSnapshotCache class that stores validated contents of requirement files
+    so that an unchanged file does not have to be parsed and validated again.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+class SettingsSnapshotCache:
+    """ Stores snapshots (in practice the requirements read from a file and the warnings produced by
+        their validation) in a directory, one file per snapshot. A snapshot is identified by the hash of
+        the contents of the requirement file (see key()) so a modified file never gets a stale snapshot
+        and there's no need to look at modification times.
+
+        Snapshots are stored as JSON, so reading one can never run code, even if someone else can write to
+        the directory. Only snapshots made of dicts with string keys, lists, strings, numbers, booleans and
+        None can be stored. JSON would silently change anything else (e.g. tuples or dates from YAML),
+        so store() refuses snapshots that do not come back from JSON unchanged.
+
+        The cache is only an optimization. Failure to read or write a snapshot is logged and otherwise
+        ignored. Only MAX_SNAPSHOTS most recently stored snapshots are kept.
+    """
+
+    # Must be changed whenever the structure of the snapshots or the rules of validation change.
+    # Snapshots made by a different version are ignored.
+    FORMAT_VERSION = 2
+
+    MAX_SNAPSHOTS = 8
+
+    SNAPSHOT_SUFFIX = '.json'
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    @classmethod
+    def key(cls, content):
+        """ Returns the key of the snapshot of a requirement file with specified content (bytes) """
+
+        return hashlib.blake2b(content, digest_size = 16, person = 'v{}'.format(cls.FORMAT_VERSION).encode('ascii')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._directory, key + self.SNAPSHOT_SUFFIX)
+
+    def load(self, key):
+        """ Returns the snapshot stored under specified key or None if there isn't one """
+
+        try:
+            with open(self._path(key), 'r', encoding = 'utf-8') as snapshot_file:
+                return json.load(snapshot_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exception:
+            logger.debug("Ignoring unreadable settings snapshot %s: %s", self._path(key), exception)
+            return None
+
+    def store(self, key, snapshot):
+        """ Stores the snapshot under specified key and removes the oldest snapshots if there are too many """
+
+        try:
+            content = json.dumps(snapshot, allow_nan = False)
+            if json.loads(content) != snapshot:
+                raise ValueError("the snapshot is changed by conversion to JSON")
+        except (TypeError, ValueError) as exception:
+            logger.debug("Not storing settings snapshot that cannot be represented in JSON: %s", exception)
+            return
+
+        try:
+            os.makedirs(self._directory, exist_ok = True)
+
+            # Written to a temporary file first so that a concurrently starting watchdog never sees a partial snapshot
+            (descriptor, temporary_path) = tempfile.mkstemp(dir = self._directory)
+            try:
+                with os.fdopen(descriptor, 'w', encoding = 'utf-8') as snapshot_file:
+                    snapshot_file.write(content)
+                os.replace(temporary_path, self._path(key))
+            except:
+                os.unlink(temporary_path)
+                raise
+
+            self._remove_old_snapshots()
+        except OSError as exception:
+            logger.debug("Failed to store settings snapshot in %s: %s", self._directory, exception)
+
+    def _remove_old_snapshots(self):
+        paths = [
+            os.path.join(self._directory, file_name)
+            for file_name in os.listdir(self._directory)
+            if file_name.endswith(self.SNAPSHOT_SUFFIX)
+        ]
+
+        for path in sorted(paths, key = os.path.getmtime)[:-self.MAX_SNAPSHOTS]:
+            os.unlink(path)
@@ -0,0 +1,211 @@
+""" Definition of ShardSupervisor class that runs the probing processes used by HttpWatchdog.run_sharded() """
+
+import time
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.connection
+
+from .shard_worker import run_shard
+
+logger = logging.getLogger(__name__)
+
+class ShardSupervisor:
+    """ Starts a process for every shard of the pages, passes on the messages they send after every batch and
+        restarts the ones that exit.
+
+        A process that dies is restarted after a delay that starts at MIN_RESTART_DELAY and doubles with every
+        crash, up to MAX_RESTART_DELAY. It goes back to the minimum once the process manages to run for at
+        least MAX_RESTART_DELAY seconds. The other processes are not affected. The results the process stored
+        before dying stay in the table, except for a write interrupted by the crash (see SharedResultTable.repair()).
+
+        Processes are created with the 'spawn' start method so that they don't inherit the threads, sockets and
+        locks of the main process. Their log records are passed to the handlers of the root logger of the main process.
+    """
+
+    MIN_RESTART_DELAY = 1
+    MAX_RESTART_DELAY = 60
+
+    # How long stop() waits for a process to exit after terminating it before killing it
+    STOP_TIMEOUT = 5
+
+    def __init__(self, process_count, target = run_shard):
+        """ target is the function run by the processes. It gets the same arguments as run_shard(). """
+
+        assert process_count >= 1
+
+        self.process_count = process_count
+
+        self._target       = target
+        self._context      = multiprocessing.get_context('spawn')
+        self._table        = None
+        self._settings     = None
+        self._workers      = []
+        self._log_queue    = None
+        self._log_listener = None
+
+    def start(self, table, shards, settings):
+        """ Starts a process for each of the shards, which are (page indices, page configs) tuples. The processes store
+            their results in table, a SharedResultTable. settings are the keyword arguments for their watchdogs.
+        """
+
+        assert len(self._workers) == 0
+        assert len(shards) <= self.process_count
+
+        root_logger = logging.getLogger()
+
+        self._table        = table
+        self._settings     = settings
+        self._log_queue    = self._context.Queue()
+        self._log_listener = logging.handlers.QueueListener(self._log_queue, *root_logger.handlers, respect_handler_level = True)
+        self._log_listener.start()
+
+        now = time.time()
+        for (shard_index, (page_indices, page_configs)) in enumerate(shards):
+            worker = {
+                'shard_index':   shard_index,
+                'page_indices':  page_indices,
+                'page_configs':  page_configs,
+                'process':       None,
+                'connection':    None,
+                'started_at':    None,
+                'restart_at':    now,
+                'restart_delay': self.MIN_RESTART_DELAY,
+            }
+            self._workers.append(worker)
+            self._start_worker(worker)
+
+    def _start_worker(self, worker):
+        (receiving_connection, sending_connection) = self._context.Pipe(duplex = False)
+
+        worker['process'] = self._context.Process(
+            target = self._target,
+            name   = 'ProbingProcess-{}'.format(worker['shard_index']),
+            daemon = True,
+            args   = (
+                worker['shard_index'],
+                self._table.name,
+                len(self._table),
+                worker['page_indices'],
+                worker['page_configs'],
+                self._settings,
+                sending_connection,
+                self._log_queue,
+                logging.getLogger().getEffectiveLevel(),
+            )
+        )
+        worker['process'].start()
+
+        # The process has its own copy now. Closing ours lets recv() fail with EOFError when the process dies.
+        sending_connection.close()
+
+        worker['connection'] = receiving_connection
+        worker['started_at'] = time.time()
+        worker['restart_at'] = None
+
+    def _receive_all(self, worker):
+        """ Returns all the messages waiting in the connection of a worker. Closes the connection if the process is gone. """
+
+        messages = []
+        try:
+            while worker['connection'].poll():
+                messages.append(worker['connection'].recv())
+        except EOFError:
+            worker['connection'].close()
+            worker['connection'] = None
+
+        return messages
+
+    def _handle_exit(self, worker):
+        """ Cleans up after a process that has exited and schedules its restart """
+
+        now = time.time()
+
+        worker['process'].join()
+        logger.error("ERROR: Probing process %d exited with code %s. Restarting it in %d seconds.", worker['shard_index'], worker['process'].exitcode, worker['restart_delay'])
+
+        cleared_count = self._table.repair(worker['page_indices'])
+        if cleared_count > 0:
+            logger.warning("WARNING: Lost the results of %d pages that were being stored when probing process %d exited", cleared_count, worker['shard_index'])
+
+        if worker['connection'] != None:
+            worker['connection'].close()
+            worker['connection'] = None
+
+        if now - worker['started_at'] >= self.MAX_RESTART_DELAY:
+            worker['restart_delay'] = self.MIN_RESTART_DELAY
+
+        worker['process']       = None
+        worker['restart_at']    = now + worker['restart_delay']
+        worker['restart_delay'] = min(worker['restart_delay'] * 2, self.MAX_RESTART_DELAY)
+
+    def poll(self, timeout):
+        """ Waits at most timeout seconds for messages from the processes and returns all that have arrived.
+            Restarts the processes that have exited.
+        """
+
+        now = time.time()
+        for worker in self._workers:
+            if worker['restart_at'] != None and worker['restart_at'] <= now:
+                self._start_worker(worker)
+
+        running_workers  = [worker for worker in self._workers if worker['process'] != None]
+        pending_restarts = [worker['restart_at'] - now for worker in self._workers if worker['restart_at'] != None]
+        if len(pending_restarts) > 0:
+            timeout = max(0, min([timeout] + pending_restarts))
+
+        # A process that died may still have messages in its pipe, so the connection is read before the sentinel is checked
+        ready = multiprocessing.connection.wait(
+            [worker['connection'] for worker in running_workers if worker['connection'] != None] +
+            [worker['process'].sentinel for worker in running_workers],
+            timeout
+        )
+
+        messages = []
+        for worker in running_workers:
+            if worker['connection'] in ready:
+                messages.extend(self._receive_all(worker))
+
+            if worker['process'].sentinel in ready:
+                if worker['connection'] != None:
+                    messages.extend(self._receive_all(worker))
+
+                self._handle_exit(worker)
+
+        return messages
+
+    def stop(self):
+        """ Stops all the processes and returns the messages they sent before stopping that have not been returned
+            by poll() yet. Does nothing if the processes are not running.
+        """
+
+        messages = []
+        for worker in self._workers:
+            if worker['process'] != None:
+                worker['process'].terminate()
+
+        for worker in self._workers:
+            if worker['process'] != None:
+                worker['process'].join(self.STOP_TIMEOUT)
+                if worker['process'].exitcode == None:
+                    worker['process'].kill()
+                    worker['process'].join()
+
+            if worker['connection'] != None:
+                messages.extend(self._receive_all(worker))
+                if worker['connection'] != None:
+                    worker['connection'].close()
+
+            # A process may have been terminated in the middle of a write
+            self._table.repair(worker['page_indices'])
+
+        if self._log_listener != None:
+            self._log_listener.stop()
+            self._log_queue.close()
+            self._log_queue.join_thread()
+
+        self._workers      = []
+        self._log_queue    = None
+        self._log_listener = None
+
+        return messages
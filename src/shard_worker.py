@@ -0,0 +1,73 @@
+""" Definition of ShardWatchdog class and run_shard() function that probe a part of the pages in a separate process
+    started by ShardSupervisor.
+"""
+
+import signal
+import logging
+import logging.handlers
+from array import array
+from queue import Queue
+
+from .http_watchdog       import HttpWatchdog
+from .shared_result_table import SharedResultTable
+
+logger = logging.getLogger(__name__)
+
+class ShardWatchdog(HttpWatchdog):
+    """ A watchdog that probes a shard of the pages of the main one and stores the results in its SharedResultTable.
+
+        Page indices used internally refer to the pages in the shard. After every batch the watchdog sends a
+        (page indices, duration, maximum scheduler lag, number of skipped deadlines) tuple to the main process
+        through connection, with the indices of the probed pages in the whole table. The main process keeps the
+        history, metrics and the result log of all pages, so the shard does not update its own.
+    """
+
+    def __init__(self, connection, result_table_shard, probe_interval, page_configs, **settings):
+        self._connection         = connection
+        self._result_table_shard = result_table_shard
+        self._probed_pages       = array('I')
+
+        # The history is never used but can't be empty
+        super().__init__(probe_interval, page_configs, history_memory = 1, **settings)
+
+    def _create_result_storage(self, page_count):
+        assert page_count == len(self._result_table_shard)
+
+        return self._result_table_shard
+
+    def _observe_result(self, page_index, timestamp, result):
+        self._probed_pages.append(self._result_table_shard.page_indices[page_index])
+
+    def _finish_batch(self, duration, max_lag, skipped_deadlines):
+        self._scheduler_lag = max_lag
+
+        self._connection.send((self._probed_pages, duration, max_lag, skipped_deadlines))
+        self._probed_pages = array('I')
+
+def run_shard(shard_index, table_name, page_count, page_indices, page_configs, settings, connection, log_queue, log_level):
+    """ The entry point of a probing process. Attaches to the SharedResultTable called table_name and probes the
+        pages with specified indices forever. The process sends its log records to the main one through log_queue.
+    """
+
+    # Ctrl+C in the terminal reaches the whole process group. The main process decides when to stop the shards.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    table = SharedResultTable(page_count, table_name)
+    try:
+        logger.debug("Probing process %d started with %d pages", shard_index, len(page_indices))
+
+        watchdog = ShardWatchdog(connection, table.shard(page_indices), settings['probe_interval'], page_configs, **{
+            name: value
+            for (name, value) in settings.items()
+            if name != 'probe_interval'
+        })
+        watchdog.run_forever(Queue())
+    except (BrokenPipeError, EOFError):
+        # The main process is gone
+        pass
+    finally:
+        table.close()
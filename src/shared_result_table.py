@@ -0,0 +1,252 @@
+""" Definition of SharedResultTable class that keeps the latest probe results in shared memory
+    so that they can be written by one process and read by another without passing them around.
+"""
+
+import math
+import time
+import zlib
+import struct
+from multiprocessing import shared_memory
+
+from .probe_result import ProbeResult, ProbeRecord, ProbeTimings
+from .dns_cache    import DnsCache
+
+class SharedResultTable:
+    """ A table of ProbeRecords stored in a block of shared memory, one fixed-size slot per page. It behaves
+        like a list of results (None for pages that have none): it supports len(), indexing and assignment.
+        Records are encoded on assignment and decoded on every access, so there's no copy of the results
+        in any of the processes that use the table.
+
+        Each slot has the following layout (little-endian):
+
+            - sequence number (uint64): incremented before and after every write, so it's odd while
+              a write is in progress and 0 if the slot has never been written
+            - CRC-32 of the rest of the slot (uint32)
+            - ProbeResult value, -1 if there is no result (signed char)
+            - flags: REVALIDATED, HAS_TIMINGS (unsigned char)
+            - HTTP status, -1 if there was no response (signed short)
+            - last_probed_at, request_duration and scheduler_lag (doubles, NaN for None)
+            - durations of TIMING_PHASES (doubles, NaN for phases that did not occur)
+            - source of the DNS lookup: index in DNS_SOURCES, -1 for None (signed char)
+            - length of the reason, NO_REASON for None (unsigned char)
+            - reason encoded as UTF-8 and truncated to MAX_REASON_SIZE bytes
+
+        Each slot must have a single writer at a time. Readers take no locks. A reader copies the slot and
+        tries again if the sequence number changed in the meantime or the checksum does not match, i.e. if
+        it caught a write in progress. The checksum also detects slots left half-written by a process that
+        crashed (see repair()).
+
+        The table is created by one process and attached to by name (see name) in the others. The block of
+        memory exists until unlink() is called and all processes close it (or exit).
+    """
+
+    SLOT_SIZE       = 192
+    HEADER          = struct.Struct('<QI')
+    SEQUENCE_NUMBER = struct.Struct('<Q')
+    MAX_REASON_SIZE = SLOT_SIZE - HEADER.size - struct.calcsize('<bBh8dbB')
+    BODY            = struct.Struct('<bBh8dbB{}s'.format(MAX_REASON_SIZE))
+
+    REVALIDATED = 1
+    HAS_TIMINGS = 2
+    NO_RESULT   = -1
+    NO_REASON   = 255
+
+    # SYNC: Keep in sync with HttpWatchdog.TIMING_PHASES
+    TIMING_PHASES = ['dns', 'connect', 'tls', 'ttfb', 'download']
+    DNS_SOURCES   = [DnsCache.SOURCE_CACHE, DnsCache.SOURCE_RESOLVER, DnsCache.SOURCE_STALE]
+
+    # A reader that keeps catching writes in progress gives up after this many attempts and returns None
+    MAX_READ_ATTEMPTS = 1000
+
+    def __init__(self, page_count, name = None):
+        """ Creates a new table for page_count pages or, if name is specified, attaches to an existing
+            one created by another process.
+        """
+
+        assert self.HEADER.size + self.BODY.size == self.SLOT_SIZE
+
+        # A block of memory can't be empty
+        size = max(1, page_count * self.SLOT_SIZE)
+
+        if name == None:
+            self._memory = shared_memory.SharedMemory(create = True, size = size)
+        else:
+            self._memory = shared_memory.SharedMemory(name = name)
+            assert self._memory.size >= size
+
+        self._page_count = page_count
+        self._buffer     = self._memory.buf
+
+    @property
+    def name(self):
+        """ The name under which other processes can find the table """
+
+        return self._memory.name
+
+    def close(self):
+        """ Unmaps the table in this process. The table must not be used afterwards. """
+
+        self._buffer = None
+        self._memory.close()
+
+    def unlink(self):
+        """ Frees the block of memory as soon as all processes close it. Other processes can no longer attach to it. """
+
+        self._memory.unlink()
+
+    def __len__(self):
+        return self._page_count
+
+    def __getitem__(self, page_index):
+        return self.read(page_index)[1]
+
+    def __setitem__(self, page_index, result):
+        if not 0 <= page_index < self._page_count:
+            raise IndexError("Page index out of range")
+
+        offset = page_index * self.SLOT_SIZE
+        body   = self._encode(result)
+
+        (sequence_number,) = self.SEQUENCE_NUMBER.unpack_from(self._buffer, offset)
+        if sequence_number % 2 == 1:
+            # Left by a writer that crashed
+            sequence_number += 1
+
+        self.SEQUENCE_NUMBER.pack_into(self._buffer, offset, sequence_number + 1)
+        self._buffer[offset + self.HEADER.size : offset + self.SLOT_SIZE] = body
+        self.HEADER.pack_into(self._buffer, offset, sequence_number + 2, zlib.crc32(body))
+
+    def read(self, page_index):
+        """ Returns a (sequence number, result) tuple describing specified page. The sequence number changes
+            whenever the result is replaced (even with an identical one).
+        """
+
+        if not 0 <= page_index < self._page_count:
+            raise IndexError("Page index out of range")
+
+        offset = page_index * self.SLOT_SIZE
+        for attempt in range(self.MAX_READ_ATTEMPTS):
+            (sequence_number,) = self.SEQUENCE_NUMBER.unpack_from(self._buffer, offset)
+            if sequence_number == 0:
+                return (0, None)
+
+            if sequence_number % 2 == 0:
+                slot = bytes(self._buffer[offset : offset + self.SLOT_SIZE])
+                (slot_sequence_number, checksum) = self.HEADER.unpack_from(slot)
+
+                if slot_sequence_number == sequence_number and zlib.crc32(slot[self.HEADER.size:]) == checksum:
+                    return (sequence_number, self._decode(slot))
+
+            # Let the writer finish
+            time.sleep(0)
+
+        return (sequence_number, None)
+
+    def sequence_number(self, page_index):
+        return self.SEQUENCE_NUMBER.unpack_from(self._buffer, page_index * self.SLOT_SIZE)[0]
+
+    def repair(self, page_indices):
+        """ Finishes writes to specified pages interrupted by a crash of the writer. Slots whose content is
+            complete become readable again and the others are cleared. Must not be called while the pages
+            have a writer. Returns the number of slots that had to be cleared.
+        """
+
+        cleared_count = 0
+        for page_index in page_indices:
+            offset = page_index * self.SLOT_SIZE
+
+            (sequence_number, checksum) = self.HEADER.unpack_from(self._buffer, offset)
+            if sequence_number % 2 == 1:
+                body = bytes(self._buffer[offset + self.HEADER.size : offset + self.SLOT_SIZE])
+                if zlib.crc32(body) == checksum:
+                    self.SEQUENCE_NUMBER.pack_into(self._buffer, offset, sequence_number + 1)
+                else:
+                    self[page_index] = None
+                    cleared_count   += 1
+
+        return cleared_count
+
+    def shard(self, page_indices):
+        """ Returns a SharedResultTableShard that contains specified pages """
+
+        return SharedResultTableShard(self, page_indices)
+
+    @classmethod
+    def _optional_float(cls, value):
+        return value if value == value else None
+
+    def _encode(self, result):
+        if result == None:
+            return self.BODY.pack(self.NO_RESULT, 0, -1, *([math.nan] * 8), -1, self.NO_REASON, b'')
+
+        timings = result.timings
+        flags   = (self.REVALIDATED if result.revalidated else 0) | (self.HAS_TIMINGS if timings != None else 0)
+        if timings != None:
+            durations  = [getattr(timings, phase) for phase in self.TIMING_PHASES]
+            dns_source = self.DNS_SOURCES.index(timings.dns_source) if timings.dns_source != None else -1
+        else:
+            durations  = [None] * len(self.TIMING_PHASES)
+            dns_source = -1
+
+        # Truncation may cut a character in half. The decoder drops what's left of it.
+        reason = result.reason.encode('utf-8')[:self.MAX_REASON_SIZE] if result.reason != None else b''
+
+        return self.BODY.pack(
+            result.result,
+            flags,
+            result.http_status if result.http_status != None else -1,
+            result.last_probed_at if result.last_probed_at != None else math.nan,
+            result.request_duration if result.request_duration != None else math.nan,
+            result.scheduler_lag if result.scheduler_lag != None else math.nan,
+            *[duration if duration != None else math.nan for duration in durations],
+            dns_source,
+            len(reason) if result.reason != None else self.NO_REASON,
+            reason
+        )
+
+    def _decode(self, slot):
+        fields = self.BODY.unpack_from(slot, self.HEADER.size)
+
+        (result, flags, http_status, last_probed_at, request_duration, scheduler_lag) = fields[:6]
+        (dns_source, reason_length, reason) = fields[-3:]
+        durations = fields[6:-3]
+
+        if result == self.NO_RESULT:
+            return None
+
+        if flags & self.HAS_TIMINGS:
+            timings = ProbeTimings(
+                dns_source = self.DNS_SOURCES[dns_source] if dns_source != -1 else None,
+                **{phase: self._optional_float(duration) for (phase, duration) in zip(self.TIMING_PHASES, durations)}
+            )
+        else:
+            timings = None
+
+        return ProbeRecord(
+            result           = ProbeResult(result),
+            http_status      = http_status if http_status != -1 else None,
+            reason           = reason[:reason_length].decode('utf-8', 'ignore') if reason_length != self.NO_REASON else None,
+            last_probed_at   = self._optional_float(last_probed_at),
+            request_duration = self._optional_float(request_duration),
+            scheduler_lag    = self._optional_float(scheduler_lag),
+            revalidated      = bool(flags & self.REVALIDATED),
+            timings          = timings
+        )
+
+class SharedResultTableShard:
+    """ A part of a SharedResultTable that consists of specified pages: i-th element of the shard is
+        page_indices[i]-th element of the table. Behaves like a list of results, like the table.
+    """
+
+    def __init__(self, table, page_indices):
+        self._table       = table
+        self.page_indices = page_indices
+
+    def __len__(self):
+        return len(self.page_indices)
+
+    def __getitem__(self, index):
+        return self._table[self.page_indices[index]]
+
+    def __setitem__(self, index, result):
+        self._table[self.page_indices[index]] = result
@@ -0,0 +1,105 @@
+""" Definition of StatusApi class that describes the watchdog status as JSON documents """
+
+import json
+import uuid
+import hashlib
+from datetime  import datetime, timezone
+from threading import Lock
+
+from .probe_result import ProbeResult
+
+class StatusApi:
+    """ Generates JSON documents with the results of the watchdog probes for use by other programs.
+
+        A document describes either all pages or only those whose results have been replaced after
+        a specific version (see HttpWatchdog.probe_results_version). A client can pass the version
+        from the last document it received to get only the changes. Each document comes with a strong
+        ETag computed from its content.
+    """
+
+    # Versions start from zero every time the program starts. The identifier makes sure that an ETag
+    # from a previous run never matches a document generated by the current one.
+    INSTANCE_ID = uuid.uuid4().hex[:8]
+
+    # (version, (content, etag)) tuple describing the last full document
+    _full_document_cache      = (None, None)
+    _full_document_cache_lock = Lock()
+
+    @classmethod
+    def describe_page(cls, page_index, result, page_version, page_config):
+        """ Returns a dict describing the result of a single page, ready to be serialized as JSON """
+
+        page = {
+            'index':   page_index,
+            'url':     page_config.url,
+            'version': page_version,
+        }
+
+        if result == None:
+            page['result'] = ProbeResult.to_str(ProbeResult.NOT_PROBED_YET)
+            return page
+
+        page.update({
+            'result':           ProbeResult.to_str(result.result),
+            'http_status':      result.http_status,
+            'reason':           result.reason,
+            'last_probed_at':   datetime.fromtimestamp(result.last_probed_at, timezone.utc).replace(tzinfo = None).isoformat() + 'Z',
+            'request_duration': result.request_duration,
+            'revalidated':      result.revalidated,
+            'timings':          result.timings._asdict() if result.timings != None else None,
+        })
+        return page
+
+    @classmethod
+    def _generate_document(cls, probe_data_provider, version, since):
+        # NOTE: The version must be read by the caller before the results. A page replaced in the meantime
+        # may be included even if it's newer than the version but no page older than the version is missed.
+        # All lists must come from the same table. They're replaced together when the requirement file is reloaded.
+        page_table    = probe_data_provider.page_table
+        probe_results = page_table.probe_results
+        page_versions = page_table.page_versions
+        page_configs  = page_table.page_configs
+
+        pages = [
+            cls.describe_page(page_index, probe_results[page_index], page_versions[page_index], page_configs[page_index])
+            for page_index in range(len(page_configs))
+            if since == None or page_versions[page_index] > since
+        ]
+
+        content = json.dumps({
+            'version':    version,
+            'since':      since,
+            'page_count': len(page_configs),
+            'pages':      pages
+        }, sort_keys = True)
+
+        etag = '"{}-{}"'.format(cls.INSTANCE_ID, hashlib.sha1(content.encode('utf-8')).hexdigest()[:16])
+
+        return (content, etag)
+
+    @classmethod
+    def status(cls, probe_data_provider, since = None):
+        """ Returns a (content, etag) tuple. content is a JSON document describing the results of all pages or,
+            if since is not None, only the pages whose results have been replaced after that version. If since
+            is greater than the current version (e.g. the client remembers a version from before a restart),
+            all pages are described. The etag is a quoted string to be sent in the ETag header.
+
+            probe_data_provider must have probe_results_version and page_table properties (see HttpWatchdog). The full document is generated only once per version.
+        """
+
+        version = probe_data_provider.probe_results_version
+        if since != None and since > version:
+            since = None
+
+        if since != None:
+            return cls._generate_document(probe_data_provider, version, since)
+
+        with cls._full_document_cache_lock:
+            (cached_version, cached_document) = cls._full_document_cache
+            if cached_version == version:
+                return cached_document
+
+            document = cls._generate_document(probe_data_provider, version, None)
+            cls._full_document_cache = (version, document)
+
+        return document
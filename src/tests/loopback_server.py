@@ -0,0 +1,140 @@
+""" Definition of LoopbackServer class that serves scripted HTTP responses on 127.0.0.1 for tests of the HTTP clients """
+
+import os
+import time
+import socket
+import struct
+import subprocess
+import socketserver
+from threading import Thread, Lock
+
+class LoopbackRequestHandler(socketserver.StreamRequestHandler):
+    def _reset(self):
+        # SO_LINGER with zero timeout makes close() send RST instead of FIN
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+
+    def handle(self):
+        self.connection.settimeout(self.server.idle_timeout)
+
+        while True:
+            try:
+                request_line = self.rfile.readline()
+            except socket.timeout:
+                self.server.count('idle_closes')
+                return
+
+            if request_line == b'':
+                return
+
+            headers = {}
+            while True:
+                line = self.rfile.readline()
+                if line in [b'\r\n', b'\n', b'']:
+                    break
+
+                (name, separator, value) = line.decode('iso-8859-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            path = request_line.decode('iso-8859-1').split(' ')[1]
+            self.server.begin_request(path, headers)
+            try:
+                for part in self.server.respond(path, headers):
+                    if part is LoopbackServer.RESET:
+                        self._reset()
+                        return
+                    elif part is LoopbackServer.CLOSE:
+                        return
+                    elif isinstance(part, float):
+                        time.sleep(part)
+                    else:
+                        self.wfile.write(part)
+                        self.wfile.flush()
+            finally:
+                self.server.end_request()
+
+            if headers.get('connection', '').lower() == 'close':
+                return
+
+class LoopbackServer(socketserver.ThreadingTCPServer):
+    """ Serves requests on a random port of 127.0.0.1 in a background thread. respond is a function that gets the
+        path and the headers of a request (a dict with lowercase names) and returns a list of parts of the response:
+        bytes to send, a float to sleep for that many seconds, CLOSE to close the connection or RESET to reset it.
+        A connection is kept open after the response unless the request asked otherwise. If idle_timeout is not
+        None, a connection that has been idle for that many seconds is closed. ssl_context enables HTTPS.
+
+        The server records the requests and counts connections, concurrently handled requests and idle closes.
+    """
+
+    CLOSE = object()
+    RESET = object()
+
+    daemon_threads      = True
+    allow_reuse_address = True
+
+    def __init__(self, respond, idle_timeout = None, ssl_context = None):
+        super().__init__(('127.0.0.1', 0), LoopbackRequestHandler)
+
+        if ssl_context != None:
+            self.socket = ssl_context.wrap_socket(self.socket, server_side = True)
+
+        self.respond             = respond
+        self.idle_timeout        = idle_timeout
+        self.requests            = []
+        self.connections         = 0
+        self.idle_closes         = 0
+        self.active_requests     = 0
+        self.max_active_requests = 0
+        self._lock               = Lock()
+
+        Thread(target = self.serve_forever, kwargs = {'poll_interval': 0.05}, daemon = True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def url(self, path, scheme = 'http', host = '127.0.0.1'):
+        return '{}://{}:{}{}'.format(scheme, host, self.port, path)
+
+    def count(self, counter_name):
+        with self._lock:
+            setattr(self, counter_name, getattr(self, counter_name) + 1)
+
+    def begin_request(self, path, headers):
+        with self._lock:
+            self.requests.append((path, headers))
+            self.active_requests    += 1
+            self.max_active_requests = max(self.max_active_requests, self.active_requests)
+
+    def end_request(self):
+        with self._lock:
+            self.active_requests -= 1
+
+    def process_request(self, request, client_address):
+        self.count('connections')
+        super().process_request(request, client_address)
+
+    def handle_error(self, request, client_address):
+        # Clients going away in the middle of a response are expected in these tests
+        pass
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+def generate_certificate(directory):
+    """ Creates a self-signed certificate for 'localhost' with the openssl command. Returns paths to the certificate and the key. """
+
+    certificate_path = os.path.join(directory, 'localhost.crt')
+    key_path         = os.path.join(directory, 'localhost.key')
+
+    subprocess.run(
+        [
+            'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+            '-addext', 'subjectAltName=DNS:localhost', '-keyout', key_path, '-out', certificate_path
+        ],
+        check  = True,
+        stdout = subprocess.DEVNULL,
+        stderr = subprocess.DEVNULL
+    )
+
+    return (certificate_path, key_path)
@@ -0,0 +1,132 @@
+import ssl
+import shutil
+import asyncio
+import tempfile
+import unittest
+import http.client
+
+from ..async_http_client import AsyncHttpClient
+from ..tls_session_cache import TlsSessionCache
+from .loopback_server    import LoopbackServer, generate_certificate
+
+class AsyncHttpClientTest(unittest.TestCase):
+    def setUp(self):
+        self.responses = []
+        self.server    = LoopbackServer(lambda path, headers: self.responses.pop(0))
+
+    def tearDown(self):
+        self.server.close()
+
+    def _get(self, read, headers = {}, client = None, scheme = 'http', host = '127.0.0.1'):
+        """ Sends a request to the server and returns whatever read(response) returns """
+
+        async def get():
+            response = await (client or AsyncHttpClient(5)).get(scheme, host, self.server.port, '/page?a=1', headers)
+            try:
+                return await read(response)
+            finally:
+                response.close()
+
+        return asyncio.run(get())
+
+    @classmethod
+    async def _read_in_chunks(cls, response, max_size = 64 * 1024):
+        chunks = []
+        while True:
+            chunk = await response.read_chunk(max_size)
+            if chunk == b'':
+                return chunks
+
+            chunks.append(chunk)
+
+    def test_get_should_send_request_and_parse_status_line_and_headers(self):
+        self.responses.append([b'HTTP/1.1 404 Not Found\r\nContent-Length: 4\r\nX-Spam:  eggs\r\n\r\nspam'])
+
+        async def read(response):
+            return (response.status, response.reason, response.getheader('x-spam'), response.getheader('X-Missing', '-'), await response.read())
+
+        self.assertEqual(self._get(read, {'If-None-Match': '"1"'}), (404, 'Not Found', 'eggs', '-', b'spam'))
+
+        [(path, headers)] = self.server.requests
+        self.assertEqual(path, '/page?a=1')
+        self.assertEqual(headers['host'], '127.0.0.1:{}'.format(self.server.port))
+        self.assertEqual(headers['connection'], 'close')
+        self.assertEqual(headers['if-none-match'], '"1"')
+
+    def test_read_chunk_should_return_content_length_body_in_parts_of_at_most_max_size(self):
+        self.responses.append([b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n01234', 0.05, b'56789 and more'])
+
+        chunks = self._get(lambda response: self._read_in_chunks(response, 4))
+
+        self.assertTrue(all(len(chunk) <= 4 for chunk in chunks))
+        self.assertEqual(b''.join(chunks), b'0123456789')
+
+    def test_read_should_decode_chunked_body_with_extensions_and_trailers(self):
+        self.responses.append([
+            b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n',
+            b'5;name=value\r\nspam \r\n',
+            0.05,
+            b'4\r\neg', b'gs\r\n0\r\nX-Trailer: 1\r\n\r\n',
+        ])
+
+        self.assertEqual(self._get(lambda response: response.read()), b'spam eggs')
+
+    def test_read_should_read_body_until_connection_close(self):
+        self.responses.append([b'HTTP/1.0 200 OK\r\n\r\nspam ', 0.05, b'eggs', LoopbackServer.CLOSE])
+
+        self.assertEqual(self._get(lambda response: response.read()), b'spam eggs')
+
+    def test_read_should_raise_incomplete_read_if_body_is_cut_short(self):
+        self.responses.append([b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nspam', LoopbackServer.CLOSE])
+        self.responses.append([b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n9\r\nspam', LoopbackServer.CLOSE])
+        self.responses.append([b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nspam\r\n', LoopbackServer.CLOSE])
+
+        for i in range(3):
+            with self.assertRaises(http.client.IncompleteRead):
+                self._get(lambda response: response.read())
+
+    def test_get_should_reject_invalid_responses(self):
+        self.responses.append([LoopbackServer.CLOSE])
+        self.responses.append([b'SPAM/1.1 200 OK\r\n\r\n', LoopbackServer.CLOSE])
+        self.responses.append([b'HTTP/1.1 OK\r\n\r\n', LoopbackServer.CLOSE])
+        self.responses.append([b'HTTP/1.1 200 OK\r\nContent-Length: spam\r\n\r\n', LoopbackServer.CLOSE])
+
+        for exception_class in [http.client.RemoteDisconnected, http.client.BadStatusLine, http.client.BadStatusLine, http.client.HTTPException]:
+            with self.assertRaises(exception_class):
+                self._get(lambda response: response.read())
+
+    def test_get_should_raise_connection_error_if_connection_is_reset(self):
+        self.responses.append([LoopbackServer.RESET])
+        self.responses.append([b'HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nspam', 0.05, LoopbackServer.RESET])
+
+        for i in range(2):
+            with self.assertRaises((ConnectionError, http.client.HTTPException)):
+                self._get(lambda response: response.read())
+
+    @unittest.skipIf(shutil.which('openssl') == None, "the openssl command is not available")
+    def test_get_should_upgrade_connection_to_tls_and_verify_certificate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            (certificate_path, key_path) = generate_certificate(directory)
+
+            server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            server_context.load_cert_chain(certificate_path, key_path)
+
+            self.server.close()
+            self.server = LoopbackServer(lambda path, headers: self.responses.pop(0), ssl_context = server_context)
+            self.responses.append([b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nspam'])
+            self.responses.append([b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nspam'])
+
+            async def read(response):
+                return (await response.read(), sorted(response.connection_timings))
+
+            client = AsyncHttpClient(5, tls_sessions = TlsSessionCache(certificate_path))
+            (body, timing_names) = self._get(read, client = client, scheme = 'https', host = 'localhost')
+
+            self.assertEqual(body, b'spam')
+            self.assertIn('connect', timing_names)
+            if hasattr(asyncio.StreamWriter, 'start_tls'):
+                self.assertIn('tls', timing_names)
+
+            # The certificate of the server is not signed by the system CAs
+            with self.assertRaises(ssl.SSLError):
+                self._get(read, scheme = 'https', host = 'localhost')
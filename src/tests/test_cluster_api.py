@@ -0,0 +1,61 @@
+import json
+import unittest
+
+from ..cluster_api  import ClusterApi
+from ..status_api   import StatusApi
+from ..probe_result import ProbeResult, ProbeRecord, ProbeTimings
+from ..page_table   import PageConfig
+
+class ClusterProbeDataProvider:
+    def __init__(self):
+        self.probe_results_version = 0
+        self.page_configs          = [PageConfig('http://google.pl/{}'.format(i), (), 60) for i in range(3)]
+        self.probe_results         = [None] * 3
+        self.page_versions         = [0] * 3
+        self.page_keys             = [bytes([i]) * 8 for i in range(3)]
+        self.owned_pages           = bytearray([1, 1, 0])
+
+    @property
+    def page_table(self):
+        # The provider has all the attributes of a PageTable
+        return self
+
+    def replace_result(self, page_index, result):
+        self.probe_results[page_index]  = result
+        self.page_versions[page_index]  = self.probe_results_version + 1
+        self.probe_results_version     += 1
+
+class ClusterApiTest(unittest.TestCase):
+    def test_parse_should_restore_results_of_owned_pages(self):
+        timings  = ProbeTimings(dns = None, connect = 0.1, tls = 0.2, ttfb = 0.3, dns_source = 'resolver', download = 0.125)
+        results  = [
+            ProbeRecord(ProbeResult.MATCH, 200, 'OK', 946684800.123456, 0.1, 0.0625, False, timings),
+            ProbeRecord(ProbeResult.CONNECTION_ERROR, None, 'Connection refused', 946684801.5, None, 0.0, False, None),
+        ]
+        provider = ClusterProbeDataProvider()
+        for (page_index, result) in enumerate(results + results[:1]):
+            provider.replace_result(page_index, result)
+
+        (instance, version, since, page_results) = ClusterApi.parse(ClusterApi.document(provider))
+
+        self.assertEqual(instance, StatusApi.INSTANCE_ID)
+        self.assertEqual(version, 3)
+        self.assertEqual(since, None)
+        self.assertEqual(page_results, [(provider.page_keys[0], results[0]), (provider.page_keys[1], results[1])])
+
+    def test_document_should_describe_only_results_replaced_after_since(self):
+        provider = ClusterProbeDataProvider()
+        provider.replace_result(0, ProbeRecord(ProbeResult.MATCH, 200, 'OK', 946684800.0, 0.1, 0.0, False, None))
+        provider.replace_result(1, ProbeRecord(ProbeResult.NO_MATCH, 200, 'OK', 946684800.0, 0.1, 0.0, False, None))
+
+        (instance, version, since, page_results)    = ClusterApi.parse(ClusterApi.document(provider, 1))
+        (instance, version, since_2, page_results_2) = ClusterApi.parse(ClusterApi.document(provider, 5))
+
+        self.assertEqual([page_key for (page_key, result) in page_results], [provider.page_keys[1]])
+        self.assertEqual(since_2, None)
+        self.assertEqual(len(page_results_2), 2)
+
+    def test_parse_should_reject_invalid_documents(self):
+        for content in ['[]', '{"version": 1}', json.dumps({'instance': 'a', 'version': 1, 'since': None, 'results': [[1]]}), 'spam']:
+            with self.assertRaises(ValueError):
+                ClusterApi.parse(content)
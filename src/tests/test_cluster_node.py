@@ -0,0 +1,95 @@
+import time
+import socket
+import unittest
+from threading import Thread
+
+from ..cluster_node                   import ClusterNode
+from ..http_watchdog                  import HttpWatchdog
+from ..report_server                  import ThreadingReportServer
+from ..reporting_http_request_handler import ReportingHTTPRequestHandler
+from ..probe_result                   import ProbeResult, ProbeRecord
+
+class OtherInstanceClusterNode(ClusterNode):
+    # Both nodes of the test run in the same process and serve documents with the same instance identifier
+    INSTANCE_ID = 'other'
+
+class ClusterNodeTest(unittest.TestCase):
+    PAGE_CONFIGS = [{'url': 'http://site{}.example.com/'.format(i), 'patterns': ['spam']} for i in range(40)]
+
+    def setUp(self):
+        self.watchdogs = []
+        self.servers   = []
+        self.addresses = []
+        for i in range(2):
+            watchdog = HttpWatchdog(100, self.PAGE_CONFIGS)
+            server   = ThreadingReportServer(('127.0.0.1', 0), ReportingHTTPRequestHandler)
+            server.probe_data_provider = watchdog
+            Thread(target = server.serve_forever, daemon = True).start()
+
+            self.watchdogs.append(watchdog)
+            self.servers.append(server)
+            self.addresses.append('127.0.0.1:{}'.format(server.server_address[1]))
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+        for watchdog in self.watchdogs:
+            watchdog.close()
+
+    def test_nodes_should_split_pages_share_results_and_take_over_pages_of_nodes_that_leave(self):
+        nodes = [OtherInstanceClusterNode(address, self.addresses, watchdog, 0.05, 0.1) for (address, watchdog) in zip(self.addresses, self.watchdogs)]
+        for (node, watchdog) in zip(nodes, self.watchdogs):
+            node.poll()
+            watchdog._apply_cluster_requests()
+
+        owned_pages = [watchdog.page_table.owned_pages for watchdog in self.watchdogs]
+        self.assertEqual(nodes[0].members, sorted(self.addresses))
+        self.assertEqual([a + b for (a, b) in zip(*owned_pages)], [1] * len(self.PAGE_CONFIGS))
+        self.assertGreater(sum(owned_pages[0]), 0)
+        self.assertGreater(sum(owned_pages[1]), 0)
+
+        page_index = owned_pages[0].index(1)
+        result     = ProbeRecord(ProbeResult.NO_MATCH, 200, 'OK', 946684800.5, 0.25, 0.0, False, None)
+        self.watchdogs[0]._probe_results[page_index] = result
+        self.watchdogs[0]._observe_result(page_index, result.last_probed_at, result)
+
+        nodes[1].poll()
+        self.watchdogs[1]._apply_cluster_requests()
+
+        self.assertEqual(self.watchdogs[1].probe_results[page_index], result)
+
+        self.servers[0].shutdown()
+        self.servers[0].server_close()
+        self.servers.pop(0)
+        time.sleep(0.2)
+
+        with self.assertLogs('src.cluster_node', 'INFO'):
+            nodes[1].poll()
+        self.watchdogs[1]._apply_cluster_requests()
+
+        self.assertEqual(nodes[1].members, [self.addresses[1]])
+        self.assertEqual(list(self.watchdogs[1].page_table.owned_pages), [1] * len(self.PAGE_CONFIGS))
+
+    def test_poll_should_not_let_peers_that_do_not_respond_delay_the_others(self):
+        # Connections to these sockets are accepted by the kernel but nothing ever answers them
+        silent_sockets = [socket.socket() for i in range(3)]
+        for silent_socket in silent_sockets:
+            silent_socket.bind(('127.0.0.1', 0))
+            silent_socket.listen(8)
+        silent_addresses = ['127.0.0.1:{}'.format(silent_socket.getsockname()[1]) for silent_socket in silent_sockets]
+
+        try:
+            node = OtherInstanceClusterNode(self.addresses[0], self.addresses + silent_addresses, self.watchdogs[0], 0.3, 0.9)
+
+            start_time = time.monotonic()
+            node.poll()
+            poll_time  = time.monotonic() - start_time
+        finally:
+            for silent_socket in silent_sockets:
+                silent_socket.close()
+
+        # Every request is abandoned after 0.3 seconds, but asked one by one the silent peers would take 0.9
+        self.assertEqual(node.members, sorted(self.addresses))
+        self.assertLess(poll_time, 0.6)
@@ -0,0 +1,93 @@
+import time
+import unittest
+
+from ..connection_pool import ConnectionPool
+from .loopback_server  import LoopbackServer
+
+class ConnectionPoolTest(unittest.TestCase):
+    RESPONSE = [b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nspam']
+
+    def setUp(self):
+        self.server = LoopbackServer(lambda path, headers: self.RESPONSE, idle_timeout = 0.2)
+
+    def tearDown(self):
+        self.server.close()
+
+    def _request(self, pool):
+        """ Sends a request over a connection from the pool and returns the connection to the pool. Returns the connection and the reused flag. """
+
+        (connection, reused) = pool.acquire('http', '127.0.0.1', self.server.port)
+
+        connection.request('GET', '/')
+        self.assertEqual(connection.getresponse().read(), b'spam')
+
+        pool.release('http', '127.0.0.1', self.server.port, connection)
+
+        return (connection, reused)
+
+    def test_acquire_should_reuse_released_connections_and_count_hits_and_misses(self):
+        pool = ConnectionPool(4, 60, 5)
+        self.assertEqual(pool.hit_rate, None)
+
+        (connection_1, reused_1) = self._request(pool)
+        (connection_2, reused_2) = self._request(pool)
+        (connection_3, reused_3) = pool.acquire('http', 'localhost', self.server.port)
+
+        self.assertEqual([reused_1, reused_2, reused_3], [False, True, False])
+        self.assertIs(connection_2, connection_1)
+        self.assertIsNot(connection_3, connection_1)
+        self.assertEqual((pool.hits, pool.misses), (1, 2))
+        self.assertAlmostEqual(pool.hit_rate, 1 / 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_release_should_close_connections_above_max_size(self):
+        pool = ConnectionPool(1, 60, 5)
+
+        (connection_1, reused_1) = pool.acquire('http', '127.0.0.1', self.server.port)
+        (connection_2, reused_2) = pool.acquire('http', '127.0.0.1', self.server.port)
+        for connection in [connection_1, connection_2]:
+            connection.request('GET', '/')
+            connection.getresponse().read()
+
+        pool.release('http', '127.0.0.1', self.server.port, connection_1)
+        pool.release('http', '127.0.0.1', self.server.port, connection_2)
+
+        self.assertEqual(pool.idle_count, 1)
+        self.assertNotEqual(connection_1.sock, None)
+        self.assertEqual(connection_2.sock, None)
+
+    def test_acquire_should_close_connections_idle_for_longer_than_idle_timeout(self):
+        pool = ConnectionPool(4, 0.05, 5)
+
+        (connection_1, reused_1) = self._request(pool)
+        time.sleep(0.1)
+        (connection_2, reused_2) = pool.acquire('http', '127.0.0.1', self.server.port)
+
+        self.assertFalse(reused_2)
+        self.assertEqual(connection_1.sock, None)
+        self.assertEqual(pool.idle_count, 0)
+
+    def test_acquire_should_drop_connections_closed_by_the_server(self):
+        pool = ConnectionPool(4, 60, 5)
+
+        (connection_1, reused_1) = self._request(pool)
+
+        # The server closes keep-alive connections idle for more than 0.2 seconds
+        time.sleep(0.4)
+        self.assertEqual(self.server.idle_closes, 1)
+
+        (connection_2, reused_2) = self._request(pool)
+
+        self.assertFalse(reused_2)
+        self.assertIsNot(connection_2, connection_1)
+        self.assertEqual(connection_1.sock, None)
+        self.assertEqual((pool.hits, pool.misses), (0, 2))
+
+    def test_close_all_should_close_idle_connections(self):
+        pool = ConnectionPool(4, 60, 5)
+
+        (connection, reused) = self._request(pool)
+        pool.close_all()
+
+        self.assertEqual(pool.idle_count, 0)
+        self.assertEqual(connection.sock, None)
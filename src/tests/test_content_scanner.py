@@ -0,0 +1,91 @@
+import unittest
+
+from ..content_scanner import ContentScanner
+from ..pattern_matcher import PatternMatcher
+
+class ContentScannerTest(unittest.TestCase):
+    def test_scanner_should_find_patterns_in_separate_chunks(self):
+        scanner = ContentScanner(PatternMatcher(['spam', 'eggs']), 'utf-8')
+        scanner.feed(b'<p>spam</p>')
+        self.assertFalse(scanner.all_matched)
+
+        scanner.feed(b'<p>eggs</p>')
+        self.assertTrue(scanner.all_matched)
+        self.assertEqual(scanner.matches, [(3, 'spam'), (14, 'eggs')])
+
+    def test_scanner_should_find_matches_crossing_chunk_boundaries(self):
+        scanner = ContentScanner(PatternMatcher(['spam and eggs']), 'utf-8')
+        scanner.feed(b'x' * 100 + b'spam a')
+        scanner.feed(b'nd eggs')
+        scanner.finish()
+
+        self.assertTrue(scanner.all_matched)
+        self.assertEqual(scanner.matches, [(100, 'spam and eggs')])
+
+    def test_scanner_should_find_regex_matches_crossing_chunk_boundaries(self):
+        scanner = ContentScanner(PatternMatcher(['spam\\s+and\\s+eggs']), 'utf-8')
+        scanner.feed(b'x' * 100 + b'spam  a')
+        scanner.feed(b'nd eggs')
+        scanner.finish()
+
+        self.assertEqual(scanner.matches, [(100, 'spam  and eggs')])
+
+    def test_scanner_should_find_long_matches_crossing_window_boundaries(self):
+        body    = b'x' * 100 + b'<title>' + b'spam ' * 5000 + b'</title>'
+        scanner = ContentScanner(PatternMatcher(['<title>[a-z ]+</title>', '<title>.*</title>']), 'utf-8')
+        for start in range(0, len(body), 1000):
+            scanner.feed(body[start : start + 1000])
+        scanner.finish()
+
+        self.assertEqual([match[0] if match != None else None for match in scanner.matches], [100, 100])
+
+    def test_scanner_should_not_match_anchors_and_lookarounds_at_window_boundaries(self):
+        # The second window starts with the last MATCH_OVERLAP characters of the first chunk: 'eggs' followed by 'b's
+        first_chunk = b'a' + b'eggs' + b'b' * (ContentScanner.MATCH_OVERLAP - 4)
+
+        scanner = ContentScanner(PatternMatcher(['^eggs', '\\beggs', '(?<!a)eggs', 'b$', 'b\\b', '^a', 'c$']), 'utf-8')
+        scanner.feed(first_chunk)
+        scanner.feed(b'c')
+        scanner.finish()
+
+        self.assertEqual(scanner.matches, [None, None, None, None, None, (0, 'a'), (len(first_chunk), 'c')])
+
+    def test_scanner_should_decode_multibyte_characters_split_between_chunks(self):
+        encoded = 'Leoš Janáček'.encode('utf-8')
+
+        scanner = ContentScanner(PatternMatcher(['Janáček']), 'utf-8')
+        scanner.feed(encoded[:8])
+        scanner.feed(encoded[8:])
+        scanner.finish()
+
+        self.assertTrue(scanner.all_matched)
+
+    def test_scanner_should_respect_charset(self):
+        scanner = ContentScanner(PatternMatcher(['café']), 'latin1')
+        scanner.feed('café'.encode('latin1'))
+        scanner.finish()
+
+        self.assertTrue(scanner.all_matched)
+
+    def test_scanner_should_not_fail_on_invalid_bytes(self):
+        scanner = ContentScanner(PatternMatcher(['spam']), 'utf-8')
+        scanner.feed(b'\xff\xfe\x00spam')
+        scanner.finish()
+
+        self.assertTrue(scanner.all_matched)
+
+    def test_scanner_should_report_patterns_not_found(self):
+        scanner = ContentScanner(PatternMatcher(['spam', 'ham']), 'utf-8')
+        scanner.feed(b'spam, spam, eggs')
+        scanner.finish()
+
+        self.assertFalse(scanner.all_matched)
+        self.assertEqual(scanner.matches, [(0, 'spam'), None])
+
+    def test_scanner_with_no_patterns_should_match_immediately(self):
+        scanner = ContentScanner(PatternMatcher([]), 'utf-8')
+        self.assertTrue(scanner.all_matched)
+
+    def test_scanner_should_raise_lookup_error_for_unknown_charset(self):
+        with self.assertRaises(LookupError):
+            ContentScanner(PatternMatcher([]), 'no-such-charset')
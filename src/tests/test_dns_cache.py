@@ -0,0 +1,75 @@
+import socket
+import asyncio
+import unittest
+
+from ..dns_cache import DnsCache
+
+class ScriptedDnsCache(DnsCache):
+    """ A DnsCache that answers lookups from a list of results instead of asking the resolver """
+
+    def __init__(self, answers, *args):
+        super().__init__(*args)
+        self.answers = list(answers)
+        self.lookups = 0
+
+    def _getaddrinfo(self, host, port):
+        self.lookups += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+
+        return answer
+
+    async def _getaddrinfo_async(self, host, port):
+        return self._getaddrinfo(host, port)
+
+ADDRESSES = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 80))]
+
+class DnsCacheTest(unittest.TestCase):
+    def test_resolve_should_reuse_addresses_until_they_expire(self):
+        dns_cache = ScriptedDnsCache([ADDRESSES], 60, 60, 60)
+
+        self.assertEqual(dns_cache.resolve('example.com', 80), (ADDRESSES, DnsCache.SOURCE_RESOLVER))
+        self.assertEqual(dns_cache.resolve('example.com', 80), (ADDRESSES, DnsCache.SOURCE_CACHE))
+        self.assertEqual(dns_cache.lookups, 1)
+        self.assertEqual(dns_cache.hit_rate, 0.5)
+
+    def test_resolve_should_cache_failures(self):
+        dns_cache = ScriptedDnsCache([socket.gaierror(socket.EAI_NONAME, 'Name or service not known')], 60, 60, 60)
+
+        with self.assertRaises(socket.gaierror):
+            dns_cache.resolve('example.com', 80)
+        with self.assertRaises(socket.gaierror) as context:
+            dns_cache.resolve('example.com', 80)
+
+        self.assertEqual(context.exception.args, (socket.EAI_NONAME, 'Name or service not known'))
+        self.assertEqual(dns_cache.lookups, 1)
+        self.assertEqual(dns_cache.failures, 1)
+
+    def test_resolve_should_fall_back_to_expired_addresses_if_resolver_fails(self):
+        dns_cache = ScriptedDnsCache([ADDRESSES, socket.gaierror(socket.EAI_AGAIN, 'Temporary failure')], 0, 60, 60)
+
+        dns_cache.resolve('example.com', 80)
+        self.assertEqual(dns_cache.resolve('example.com', 80), (ADDRESSES, DnsCache.SOURCE_STALE))
+
+        # The failed refresh is not retried until negative_ttl passes
+        self.assertEqual(dns_cache.resolve('example.com', 80), (ADDRESSES, DnsCache.SOURCE_CACHE))
+        self.assertEqual(dns_cache.lookups, 2)
+        self.assertEqual(dns_cache.stale_hits, 1)
+
+    def test_resolve_should_not_use_addresses_older_than_max_stale(self):
+        dns_cache = ScriptedDnsCache([ADDRESSES, socket.gaierror(socket.EAI_AGAIN, 'Temporary failure')], 0, 60, 60)
+
+        dns_cache.resolve('example.com', 80)
+        dns_cache._entries[('example.com', 80)]['resolved_at'] -= 120
+        with self.assertRaises(socket.gaierror):
+            dns_cache.resolve('example.com', 80)
+
+    def test_resolve_async_should_share_entries_with_resolve(self):
+        dns_cache = ScriptedDnsCache([ADDRESSES], 60, 60, 60)
+
+        dns_cache.resolve('example.com', 80)
+        result = asyncio.run(dns_cache.resolve_async('example.com', 80, 1))
+
+        self.assertEqual(result, (ADDRESSES, DnsCache.SOURCE_CACHE))
+        self.assertEqual(dns_cache.lookups, 1)
@@ -0,0 +1,36 @@
+import unittest
+
+from ..hash_ring import HashRing
+
+class HashRingTest(unittest.TestCase):
+    KEYS = ['http://site{}.example.com:80/page/{}'.format(i % 50, i) for i in range(3000)]
+
+    def _assignment(self, hash_ring):
+        return {key: hash_ring.owner(key) for key in self.KEYS}
+
+    def test_owner_should_not_depend_on_the_order_of_nodes(self):
+        self.assertEqual(
+            self._assignment(HashRing(['a:1', 'b:2', 'c:3'])),
+            self._assignment(HashRing(['c:3', 'a:1', 'b:2']))
+        )
+
+    def test_owner_should_split_keys_evenly(self):
+        owners = list(self._assignment(HashRing(['a:1', 'b:2', 'c:3'])).values())
+
+        for node in ['a:1', 'b:2', 'c:3']:
+            self.assertGreater(owners.count(node), len(self.KEYS) / 3 * 0.7)
+
+    def test_adding_a_node_should_move_keys_only_to_that_node(self):
+        before = self._assignment(HashRing(['a:1', 'b:2', 'c:3']))
+        after  = self._assignment(HashRing(['a:1', 'b:2', 'c:3', 'd:4']))
+
+        moved_keys = [key for key in self.KEYS if before[key] != after[key]]
+
+        self.assertTrue(all(after[key] == 'd:4' for key in moved_keys))
+        self.assertLess(len(moved_keys), len(self.KEYS) / 4 * 1.3)
+
+    def test_removing_a_node_should_move_only_its_keys(self):
+        before = self._assignment(HashRing(['a:1', 'b:2', 'c:3']))
+        after  = self._assignment(HashRing(['a:1', 'c:3']))
+
+        self.assertEqual([key for key in self.KEYS if before[key] != after[key]], [key for key in self.KEYS if before[key] == 'b:2'])
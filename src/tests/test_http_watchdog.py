@@ -1,7 +1,25 @@
+import time
+import shutil
+import tempfile
 import unittest
+from queue        import Queue
+from threading    import Timer
 from urllib.parse import urlparse
 
-from ..http_watchdog import HttpWatchdog, CharsetDetectionError
+from ..http_watchdog   import HttpWatchdog, CharsetDetectionError
+from ..probe_engines   import ENGINES
+from ..probe_result    import ProbeResult, ProbeRecord
+from ..probe_scheduler import ProbeScheduler
+from ..result_log      import ResultLog
+from ..connection_pool import ConnectionPool
+from .loopback_server   import LoopbackServer
+
+class UncheckedConnectionPool(ConnectionPool):
+    """ Hands out pooled connections without checking whether they're still open, as if the server closed them right after the check """
+
+    @classmethod
+    def _is_connection_alive(cls, connection):
+        return True
 
 class HttpWatchdogTest(unittest.TestCase):
     def test_dissect_and_escape_url_should_split_valid_url(self):
@@ -94,6 +112,21 @@ class HttpWatchdogTest(unittest.TestCase):
         with self.assertRaises(CharsetDetectionError):
             HttpWatchdog._detect_response_charset('charset=utf-8; Content-Type: text/html; charset=utf-8')
 
+    def test_is_text_content_type_should_accept_text_documents(self):
+        self.assertTrue(HttpWatchdog._is_text_content_type('text/html; charset=utf-8'))
+        self.assertTrue(HttpWatchdog._is_text_content_type('text/plain'))
+        self.assertTrue(HttpWatchdog._is_text_content_type('application/xhtml+xml'))
+        self.assertTrue(HttpWatchdog._is_text_content_type('application/atom+xml'))
+        self.assertTrue(HttpWatchdog._is_text_content_type('Application/JSON'))
+
+    def test_is_text_content_type_should_accept_missing_content_type(self):
+        self.assertTrue(HttpWatchdog._is_text_content_type(None))
+
+    def test_is_text_content_type_should_reject_binary_content(self):
+        self.assertFalse(HttpWatchdog._is_text_content_type('image/png'))
+        self.assertFalse(HttpWatchdog._is_text_content_type('application/octet-stream'))
+        self.assertFalse(HttpWatchdog._is_text_content_type('application/zip'))
+
     def test_page_configs_should_provide_access_to_a_list_of_page_configs(self):
         input_page_configs = [
             {
@@ -116,7 +149,448 @@ class HttpWatchdogTest(unittest.TestCase):
         self.assertEqual(len(page_configs), 3)
 
         for i in range(len(input_page_configs)):
-            self.assertEqual(page_configs[i]['url'], input_page_configs[i]['url'])
+            self.assertEqual(page_configs[i].url, input_page_configs[i]['url'])
 
             for j in range(len(input_page_configs[i]['patterns'])):
-                self.assertEqual(page_configs[i]['regexes'][j].pattern, input_page_configs[i]['patterns'][j])
+                self.assertEqual(page_configs[i].regexes[j].pattern, input_page_configs[i]['patterns'][j])
+
+    def test_pages_with_the_same_request_target_should_be_fetched_together(self):
+        input_page_configs = [
+            {
+                'url':      'http://google.pl/search',
+                'patterns': ['spam', 'eggs']
+            },
+            {
+                'url':      'https://google.pl/search',
+                'patterns': ['spam']
+            },
+            {
+                'url':      'http://google.pl:80/search#results',
+                'patterns': ['eggs', 'ham']
+            },
+            {
+                'url':      'http://例子.测试/首页',
+                'patterns': []
+            },
+            {
+                'url':      'http://例子.测试:80/首页#top',
+                'patterns': ['spam']
+            }
+        ]
+
+        fetch_groups = HttpWatchdog(100, input_page_configs)._fetch_groups
+
+        self.assertEqual(len(fetch_groups), 3)
+
+        self.assertEqual(fetch_groups[0]['page_indices'], [0, 2])
+        self.assertEqual(fetch_groups[0]['matcher'].patterns, ['spam', 'eggs', 'ham'])
+        self.assertEqual(fetch_groups[0]['pattern_indices'], [[0, 1], [1, 2]])
+
+        self.assertEqual(fetch_groups[1]['page_indices'], [1])
+        self.assertEqual(fetch_groups[1]['host_key'], ('google.pl', 443))
+
+        self.assertEqual(fetch_groups[2]['page_indices'], [3, 4])
+        self.assertEqual(fetch_groups[2]['matcher'].patterns, ['spam'])
+        self.assertEqual(fetch_groups[2]['pattern_indices'], [[], [0]])
+
+    def test_pages_with_the_same_url_and_patterns_should_share_strings_and_compiled_regexes(self):
+        # Built at runtime so that the strings are not shared by the compiler
+        input_page_configs = [{'url': 'http://google.pl/' + str(i // 2), 'patterns': ['sp' + 'am', 'eggs']} for i in range(4)]
+
+        page_configs = HttpWatchdog(100, input_page_configs).page_configs
+
+        self.assertIs(page_configs[0].url, page_configs[1].url)
+        self.assertIs(page_configs[0].regexes, page_configs[3].regexes)
+        self.assertIsNot(input_page_configs[0]['url'], input_page_configs[1]['url'])
+
+    def test_process_fetch_result_should_create_records_sharing_timings(self):
+        watchdog = HttpWatchdog(100, [
+            {'url': 'http://google.pl/', 'patterns': ['spam']},
+            {'url': 'http://google.pl/#top', 'patterns': ['eggs']},
+        ])
+        timings      = {'dns': None, 'connect': 0.5, 'tls': None, 'ttfb': 0.25, 'dns_source': None}
+        fetch_result = ([(5, 'spam'), None], None, 200, 'OK', 1000.0, 1001.0, False, timings)
+
+        page_results = watchdog._process_fetch_result(watchdog._fetch_groups[0], fetch_result, 0.125)
+
+        self.assertEqual([page_index for (page_index, result) in page_results], [0, 1])
+        self.assertEqual([result.result for (page_index, result) in page_results], [ProbeResult.MATCH, ProbeResult.NO_MATCH])
+        self.assertEqual(page_results[0][1].request_duration, 1.0)
+        self.assertEqual(page_results[0][1].scheduler_lag, 0.125)
+        self.assertIsInstance(page_results[0][1].last_probed_at, float)
+        self.assertEqual(page_results[0][1].timings.connect, 0.5)
+        self.assertEqual(page_results[0][1].timings.download, None)
+        self.assertIs(page_results[0][1].timings, page_results[1][1].timings)
+
+    def test_conditional_request_headers_should_use_validators_remembered_for_the_same_matcher(self):
+        class ResponseWithValidators:
+            def getheader(self, name, default = None):
+                return {'ETag': '"abc"', 'Last-Modified': 'Sat, 01 Jan 2000 00:00:00 GMT'}.get(name, default)
+
+        watchdog = HttpWatchdog(100, [{'url': 'http://google.pl/', 'patterns': ['spam']}])
+        matcher  = watchdog._fetch_groups[0]['matcher']
+        watchdog._update_revalidation_cache('http://google.pl/', matcher, ResponseWithValidators(), [(5, 'spam')])
+
+        self.assertEqual(watchdog._conditional_request_headers('http://google.pl/', matcher), {
+            'If-None-Match':     '"abc"',
+            'If-Modified-Since': 'Sat, 01 Jan 2000 00:00:00 GMT'
+        })
+        self.assertEqual(watchdog._cached_matches('http://google.pl/', matcher), [(5, 'spam')])
+        self.assertEqual(watchdog._conditional_request_headers('http://google.pl/other', matcher), {})
+
+        watchdog._update_revalidation_cache('http://google.pl/', matcher, ResponseWithValidators(), None)
+        self.assertEqual(watchdog._conditional_request_headers('http://google.pl/', matcher), {})
+
+    def test_log_transition_should_log_only_changes_of_state(self):
+        def result(probe_result, http_status):
+            return ProbeRecord(probe_result, http_status, '', 0, None, 0, False, None)
+
+        watchdog = HttpWatchdog(100, [{'url': 'http://google.pl/', 'patterns': ['spam']}], log_transitions_only = True)
+
+        with self.assertLogs('src.http_watchdog', 'DEBUG') as logs:
+            watchdog._log_transition(0, None, result(ProbeResult.MATCH, 200))
+            watchdog._log_transition(0, result(ProbeResult.MATCH, 200), result(ProbeResult.MATCH, 304))
+            watchdog._log_transition(0, result(ProbeResult.MATCH, 200), result(ProbeResult.HTTP_ERROR, 500))
+            watchdog._log_transition(0, result(ProbeResult.HTTP_ERROR, 500), result(ProbeResult.HTTP_ERROR, 503))
+            watchdog._log_transition(0, result(ProbeResult.HTTP_ERROR, 503), result(ProbeResult.CONNECTION_ERROR, None))
+
+        self.assertEqual(len(logs.output), 4)
+        self.assertTrue(logs.output[1].endswith('(previously MATCH 200)'))
+        self.assertTrue(logs.output[3].endswith('(previously HTTP ERROR 503)'))
+
+    def test_reload_should_keep_results_of_unchanged_pages_and_replace_page_table(self):
+        def result(probe_result):
+            return ProbeRecord(probe_result, 200, 'OK', 1000.0, 0.25, 0, False, None)
+
+        watchdog = HttpWatchdog(100, [
+            {'url': 'http://google.pl/1', 'patterns': ['spam']},
+            {'url': 'http://google.pl/2', 'patterns': ['spam']},
+            {'url': 'http://google.pl/3', 'patterns': ['spam']},
+        ])
+        for (page_index, probe_result) in enumerate([ProbeResult.MATCH, ProbeResult.NO_MATCH, ProbeResult.HTTP_ERROR]):
+            watchdog._probe_results[page_index] = result(probe_result)
+            watchdog._probe_history.record(page_index, 1000.0, result(probe_result))
+            watchdog._metrics.observe_result(page_index, result(probe_result))
+
+        old_page_table  = watchdog.page_table
+        unchanged_regex = watchdog.page_configs[2].regexes[0]
+        subscription    = watchdog.result_broadcaster.subscribe()
+
+        watchdog.reload([
+            {'url': 'http://google.pl/3', 'patterns': ['spam'], 'interval': 50},
+            {'url': 'http://google.pl/2', 'patterns': ['eggs']},
+            {'url': 'http://google.pl/1', 'patterns': ['spam']},
+        ])
+
+        page_table = watchdog.page_table
+        self.assertIsNot(page_table, old_page_table)
+        self.assertEqual(len(old_page_table.page_configs), 3)
+        self.assertEqual([page_config.url for page_config in page_table.page_configs], ['http://google.pl/3', 'http://google.pl/2', 'http://google.pl/1'])
+        self.assertEqual([page_config.interval for page_config in page_table.page_configs], [50, 100, 100])
+        self.assertIs(page_table.page_configs[0].regexes[0], unchanged_regex)
+        self.assertEqual([probe_result.result if probe_result != None else None for probe_result in page_table.probe_results], [ProbeResult.HTTP_ERROR, None, ProbeResult.MATCH])
+        self.assertEqual([len(watchdog._probe_history._buffers[page_index]) for page_index in range(3)], [1, 0, 1])
+        self.assertEqual(page_table.page_versions, [1, 1, 1])
+        self.assertEqual(watchdog.probe_results_version, 1)
+        self.assertIn('page="2",url="http://google.pl/1"', watchdog.metrics.exposition())
+        self.assertEqual(subscription.get(0), watchdog.result_broadcaster.RESET_EVENT)
+        self.assertEqual([fetch_group['page_indices'] for fetch_group in watchdog._fetch_groups], [[0], [1], [2]])
+
+    def test_assign_shards_should_balance_pages_and_keep_small_hosts_together(self):
+        fetch_groups = [
+            {'host_key': ('a.pl', 80), 'page_indices': [0, 1]},
+            {'host_key': ('a.pl', 80), 'page_indices': [2, 3]},
+            {'host_key': ('a.pl', 80), 'page_indices': [4]},
+            {'host_key': ('b.pl', 80), 'page_indices': [5]},
+            {'host_key': ('c.pl', 80), 'page_indices': [6]},
+            {'host_key': ('c.pl', 80), 'page_indices': [7]},
+        ]
+
+        self.assertEqual(HttpWatchdog._assign_shards(fetch_groups, 2), [[0, 1, 6, 7], [2, 3, 4, 5]])
+        self.assertEqual(HttpWatchdog._assign_shards(fetch_groups, 1), [list(range(8))])
+        self.assertEqual(HttpWatchdog._assign_shards(fetch_groups[3:4], 4), [[5]])
+
+    def test_run_sharded_should_observe_every_stored_result_once(self):
+        class ScriptedSupervisor:
+            process_count = 2
+
+            def __init__(self, batches):
+                self.batches = batches
+                self.shards  = None
+                self.stopped = False
+
+            def start(self, table, shards, settings):
+                self.table  = table
+                self.shards = shards
+
+            def poll(self, timeout):
+                if len(self.batches) == 0:
+                    raise KeyboardInterrupt
+
+                (page_index, result) = self.batches.pop(0)
+                if result != None:
+                    self.table[page_index] = result
+
+                return [([page_index], 0.5, 0.25, 0)]
+
+            def stop(self):
+                self.stopped = True
+                return []
+
+        result     = ProbeRecord(ProbeResult.MATCH, 200, 'OK', 1000.0, 0.25, 0, False, None)
+        watchdog   = HttpWatchdog(100, [
+            {'url': 'http://google.pl/1', 'patterns': ['spam']},
+            {'url': 'http://bing.com/1', 'patterns': ['eggs']},
+        ], shared_results = True)
+        supervisor = ScriptedSupervisor([(0, result), (1, result), (0, None)])
+
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                watchdog.run_sharded(Queue(), supervisor)
+
+            self.assertEqual(supervisor.shards, [
+                ([0], [{'url': 'http://google.pl/1', 'patterns': ['spam'], 'interval': 100}]),
+                ([1], [{'url': 'http://bing.com/1', 'patterns': ['eggs'], 'interval': 100}]),
+            ])
+            self.assertTrue(supervisor.stopped)
+            self.assertEqual(watchdog.probe_results[1], result)
+            self.assertEqual(watchdog.probe_results_version, 2)
+            self.assertEqual(watchdog.page_versions, [1, 2])
+            self.assertEqual(len(watchdog._probe_history._buffers[0]), 1)
+            self.assertEqual(watchdog.scheduler_lag, 0.25)
+        finally:
+            watchdog.close()
+
+    def test_set_ownership_should_schedule_only_owned_pages_and_store_newer_remote_results(self):
+        def result(last_probed_at):
+            return ProbeRecord(ProbeResult.MATCH, 200, 'OK', last_probed_at, 0.25, 0, False, None)
+
+        watchdog = HttpWatchdog(100, [
+            {'url': 'http://google.pl/1', 'patterns': ['spam']},
+            {'url': 'http://google.pl/2', 'patterns': ['spam']},
+            {'url': 'http://google.pl/2#top', 'patterns': ['eggs']},
+        ])
+        watchdog._scheduler = ProbeScheduler()
+        for group_index in range(len(watchdog._fetch_groups)):
+            watchdog._scheduler.add(group_index, 100, 0)
+
+        watchdog.set_ownership(lambda target_key: target_key == 'http://google.pl:80/1')
+
+        self.assertEqual(list(watchdog.page_table.owned_pages), [1, 0, 0])
+        self.assertEqual([group_index for (group_index, deadline) in watchdog._scheduler.pop_due(1000)], [0])
+
+        page_keys = watchdog.page_table.page_keys
+        watchdog._store_remote_results([(page_keys[0], result(1000.0)), (page_keys[1], result(1000.0)), (page_keys[2], result(1000.0))])
+        watchdog._store_remote_results([(page_keys[1], result(900.0)), (page_keys[2], result(1100.0))])
+
+        self.assertEqual(watchdog.probe_results[0], None)
+        self.assertEqual([watchdog.probe_results[page_index].last_probed_at for page_index in [1, 2]], [1000.0, 1100.0])
+        self.assertEqual(watchdog.probe_results_version, 3)
+
+    def test_store_remote_results_should_not_log_or_count_them(self):
+        result    = ProbeRecord(ProbeResult.MATCH, 200, 'OK', 1000.0, 0.25, 0, False, None)
+        directory = tempfile.mkdtemp()
+        try:
+            watchdog = HttpWatchdog(100, [
+                {'url': 'http://google.pl/1', 'patterns': ['spam']},
+                {'url': 'http://google.pl/2', 'patterns': ['spam']},
+            ], result_log_path = directory)
+            watchdog.set_ownership(lambda target_key: target_key == 'http://google.pl:80/1')
+
+            page_keys = watchdog.page_table.page_keys
+            watchdog._store_remote_results([(page_keys[1], result)])
+            watchdog.close()
+
+            self.assertEqual(watchdog.probe_results[1], result)
+            self.assertEqual(watchdog.probe_results_version, 1)
+            self.assertEqual(len(watchdog._probe_history._buffers[1]), 1)
+            self.assertNotIn('http_watchdog_probe_results_total{page="1"', watchdog.metrics.exposition())
+
+            result_log = ResultLog(directory, 1024 * 1024, 1024)
+            try:
+                (latest_results, history) = result_log.restore(page_keys, 0)
+            finally:
+                result_log.close()
+
+            self.assertEqual(latest_results, {})
+        finally:
+            shutil.rmtree(directory)
+
+    def test_asyncio_engine_should_match_streamed_bodies_and_stop_at_max_page_size(self):
+        def respond(path, headers):
+            body = b'spam ' * 1000 + (b'eggs' if path == '/eggs' else b'')
+            if path.startswith('/chunked'):
+                return [b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n' + '{:x}\r\n'.format(len(body)).encode('ascii') + body + b'\r\n0\r\n\r\n']
+
+            return [b'HTTP/1.1 200 OK\r\nContent-Length: ' + str(len(body)).encode('ascii') + b'\r\n\r\n' + body]
+
+        server = LoopbackServer(respond)
+        try:
+            watchdog = HttpWatchdog(100, [
+                {'url': server.url('/chunked'), 'patterns': ['spam', 'eggs']},
+                {'url': server.url('/eggs'), 'patterns': ['eggs']},
+                {'url': server.url('/chunked/spam'), 'patterns': ['spam']},
+            ], engine = 'asyncio', max_page_size = 4000)
+
+            results = dict(watchdog.probe())
+
+            self.assertEqual(results[0].result, ProbeResult.CONTENT_ERROR)
+            self.assertEqual(results[0].reason, "Page size exceeds the limit of 4000 bytes")
+            self.assertEqual(results[1].result, ProbeResult.CONTENT_ERROR)
+            self.assertEqual(results[1].reason, "Page size (5004 bytes) exceeds the limit of 4000 bytes")
+
+            # The body is larger than the limit but the pattern is found before the limit is reached
+            self.assertEqual(results[2].result, ProbeResult.MATCH)
+        finally:
+            server.close()
+
+    def test_patterns_searched_in_the_whole_text_should_match_in_the_part_of_an_oversized_page_that_has_been_read(self):
+        def respond(path, headers):
+            body = b'a spam b ' + b'x' * 8000
+            return [b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n' + '{:x}\r\n'.format(len(body)).encode('ascii') + body + b'\r\n0\r\n\r\n']
+
+        server = LoopbackServer(respond)
+        try:
+            for engine in ENGINES:
+                watchdog = HttpWatchdog(100, [
+                    {'url': server.url('/literal'), 'patterns': ['spam']},
+                    {'url': server.url('/unbounded'), 'patterns': ['a.*b']},
+                    {'url': server.url('/missing'), 'patterns': ['a.*b', 'eggs.*']},
+                ], engine = engine, max_page_size = 4000)
+
+                results = dict(watchdog.probe())
+
+                self.assertEqual([results[i].result for i in range(3)], [ProbeResult.MATCH, ProbeResult.MATCH, ProbeResult.CONTENT_ERROR])
+                self.assertEqual(results[2].reason, "Page size exceeds the limit of 4000 bytes")
+        finally:
+            server.close()
+
+    def test_send_request_should_retry_on_a_new_connection_if_a_pooled_one_has_been_closed(self):
+        server = LoopbackServer(lambda path, headers: [b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nspam'], idle_timeout = 0.1)
+        try:
+            watchdog = HttpWatchdog(100, [{'url': server.url('/'), 'patterns': ['spam']}])
+            watchdog._connection_pool = UncheckedConnectionPool(4, 60, 5)
+
+            [(page_index, result_1)] = watchdog.probe()
+
+            # The server closes the connection waiting in the pool
+            time.sleep(0.3)
+            [(page_index, result_2)] = watchdog.probe()
+
+            self.assertEqual([result_1.result, result_2.result], [ProbeResult.MATCH, ProbeResult.MATCH])
+            self.assertNotEqual(result_2.timings.connect, None)
+            self.assertEqual(server.connections, 2)
+            self.assertEqual(len(server.requests), 2)
+            self.assertEqual((watchdog._connection_pool.hits, watchdog._connection_pool.misses), (1, 2))
+        finally:
+            server.close()
+
+    def test_send_request_should_not_retry_on_a_new_connection(self):
+        server = LoopbackServer(lambda path, headers: [LoopbackServer.RESET])
+        try:
+            watchdog = HttpWatchdog(100, [{'url': server.url('/'), 'patterns': ['spam']}])
+
+            [(page_index, result)] = watchdog.probe()
+
+            self.assertEqual(result.result, ProbeResult.CONNECTION_ERROR)
+            self.assertEqual(server.connections, 1)
+        finally:
+            server.close()
+
+    def test_concurrent_probing_should_respect_max_host_connections_and_yield_one_result_per_page(self):
+        def respond(path, headers):
+            return [0.05, b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nspam']
+
+        servers = [LoopbackServer(respond), LoopbackServer(respond)]
+        try:
+            page_configs = [{'url': server.url('/{}'.format(i)), 'patterns': ['spam']} for server in servers for i in range(6)]
+
+            # Fetched together with the first page
+            page_configs.append({'url': servers[0].url('/0#top'), 'patterns': ['eggs']})
+
+            for (engine, workers) in [('blocking', 8), ('asyncio', 1)]:
+                watchdog = HttpWatchdog(100, page_configs, workers = workers, max_host_connections = 2, engine = engine)
+
+                for cycle in range(2):
+                    results = list(watchdog.probe())
+
+                    self.assertEqual(sorted(page_index for (page_index, result) in results), list(range(len(page_configs))))
+                    self.assertEqual([result.result for (page_index, result) in sorted(results)], [ProbeResult.MATCH] * 12 + [ProbeResult.NO_MATCH])
+
+            for server in servers:
+                self.assertEqual(len(server.requests), 2 * 2 * 6)
+                self.assertEqual(server.max_active_requests, 2)
+        finally:
+            for server in servers:
+                server.close()
+
+    def test_concurrent_probing_should_reuse_worker_threads_and_not_wait_for_running_probes_when_stopped(self):
+        def respond(path, headers):
+            return ([2.0] if path == '/slow' else []) + [b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nspam']
+
+        server = LoopbackServer(respond)
+        try:
+            watchdog = HttpWatchdog(100, [
+                {'url': server.url('/fast'), 'patterns': ['spam']},
+                {'url': server.url('/slow'), 'patterns': ['spam']},
+            ], workers = 2)
+
+            list(watchdog._probe_groups([(0, time.time())]))
+            worker_pool = watchdog._worker_pool
+            list(watchdog._probe_groups([(0, time.time())]))
+            self.assertIs(watchdog._worker_pool, worker_pool)
+
+            results = watchdog.probe()
+            (page_index, result) = next(results)
+
+            start_time = time.time()
+            results.close()
+
+            self.assertEqual(page_index, 0)
+            self.assertLess(time.time() - start_time, 1)
+            self.assertEqual(watchdog._worker_pool, None)
+
+            watchdog.close()
+        finally:
+            server.close()
+
+    def test_run_forever_should_keep_probing_other_pages_while_a_probe_hangs_and_not_wait_for_it_when_interrupted(self):
+        hanging_server = LoopbackServer(lambda path, headers: [5.0, b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nspam'])
+        fast_server    = LoopbackServer(lambda path, headers: [b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nspam'])
+        try:
+            for engine in ENGINES:
+                watchdog = HttpWatchdog(100, [
+                    {'url': hanging_server.url('/{}'.format(engine)), 'patterns': ['spam'], 'interval': 0.1},
+                    {'url': fast_server.url('/{}'.format(engine)), 'patterns': ['spam'], 'interval': 0.1},
+                ], workers = 2, engine = engine)
+
+                exception_queue = Queue()
+                interrupt       = KeyboardInterrupt()
+                Timer(1.0, exception_queue.put, [(KeyboardInterrupt, interrupt, None)]).start()
+
+                start_time = time.time()
+                with self.assertRaises(KeyboardInterrupt):
+                    watchdog.run_forever(exception_queue)
+                run_time = time.time() - start_time
+
+                watchdog.close()
+
+                # The hanging probe is abandoned rather than awaited
+                self.assertLess(run_time, 2)
+                self.assertEqual(watchdog.probe_results[0], None)
+                self.assertEqual(watchdog.probe_results[1].result, ProbeResult.MATCH)
+                self.assertGreaterEqual(sum(1 for (path, headers) in fast_server.requests if path == '/' + engine), 5)
+        finally:
+            hanging_server.close()
+            fast_server.close()
+
+    def test_store_result_should_update_results_versions_and_history(self):
+        result   = ProbeRecord(ProbeResult.NO_MATCH, 200, 'OK', 1000.0, 0.25, 0, False, None)
+        watchdog = HttpWatchdog(100, [{'url': 'http://google.pl/', 'patterns': ['spam']}], connection_timeout = 2)
+
+        watchdog.store_result(0, result)
+
+        self.assertEqual(watchdog.probe_results[0], result)
+        self.assertEqual(watchdog.probe_results_version, 1)
+        self.assertEqual(len(watchdog._probe_history._buffers[0]), 1)
+        self.assertEqual(watchdog._shard_settings['connection_timeout'], 2)
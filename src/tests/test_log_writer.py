@@ -0,0 +1,76 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import threading
+
+from ..log_writer import LogWriter, BatchedRotatingFileHandler
+
+class LogWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.logger    = logging.getLogger('test_log_writer')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        self.logger.handlers = []
+        shutil.rmtree(self.directory)
+
+    def _read_log(self, file_name):
+        with open(os.path.join(self.directory, file_name)) as log_file:
+            return log_file.read().splitlines()
+
+    def test_stop_should_write_all_records_to_handlers_that_accept_their_level(self):
+        debug_handler = BatchedRotatingFileHandler(os.path.join(self.directory, 'debug.log'))
+        error_handler = BatchedRotatingFileHandler(os.path.join(self.directory, 'error.log'))
+        error_handler.setLevel(logging.ERROR)
+
+        log_writer = LogWriter([debug_handler, error_handler])
+        self.logger.addHandler(log_writer.handler())
+        log_writer.start()
+
+        for i in range(100):
+            self.logger.debug("Line %d", i)
+        self.logger.error("Failure")
+
+        log_writer.stop()
+
+        self.assertEqual(self._read_log('debug.log'), ["Line {}".format(i) for i in range(100)] + ["Failure"])
+        self.assertEqual(self._read_log('error.log'), ["Failure"])
+
+    def test_batched_rotating_file_handler_should_rotate_files(self):
+        handler    = BatchedRotatingFileHandler(os.path.join(self.directory, 'watchdog.log'), maxBytes = 100, backupCount = 2)
+        log_writer = LogWriter([handler])
+        self.logger.addHandler(log_writer.handler())
+        log_writer.start()
+
+        for i in range(100):
+            self.logger.info("Line %02d", i)
+
+        log_writer.stop()
+
+        self.assertEqual(sorted(os.listdir(self.directory)), ['watchdog.log', 'watchdog.log.1', 'watchdog.log.2'])
+        self.assertEqual(self._read_log('watchdog.log')[-1], "Line 99")
+
+    def test_records_should_be_formatted_in_the_thread_of_the_writer(self):
+        class ThreadRecordingArgument:
+            formatting_threads = []
+
+            def __str__(self):
+                self.formatting_threads.append(threading.current_thread().name)
+                return 'argument'
+
+        handler    = BatchedRotatingFileHandler(os.path.join(self.directory, 'watchdog.log'))
+        log_writer = LogWriter([handler])
+        # Only the handler of the writer, so that no other handler (e.g. one of a test runner) formats the record
+        self.logger.handlers = [log_writer.handler()]
+        log_writer.start()
+
+        self.logger.info("Formatted %s", ThreadRecordingArgument())
+
+        log_writer.stop()
+
+        self.assertEqual(self._read_log('watchdog.log'), ["Formatted argument"])
+        self.assertEqual(ThreadRecordingArgument.formatting_threads, ['LogWriter'])
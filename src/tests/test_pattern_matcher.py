@@ -0,0 +1,90 @@
+import unittest
+
+from ..pattern_matcher import PatternMatcher, PatternCache, ahocorasick
+
+class EagerAutomatonPatternMatcher(PatternMatcher):
+    MIN_AUTOMATON_LITERALS = 1
+
+class PatternMatcherTest(unittest.TestCase):
+    def test_as_literal_should_return_plain_text_unchanged(self):
+        self.assertEqual(PatternMatcher.as_literal('<body'), '<body')
+        self.assertEqual(PatternMatcher.as_literal('"csi"'), '"csi"')
+        self.assertEqual(PatternMatcher.as_literal('Leoš Janáček'), 'Leoš Janáček')
+
+    def test_as_literal_should_unescape_punctuation(self):
+        self.assertEqual(PatternMatcher.as_literal('window\\._\\._'), 'window._._')
+        self.assertEqual(PatternMatcher.as_literal('function\\(\\)'), 'function()')
+
+    def test_as_literal_should_reject_regular_expressions(self):
+        self.assertEqual(PatternMatcher.as_literal('#\\d\\d\\d'), None)
+        self.assertEqual(PatternMatcher.as_literal('function\\(\\)\\{.*\\}'), None)
+        self.assertEqual(PatternMatcher.as_literal('spam|eggs'), None)
+        self.assertEqual(PatternMatcher.as_literal('(?i)spam'), None)
+        self.assertEqual(PatternMatcher.as_literal('^spam'), None)
+        self.assertEqual(PatternMatcher.as_literal('spam\\'), None)
+
+    def test_max_match_length_should_be_none_for_unbounded_or_context_dependent_patterns(self):
+        self.assertEqual(PatternMatcher.max_match_length('window\\._'), 8)
+        self.assertEqual(PatternMatcher.max_match_length('#\\d{3}|spam'), 4)
+        self.assertEqual(PatternMatcher.max_match_length('(?i)[a-z]{2,10}'), 10)
+
+        for pattern in ['<title>.*</title>', '[a-z]+', '(a+)\\1', '^spam', 'spam$', '(?m)^spam', '\\bspam', 'spam(?=eggs)', '(?<!a)spam']:
+            self.assertEqual(PatternMatcher.max_match_length(pattern), None, pattern)
+
+    def test_search_should_find_literals_and_regexes(self):
+        matcher = PatternMatcher(['spam', '#\\d\\d\\d', 'window\\._'])
+        matches = matcher.search('window._ and spam #123 spam', {0, 1, 2})
+
+        self.assertEqual(matches, {
+            0: (13, 'spam'),
+            1: (18, '#123'),
+            2: (0, 'window._')
+        })
+
+    def test_search_should_skip_patterns_that_are_not_pending(self):
+        matcher = PatternMatcher(['spam', 'eggs'])
+        matches = matcher.search('spam and eggs', {1})
+
+        self.assertEqual(matches, {1: (9, 'eggs')})
+
+    def test_search_should_not_report_patterns_that_are_not_found(self):
+        matcher = PatternMatcher(['spam', 'ham', 'h.m'])
+        matches = matcher.search('spam and eggs', {0, 1, 2})
+
+        self.assertEqual(matches, {0: (0, 'spam')})
+
+    @unittest.skipIf(ahocorasick == None, "pyahocorasick is not installed")
+    def test_search_with_automaton_should_find_first_occurrence_of_every_literal(self):
+        patterns = ['spam', 'pam', 'sp', 'eggs', 'ham', 'bacon', 'baked beans', 'lobster', 'spam']
+        matcher  = EagerAutomatonPatternMatcher(patterns)
+        self.assertTrue(matcher.uses_automaton)
+
+        matches = matcher.search('eggs, bacon and spam; spam, ham and eggs', set(range(len(patterns))))
+
+        self.assertEqual(matches, {
+            0: (16, 'spam'),
+            1: (17, 'pam'),
+            2: (16, 'sp'),
+            3: (0, 'eggs'),
+            4: (28, 'ham'),
+            5: (6, 'bacon'),
+            8: (16, 'spam')
+        })
+
+class PatternCacheTest(unittest.TestCase):
+    def test_identical_patterns_should_share_compiled_regex(self):
+        cache = PatternCache()
+
+        self.assertIs(cache.regex('spam'), cache.regex('spam'))
+        self.assertIsNot(cache.regex('spam'), cache.regex('eggs'))
+
+    def test_identical_pattern_lists_should_share_matcher(self):
+        cache     = PatternCache()
+        matcher_1 = cache.matcher(['spam', 'eggs'])
+        matcher_2 = cache.matcher(['spam', 'eggs'])
+        matcher_3 = cache.matcher(['eggs', 'ham'])
+
+        self.assertIs(matcher_1, matcher_2)
+        self.assertIsNot(matcher_1, matcher_3)
+        self.assertIs(matcher_1.regexes[1], matcher_3.regexes[0])
+        self.assertEqual(cache.regex_count, 3)
@@ -0,0 +1,61 @@
+import unittest
+from concurrent.futures import Future
+
+from ..probe_dispatcher import ProbeDispatcher
+
+class ProbeDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.futures = {}
+
+    def start_probe(self, probe):
+        self.futures[probe] = Future()
+        return self.futures[probe]
+
+    def test_submit_should_queue_probes_of_hosts_without_free_connections(self):
+        dispatcher = ProbeDispatcher(2, self.start_probe)
+        for probe in ['a1', 'a2', 'a3', 'b1']:
+            dispatcher.submit(probe[0], probe)
+
+        self.assertEqual(sorted(self.futures.keys()), ['a1', 'a2', 'b1'])
+        self.assertEqual(len(dispatcher), 4)
+
+        self.futures['b1'].set_result('B')
+        self.assertEqual(dispatcher.take_finished(0), [('b1', self.futures['b1'])])
+
+        # A probe of a different host does not free a connection to 'a'
+        self.assertNotIn('a3', self.futures)
+
+        self.futures['a2'].set_result('A')
+        self.assertEqual(dispatcher.take_finished(), [('a2', self.futures['a2'])])
+        self.assertIn('a3', self.futures)
+        self.assertEqual(len(dispatcher), 2)
+
+    def test_take_finished_should_return_all_finished_probes_and_call_on_finished(self):
+        finished   = []
+        dispatcher = ProbeDispatcher(1, self.start_probe, finished.append)
+        for probe in ['a', 'b', 'c']:
+            dispatcher.submit(probe, probe)
+
+        self.assertEqual(dispatcher.take_finished(0), [])
+        self.assertEqual(dispatcher.take_finished(0.01), [])
+
+        self.futures['a'].set_result(None)
+        self.futures['c'].set_exception(ValueError())
+
+        self.assertEqual(sorted(probe for (probe, future) in dispatcher.take_finished()), ['a', 'c'])
+        self.assertEqual(finished, [self.futures['a'], self.futures['c']])
+
+    def test_take_finished_should_not_wait_without_probes(self):
+        self.assertEqual(ProbeDispatcher(1, self.start_probe).take_finished(), [])
+
+    def test_cancel_should_drop_queued_probes_and_cancel_running_ones(self):
+        dispatcher = ProbeDispatcher(1, self.start_probe)
+        for probe in ['a1', 'a2']:
+            dispatcher.submit('a', probe)
+
+        dispatcher.cancel()
+
+        self.assertTrue(self.futures['a1'].cancelled())
+        self.assertNotIn('a2', self.futures)
+        self.assertEqual(len(dispatcher), 0)
+        self.assertEqual(dispatcher.take_finished(), [])
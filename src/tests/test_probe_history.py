@@ -0,0 +1,66 @@
+import unittest
+
+from ..probe_history import ResultRingBuffer, ProbeHistory
+from ..probe_result  import ProbeResult, ProbeRecord
+
+class ResultRingBufferTest(unittest.TestCase):
+    def test_append_should_overwrite_oldest_results_when_full(self):
+        ring_buffer = ResultRingBuffer(3)
+        for i in range(5):
+            ring_buffer.append(float(i), ProbeResult.MATCH, 200, 0.5)
+
+        (timestamps, results, statuses, durations) = ring_buffer.snapshot()
+
+        self.assertEqual(len(ring_buffer), 3)
+        self.assertEqual(list(timestamps), [2.0, 3.0, 4.0])
+
+    def test_append_should_store_missing_status_and_duration(self):
+        ring_buffer = ResultRingBuffer(3)
+        ring_buffer.append(1.0, ProbeResult.CONNECTION_ERROR, None, None)
+
+        (timestamps, results, statuses, durations) = ring_buffer.snapshot()
+
+        self.assertEqual(list(results), [ProbeResult.CONNECTION_ERROR])
+        self.assertEqual(list(statuses), [-1])
+        self.assertNotEqual(durations[0], durations[0])
+
+class ProbeHistoryTest(unittest.TestCase):
+    @classmethod
+    def _result(cls, result, request_duration):
+        return ProbeRecord(result, 200, 'OK', 0, request_duration, 0, False, None)
+
+    def test_capacity_should_respect_memory_budget(self):
+        probe_history = ProbeHistory(10, 10 * 100 * ResultRingBuffer.ENTRY_SIZE)
+        self.assertEqual(probe_history.capacity, 100)
+
+    def test_statistics_should_include_only_results_within_the_window(self):
+        probe_history = ProbeHistory(1, 1024 * 1024)
+        for i in range(1, 101):
+            probe_history.record(0, 1000.0 + i, self._result(ProbeResult.MATCH, i / 1000))
+
+        probe_history.record(0, 1101.0, self._result(ProbeResult.NO_MATCH, 1.0))
+        probe_history.record(0, 1102.0, self._result(ProbeResult.CONNECTION_ERROR, None))
+
+        statistics = probe_history.statistics(0, [12, 1000], 1102.0)
+
+        self.assertEqual(statistics[12]['probe_count'], 12)
+        self.assertAlmostEqual(statistics[12]['uptime'], 10 / 12)
+        self.assertEqual(statistics[1000]['probe_count'], 102)
+        self.assertAlmostEqual(statistics[1000]['p50'], 0.051, places = 5)
+        self.assertAlmostEqual(statistics[1000]['p95'], 0.096, places = 5)
+        self.assertAlmostEqual(statistics[1000]['p99'], 0.1,   places = 5)
+
+    def test_statistics_should_be_none_for_windows_without_probes(self):
+        probe_history = ProbeHistory(2, 1024 * 1024)
+        probe_history.record(0, 10.0, self._result(ProbeResult.MATCH, 0.1))
+
+        self.assertEqual(probe_history.statistics(0, [5], 100.0), {5: None})
+        self.assertEqual(probe_history.statistics(1, [5], 100.0), {5: None})
+
+    def test_percentiles_should_match_nearest_rank_of_sorted_values(self):
+        values = [float(value % 37) for value in range(1000)] + [0.5] * 100
+        for size in [1, 2, 3, 10, 99, 1100]:
+            sorted_values = sorted(values[:size])
+            expected      = {percentile: sorted_values[max(0, -(-percentile * size // 100) - 1)] for percentile in [1, 50, 95, 99, 100]}
+
+            self.assertEqual(ProbeHistory._percentiles(values[:size], [1, 50, 95, 99, 100]), expected)
@@ -0,0 +1,90 @@
+import random
+import unittest
+
+from ..probe_scheduler import ProbeScheduler
+
+class ProbeSchedulerWithoutJitter(ProbeScheduler):
+    JITTER_FRACTION = 0
+
+class ProbeSchedulerTest(unittest.TestCase):
+    def test_pop_due_should_return_only_items_past_their_deadline(self):
+        scheduler = ProbeSchedulerWithoutJitter()
+        scheduler.add('a', 10, 100)
+        scheduler.add('b', 10, 105)
+
+        self.assertEqual(scheduler.pop_due(99), [])
+        self.assertEqual(scheduler.pop_due(101), [('a', 100)])
+        self.assertEqual(scheduler.next_deadline, 105)
+        self.assertEqual(scheduler.pop_due(200), [('b', 105)])
+        self.assertEqual(scheduler.next_deadline, None)
+
+    def test_reschedule_should_not_accumulate_probing_time(self):
+        scheduler = ProbeSchedulerWithoutJitter()
+        scheduler.add('a', 10, 100)
+
+        scheduler.pop_due(100)
+        skipped = scheduler.reschedule('a', 103)
+
+        self.assertEqual(skipped, 0)
+        self.assertEqual(scheduler.next_deadline, 110)
+
+    def test_reschedule_should_skip_deadlines_missed_due_to_overrun(self):
+        scheduler = ProbeSchedulerWithoutJitter()
+        scheduler.add('a', 10, 100)
+
+        scheduler.pop_due(100)
+        skipped = scheduler.reschedule('a', 125)
+
+        self.assertEqual(skipped, 2)
+        self.assertEqual(scheduler.next_deadline, 130)
+
+    def test_items_should_have_separate_intervals(self):
+        scheduler = ProbeSchedulerWithoutJitter()
+        scheduler.add('fast', 1, 0)
+        scheduler.add('slow', 5, 0)
+
+        probes = []
+        for now in range(10):
+            for (item, deadline) in scheduler.pop_due(now):
+                probes.append(item)
+                scheduler.reschedule(item, now)
+
+        self.assertEqual(probes.count('fast'), 10)
+        self.assertEqual(probes.count('slow'), 2)
+
+    def test_zero_interval_should_make_item_due_immediately(self):
+        scheduler = ProbeSchedulerWithoutJitter()
+        scheduler.add('a', 0, 100)
+
+        scheduler.pop_due(100)
+        scheduler.reschedule('a', 107)
+
+        self.assertEqual(scheduler.pop_due(107), [('a', 107)])
+
+    def test_jitter_should_stay_within_bounds_and_not_accumulate(self):
+        scheduler = ProbeScheduler(random.Random(0))
+        scheduler.add('a', 100, 0)
+
+        first_deadline = scheduler.next_deadline
+        self.assertTrue(0 <= first_deadline <= 100 * ProbeScheduler.JITTER_FRACTION)
+
+        for cycle in range(1, 1000):
+            [(item, deadline)] = scheduler.pop_due(float('inf'))
+            scheduler.reschedule('a', deadline)
+
+            expected_deadline = first_deadline + cycle * 100
+            self.assertLessEqual(abs(scheduler.next_deadline - expected_deadline), 100 * ProbeScheduler.JITTER_FRACTION / 2)
+
+    def test_rename_should_keep_deadlines_and_drop_missing_items(self):
+        scheduler = ProbeSchedulerWithoutJitter()
+        scheduler.add('a', 10, 100)
+        scheduler.add('b', 20, 105)
+        scheduler.add('c', 30, 110)
+
+        scheduler.rename({'a': 'x', 'c': 'a'})
+
+        self.assertEqual(len(scheduler), 2)
+        self.assertEqual(scheduler.pop_due(200), [('x', 100), ('a', 110)])
+        scheduler.reschedule('x', 200)
+        scheduler.reschedule('a', 200)
+        self.assertEqual(scheduler.pop_due(1000), [('x', 210), ('a', 230)])
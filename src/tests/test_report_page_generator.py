@@ -0,0 +1,54 @@
+import unittest
+
+from ..report_page_generator import ReportPageGenerator
+from ..probe_result          import ProbeResult, ProbeRecord
+from ..page_table            import PageConfig
+
+class StaticProbeDataProvider:
+    def __init__(self):
+        self.probe_results_version = 0
+        self.statistics_requests   = 0
+        self.page_configs          = [PageConfig('http://google.pl/', (), 60)]
+        self.probe_results         = [ProbeRecord(
+            result           = ProbeResult.MATCH,
+            http_status      = 200,
+            reason           = 'OK',
+            last_probed_at   = 946684800.0,
+            request_duration = 0.1,
+            scheduler_lag    = 0,
+            revalidated      = False,
+            timings          = None
+        )]
+
+    @property
+    def page_table(self):
+        # The provider has all the attributes of a PageTable
+        return self
+
+    @property
+    def probe_statistics(self):
+        self.statistics_requests += 1
+        return [{ReportPageGenerator.HOUR: None, ReportPageGenerator.DAY: None}]
+
+class ReportPageGeneratorTest(unittest.TestCase):
+    def setUp(self):
+        ReportPageGenerator._report_cache = (None, None)
+
+    def test_cached_report_should_generate_report_only_when_version_changes(self):
+        provider = StaticProbeDataProvider()
+
+        first_report  = ReportPageGenerator.cached_report(provider)
+        second_report = ReportPageGenerator.cached_report(provider)
+        self.assertIs(first_report, second_report)
+        self.assertEqual(provider.statistics_requests, 1)
+
+        provider.probe_results_version += 1
+        ReportPageGenerator.cached_report(provider)
+        self.assertEqual(provider.statistics_requests, 2)
+
+    def test_generate_report_should_pass_probe_time_to_the_client_as_epoch_milliseconds(self):
+        provider = StaticProbeDataProvider()
+        report   = ReportPageGenerator.generate_report(provider.probe_results, provider.probe_statistics, provider.page_configs, 0)
+
+        self.assertIn("data-timestamp='946684800000'", report)
+        self.assertIn("title='2000-01-01 00:00:00 UTC'", report)
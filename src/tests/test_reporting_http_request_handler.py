@@ -0,0 +1,15 @@
+import unittest
+
+from ..reporting_http_request_handler import ReportingHTTPRequestHandler
+
+class ReportingHTTPRequestHandlerTest(unittest.TestCase):
+    def test_accepts_gzip_should_detect_gzip_among_other_codings(self):
+        self.assertTrue(ReportingHTTPRequestHandler._accepts_gzip('gzip'))
+        self.assertTrue(ReportingHTTPRequestHandler._accepts_gzip('deflate, GZIP;q=0.5, br'))
+        self.assertTrue(ReportingHTTPRequestHandler._accepts_gzip('x-gzip'))
+
+    def test_accepts_gzip_should_reject_missing_or_refused_gzip(self):
+        self.assertFalse(ReportingHTTPRequestHandler._accepts_gzip(None))
+        self.assertFalse(ReportingHTTPRequestHandler._accepts_gzip('identity'))
+        self.assertFalse(ReportingHTTPRequestHandler._accepts_gzip('gzip;q=0'))
+        self.assertFalse(ReportingHTTPRequestHandler._accepts_gzip('gzip; q=0.000, deflate'))
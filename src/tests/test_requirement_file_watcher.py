@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..requirement_file_watcher import RequirementFileWatcher
+from ..settings_manager         import ConfigurationError
+
+class RequirementFileWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path      = os.path.join(self.directory, 'pages.yaml')
+        self.changes   = []
+
+        self._write('spam', 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, content, modification_time):
+        with open(self.path, 'w') as requirement_file:
+            requirement_file.write(content)
+
+        os.utime(self.path, (modification_time, modification_time))
+
+    def _read_page_configs(self):
+        with open(self.path) as requirement_file:
+            content = requirement_file.read()
+
+        if content == 'invalid':
+            raise ConfigurationError("Invalid requirement file")
+
+        return [{'url': 'http://google.pl/', 'patterns': [content]}]
+
+    def test_check_should_read_file_only_if_modified_or_forced(self):
+        watcher = RequirementFileWatcher(self.path, self._read_page_configs, self.changes.append, 0)
+
+        watcher.check(False)
+        self.assertEqual(self.changes, [])
+
+        self._write('eggs', 2000)
+        watcher.check(False)
+        watcher.check(False)
+        watcher.check(True)
+
+        self.assertEqual([page_configs[0]['patterns'] for page_configs in self.changes], [['eggs'], ['eggs']])
+
+    def test_check_should_keep_previous_pages_if_file_is_invalid_or_missing(self):
+        watcher = RequirementFileWatcher(self.path, self._read_page_configs, self.changes.append, 0)
+
+        self._write('invalid', 2000)
+        with self.assertLogs('src.requirement_file_watcher', 'ERROR'):
+            watcher.check(False)
+
+        os.unlink(self.path)
+        with self.assertLogs('src.requirement_file_watcher', 'ERROR'):
+            watcher.check(False)
+
+        self._write('bacon', 3000)
+        watcher.check(False)
+
+        self.assertEqual([page_configs[0]['patterns'] for page_configs in self.changes], [['bacon']])
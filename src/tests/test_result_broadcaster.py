@@ -0,0 +1,62 @@
+import unittest
+
+from ..result_broadcaster import ResultBroadcaster
+
+class ResultBroadcasterTest(unittest.TestCase):
+    def test_publish_should_deliver_events_to_all_subscribers(self):
+        broadcaster    = ResultBroadcaster(10, 10)
+        subscription_1 = broadcaster.subscribe()
+        subscription_2 = broadcaster.subscribe()
+
+        broadcaster.publish(1, 0, 'result')
+
+        self.assertEqual(subscription_1.get(0), (1, 0, 'result'))
+        self.assertEqual(subscription_2.get(0), (1, 0, 'result'))
+        self.assertEqual(subscription_1.get(0), None)
+
+    def test_publish_should_drop_subscribers_that_fall_behind(self):
+        broadcaster  = ResultBroadcaster(2, 10)
+        subscription = broadcaster.subscribe()
+
+        for event_id in range(1, 4):
+            broadcaster.publish(event_id, 0, 'result')
+
+        self.assertTrue(subscription.dropped)
+        self.assertEqual(broadcaster.subscriber_count, 0)
+
+    def test_subscribe_should_replay_events_after_last_event_id(self):
+        broadcaster = ResultBroadcaster(10, 10)
+        for event_id in range(1, 6):
+            broadcaster.publish(event_id, event_id, 'result')
+
+        subscription = broadcaster.subscribe(3)
+
+        self.assertFalse(subscription.missed_events)
+        self.assertEqual(subscription.get(0), (4, 4, 'result'))
+        self.assertEqual(subscription.get(0), (5, 5, 'result'))
+        self.assertEqual(subscription.get(0), None)
+
+    def test_subscribe_should_report_events_that_cannot_be_replayed(self):
+        broadcaster = ResultBroadcaster(10, 3)
+        for event_id in range(1, 6):
+            broadcaster.publish(event_id, 0, 'result')
+
+        self.assertTrue(broadcaster.subscribe(1).missed_events)
+        self.assertFalse(broadcaster.subscribe(2).missed_events)
+        self.assertTrue(broadcaster.subscribe(100).missed_events)
+
+    def test_reset_should_prevent_resuming_from_earlier_events(self):
+        broadcaster  = ResultBroadcaster(10, 10)
+        subscription = broadcaster.subscribe()
+        for event_id in range(1, 4):
+            broadcaster.publish(event_id, 0, 'result')
+
+        broadcaster.reset(4)
+
+        self.assertTrue(subscription.missed_events)
+        self.assertEqual([subscription.get(0) for i in range(4)][-1], ResultBroadcaster.RESET_EVENT)
+        self.assertTrue(broadcaster.subscribe(3).missed_events)
+        self.assertFalse(broadcaster.subscribe(4).missed_events)
+
+        broadcaster.publish(5, 0, 'result')
+        self.assertEqual(broadcaster.subscribe(4).get(0), (5, 0, 'result'))
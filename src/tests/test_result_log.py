@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..result_log   import ResultLog
+from ..probe_result import ProbeResult, ProbeRecord, ProbeTimings
+
+class ResultLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @classmethod
+    def _result(cls, result, http_status, request_duration, reason = 'OK', timings = None):
+        return ProbeRecord(
+            result           = result,
+            http_status      = http_status,
+            reason           = reason,
+            last_probed_at   = None,
+            request_duration = request_duration,
+            scheduler_lag    = 0.5,
+            revalidated      = False,
+            timings          = timings
+        )
+
+    def test_restore_should_return_latest_result_and_history_of_each_page(self):
+        page_1 = ResultLog.page_key('http://google.pl/', ['spam'])
+        page_2 = ResultLog.page_key('http://google.pl/', ['eggs'])
+
+        result_log = ResultLog(self.directory, 1024 * 1024, 1024 * 1024)
+        result_log.append(page_1, 100.0, self._result(ProbeResult.MATCH, 200, 0.25))
+        result_log.append(page_2, 101.0, self._result(ProbeResult.CONNECTION_ERROR, None, None, 'Connection refused'))
+        result_log.append(page_1, 102.0, self._result(ProbeResult.HTTP_ERROR, 404, 0.125, 'Not Found', ProbeTimings(None, 0.025, None, 0.1, 'cache', 0)))
+        result_log.close()
+
+        result_log = ResultLog(self.directory, 1024 * 1024, 1024 * 1024)
+        try:
+            (latest_results, history) = result_log.restore([page_1, page_2], 0)
+        finally:
+            result_log.close()
+
+        self.assertEqual(latest_results[page_1][0], 102.0)
+        self.assertIs(latest_results[page_1][1].result, ProbeResult.HTTP_ERROR)
+        self.assertEqual(latest_results[page_1][1].http_status, 404)
+        self.assertEqual(latest_results[page_1][1].reason, 'Not Found')
+        self.assertEqual(latest_results[page_1][1].scheduler_lag, 0.5)
+        self.assertEqual(latest_results[page_1][1].timings, ProbeTimings(None, 0.025, None, 0.1, 'cache', 0))
+        self.assertEqual(latest_results[page_2][1].http_status, None)
+        self.assertEqual(latest_results[page_2][1].request_duration, None)
+        self.assertEqual(latest_results[page_2][1].last_probed_at, 101.0)
+        self.assertEqual(latest_results[page_2][1].timings, None)
+        self.assertEqual(history[page_1], [(102.0, ProbeResult.HTTP_ERROR, 404, 0.125), (100.0, ProbeResult.MATCH, 200, 0.25)])
+
+    def test_restore_should_skip_history_older_than_since(self):
+        page = ResultLog.page_key('http://google.pl/', [])
+
+        result_log = ResultLog(self.directory, 1024 * 1024, 1024 * 1024)
+        for timestamp in range(10):
+            result_log.append(page, float(timestamp), self._result(ProbeResult.MATCH, 200, 0.25))
+        result_log.close()
+
+        (latest_results, history) = result_log.restore([page], 7)
+
+        self.assertEqual([entry[0] for entry in history[page]], [9.0, 8.0])
+
+    def test_opening_log_should_discard_incomplete_record(self):
+        page = ResultLog.page_key('http://google.pl/', [])
+
+        result_log = ResultLog(self.directory, 1024 * 1024, 1024 * 1024)
+        result_log.append(page, 1.0, self._result(ProbeResult.MATCH, 200, 0.25))
+        result_log.close()
+
+        segment_path = os.path.join(self.directory, ResultLog.SEGMENT_NAME_FORMAT.format(1))
+        valid_size   = os.path.getsize(segment_path)
+        with open(segment_path, 'ab') as segment_file:
+            segment_file.write(b'\x50\x00\x00\x00torn')
+
+        result_log = ResultLog(self.directory, 1024 * 1024, 1024 * 1024)
+        result_log.append(page, 2.0, self._result(ProbeResult.NO_MATCH, 200, 0.25))
+        result_log.close()
+
+        (latest_results, history) = result_log.restore([page], 0)
+
+        self.assertEqual(os.path.getsize(segment_path), valid_size * 2)
+        self.assertEqual([entry[0] for entry in history[page]], [2.0, 1.0])
+
+    def test_commit_should_start_new_segments_and_delete_oldest_ones(self):
+        page = ResultLog.page_key('http://google.pl/', [])
+
+        result_log = ResultLog(self.directory, 2000, 500)
+        for timestamp in range(100):
+            result_log.append(page, float(timestamp), self._result(ProbeResult.MATCH, 200, 0.25))
+            result_log.commit()
+        result_log.close()
+
+        sizes = [os.path.getsize(os.path.join(self.directory, file_name)) for file_name in os.listdir(self.directory)]
+        (latest_results, history) = result_log.restore([page], -1)
+
+        self.assertLessEqual(sum(sizes), 2000)
+        self.assertGreater(len(sizes), 1)
+        self.assertEqual(latest_results[page][0], 99.0)
+        self.assertLess(len(history[page]), 100)
+
+    def test_restore_should_not_look_for_latest_results_older_than_latest_since(self):
+        page     = ResultLog.page_key('http://google.pl/', [])
+        new_page = ResultLog.page_key('http://google.pl/new', [])
+
+        result_log = ResultLog(self.directory, 1024 * 1024, 1024 * 1024)
+        for timestamp in range(100):
+            result_log.append(page if timestamp != 50 else new_page, float(timestamp), self._result(ProbeResult.MATCH, 200, 0.25))
+        result_log.close()
+
+        class CountingResultLog(ResultLog):
+            records_read = 0
+
+            @classmethod
+            def _record_start(cls, data, end):
+                cls.records_read += 1
+                return super()._record_start(data, end)
+
+        result_log = CountingResultLog(self.directory, 1024 * 1024, 1024 * 1024)
+        try:
+            CountingResultLog.records_read = 0
+            (latest_results, history) = result_log.restore([page, new_page, ResultLog.page_key('http://google.pl/never', [])], 90, 80)
+        finally:
+            result_log.close()
+
+        self.assertEqual(list(latest_results.keys()), [page])
+        self.assertEqual(len(history[page]), 9)
+        self.assertLessEqual(CountingResultLog.records_read, 22)
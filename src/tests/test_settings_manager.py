@@ -0,0 +1,174 @@
+import os
+import json
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from ..settings_manager import SettingsManager, ConfigurationError
+
+class CountingSettingsManager(SettingsManager):
+    """ A SettingsManager that counts how many times the requirement file gets parsed """
+
+    parse_count = 0
+
+    @classmethod
+    def _load_requirement_file(cls, content, file_name):
+        cls.parse_count += 1
+        return super()._load_requirement_file(content, file_name)
+
+class SettingsManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory  = tempfile.mkdtemp()
+        self.path       = os.path.join(self.directory, 'pages.yaml')
+        self.cache_path = os.path.join(self.directory, 'cache')
+
+        CountingSettingsManager.parse_count = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _read(self, content, *arguments):
+        with open(self.path, 'w') as requirement_file:
+            requirement_file.write(content)
+
+        command_line_namespace = CountingSettingsManager._parse_command_line([self.path, '--config-cache', self.cache_path] + list(arguments))
+        return CountingSettingsManager._read_and_validate(command_line_namespace)
+
+    def test_read_and_validate_should_merge_file_and_command_line(self):
+        (settings, warnings) = self._read(
+            "workers: 4\n"
+            "port: 8080\n"
+            "pages:\n"
+            "  - url: 'http://google.pl/'\n"
+            "    patterns: ['spam']\n"
+            "  - url: 'https://google.pl/'\n"
+            "    patterns: []\n"
+            "    interval: 60\n",
+            '--port', '9000'
+        )
+
+        self.assertEqual(settings['pages'], [
+            {'url': 'http://google.pl/', 'patterns': ['spam']},
+            {'url': 'https://google.pl/', 'patterns': [], 'interval': 60},
+        ])
+        self.assertEqual(settings['workers'], 4)
+        self.assertEqual(settings['port'], 9000)
+        self.assertEqual(warnings, ["line 6: No patterns specified for url https://google.pl/."])
+
+    def test_read_and_validate_should_accept_a_positive_connection_timeout(self):
+        content = "connection-timeout: 5\npages:\n  - url: 'http://google.pl/'\n    patterns: ['spam']\n"
+
+        self.assertEqual(self._read(content)[0]['connection_timeout'], 5)
+        self.assertEqual(self._read(content, '--connection-timeout', '7')[0]['connection_timeout'], 7)
+        self.assertEqual(self._read(content.replace('connection-timeout: 5', 'workers: 1'))[0]['connection_timeout'], 30)
+
+        with self.assertRaises(ConfigurationError) as context:
+            self._read(content, '--connection-timeout', '0')
+
+        self.assertIn("'connection-timeout'", str(context.exception))
+
+    def test_read_and_validate_should_report_all_invalid_pages_with_line_numbers(self):
+        with self.assertRaises(ConfigurationError) as context:
+            self._read(
+                "pages:\n"
+                "  - url: 'ftp://google.pl/'\n"
+                "    patterns: ['spam']\n"
+                "  - url: 'http://google.pl/'\n"
+                "    patterns: ['spam']\n"
+                "  - url: 'http://google.pl/'\n"
+                "    interval: -1\n"
+                "  - url: 'http://google.pl/'\n"
+                "    patterns: ['spam']\n"
+                "    interval: true\n"
+            )
+
+        self.assertEqual(str(context.exception).split('\n'), [
+            "line 2: Unsupported protocol: 'ftp'",
+            "line 6: Page config is missing 'patterns' key",
+            "line 6: 'interval' must be a non-negative integer (got -1 for url http://google.pl/)",
+            "line 8: 'interval' must be a non-negative integer (got True for url http://google.pl/)",
+        ])
+
+    def test_read_and_validate_should_reject_booleans_as_numeric_settings(self):
+        with self.assertRaises(ConfigurationError):
+            self._read(
+                "probe-interval: true\n"
+                "pages:\n"
+                "  - url: 'http://google.pl/'\n"
+                "    patterns: ['spam']\n"
+            )
+
+    def test_read_and_validate_should_accept_cluster_peers_from_file_or_command_line(self):
+        content = (
+            "cluster-peers: ['127.0.0.1:8001', '127.0.0.1:8002']\n"
+            "pages:\n"
+            "  - url: 'http://google.pl/'\n"
+            "    patterns: ['spam']\n"
+        )
+
+        (settings_1, warnings_1) = self._read(content, '--cluster-node', '127.0.0.1:8002')
+        (settings_2, warnings_2) = self._read(content, '--cluster-node', '[::1]:8003', '--cluster-peers', '[::1]:8003, [::1]:8004')
+
+        self.assertEqual(settings_1['cluster_peers'], ['127.0.0.1:8001', '127.0.0.1:8002'])
+        self.assertEqual(settings_2['cluster_peers'], ['[::1]:8003', '[::1]:8004'])
+
+        for arguments in [['--cluster-node', '127.0.0.1:8003'], ['--cluster-peers', 'localhost']]:
+            with self.assertRaises(ConfigurationError):
+                self._read(content, *arguments)
+
+    def test_read_and_validate_should_report_yaml_syntax_errors(self):
+        with self.assertRaises(ConfigurationError) as context:
+            self._read("pages:\n  - url: [\n")
+
+        self.assertIn('"{}", line 3'.format(self.path), str(context.exception))
+
+    def test_read_and_validate_should_parse_unchanged_file_only_once(self):
+        content = "pages:\n  - url: 'http://google.pl/'\n    patterns: ['spam']\n"
+
+        (settings_1, warnings_1) = self._read(content)
+        (settings_2, warnings_2) = self._read(content, '--workers', '2')
+        (settings_3, warnings_3) = self._read(content.replace('spam', 'eggs'))
+
+        self.assertEqual(CountingSettingsManager.parse_count, 2)
+        self.assertEqual(settings_2['pages'], settings_1['pages'])
+        self.assertEqual(settings_2['workers'], 2)
+        self.assertEqual(settings_3['pages'][0]['patterns'], ['eggs'])
+
+    def test_read_and_validate_should_not_cache_anything_unless_a_cache_directory_is_given(self):
+        content = "pages:\n  - url: 'http://google.pl/'\n    patterns: ['spam']\n"
+        with open(self.path, 'w') as requirement_file:
+            requirement_file.write(content)
+
+        command_line_namespace = CountingSettingsManager._parse_command_line([self.path])
+        for i in range(2):
+            CountingSettingsManager._read_and_validate(command_line_namespace)
+
+        self.assertEqual(command_line_namespace.config_cache, None)
+        self.assertEqual(CountingSettingsManager.parse_count, 2)
+
+    def test_read_and_validate_should_store_snapshots_as_json_and_ignore_unexpected_ones(self):
+        content = "pages:\n  - url: 'http://google.pl/'\n    patterns: ['spam']\n"
+
+        self._read(content)
+
+        [snapshot_name] = os.listdir(self.cache_path)
+        with open(os.path.join(self.cache_path, snapshot_name)) as snapshot_file:
+            self.assertEqual(json.load(snapshot_file)['requirements']['pages'][0]['patterns'], ['spam'])
+
+        with open(os.path.join(self.cache_path, snapshot_name), 'wb') as snapshot_file:
+            snapshot_file.write(pickle.dumps(({'pages': []}, [])))
+
+        (settings, warnings) = self._read(content)
+
+        self.assertEqual(CountingSettingsManager.parse_count, 2)
+        self.assertEqual(settings['pages'][0]['patterns'], ['spam'])
+
+    def test_read_and_validate_should_not_cache_invalid_files(self):
+        content = "pages: []\n"
+
+        for i in range(2):
+            with self.assertRaises(ConfigurationError):
+                self._read(content)
+
+        self.assertEqual(CountingSettingsManager.parse_count, 2)
@@ -0,0 +1,42 @@
+import sys
+import time
+import unittest
+
+from ..shard_supervisor    import ShardSupervisor
+from ..shared_result_table import SharedResultTable
+from ..probe_result        import ProbeResult, ProbeRecord
+
+def probe_once_and_crash(shard_index, table_name, page_count, page_indices, page_configs, settings, connection, log_queue, log_level):
+    """ Stands in for run_shard(). Stores a single result in the table, reports it and exits with an error. """
+
+    table = SharedResultTable(page_count, table_name)
+    table[page_indices[0]] = ProbeRecord(ProbeResult.MATCH, 200, 'OK', time.time(), 0.25, 0.0, False, None)
+    table.close()
+
+    connection.send((page_indices[:1], 0.5, 0.0, 0))
+    sys.exit(1)
+
+class QuickShardSupervisor(ShardSupervisor):
+    MIN_RESTART_DELAY = 0.1
+
+class ShardSupervisorTest(unittest.TestCase):
+    def test_supervisor_should_pass_messages_on_and_restart_processes_that_exit(self):
+        table      = SharedResultTable(3)
+        supervisor = QuickShardSupervisor(2, probe_once_and_crash)
+        try:
+            with self.assertLogs('src.shard_supervisor', 'ERROR'):
+                supervisor.start(table, [([0, 1], []), ([2], [])], {})
+
+                messages = []
+                deadline = time.time() + 30
+                while len(messages) < 4 and time.time() < deadline:
+                    messages.extend(supervisor.poll(0.1))
+
+            self.assertGreaterEqual(len(messages), 4)
+            self.assertEqual(sorted(set(tuple(page_indices) for (page_indices, duration, max_lag, skipped_deadlines) in messages)), [(0,), (2,)])
+            self.assertEqual(table[0].result, ProbeResult.MATCH)
+            self.assertEqual(table[1], None)
+        finally:
+            supervisor.stop()
+            table.close()
+            table.unlink()
@@ -0,0 +1,74 @@
+import unittest
+
+from ..shared_result_table import SharedResultTable
+from ..probe_result        import ProbeResult, ProbeRecord, ProbeTimings
+
+class SharedResultTableTest(unittest.TestCase):
+    def setUp(self):
+        self.table = SharedResultTable(4)
+
+    def tearDown(self):
+        self.table.close()
+        self.table.unlink()
+
+    def test_table_should_store_records(self):
+        timings = ProbeTimings(dns = 0.001, connect = 0.02, tls = None, ttfb = 0.1, dns_source = 'cache', download = 0.01)
+        records = [
+            ProbeRecord(ProbeResult.MATCH, 304, 'Not Modified', 1000.5, 0.125, 0.0625, True, timings),
+            ProbeRecord(ProbeResult.CONNECTION_ERROR, None, 'Connection refused', 1001.5, None, 0.0, False, None),
+        ]
+
+        self.table[1] = records[0]
+        self.table[3] = records[1]
+
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual([self.table[i] for i in range(4)], [None, records[0], None, records[1]])
+
+    def test_table_should_truncate_long_reasons_on_character_boundary(self):
+        self.table[0] = ProbeRecord(ProbeResult.CONNECTION_ERROR, None, 'ż' * 100, 1000.0, None, 0.0, False, None)
+
+        reason = self.table[0].reason
+        self.assertLessEqual(len(reason.encode('utf-8')), SharedResultTable.MAX_REASON_SIZE)
+        self.assertEqual(reason, 'ż' * len(reason))
+
+    def test_sequence_number_should_change_on_every_write(self):
+        record = ProbeRecord(ProbeResult.MATCH, 200, 'OK', 1000.0, 0.25, 0.0, False, None)
+
+        self.table[0] = record
+        (sequence_number_1, record_1) = self.table.read(0)
+        self.table[0] = record
+        (sequence_number_2, record_2) = self.table.read(0)
+        self.table[0] = None
+
+        self.assertEqual(self.table.read(1), (0, None))
+        self.assertNotEqual(sequence_number_1, sequence_number_2)
+        self.assertEqual(record_1, record_2)
+        self.assertEqual(self.table[0], None)
+
+    def test_table_should_be_visible_to_other_instances_attached_by_name(self):
+        record = ProbeRecord(ProbeResult.NO_MATCH, 200, 'OK', 1000.0, 0.25, 0.0, False, None)
+        other  = SharedResultTable(4, self.table.name)
+        try:
+            other.shard([2, 0])[1] = record
+
+            self.assertEqual(self.table[0], record)
+            self.assertEqual(len(other.shard([2, 0])), 2)
+        finally:
+            other.close()
+
+    def test_repair_should_complete_or_clear_interrupted_writes(self):
+        record = ProbeRecord(ProbeResult.MATCH, 200, 'OK', 1000.0, 0.25, 0.0, False, None)
+        self.table[0] = record
+        self.table[1] = record
+
+        # Simulate writers that crashed after writing the whole body and in the middle of it
+        for page_index in [0, 1]:
+            offset = page_index * SharedResultTable.SLOT_SIZE
+            SharedResultTable.SEQUENCE_NUMBER.pack_into(self.table._buffer, offset, self.table.sequence_number(page_index) + 1)
+        self.table._buffer[SharedResultTable.SLOT_SIZE + SharedResultTable.HEADER.size] = 3
+
+        self.assertEqual(self.table.repair([0, 1, 2]), 1)
+        self.assertEqual(self.table[0], record)
+        self.assertEqual(self.table[1], None)
+        self.assertEqual(self.table.sequence_number(0) % 2, 0)
+        self.assertEqual(self.table.sequence_number(1) % 2, 0)
@@ -0,0 +1,74 @@
+import json
+import unittest
+
+from ..status_api   import StatusApi
+from ..probe_result import ProbeResult, ProbeRecord
+from ..page_table   import PageConfig
+
+class VersionedProbeDataProvider:
+    def __init__(self):
+        self.probe_results_version = 0
+        self.page_configs          = [PageConfig('http://google.pl/{}'.format(i), (), 60) for i in range(3)]
+        self.probe_results         = [None] * 3
+        self.page_versions         = [0] * 3
+
+    @property
+    def page_table(self):
+        # The provider has all the attributes of a PageTable
+        return self
+
+    def replace_result(self, page_index, result):
+        self.probe_results[page_index] = ProbeRecord(
+            result           = result,
+            http_status      = 200,
+            reason           = 'OK',
+            last_probed_at   = 946684800.0,
+            request_duration = 0.1,
+            scheduler_lag    = 0,
+            revalidated      = False,
+            timings          = None
+        )
+        self.page_versions[page_index] = self.probe_results_version + 1
+        self.probe_results_version    += 1
+
+class StatusApiTest(unittest.TestCase):
+    def test_status_should_describe_all_pages_without_since(self):
+        provider = VersionedProbeDataProvider()
+        provider.replace_result(1, ProbeResult.NO_MATCH)
+
+        (content, etag) = StatusApi.status(provider)
+        document = json.loads(content)
+
+        self.assertEqual(document['version'], 1)
+        self.assertEqual([page['result'] for page in document['pages']], ['NOT PROBED YET', 'NO MATCH', 'NOT PROBED YET'])
+        self.assertEqual(document['pages'][1]['last_probed_at'], '2000-01-01T00:00:00Z')
+
+    def test_status_should_describe_only_pages_replaced_after_since(self):
+        provider = VersionedProbeDataProvider()
+        provider.replace_result(0, ProbeResult.MATCH)
+        provider.replace_result(2, ProbeResult.MATCH)
+        provider.replace_result(1, ProbeResult.MATCH)
+
+        document = json.loads(StatusApi.status(provider, 1)[0])
+
+        self.assertEqual(document['version'], 3)
+        self.assertEqual([page['index'] for page in document['pages']], [1, 2])
+
+    def test_status_should_describe_all_pages_if_since_is_from_the_future(self):
+        provider = VersionedProbeDataProvider()
+
+        document = json.loads(StatusApi.status(provider, 100)[0])
+
+        self.assertEqual(document['since'], None)
+        self.assertEqual(len(document['pages']), 3)
+
+    def test_status_etag_should_change_only_with_content(self):
+        provider = VersionedProbeDataProvider()
+
+        etag_1 = StatusApi.status(provider, 0)[1]
+        etag_2 = StatusApi.status(provider, 0)[1]
+        provider.replace_result(0, ProbeResult.MATCH)
+        etag_3 = StatusApi.status(provider, 0)[1]
+
+        self.assertEqual(etag_1, etag_2)
+        self.assertNotEqual(etag_2, etag_3)
@@ -0,0 +1,49 @@
+import ssl
+import unittest
+
+from ..tls_session_cache import TlsSessionCache
+
+class FakeSslObject:
+    """ Stands in for SSLSocket/SSLObject which can only be obtained from a real handshake """
+
+    def __init__(self, session, session_reused = False):
+        self.session        = session
+        self.session_reused = session_reused
+
+class TlsSessionCacheTest(unittest.TestCase):
+    def test_context_should_verify_certificates_by_default(self):
+        tls_sessions = TlsSessionCache()
+
+        self.assertEqual(tls_sessions.context.verify_mode, ssl.CERT_REQUIRED)
+        self.assertTrue(tls_sessions.context.check_hostname)
+
+    def test_context_should_skip_verification_if_disabled(self):
+        tls_sessions = TlsSessionCache(verify = 'none')
+
+        self.assertEqual(tls_sessions.context.verify_mode, ssl.CERT_NONE)
+        self.assertFalse(tls_sessions.context.check_hostname)
+
+    def test_session_should_be_offered_only_to_the_same_origin(self):
+        tls_sessions = TlsSessionCache()
+        tls_sessions.store('example.com', 443, FakeSslObject('session'))
+
+        with tls_sessions.origin('example.com', 443):
+            self.assertEqual(tls_sessions._session_for_current_origin(), 'session')
+
+            with tls_sessions.origin('example.com', 8443):
+                self.assertEqual(tls_sessions._session_for_current_origin(), None)
+
+        self.assertEqual(tls_sessions._session_for_current_origin(), None)
+
+    def test_handshake_completed_should_count_resumed_handshakes(self):
+        tls_sessions = TlsSessionCache()
+        self.assertEqual(tls_sessions.resumption_rate, None)
+
+        tls_sessions.handshake_completed(FakeSslObject('session', session_reused = False))
+        tls_sessions.handshake_completed(FakeSslObject('session', session_reused = True))
+        tls_sessions.handshake_completed(FakeSslObject('session', session_reused = True))
+        tls_sessions.handshake_completed(FakeSslObject('session', session_reused = True))
+
+        self.assertEqual(tls_sessions.full_handshakes, 1)
+        self.assertEqual(tls_sessions.resumed_handshakes, 3)
+        self.assertEqual(tls_sessions.resumption_rate, 0.75)
@@ -0,0 +1,96 @@
+import unittest
+
+from ..watchdog_metrics import WatchdogMetrics
+from ..probe_result     import ProbeResult, ProbeRecord, ProbeTimings
+from ..page_table       import PageConfig
+
+class CountingWatchdogMetrics(WatchdogMetrics):
+    def __init__(self, page_configs):
+        super().__init__(page_configs)
+        self.rendered_pages = []
+
+    def _render_page(self, page_index):
+        self.rendered_pages.append(page_index)
+        return super()._render_page(page_index)
+
+class WatchdogMetricsTest(unittest.TestCase):
+    @classmethod
+    def _result(cls, result, request_duration, timings = None):
+        return ProbeRecord(result, 200, 'OK', 0, request_duration, 0, False, ProbeTimings(**timings) if timings != None else None)
+
+    def test_exposition_should_include_cumulative_histogram_and_result_counters(self):
+        metrics = WatchdogMetrics([PageConfig('http://google.pl/"quoted"', (), 60)])
+        metrics.observe_result(0, self._result(ProbeResult.MATCH, 0.003))
+        metrics.observe_result(0, self._result(ProbeResult.MATCH, 0.2))
+        metrics.observe_result(0, self._result(ProbeResult.CONNECTION_ERROR, None))
+
+        lines = metrics.exposition().split('\n')
+
+        labels = 'page="0",url="http://google.pl/\\"quoted\\""'
+        self.assertIn('http_watchdog_request_duration_seconds_bucket{' + labels + ',le="0.005"} 1', lines)
+        self.assertIn('http_watchdog_request_duration_seconds_bucket{' + labels + ',le="0.1"} 1', lines)
+        self.assertIn('http_watchdog_request_duration_seconds_bucket{' + labels + ',le="0.25"} 2', lines)
+        self.assertIn('http_watchdog_request_duration_seconds_bucket{' + labels + ',le="+Inf"} 2', lines)
+        self.assertIn('http_watchdog_request_duration_seconds_count{' + labels + '} 2', lines)
+        self.assertIn('http_watchdog_probe_results_total{' + labels + ',result="match"} 2', lines)
+        self.assertIn('http_watchdog_probe_results_total{' + labels + ',result="connection_error"} 1', lines)
+
+    def test_exposition_should_include_batch_metrics(self):
+        metrics = WatchdogMetrics([])
+        metrics.observe_batch(1.5, 0.25, 3)
+
+        lines = metrics.exposition().split('\n')
+
+        self.assertIn('http_watchdog_cycle_duration_seconds_bucket{le="2.5"} 1', lines)
+        self.assertIn('http_watchdog_cycle_duration_seconds_sum 1.5', lines)
+        self.assertIn('http_watchdog_scheduler_lag_seconds 0.25', lines)
+        self.assertIn('http_watchdog_skipped_probes_total 3', lines)
+
+    def test_exposition_should_include_phase_durations(self):
+        metrics = WatchdogMetrics([PageConfig('http://google.pl/', (), 60)])
+        metrics.observe_result(0, self._result(ProbeResult.MATCH, 0.5, {'dns': None, 'connect': None, 'tls': None, 'ttfb': 0.25, 'download': 0.25, 'dns_source': None}))
+        metrics.observe_result(0, self._result(ProbeResult.MATCH, 0.5, {'dns': 0.5, 'connect': 0.125, 'tls': 0.125, 'ttfb': 0.25, 'download': 0.25, 'dns_source': 'resolver'}))
+
+        lines = metrics.exposition().split('\n')
+
+        self.assertIn('http_watchdog_request_phase_seconds_total{page="0",url="http://google.pl/",phase="ttfb"} 0.5', lines)
+        self.assertIn('http_watchdog_request_phase_seconds_total{page="0",url="http://google.pl/",phase="dns"} 0.5', lines)
+        self.assertIn('http_watchdog_request_phase_duration_seconds_count{phase="dns"} 1', lines)
+        self.assertIn('http_watchdog_request_phase_duration_seconds_count{phase="download"} 2', lines)
+
+    def test_exposition_should_count_dns_lookups_and_exclude_cache_hits_from_dns_time(self):
+        metrics = WatchdogMetrics([PageConfig('http://google.pl/', (), 60)])
+        metrics.observe_result(0, self._result(ProbeResult.MATCH, 0.5, {'dns': 0.5, 'connect': 0.125, 'tls': None, 'ttfb': 0.25, 'download': 0.25, 'dns_source': 'resolver'}))
+        metrics.observe_result(0, self._result(ProbeResult.MATCH, 0.5, {'dns': 0.001, 'connect': 0.125, 'tls': None, 'ttfb': 0.25, 'download': 0.25, 'dns_source': 'cache'}))
+        metrics.observe_result(0, self._result(ProbeResult.MATCH, 0.5, {'dns': 0.002, 'connect': 0.125, 'tls': None, 'ttfb': 0.25, 'download': 0.25, 'dns_source': 'cache'}))
+
+        lines = metrics.exposition().split('\n')
+
+        self.assertIn('http_watchdog_dns_lookups_total{source="cache"} 2', lines)
+        self.assertIn('http_watchdog_dns_lookups_total{source="resolver"} 1', lines)
+        self.assertIn('http_watchdog_request_phase_seconds_total{page="0",url="http://google.pl/",phase="dns"} 0.5', lines)
+        self.assertIn('http_watchdog_request_phase_duration_seconds_count{phase="dns"} 1', lines)
+        self.assertIn('http_watchdog_request_phase_duration_seconds_count{phase="connect"} 3', lines)
+
+    def test_exposition_should_render_again_only_pages_observed_since_previous_call(self):
+        page_configs = [PageConfig('http://site{}.example.com/'.format(i), (), 60) for i in range(5)]
+        metrics      = CountingWatchdogMetrics(page_configs)
+        metrics.observe_result(1, self._result(ProbeResult.MATCH, 0.2))
+        metrics.exposition()
+
+        metrics.rendered_pages = []
+        metrics.observe_result(3, self._result(ProbeResult.NO_MATCH, 0.3))
+        metrics.observe_result(3, self._result(ProbeResult.MATCH, 0.3))
+        metrics.observe_batch(1.5, 0.25, 0)
+        exposition = metrics.exposition()
+
+        self.assertEqual(metrics.rendered_pages, [3])
+        self.assertIn('http_watchdog_probe_results_total{page="3",url="http://site3.example.com/",result="no_match"} 1\n', exposition)
+
+        # Same as rendering everything from scratch, apart from the process metrics
+        rendered_from_scratch = WatchdogMetrics(page_configs)
+        for (page_index, result) in [(1, ProbeResult.MATCH), (3, ProbeResult.NO_MATCH), (3, ProbeResult.MATCH)]:
+            rendered_from_scratch.observe_result(page_index, self._result(result, 0.2 if page_index == 1 else 0.3))
+        rendered_from_scratch.observe_batch(1.5, 0.25, 0)
+
+        self.assertEqual(exposition.split('# HELP process_')[0], rendered_from_scratch.exposition().split('# HELP process_')[0])
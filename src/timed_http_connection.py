@@ -0,0 +1,113 @@
+""" Definitions of TimedHTTPConnection and TimedHTTPSConnection classes that measure how long each phase
+    of establishing a connection takes.
+"""
+
+import time
+import socket
+import http.client
+
+from .dns_cache import DnsCache
+
+def resolve_and_connect(host, port, timeout, source_address, connection_timings, dns_cache = None):
+    """ Resolves host and connects to the first address that accepts the connection. Works like
+        socket.create_connection() but records the time spent resolving the name as 'dns' and
+        connecting as 'connect' in connection_timings (a dict). The name is resolved with dns_cache
+        (a DnsCache) if specified and the source of the addresses is recorded as 'dns_source'.
+    """
+
+    start_time = time.perf_counter()
+    if dns_cache != None:
+        (addresses, dns_source) = dns_cache.resolve(host, port)
+    else:
+        addresses  = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        dns_source = DnsCache.SOURCE_RESOLVER
+
+    connection_timings['dns']        = time.perf_counter() - start_time
+    connection_timings['dns_source'] = dns_source
+
+    start_time = time.perf_counter()
+    last_error = None
+    for (family, socket_type, protocol, canonical_name, address) in addresses:
+        sock = None
+        try:
+            sock = socket.socket(family, socket_type, protocol)
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address != None:
+                sock.bind(source_address)
+
+            sock.connect(address)
+
+            connection_timings['connect'] = time.perf_counter() - start_time
+            return sock
+        except OSError as error:
+            last_error = error
+            if sock != None:
+                sock.close()
+
+    if last_error != None:
+        raise last_error
+
+    raise OSError("getaddrinfo returns an empty list")
+
+class ConnectionTimingMixin:
+    """ Makes an http.client connection record the duration of name resolution and TCP handshake (and TLS
+        handshake in case of HTTPS) in connection_timings. The dict is filled in when the connection is
+        established (i.e. when the first request is sent) and stays empty for requests sent over an
+        already open connection.
+
+        Host names are resolved with dns_cache if it's passed to the constructor.
+    """
+
+    def __init__(self, *args, dns_cache = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connection_timings = {}
+        self._dns_cache         = dns_cache
+
+    def _connect_socket(self):
+        self.connection_timings = {}
+        self.sock = resolve_and_connect(self.host, self.port, self.timeout, self.source_address, self.connection_timings, self._dns_cache)
+
+        # Same as in HTTPConnection.connect(). Requests are small and should not wait for more data.
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+class TimedHTTPConnection(ConnectionTimingMixin, http.client.HTTPConnection):
+    def connect(self):
+        self._connect_socket()
+
+class TimedHTTPSConnection(ConnectionTimingMixin, http.client.HTTPSConnection):
+    """ If tls_sessions (a TlsSessionCache) is passed to the constructor, the connection uses its SSLContext
+        and tries to resume the last TLS session of the origin. The session is updated after every response.
+    """
+
+    def __init__(self, *args, tls_sessions = None, **kwargs):
+        if tls_sessions != None:
+            kwargs['context'] = tls_sessions.context
+
+        super().__init__(*args, **kwargs)
+        self._tls_sessions = tls_sessions
+
+    def connect(self):
+        self._connect_socket()
+
+        start_time = time.perf_counter()
+        if self._tls_sessions != None:
+            with self._tls_sessions.origin(self.host, self.port):
+                self.sock = self._context.wrap_socket(self.sock, server_hostname = self.host)
+
+            self._tls_sessions.handshake_completed(self.sock)
+        else:
+            self.sock = self._context.wrap_socket(self.sock, server_hostname = self.host)
+
+        self.connection_timings['tls'] = time.perf_counter() - start_time
+
+    def getresponse(self):
+        # http.client drops the socket if the server is going to close the connection. It's still open though.
+        sock     = self.sock
+        response = super().getresponse()
+
+        # TLS 1.3 servers send session tickets after the handshake so they have surely arrived before the response
+        if self._tls_sessions != None and sock != None:
+            self._tls_sessions.store(self.host, self.port, sock)
+
+        return response
@@ -0,0 +1,124 @@
+""" Definition of TlsSessionCache class that shares a single SSLContext between all HTTPS connections
+    and lets new connections resume TLS sessions established by the previous ones.
+"""
+
+import ssl
+import contextvars
+from contextlib import contextmanager
+from threading import Lock
+
+# (host, port) of the connection being established by the current thread or task. SSLContext is given
+# only the host name and asyncio does not allow passing a session to the handshake at all.
+_connecting_origin = contextvars.ContextVar('connecting_origin', default = None)
+
+class SessionResumingSSLContext(ssl.SSLContext):
+    """ An SSLContext that offers the server the session stored in session_cache for the origin being
+        connected to, unless a session is passed explicitly.
+    """
+
+    session_cache = None
+
+    def wrap_socket(self, sock, server_side = False, do_handshake_on_connect = True, suppress_ragged_eofs = True, server_hostname = None, session = None):
+        if session == None and not server_side:
+            session = self.session_cache._session_for_current_origin()
+
+        return super().wrap_socket(sock, server_side, do_handshake_on_connect, suppress_ragged_eofs, server_hostname, session)
+
+    def wrap_bio(self, incoming, outgoing, server_side = False, server_hostname = None, session = None):
+        if session == None and not server_side:
+            session = self.session_cache._session_for_current_origin()
+
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session)
+
+class TlsSessionCache:
+    """ Owns the SSLContext used by all HTTPS probes and the latest TLS session of every origin.
+
+        Creating a context loads the whole CA bundle and a full handshake costs a few asymmetric
+        operations on both ends, so neither should be repeated for every probe. Connections that are
+        established within origin() offer the server the last session seen for the origin and if
+        the server accepts it, the handshake is abbreviated.
+
+        Sessions must be stored with store() once the server had a chance to send them. TLS 1.3 servers
+        send session tickets after the handshake, so it's best to do it after receiving the response
+        headers.
+
+        ca_file is a path to a PEM file with trusted CA certificates. The system default ones are used if
+        it's None. verify is one of VERIFY_MODES. 'none' disables both certificate and host name checks.
+    """
+
+    VERIFY_MODES = ['required', 'none']
+
+    def __init__(self, ca_file = None, verify = 'required'):
+        assert verify in self.VERIFY_MODES
+
+        self.context               = self.create_context(ca_file, verify)
+        self.context.session_cache = self
+
+        self._sessions = {}
+        self._lock     = Lock()
+
+        self.full_handshakes    = 0
+        self.resumed_handshakes = 0
+
+    @classmethod
+    def create_context(cls, ca_file, verify):
+        """ Returns a SessionResumingSSLContext configured like ssl.create_default_context() """
+
+        context = SessionResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        if ca_file != None:
+            context.load_verify_locations(cafile = ca_file)
+        else:
+            context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+
+        if verify == 'none':
+            context.check_hostname = False
+            context.verify_mode    = ssl.CERT_NONE
+
+        # Same as the context created by http.client. Both clients speak only HTTP/1.1.
+        context.set_alpn_protocols(['http/1.1'])
+
+        return context
+
+    @contextmanager
+    def origin(self, host, port):
+        """ A context manager. TLS connections established inside it are resumed with the session of specified origin. """
+
+        token = _connecting_origin.set((host, port))
+        try:
+            yield
+        finally:
+            _connecting_origin.reset(token)
+
+    def _session_for_current_origin(self):
+        origin = _connecting_origin.get()
+        if origin == None:
+            return None
+
+        with self._lock:
+            return self._sessions.get(origin)
+
+    def handshake_completed(self, ssl_object):
+        """ Counts a completed handshake. ssl_object is an SSLSocket or SSLObject. """
+
+        with self._lock:
+            if ssl_object.session_reused:
+                self.resumed_handshakes += 1
+            else:
+                self.full_handshakes += 1
+
+    def store(self, host, port, ssl_object):
+        """ Remembers the current session of ssl_object (an SSLSocket or SSLObject) for specified origin """
+
+        session = ssl_object.session
+        if session == None:
+            return
+
+        with self._lock:
+            self._sessions[(host, port)] = session
+
+    @property
+    def resumption_rate(self):
+        """ The fraction of handshakes that resumed a session. None if there were no handshakes yet. """
+
+        total = self.full_handshakes + self.resumed_handshakes
+        return self.resumed_handshakes / total if total > 0 else None
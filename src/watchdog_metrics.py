@@ -0,0 +1,292 @@
+""" Definition of WatchdogMetrics class that collects statistics of the watchdog and exposes them in Prometheus text format """
+
+import os
+import time
+import bisect
+from array     import array
+from threading import Lock
+
+from .probe_result import ProbeResult
+from .dns_cache    import DnsCache
+
+class WatchdogMetrics:
+    """ A set of counters updated by the probing thread after every probe and every batch.
+
+        Updating a metric is just an increment of a few numbers so it does not slow down probing.
+        The text exposed to Prometheus is generated only when requested. The lines describing
+        each page are kept between requests and generated again only for the pages that have
+        been probed since the previous request, so the cost of a scrape depends on the number
+        of probes in between rather than on the number of pages. Values of different metrics are
+        read without locking, so a scrape that coincides with an update may see a count that
+        already includes a probe and a sum that does not. Prometheus tolerates it and the next
+        scrape is consistent again.
+    """
+
+    # Upper bounds (in seconds) of histogram buckets. The last, implicit bucket is +Inf.
+    DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+    # SYNC: Keep in sync with HttpWatchdog.TIMING_PHASES
+    TIMING_PHASES = ['dns', 'connect', 'tls', 'ttfb', 'download']
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+    # Metrics broken down by page, each one with its HELP and TYPE lines
+    PAGE_METRIC_HEADERS = [
+        (
+            '# HELP http_watchdog_request_duration_seconds Time it took to complete the request for a page.\n'
+            '# TYPE http_watchdog_request_duration_seconds histogram\n'
+        ),
+        (
+            '# HELP http_watchdog_probe_results_total Number of probes of a page by their result.\n'
+            '# TYPE http_watchdog_probe_results_total counter\n'
+        ),
+        (
+            '# HELP http_watchdog_request_phase_seconds_total Total time spent in each phase of the requests for a page.\n'
+            '# TYPE http_watchdog_request_phase_seconds_total counter\n'
+        ),
+    ]
+
+    def __init__(self, page_configs):
+        page_count = len(page_configs)
+
+        # Page labels are the same in every scrape so they're formatted only once
+        self._escaped_urls = [self._escape_label_value(page_config.url) for page_config in page_configs]
+        self._page_labels  = self._format_page_labels(self._escaped_urls)
+
+        # Non-cumulative bucket counts. The cumulative ones required by the format are computed when rendering.
+        self._duration_buckets = [array('Q', [0] * (len(self.DURATION_BUCKETS) + 1)) for i in range(page_count)]
+        self._duration_sums    = array('d', [0.0] * page_count)
+        self._result_counts    = [{} for i in range(page_count)]
+        self._phase_sums       = [array('d', [0.0] * len(self.TIMING_PHASES)) for i in range(page_count)]
+
+        # A histogram per phase would multiply the size of the output so they're not broken down by page
+        self._phase_buckets = [array('Q', [0] * (len(self.DURATION_BUCKETS) + 1)) for phase in self.TIMING_PHASES]
+        self._phase_totals  = array('d', [0.0] * len(self.TIMING_PHASES))
+        self._dns_lookups   = {}
+
+        self._cycle_buckets     = array('Q', [0] * (len(self.DURATION_BUCKETS) + 1))
+        self._cycle_sum         = 0.0
+        self._scheduler_lag     = 0.0
+        self._skipped_probes    = 0
+        self._observation_count = 0
+
+        # Lines of each of PAGE_METRIC_HEADERS for every page, kept between scrapes. A page is marked as dirty
+        # after its counters are updated and its lines are generated again by the next scrape.
+        self._page_lines  = [None] * page_count
+        self._dirty_pages = bytearray(b'\x01') * page_count
+
+        self._cache      = (None, None)
+        self._cache_lock = Lock()
+
+    @classmethod
+    def _escape_label_value(cls, value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    @classmethod
+    def _format_page_labels(cls, escaped_urls):
+        return ['page="{}",url="{}"'.format(page_index, escaped_url) for (page_index, escaped_url) in enumerate(escaped_urls)]
+
+    def reordered(self, page_configs, old_indices):
+        """ Returns new metrics for a changed list of pages. old_indices[i] is the index of i-th page from page_configs
+            in these metrics or None if the page is new. The counters of the pages that are still present and all the
+            counters not broken down by page are carried over. The page labels change along with page indices.
+
+            This instance must not be updated afterwards but can still be exposed by readers that use it.
+        """
+
+        metrics = WatchdogMetrics([])
+
+        metrics._escaped_urls = [
+            self._escaped_urls[old_index] if old_index != None else self._escape_label_value(page_config.url)
+            for (page_config, old_index) in zip(page_configs, old_indices)
+        ]
+        metrics._page_labels      = self._format_page_labels(metrics._escaped_urls)
+        metrics._duration_buckets = [self._duration_buckets[old_index] if old_index != None else array('Q', [0] * (len(self.DURATION_BUCKETS) + 1)) for old_index in old_indices]
+        metrics._duration_sums    = array('d', [self._duration_sums[old_index] if old_index != None else 0.0 for old_index in old_indices])
+        metrics._result_counts    = [self._result_counts[old_index] if old_index != None else {} for old_index in old_indices]
+        metrics._phase_sums       = [self._phase_sums[old_index] if old_index != None else array('d', [0.0] * len(self.TIMING_PHASES)) for old_index in old_indices]
+
+        metrics._phase_buckets     = self._phase_buckets
+        metrics._phase_totals      = self._phase_totals
+        metrics._dns_lookups       = self._dns_lookups
+        metrics._cycle_buckets     = self._cycle_buckets
+        metrics._cycle_sum         = self._cycle_sum
+        metrics._scheduler_lag     = self._scheduler_lag
+        metrics._skipped_probes    = self._skipped_probes
+        metrics._observation_count = self._observation_count
+
+        # Page labels have changed so the lines of all pages are generated anew
+        metrics._page_lines  = [None] * len(page_configs)
+        metrics._dirty_pages = bytearray(b'\x01') * len(page_configs)
+
+        return metrics
+
+    def observe_result(self, page_index, result):
+        """ Updates the metrics with a ProbeRecord (in the format used by HttpWatchdog.probe_results) """
+
+        if result.request_duration != None:
+            self._duration_buckets[page_index][bisect.bisect_left(self.DURATION_BUCKETS, result.request_duration)] += 1
+            self._duration_sums[page_index] += result.request_duration
+
+        if result.timings != None:
+            dns_source = result.timings.dns_source
+            if dns_source != None:
+                self._dns_lookups[dns_source] = self._dns_lookups.get(dns_source, 0) + 1
+
+            for (phase_index, phase) in enumerate(self.TIMING_PHASES):
+                duration = getattr(result.timings, phase)
+
+                # Only real lookups count as DNS time. Cache hits are counted in http_watchdog_dns_lookups_total.
+                if phase == 'dns' and dns_source != DnsCache.SOURCE_RESOLVER:
+                    continue
+
+                if duration != None:
+                    self._phase_sums[page_index][phase_index] += duration
+                    self._phase_buckets[phase_index][bisect.bisect_left(self.DURATION_BUCKETS, duration)] += 1
+                    self._phase_totals[phase_index] += duration
+
+        result_counts = self._result_counts[page_index]
+        result_counts[result.result] = result_counts.get(result.result, 0) + 1
+
+        # NOTE: Marked after the update. A scrape that clears the mark in the middle of it sees the mark again next time.
+        self._dirty_pages[page_index] = 1
+        self._observation_count += 1
+
+    def observe_batch(self, duration, scheduler_lag, skipped_probes):
+        """ Updates the metrics after a batch of probes that took duration seconds. scheduler_lag is the
+            maximum lag in the batch and skipped_probes the number of deadlines that had to be skipped.
+        """
+
+        self._cycle_buckets[bisect.bisect_left(self.DURATION_BUCKETS, duration)] += 1
+        self._cycle_sum      += duration
+        self._scheduler_lag   = scheduler_lag
+        self._skipped_probes += skipped_probes
+
+        self._observation_count += 1
+
+    @classmethod
+    def _histogram_lines(cls, name, labels, buckets, total):
+        separator = ',' if labels != '' else ''
+
+        lines      = []
+        cumulative = 0
+        for (upper_bound, count) in zip(cls.DURATION_BUCKETS + ['+Inf'], buckets):
+            cumulative += count
+            lines.append('{}_bucket{{{}{}le="{}"}} {}\n'.format(name, labels, separator, upper_bound, cumulative))
+
+        braced_labels = '{' + labels + '}' if labels != '' else ''
+        lines.append('{}_sum{} {}\n'.format(name, braced_labels, repr(total)))
+        lines.append('{}_count{} {}\n'.format(name, braced_labels, cumulative))
+
+        return lines
+
+    def _render_page(self, page_index):
+        """ Returns the lines of each of PAGE_METRIC_HEADERS for specified page, each one joined into a single string """
+
+        labels = self._page_labels[page_index]
+
+        duration_lines = self._histogram_lines('http_watchdog_request_duration_seconds', labels, self._duration_buckets[page_index], self._duration_sums[page_index])
+
+        result_lines = []
+        for (result, count) in sorted(self._result_counts[page_index].items()):
+            result_label = ProbeResult.to_str(result).lower().replace(' ', '_')
+            result_lines.append('http_watchdog_probe_results_total{{{},result="{}"}} {}\n'.format(labels, result_label, count))
+
+        phase_lines = [
+            'http_watchdog_request_phase_seconds_total{{{},phase="{}"}} {}\n'.format(labels, phase, repr(total))
+            for (phase, total) in zip(self.TIMING_PHASES, self._phase_sums[page_index])
+        ]
+
+        return (''.join(duration_lines), ''.join(result_lines), ''.join(phase_lines))
+
+    def _render_watchdog_metrics(self):
+        """ Generates the lines of the dirty pages and joins them with the metrics that are not broken down by page.
+            Must be called with _cache_lock held.
+        """
+
+        page_index = self._dirty_pages.find(1)
+        while page_index != -1:
+            self._dirty_pages[page_index] = 0
+            self._page_lines[page_index]  = self._render_page(page_index)
+
+            page_index = self._dirty_pages.find(1, page_index + 1)
+
+        lines = []
+        for (metric_index, header) in enumerate(self.PAGE_METRIC_HEADERS):
+            lines.append(header)
+            lines.extend(page_lines[metric_index] for page_lines in self._page_lines)
+
+        lines += [
+            '# HELP http_watchdog_request_phase_duration_seconds Duration of each phase of a request, for all pages.\n',
+            '# TYPE http_watchdog_request_phase_duration_seconds histogram\n',
+        ]
+        for (phase, buckets, total) in zip(self.TIMING_PHASES, self._phase_buckets, self._phase_totals):
+            lines += self._histogram_lines('http_watchdog_request_phase_duration_seconds', 'phase="{}"'.format(phase), buckets, total)
+
+        lines += [
+            '# HELP http_watchdog_dns_lookups_total Number of host name lookups by the source of the answer (cache, resolver or stale).\n',
+            '# TYPE http_watchdog_dns_lookups_total counter\n',
+        ]
+        for (dns_source, count) in sorted(self._dns_lookups.items()):
+            lines.append('http_watchdog_dns_lookups_total{{source="{}"}} {}\n'.format(dns_source, count))
+
+        lines += [
+            '# HELP http_watchdog_cycle_duration_seconds Time it took to perform a batch of probes that were due at the same time.\n',
+            '# TYPE http_watchdog_cycle_duration_seconds histogram\n',
+        ]
+        lines += self._histogram_lines('http_watchdog_cycle_duration_seconds', '', self._cycle_buckets, self._cycle_sum)
+
+        lines += [
+            '# HELP http_watchdog_scheduler_lag_seconds The longest delay between the deadline of a probe and its start in the last batch.\n',
+            '# TYPE http_watchdog_scheduler_lag_seconds gauge\n',
+            'http_watchdog_scheduler_lag_seconds {}\n'.format(repr(self._scheduler_lag)),
+            '# HELP http_watchdog_skipped_probes_total Number of probes skipped because probing could not keep up.\n',
+            '# TYPE http_watchdog_skipped_probes_total counter\n',
+            'http_watchdog_skipped_probes_total {}\n'.format(self._skipped_probes),
+        ]
+
+        return ''.join(lines)
+
+    @classmethod
+    def _resident_memory(cls):
+        """ Returns the resident set size of the process in bytes or None if it cannot be determined (e.g. without /proc) """
+
+        try:
+            with open('/proc/self/statm') as statm_file:
+                return int(statm_file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            return None
+
+    @classmethod
+    def _render_process_metrics(cls):
+        lines = [
+            '# HELP process_cpu_seconds_total Total user and system CPU time spent in seconds.\n',
+            '# TYPE process_cpu_seconds_total counter\n',
+            'process_cpu_seconds_total {}\n'.format(repr(time.process_time())),
+        ]
+
+        resident_memory = cls._resident_memory()
+        if resident_memory != None:
+            lines += [
+                '# HELP process_resident_memory_bytes Resident memory size in bytes.\n',
+                '# TYPE process_resident_memory_bytes gauge\n',
+                'process_resident_memory_bytes {}\n'.format(resident_memory),
+            ]
+
+        return ''.join(lines)
+
+    def exposition(self):
+        """ Returns all metrics in Prometheus text exposition format. Nothing but the process metrics is
+            generated again unless something has been observed since the previous call and even then only
+            the lines of the pages probed in the meantime (see _render_watchdog_metrics()).
+        """
+
+        observation_count = self._observation_count
+
+        with self._cache_lock:
+            (cached_count, cached_text) = self._cache
+            if cached_count != observation_count:
+                cached_text = self._render_watchdog_metrics()
+                self._cache = (observation_count, cached_text)
+
+        return cached_text + self._render_process_metrics()